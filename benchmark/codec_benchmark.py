@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import codec
+
+
+def make_payload(rows: int) -> Dict[str, Any]:
+    """生成类似SAP物料清单的TOOL_USED响应
+
+    Args:
+        rows: 行数
+
+    Returns:
+        dict: JSON-RPC格式的响应数据
+    """
+    return {
+        "JSONRPC": "2.0",
+        "RESULT": [
+            {
+                "MATNR": f"{index:018d}",
+                "MAKTX": f"测试物料 {index} 描述文本",
+                "MTART": "FERT",
+                "MEINS": "EA",
+                "BRGEW": round(index * 0.125, 3),
+                "LABST": index % 1000,
+                "WERKS": "1000",
+                "ERSDA": "2024-01-01",
+                "BLOCKED": index % 7 == 0
+            }
+            for index in range(rows)
+        ],
+        "ID": ""
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int) -> float:
+    """测量函数的平均CPU时间（毫秒）"""
+    func()
+    start = time.process_time()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - start) * 1000 / repeat
+
+
+def run(rows: int, repeat: int) -> List[Dict[str, Any]]:
+    """对比标准库和utils.codec处理一次SAP调用的CPU时间
+
+    一次调用包括：编码请求体、解码响应体、记录响应日志（前500字符）。
+
+    Args:
+        rows: 响应行数
+        repeat: 重复次数
+
+    Returns:
+        list: 每个步骤的耗时对比
+    """
+    payload = make_payload(rows)
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+    steps = [
+        (
+            "编码请求体",
+            lambda: json.dumps(payload).encode("utf-8"),
+            lambda: codec.dumps(payload)
+        ),
+        (
+            "解码响应体",
+            lambda: json.loads(body.decode("utf-8")),
+            lambda: codec.loads(body)
+        ),
+        (
+            "记录响应日志",
+            lambda: json.dumps(payload, ensure_ascii=False)[:500],
+            lambda: codec.preview(body)
+        ),
+    ]
+
+    results = []
+    for name, baseline, candidate in steps:
+        baseline_ms = measure(baseline, repeat)
+        candidate_ms = measure(candidate, repeat)
+        results.append({
+            "step": name,
+            "stdlib_ms": baseline_ms,
+            "codec_ms": candidate_ms,
+            "speedup": baseline_ms / candidate_ms if candidate_ms else float("inf")
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON编解码性能对比")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 10000, 100000], help="响应行数")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数")
+    args = parser.parse_args()
+
+    print(f"JSON后端: {codec.JSON_BACKEND}")
+    for rows in args.rows:
+        size = len(codec.dumps(make_payload(rows)))
+        print(f"\n行数: {rows}, 响应大小: {size / 1024:.1f} KB")
+        print(f"{'步骤':<10}{'标准库(ms)':>14}{'codec(ms)':>14}{'加速比':>10}")
+        total_baseline = total_candidate = 0.0
+        for result in run(rows, args.repeat):
+            total_baseline += result["stdlib_ms"]
+            total_candidate += result["codec_ms"]
+            print(f"{result['step']:<10}{result['stdlib_ms']:>14.3f}{result['codec_ms']:>14.3f}{result['speedup']:>9.1f}x")
+        print(f"{'合计':<10}{total_baseline:>14.3f}{total_candidate:>14.3f}{total_baseline / total_candidate:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
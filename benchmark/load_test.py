@@ -0,0 +1,416 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import httpx
+from fastmcp import Client
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from mcpDemo.mockSapServer import MOCK_CONFIG
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 基准测试时模拟SAP的默认配置（覆盖mcpDemo/mockSapServer.py中面向本地调试的默认值）
+BENCHMARK_MOCK_CONFIG = dict(MOCK_CONFIG, tools=20, jitter_ms=10.0, metadata_latency_ms=5.0, seed=42)
+
+# 负载场景：每个场景是按顺序循环调用的(MCP工具名, 参数生成函数)列表
+SCENARIOS = {
+    "use_tool": [("use_tool", lambda index, tools: {"json_data": {
+        "TOOL_ID": tools[index % len(tools)], "IV_MATNR": f"{index:018d}", "IV_WERKS": "1000"
+    }})],
+    "tool_list": [("get_tool_list", lambda index, tools: {})],
+    "tool_details": [("get_tool_details", lambda index, tools: {"json_data": {"TOOL_ID": tools[index % len(tools)]}})],
+    # 模拟智能体的典型调用顺序：偶尔查清单和参数格式，大部分是执行工具
+    "mixed": [
+        ("get_tool_list", lambda index, tools: {}),
+        ("get_tool_details", lambda index, tools: {"json_data": {"TOOL_ID": tools[index % len(tools)]}}),
+    ] + [("use_tool", lambda index, tools: {"json_data": {
+        "TOOL_ID": tools[index % len(tools)], "IV_MATNR": f"{index:018d}", "IV_WERKS": "1000"
+    }})] * 8,
+}
+
+# 与基线对比的指标：(结果中的键, 名称, 越大越好)
+COMPARED_METRICS = [
+    ("throughput", "吞吐量(次/秒)", True),
+    ("p50_ms", "p50(毫秒)", False),
+    ("p95_ms", "p95(毫秒)", False),
+    ("p99_ms", "p99(毫秒)", False),
+    ("error_rate", "错误率", False),
+    ("rss_peak_mb", "峰值内存(MB)", False),
+]
+
+
+def free_port() -> int:
+    """获取一个空闲的本地端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], percent: float) -> Optional[float]:
+    """计算百分位数（线性插值）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def process_rss(pid: int) -> Optional[int]:
+    """获取进程及其子进程（多工作进程模式下的工作进程）的常驻内存之和（字节），无法获取时返回None"""
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            return sum(item.memory_info().rss for item in [process] + process.children())
+        except psutil.Error:
+            return None
+    rss = _proc_rss(pid)
+    if rss is None:
+        return None
+    for name in os.listdir("/proc"):
+        if name.isdigit() and _proc_parent_pid(int(name)) == pid:
+            rss += _proc_rss(int(name)) or 0
+    return rss
+
+
+def _proc_parent_pid(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/stat", "r", encoding="ascii", errors="replace") as f:
+            return int(f.read().rsplit(")", 1)[1].split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _proc_rss(pid: int) -> Optional[int]:
+    """从/proc读取单个进程的常驻内存（字节）"""
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+async def wait_until(url: str, timeout: float, process: subprocess.Popen) -> None:
+    """等待URL返回200，进程提前退出或超时时抛出RuntimeError"""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2.0) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"进程已退出（退出码 {process.returncode}）: {' '.join(process.args)}")
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"等待 {url} 超时（{timeout}秒）")
+
+
+def start_process(args: List[str], env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    """启动子进程，输出写入日志文件"""
+    log_file = open(log_path, "w", encoding="utf-8")
+    return subprocess.Popen(args, cwd=PROJECT_ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def stop_process(process: Optional[subprocess.Popen]) -> None:
+    """停止子进程"""
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+class MemorySampler:
+    """定期采样进程的常驻内存"""
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[int] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._sample()
+
+    def _sample(self) -> None:
+        rss = process_rss(self.pid)
+        if rss is not None:
+            self.samples.append(rss)
+
+    async def _run(self) -> None:
+        while True:
+            self._sample()
+            await asyncio.sleep(self.interval)
+
+
+async def run_clients(url: str, args: argparse.Namespace, tools: List[str]) -> Dict[str, Any]:
+    """用多个并发的fastmcp.Client发送请求
+
+    Args:
+        url: MCP服务器地址
+        args: 命令行参数
+        tools: 可用的工具ID
+
+    Returns:
+        dict: 每次调用的耗时、错误统计和总耗时
+    """
+    steps = SCENARIOS[args.scenario]
+    latencies: List[float] = []
+    errors: Counter = Counter()
+    counter = iter(range(args.requests))
+    deadline = time.monotonic() + args.duration if args.duration else None
+
+    async def worker() -> None:
+        async with Client(url, timeout=args.call_timeout) as client:
+            for index in counter:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return
+                name, make_arguments = steps[index % len(steps)]
+                start = time.monotonic()
+                try:
+                    result = await client.call_tool(name, make_arguments(index, tools), raise_on_error=False)
+                    latencies.append(time.monotonic() - start)
+                    data = result.structured_content
+                    if result.is_error:
+                        errors["tool_error"] += 1
+                    elif isinstance(data, dict) and "error" in data:
+                        # 工具通过handle_error返回的错误（SAP错误、熔断等）
+                        errors[classify_error(str(data["error"]))] += 1
+                except Exception as e:
+                    latencies.append(time.monotonic() - start)
+                    errors[f"client:{type(e).__name__}"] += 1
+
+    start = time.monotonic()
+    await asyncio.gather(*(worker() for _ in range(args.clients)))
+    return {"latencies": latencies, "errors": errors, "elapsed": time.monotonic() - start}
+
+
+def classify_error(message: str) -> str:
+    """根据工具返回的错误信息归类"""
+    if "熔断" in message:
+        return "circuit_open"
+    if "HTML" in message:
+        return "html_reauth"
+    if "超时" in message or "Timeout" in message:
+        return "timeout"
+    if "HTTP请求错误: 5" in message:
+        return "http_5xx"
+    if "排队" in message:
+        return "overload"
+    return "other"
+
+
+async def benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """启动模拟SAP和MCP服务器，运行负载并汇总结果"""
+    sap_port = args.sap_port or free_port()
+    mcp_port = args.mcp_port or free_port()
+    os.makedirs(args.work_dir, exist_ok=True)
+
+    mock_args = [sys.executable, os.path.join("mcpDemo", "mockSapServer.py"), "--port", str(sap_port)]
+    for key in MOCK_CONFIG:
+        value = getattr(args, key)
+        if value is not None:
+            mock_args += [f"--{key.replace('_', '-')}", str(value)]
+
+    # MCP服务器从环境变量读取配置（见utils/config.example.py）
+    env = dict(os.environ)
+    env.update({
+        "SAP_BASE_URL": f"http://127.0.0.1:{sap_port}/sap/zmcp",
+        "SAP_TIMEOUT": str(args.sap_timeout),
+        "MCP_HOST": "127.0.0.1",
+        "MCP_PORT": str(mcp_port),
+        "MCP_PATH": "/mcp",
+        "MCP_WORKERS": str(args.workers),
+        "PYTHONUNBUFFERED": "1",
+    })
+
+    mock_process = mcp_process = None
+    try:
+        mock_process = start_process(mock_args, env, os.path.join(args.work_dir, "mock_sap.log"))
+        await wait_until(f"http://127.0.0.1:{sap_port}/stats", 30, mock_process)
+
+        mcp_process = start_process(
+            [sys.executable, os.path.join("server", "sap_mcp_server.py")],
+            env,
+            os.path.join(args.work_dir, "mcp_server.log")
+        )
+        # /ready在预热完成后返回200
+        await wait_until(f"http://127.0.0.1:{mcp_port}/ready", 120, mcp_process)
+
+        tools = [f"BENCH_TOOL_{index:03d}" for index in range(args.tools)]
+        url = f"http://127.0.0.1:{mcp_port}/mcp"
+
+        # 预热：建立连接、加载参数格式，不计入结果
+        if args.warmup:
+            warmup_args = argparse.Namespace(**vars(args))
+            warmup_args.requests, warmup_args.duration = args.warmup, 0
+            await run_clients(url, warmup_args, tools)
+        async with httpx.AsyncClient() as client:
+            # 只统计正式负载期间的请求
+            await client.post(f"http://127.0.0.1:{sap_port}/config", json={"seed": args.seed})
+
+        rss_before = process_rss(mcp_process.pid)
+        sampler = MemorySampler(mcp_process.pid)
+        sampler.start()
+        run = await run_clients(url, args, tools)
+        await sampler.stop()
+
+        async with httpx.AsyncClient() as client:
+            sap_stats = (await client.get(f"http://127.0.0.1:{sap_port}/stats")).json()
+    finally:
+        stop_process(mcp_process)
+        stop_process(mock_process)
+
+    latencies_ms = [latency * 1000 for latency in run["latencies"]]
+    completed = len(latencies_ms)
+    error_count = sum(run["errors"].values())
+    mb = 1024 * 1024
+    return {
+        "scenario": args.scenario,
+        "clients": args.clients,
+        "workers": args.workers,
+        "completed": completed,
+        "elapsed_s": round(run["elapsed"], 3),
+        "throughput": round(completed / run["elapsed"], 2) if run["elapsed"] else 0.0,
+        "mean_ms": round(sum(latencies_ms) / completed, 3) if completed else None,
+        "p50_ms": round(percentile(latencies_ms, 50), 3) if completed else None,
+        "p95_ms": round(percentile(latencies_ms, 95), 3) if completed else None,
+        "p99_ms": round(percentile(latencies_ms, 99), 3) if completed else None,
+        "max_ms": round(max(latencies_ms), 3) if completed else None,
+        "errors": dict(run["errors"]),
+        "error_rate": round(error_count / completed, 4) if completed else 0.0,
+        "rss_before_mb": round(rss_before / mb, 1) if rss_before else None,
+        "rss_peak_mb": round(max(sampler.samples) / mb, 1) if sampler.samples else None,
+        "rss_after_mb": round(sampler.samples[-1] / mb, 1) if sampler.samples else None,
+        "sap_requests": sap_stats["requests"],
+        "sap_faults": sap_stats["faults"],
+        "mock_config": {key: getattr(args, key) for key in MOCK_CONFIG},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+    }
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    """打印结果"""
+    print(f"场景: {result['scenario']}, 并发客户端: {result['clients']}, 工作进程: {result.get('workers', 1)}, "
+          f"完成: {result['completed']} 次, "
+          f"耗时: {result['elapsed_s']}秒")
+    print(f"吞吐量: {result['throughput']} 次/秒")
+    print(f"延迟(毫秒): 平均 {result['mean_ms']}, p50 {result['p50_ms']}, p95 {result['p95_ms']}, "
+          f"p99 {result['p99_ms']}, 最大 {result['max_ms']}")
+    print(f"错误率: {result['error_rate']:.2%} {result['errors'] or ''}")
+    print(f"MCP服务器内存(MB): 负载前 {result['rss_before_mb']}, 峰值 {result['rss_peak_mb']}, "
+          f"负载后 {result['rss_after_mb']}")
+    print(f"SAP请求: {result['sap_requests']}, 模拟故障: {result['sap_faults']}")
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """与基线对比并打印差异
+
+    Args:
+        result: 本次结果
+        baseline: 基线结果
+        threshold: 允许的性能下降比例（如0.1表示10%）
+
+    Returns:
+        bool: 没有指标下降超过threshold时返回True
+    """
+    print(f"\n与基线对比（{baseline.get('environment', {}).get('time', '')}）:")
+    print(f"{'指标':<14}{'基线':>12}{'本次':>12}{'变化':>10}")
+    passed = True
+    for key, name, higher_is_better in COMPARED_METRICS:
+        old, new = baseline.get(key), result.get(key)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        if key == "error_rate":
+            # 错误率基线常为0，按绝对值比较（阈值10%对应错误率上升1个百分点）
+            regressed = new - old > threshold / 10
+        else:
+            regressed = change < -threshold if higher_is_better else change > threshold
+        passed = passed and not regressed
+        print(f"{name:<14}{old:>12}{new:>12}{change:>+9.1%}{'  退化' if regressed else ''}")
+    return passed
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="通过模拟SAP接口对MCP服务器进行负载测试")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="use_tool", help="负载场景")
+    parser.add_argument("--clients", type=int, default=20, help="并发的MCP客户端数量")
+    parser.add_argument("--requests", type=int, default=2000, help="请求总数")
+    parser.add_argument("--duration", type=float, default=0, help="最长运行时间（秒），0表示不限制")
+    parser.add_argument("--warmup", type=int, default=100, help="预热请求数（不计入结果）")
+    parser.add_argument("--call-timeout", type=float, default=120.0, help="单次工具调用的客户端超时（秒）")
+    parser.add_argument("--sap-timeout", type=int, default=30, help="MCP服务器调用SAP的超时（秒）")
+    parser.add_argument("--sap-port", type=int, default=0, help="模拟SAP端口，0表示自动选择")
+    parser.add_argument("--mcp-port", type=int, default=0, help="MCP服务器端口，0表示自动选择")
+    parser.add_argument("--workers", type=int, default=1, help="MCP服务器工作进程数量（MCP_WORKERS）")
+    parser.add_argument("--work-dir", default=os.path.join(PROJECT_ROOT, "log", "benchmark"), help="子进程日志目录")
+    parser.add_argument("--output", help="把结果保存为JSON文件（可作为之后的基线）")
+    parser.add_argument("--baseline", help="基线结果JSON文件，对比后有指标退化时退出码为1")
+    parser.add_argument("--threshold", type=float, default=0.1, help="允许的性能下降比例")
+    mock = parser.add_argument_group("模拟SAP配置（见mcpDemo/mockSapServer.py）")
+    for key, value in BENCHMARK_MOCK_CONFIG.items():
+        mock.add_argument(
+            f"--{key.replace('_', '-')}",
+            dest=key,
+            type=type(value) if value is not None else int,
+            default=value
+        )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    result = asyncio.run(benchmark(args))
+    print_result(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if not compare(result, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
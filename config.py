@@ -4,5 +4,11 @@
 # 从utils.config导入配置
 from utils.config import SAP_CONFIG, MCP_SERVER_CONFIG, WEB_CONFIG
 
+# 多SAP系统配置是可选的，旧版utils/config.py中没有时只使用SAP_CONFIG
+try:
+    from utils.config import SAP_SYSTEMS
+except ImportError:
+    SAP_SYSTEMS = {}
+
 # 为了保持向后兼容，确保这些变量在模块级别可用
 
@@ -0,0 +1,45 @@
+import asyncio
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import SAP_CONFIG
+from server.http_client import SAPHttpClient
+from server.batching import ToolCallBatcher
+
+MOCK_BASE_URL = "http://127.0.0.1:6699/sap/zmcp"
+
+
+async def main():
+    """并发提交多个TOOL_USED调用，验证批量信封的打包和拆分"""
+    SAP_CONFIG["base_url"] = MOCK_BASE_URL
+    client = SAPHttpClient()
+    batcher = ToolCallBatcher(client, window=0.01, max_batch_size=20)
+
+    requests = [
+        {"TOOL_ID": "GET_MATNR_FROM_DES", "PARAM": {"IMPORT": {"LANGU": "ZH", "MAKTX": f"物料{i}"}}}
+        for i in range(50)
+    ]
+    # 混入一个不存在的工具，验证单个条目失败不影响其他条目
+    requests.append({"TOOL_ID": "NOT_EXIST", "PARAM": {}})
+
+    results = await asyncio.gather(*(batcher.submit(request) for request in requests), return_exceptions=True)
+    await client.close()
+
+    failed = [result for result in results if isinstance(result, Exception)]
+    print(f"调用数量: {batcher.calls_submitted}")
+    print(f"HTTP请求数量: {batcher.requests_sent}")
+    print(f"成功: {len(results) - len(failed)}, 失败: {len(failed)}")
+    if failed:
+        print(f"失败原因: {failed[0]}")
+
+    async with httpx.AsyncClient() as http:
+        stats = (await http.get(MOCK_BASE_URL.split("/sap/")[0] + "/stats")).json()
+    print(f"模拟SAP收到的请求: {stats['requests']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,239 @@
+"""本地模拟SAP ICF接口
+
+实现TOOL_LIST、TOOL_DETAIL、TOOL_USED、TOOL_USED_BATCH和PING，用于在没有SAP系统时调试MCP服务器，
+也是benchmark/load_test.py使用的模拟SAP（可以模拟处理时间、5xx、超时、HTML登录页和SSE响应）。
+启动后将SAP_CONFIG["base_url"]设置为 http://127.0.0.1:6699/sap/zmcp 即可。
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+from collections import Counter
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import codec
+
+app = FastAPI(title="Mock SAP ICF")
+
+# 模拟配置，可以通过命令行参数或POST /config修改
+MOCK_CONFIG = {
+    "tools": 0,  # 额外生成的基准测试工具数量，TOOL_ID为 BENCH_TOOL_000 ~ BENCH_TOOL_{tools-1}
+    "latency_ms": 50.0,  # TOOL_USED的平均处理时间（毫秒）
+    "jitter_ms": 0.0,  # 处理时间的标准差（毫秒）
+    "metadata_latency_ms": 0.0,  # TOOL_LIST/TOOL_DETAIL的处理时间（毫秒）
+    "rows": 10,  # 基准测试工具返回的数据行数
+    "error_rate": 0.0,  # 返回503的比例
+    "timeout_rate": 0.0,  # 不响应（超过客户端超时时间）的比例
+    "hang_seconds": 60.0,  # 模拟超时时的等待时间（秒）
+    "html_rate": 0.0,  # 返回HTML登录页（状态码200）的比例，模拟登录会话失效
+    "sse_rate": 0.0,  # 以Server-Sent Events格式返回的比例
+    "seed": None,  # 随机数种子，固定后每次运行的错误分布相同
+}
+
+HTML_LOGIN_PAGE = (
+    b"<!DOCTYPE html><html><head><title>Logon</title></head>"
+    b"<body><form action=\"/sap/bc/gui/sap/its/webgui\">SAP NetWeaver Logon</form></body></html>"
+)
+
+# 每个接口ID收到的请求数量，以及模拟的故障数量
+request_counter: Counter = Counter()
+fault_counter: Counter = Counter()
+
+# 模拟工具配置
+MOCK_TOOLS = {
+    "GET_MATNR_FROM_DES": {
+        "DESCRIPTION": "Enter material description and language",
+        "PARAM": {"IMPORT": {"LANGU": "", "MAKTX": ""}}
+    },
+    "CHECK_MATNR": {
+        "DESCRIPTION": "Enter the material number and return the",
+        "PARAM": {"IMPORT": {"MATERIAL": ""}}
+    },
+}
+
+# 基准测试工具的参数格式（TOOL_DETAIL的PARAM）
+BENCH_TOOL_PARAM = {
+    "IMPORT": {
+        "IV_MATNR": {"TYPE": "CHAR", "LENGTH": 18, "DESCRIPTION": "物料编号"},
+        "IV_WERKS": {"TYPE": "CHAR", "LENGTH": 4, "DESCRIPTION": "工厂"},
+        "IV_MAX_ROWS": {"TYPE": "INT4", "DESCRIPTION": "最大行数"},
+    }
+}
+
+# 按行数缓存的基准测试结果行，避免模拟服务器自身成为瓶颈
+_rows_cache: Dict[int, List[Dict[str, Any]]] = {}
+_random = random.Random()
+
+
+def bench_tool_ids() -> List[str]:
+    """基准测试工具ID列表"""
+    return [f"BENCH_TOOL_{index:03d}" for index in range(MOCK_CONFIG["tools"])]
+
+
+def is_bench_tool(tool_id: Any) -> bool:
+    """是否为当前配置下存在的基准测试工具"""
+    if not isinstance(tool_id, str) or not tool_id.startswith("BENCH_TOOL_"):
+        return False
+    suffix = tool_id[len("BENCH_TOOL_"):]
+    return suffix.isdigit() and int(suffix) < MOCK_CONFIG["tools"]
+
+
+def result_rows(count: int) -> List[Dict[str, Any]]:
+    """生成基准测试工具返回的数据行"""
+    rows = _rows_cache.get(count)
+    if rows is None:
+        rows = _rows_cache[count] = [
+            {
+                "MATNR": f"{index:018d}",
+                "MAKTX": f"基准测试物料 {index}",
+                "WERKS": "1000",
+                "LABST": index % 1000,
+                "BRGEW": round(index * 0.125, 3),
+            }
+            for index in range(count)
+        ]
+    return rows
+
+
+def run_tool(tool_id: str, param: dict) -> dict:
+    """模拟执行一个工具"""
+    if is_bench_tool(tool_id):
+        return {"TOOL_ID": tool_id, "EXPORT": {"ET_DATA": result_rows(MOCK_CONFIG["rows"])}}
+    if tool_id not in MOCK_TOOLS:
+        raise ValueError(f"工具 {tool_id} 不存在")
+    return {"TOOL_ID": tool_id, "EXPORT": {"ECHO": param}}
+
+
+def choose_fault() -> str:
+    """按配置的比例选择本次请求模拟的故障，没有故障时返回空字符串"""
+    value = _random.random()
+    for fault in ("error", "timeout", "html"):
+        rate = MOCK_CONFIG[f"{fault}_rate"]
+        if value < rate:
+            return fault
+        value -= rate
+    return ""
+
+
+async def simulate_latency(mean_ms: float) -> None:
+    """模拟SAP处理时间"""
+    delay = max(_random.gauss(mean_ms, MOCK_CONFIG["jitter_ms"]), 0.0) / 1000
+    if delay:
+        await asyncio.sleep(delay)
+
+
+def encode(data: Any) -> Response:
+    """按配置的比例以JSON或SSE格式返回"""
+    body = codec.dumps(data)
+    if _random.random() < MOCK_CONFIG["sse_rate"]:
+        return Response(b"event: message\ndata: " + body + b"\n\n", media_type="text/event-stream")
+    return Response(body, media_type="application/json")
+
+
+@app.api_route("/sap/zmcp", methods=["GET", "POST"])
+async def zmcp(request: Request, id: str):
+    """模拟ZMCP服务入口"""
+    request_counter[id] += 1
+    body = codec.loads(await request.body()) if request.method == "POST" else {}
+
+    fault = choose_fault()
+    if fault:
+        fault_counter[fault] += 1
+    if fault == "timeout":
+        await asyncio.sleep(MOCK_CONFIG["hang_seconds"])
+    if fault == "error":
+        return Response(b"Service Unavailable", status_code=503, media_type="text/plain")
+    if fault == "html":
+        return Response(HTML_LOGIN_PAGE, media_type="text/html")
+
+    if id == "PING":
+        return JSONResponse({"STATUS": "OK"})
+
+    if id == "TOOL_LIST":
+        await simulate_latency(MOCK_CONFIG["metadata_latency_ms"])
+        tools = [{"TOOL_ID": tool_id, "DESCRIPTION": tool["DESCRIPTION"]} for tool_id, tool in MOCK_TOOLS.items()]
+        tools += [{"TOOL_ID": tool_id, "DESCRIPTION": f"基准测试工具 {tool_id}"} for tool_id in bench_tool_ids()]
+        return encode(tools)
+
+    if id == "TOOL_DETAIL":
+        await simulate_latency(MOCK_CONFIG["metadata_latency_ms"])
+        tool_id = body.get("TOOL_ID")
+        param = BENCH_TOOL_PARAM if is_bench_tool(tool_id) else MOCK_TOOLS.get(tool_id, {}).get("PARAM", {})
+        return encode({"TOOL_ID": tool_id, "PARAM": param})
+
+    if id == "TOOL_USED":
+        await simulate_latency(MOCK_CONFIG["latency_ms"])
+        try:
+            return encode(run_tool(body.get("TOOL_ID"), body.get("PARAM", {})))
+        except ValueError as e:
+            return JSONResponse({"ERROR": str(e)})
+
+    if id == "TOOL_USED_BATCH":
+        # SAP在同一个工作进程中依次处理，但只有一次HTTP往返和登录
+        items = body.get("BATCH", [])
+        await simulate_latency(MOCK_CONFIG["latency_ms"] * (1 + len(items) / 10))
+        results = []
+        for item in items:
+            try:
+                data = run_tool(item.get("TOOL_ID"), item.get("PARAM", {}))
+                results.append({"SEQ": item.get("SEQ"), "STATUS": "S", "DATA": data})
+            except ValueError as e:
+                results.append({"SEQ": item.get("SEQ"), "STATUS": "E", "MESSAGE": str(e)})
+        return encode({"RESULT": results})
+
+    return JSONResponse({"ERROR": f"未知接口ID: {id}"})
+
+
+@app.get("/stats")
+async def stats():
+    """查看每个接口ID收到的请求数量和模拟的故障数量"""
+    return {"requests": dict(request_counter), "faults": dict(fault_counter), "config": MOCK_CONFIG}
+
+
+@app.post("/config")
+async def update_config(request: Request):
+    """修改模拟配置（只修改请求中包含的字段），并清零统计"""
+    updates = codec.loads(await request.body())
+    unknown = set(updates) - set(MOCK_CONFIG)
+    if unknown:
+        return JSONResponse({"error": f"未知配置: {', '.join(sorted(unknown))}"}, status_code=400)
+    MOCK_CONFIG.update(updates)
+    if updates.get("seed") is not None:
+        _random.seed(updates["seed"])
+    request_counter.clear()
+    fault_counter.clear()
+    return MOCK_CONFIG
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="模拟SAP ICF接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6699)
+    for key, value in MOCK_CONFIG.items():
+        parser.add_argument(
+            f"--{key.replace('_', '-')}",
+            dest=key,
+            type=type(value) if value is not None else int,
+            default=value
+        )
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> None:
+    args = parse_args(argv)
+    MOCK_CONFIG.update({key: getattr(args, key) for key in MOCK_CONFIG})
+    if MOCK_CONFIG["seed"] is not None:
+        _random.seed(MOCK_CONFIG["seed"])
+    print(f"模拟SAP接口: http://{args.host}:{args.port}/sap/zmcp")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
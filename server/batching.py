@@ -0,0 +1,125 @@
+import asyncio
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    from .http_client import SAPHttpClient
+except ImportError:
+    from server.http_client import SAPHttpClient
+
+from utils.logging_config import get_logger
+from utils.tracing import start_span
+
+# 获取logger实例
+logger = get_logger(__name__)
+
+# 批量信封配置（SAP侧需要先按 Request/TOOL_USED_BATCH.md 配置批量接口）
+BATCH_ENVELOPE_CONFIG = {
+    "enabled": False,
+    "function_id": "TOOL_USED_BATCH",
+    "window": 0.005,  # 收集请求的时间窗口（秒）
+    "max_batch_size": 50,  # 单个批量请求的最大条目数
+}
+
+
+class ToolCallBatcher:
+    """TOOL_USED调用合并器
+
+    在一个很短的时间窗口内到达的TOOL_USED调用会被打包成一个TOOL_USED_BATCH请求发送，
+    SAP返回后再按序号拆分给各个调用方。窗口内只有一个调用时直接走TOOL_USED。
+    """
+
+    def __init__(
+        self,
+        client: SAPHttpClient,
+        function_id: Optional[str] = None,
+        single_function_id: str = "TOOL_USED",
+        window: Optional[float] = None,
+        max_batch_size: Optional[int] = None
+    ):
+        """初始化合并器
+
+        Args:
+            client: SAP HTTP客户端
+            function_id: SAP批量接口ID，None表示使用BATCH_ENVELOPE_CONFIG中的配置
+            single_function_id: 单个调用使用的SAP接口ID
+            window: 收集请求的时间窗口（秒），None表示使用BATCH_ENVELOPE_CONFIG中的配置
+            max_batch_size: 单个批量请求的最大条目数，None表示使用BATCH_ENVELOPE_CONFIG中的配置
+        """
+        self.client = client
+        self.function_id = function_id or BATCH_ENVELOPE_CONFIG["function_id"]
+        self.single_function_id = single_function_id
+        self.window = BATCH_ENVELOPE_CONFIG["window"] if window is None else window
+        self.max_batch_size = max_batch_size or BATCH_ENVELOPE_CONFIG["max_batch_size"]
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.requests_sent = 0
+        self.calls_submitted = 0
+
+    async def submit(self, sap_request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """提交一个TOOL_USED调用，等待合并发送后的结果
+
+        Args:
+            sap_request_data: TOOL_USED请求体，包含TOOL_ID和PARAM
+
+        Returns:
+            dict: 工具执行结果
+
+        Raises:
+            Exception: 调用失败
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((sap_request_data, future))
+        self.calls_submitted += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        """取出当前等待的调用并在后台发送"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        """发送一批调用并把结果分发给各个调用方"""
+        self.requests_sent += 1
+        start_time = time.time()
+
+        if len(batch) == 1:
+            request, future = batch[0]
+            try:
+                result = await self.client.post(params={"id": self.single_function_id}, json=request)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        try:
+            with start_span("sap.batch", batch_size=len(batch)):
+                results = await self.client.post_batch([request for request, _ in batch], function_id=self.function_id)
+        except Exception as e:
+            logger.error(f"批量请求失败: {len(batch)} 个调用, {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(Exception(str(e)))
+            return
+
+        logger.info(f"批量请求完成: {len(batch)} 个调用, 耗时: {time.time() - start_time:.3f}秒")
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if result["STATUS"] == "S":
+                future.set_result(result["DATA"])
+            else:
+                future.set_exception(Exception(result["MESSAGE"]))
@@ -0,0 +1,220 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils.metrics import registry
+
+# 熔断器配置（每个SAP系统的每个接口ID一个熔断器）
+CIRCUIT_BREAKER_CONFIG = {
+    "window_size": 20,  # 统计失败率的最近调用次数
+    "min_calls": 5,  # 窗口内至少有这么多次调用才计算失败率
+    "failure_rate_threshold": 0.5,  # 失败率达到该值时熔断
+    "open_duration": 30.0,  # 熔断持续时间（秒），之后进入半开状态
+    "probe_timeout": 60.0,  # 半开探测请求的最长等待时间（秒），超时后允许新的探测
+}
+
+# 熔断器状态
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# 调用结果
+RESULT_SUCCESS = "success"
+RESULT_FAILURE = "failure"
+RESULT_IGNORED = "ignored"
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时快速失败的异常"""
+
+    def __init__(self, breaker: "CircuitBreaker"):
+        self.details = {"circuit": breaker.stats()}
+        retry_after = self.details["circuit"]["retry_after"]
+        super().__init__(
+            f"SAP接口 {breaker.function_id or '-'} 已熔断（系统: {breaker.system}），"
+            f"{retry_after:.1f}秒后重试"
+        )
+
+
+class CircuitBreaker:
+    """SAP接口熔断器
+
+    - 关闭（closed）：正常放行，统计最近window_size次调用的失败率
+    - 打开（open）：失败率超过阈值后直接拒绝请求，不再等待SAP超时
+    - 半开（half_open）：熔断时间结束后只放行一个探测请求，成功则关闭，失败则重新打开
+
+    before_call返回的探测令牌需要传给record：半开状态下只有持有当前令牌的探测请求
+    能决定熔断器关闭还是重新打开，熔断前已放行、之后才完成的请求不影响状态。
+    """
+
+    def __init__(self, system: str, function_id: Optional[str], config: Optional[Dict[str, Any]] = None):
+        """初始化熔断器
+
+        Args:
+            system: SAP系统标识
+            function_id: SAP接口ID
+            config: 熔断配置，None表示使用CIRCUIT_BREAKER_CONFIG
+        """
+        self.system = system
+        self.function_id = function_id
+        self.config = dict(CIRCUIT_BREAKER_CONFIG, **(config or {}))
+        self.state = STATE_CLOSED
+        self._results: deque = deque(maxlen=self.config["window_size"])
+        self._opened_at = 0.0
+        self._probe_started_at: Optional[float] = None
+        self._probe_token: Optional[int] = None
+        self._tokens = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.last_failure: Optional[str] = None
+
+    def before_call(self) -> Optional[int]:
+        """调用前检查熔断状态
+
+        Returns:
+            Optional[int]: 半开状态下放行的探测请求的令牌，其他情况为None
+
+        Raises:
+            CircuitOpenError: 熔断器打开，或半开状态下已有探测请求在进行
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == STATE_OPEN:
+                if now - self._opened_at < self.config["open_duration"]:
+                    self.rejected += 1
+                    raise CircuitOpenError(self)
+                self.state = STATE_HALF_OPEN
+                self._probe_started_at = None
+                self._probe_token = None
+
+            if self.state == STATE_HALF_OPEN:
+                probe_running = self._probe_started_at is not None \
+                    and now - self._probe_started_at < self.config["probe_timeout"]
+                if probe_running:
+                    self.rejected += 1
+                    raise CircuitOpenError(self)
+                # 放行一个探测请求
+                self._probe_started_at = now
+                self._tokens += 1
+                self._probe_token = self._tokens
+                return self._probe_token
+            return None
+
+    def record(self, result: str, error: Optional[str] = None, token: Optional[int] = None) -> None:
+        """记录调用结果
+
+        Args:
+            result: RESULT_SUCCESS、RESULT_FAILURE或RESULT_IGNORED
+            error: 失败原因
+            token: before_call返回的探测令牌
+        """
+        with self._lock:
+            if self.state == STATE_OPEN:
+                # 熔断前放行的调用，结果不再计入
+                return
+            if self.state == STATE_HALF_OPEN:
+                if token is None or token != self._probe_token:
+                    # 不是当前的探测请求（熔断前放行的调用，或已超时被替换的探测）
+                    return
+                self._probe_started_at = None
+                self._probe_token = None
+                if result == RESULT_SUCCESS:
+                    self.state = STATE_CLOSED
+                    self._results.clear()
+                elif result == RESULT_FAILURE:
+                    self._open(error)
+                return
+
+            if result == RESULT_IGNORED:
+                return
+            self._results.append(result == RESULT_FAILURE)
+            if result == RESULT_FAILURE:
+                self.last_failure = error
+            if len(self._results) >= self.config["min_calls"] \
+                    and self.failure_rate() >= self.config["failure_rate_threshold"]:
+                self._open(error)
+
+    def _open(self, error: Optional[str]) -> None:
+        """进入打开状态（调用方需持有锁）"""
+        self.state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self._results.clear()
+        if error:
+            self.last_failure = error
+
+    def failure_rate(self) -> float:
+        """最近调用的失败率"""
+        if not self._results:
+            return 0.0
+        return sum(self._results) / len(self._results)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取熔断器状态
+
+        Returns:
+            dict: 状态、失败率、剩余熔断时间等
+        """
+        retry_after = 0.0
+        if self.state == STATE_OPEN:
+            retry_after = max(self.config["open_duration"] - (time.monotonic() - self._opened_at), 0.0)
+        return {
+            "system": self.system,
+            "function_id": self.function_id,
+            "state": self.state,
+            "failure_rate": round(self.failure_rate(), 3),
+            "calls": len(self._results),
+            "retry_after": round(retry_after, 1),
+            "rejected": self.rejected,
+            "last_failure": self.last_failure
+        }
+
+
+# 每个（SAP系统, 接口ID）一个熔断器
+_breakers: Dict[Tuple[str, Optional[str]], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(system: str, function_id: Optional[str]) -> CircuitBreaker:
+    """获取SAP系统和接口ID对应的熔断器
+
+    Args:
+        system: SAP系统标识
+        function_id: SAP接口ID
+
+    Returns:
+        CircuitBreaker: 熔断器
+    """
+    key = (system, function_id)
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(key, CircuitBreaker(system, function_id))
+    return breaker
+
+
+def breaker_stats() -> List[Dict[str, Any]]:
+    """获取所有熔断器的状态
+
+    Returns:
+        list: 每个熔断器的状态
+    """
+    return [breaker.stats() for breaker in list(_breakers.values())]
+
+
+def _collect_metrics():
+    """导出熔断器指标"""
+    states = []
+    rejected = []
+    for breaker in list(_breakers.values()):
+        labels = {"system": breaker.system, "function_id": breaker.function_id or ""}
+        states.extend((dict(labels, state=state), 1 if breaker.state == state else 0)
+                      for state in (STATE_CLOSED, STATE_OPEN, STATE_HALF_OPEN))
+        rejected.append((labels, breaker.rejected))
+    return [
+        ("sap_circuit_state", "gauge", "SAP接口熔断器状态（当前状态为1）", states),
+        ("sap_circuit_rejected_total", "counter", "熔断器打开时拒绝的调用次数", rejected),
+    ]
+
+
+registry.register_collector(_collect_metrics)
@@ -0,0 +1,164 @@
+import asyncio
+import copy
+import hashlib
+import time
+from typing import Any, Callable, Dict, Optional, Set
+
+try:
+    from .http_client import SAPHttpClient
+except ImportError:
+    from server.http_client import SAPHttpClient
+
+# /api/config原地修改的配置字典，每个客户端创建时复制一份
+from config import SAP_CONFIG
+from utils.logging_config import get_logger
+
+# 获取logger实例
+logger = get_logger(__name__)
+
+# 客户端注册表配置
+CLIENT_REGISTRY_CONFIG = {
+    # 配置变更后旧客户端延迟关闭的时间（秒），让正在进行的请求完成；None表示使用SAP超时时间加5秒
+    "drain_seconds": None,
+}
+
+# 参与指纹计算的SAP配置项（用于标识连接的SAP系统和登录用户）
+FINGERPRINT_KEYS = ("base_url", "client_id", "sap-user", "sap-password", "timeout")
+
+
+def config_fingerprint(config: Dict[str, Any]) -> str:
+    """计算SAP配置的指纹
+
+    Args:
+        config: SAP配置字典
+
+    Returns:
+        str: 16位十六进制指纹，不包含明文密码
+    """
+    raw = "\x1f".join(str(config.get(key, "")) for key in FINGERPRINT_KEYS)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class SAPClientRegistry:
+    """按SAP配置复用的HTTP客户端注册表
+
+    同一份SAP配置只创建一个SAPHttpClient，所有请求共用它的连接池和登录会话。
+    每个客户端使用创建时的配置副本，/api/config修改配置的过程中不会读到一半新一半旧的配置；
+    配置与副本不同时在事件循环内原子地替换为新客户端，旧客户端继续使用旧配置，
+    等待drain_seconds后关闭，正在进行的请求不会被中断。
+    """
+
+    def __init__(
+        self,
+        config: Optional[Dict[str, Any]] = None,
+        factory: Callable[[Dict[str, Any]], SAPHttpClient] = lambda config: SAPHttpClient(config=config),
+        drain_seconds: Optional[float] = None
+    ):
+        """初始化注册表
+
+        Args:
+            config: SAP配置字典，None表示使用SAP_CONFIG（/api/config会原地修改它）
+            factory: 按配置副本创建客户端的函数
+            drain_seconds: 旧客户端延迟关闭的时间（秒），None表示使用CLIENT_REGISTRY_CONFIG
+        """
+        self._config = config if config is not None else SAP_CONFIG
+        self._factory = factory
+        self._drain_seconds = drain_seconds if drain_seconds is not None else CLIENT_REGISTRY_CONFIG["drain_seconds"]
+        self._client: Optional[SAPHttpClient] = None
+        # 当前客户端使用的配置副本
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._fingerprint: Optional[str] = None
+        self._created_at: Optional[float] = None
+        self._generation = 0
+        # 等待关闭的旧客户端
+        self._retiring: Dict[SAPHttpClient, Optional[asyncio.TimerHandle]] = {}
+        self._close_tasks: Set[asyncio.Task] = set()
+        self._closed = False
+
+    def current(self) -> SAPHttpClient:
+        """获取当前配置对应的客户端，配置变化时替换为新客户端
+
+        Returns:
+            SAPHttpClient: 共享的HTTP客户端
+        """
+        if self._client is None or self._snapshot != self._config:
+            self._replace()
+        return self._client
+
+    def refresh(self) -> bool:
+        """配置保存后调用，立即按新配置重建客户端
+
+        Returns:
+            bool: 配置有变化并且已替换客户端时返回True
+        """
+        if self._client is not None and self._snapshot == self._config:
+            return False
+        self._replace()
+        return True
+
+    def _replace(self) -> None:
+        """按当前配置的副本替换客户端（只在事件循环线程中调用，替换过程中没有await，因此是原子的）"""
+        if self._closed:
+            raise RuntimeError("SAP客户端注册表已关闭")
+        old_client = self._client
+        snapshot = copy.deepcopy(self._config)
+        fingerprint = config_fingerprint(snapshot)
+        self._client = self._factory(copy.deepcopy(snapshot))
+        self._snapshot = snapshot
+        self._fingerprint = fingerprint
+        self._created_at = time.time()
+        self._generation += 1
+        if old_client is not None:
+            logger.info(f"SAP配置已变更，使用新的HTTP客户端（第{self._generation}代，指纹 {fingerprint}）")
+            self._retire(old_client)
+
+    def _retire(self, client: SAPHttpClient) -> None:
+        """延迟关闭旧客户端"""
+        delay = self._drain_seconds
+        if delay is None:
+            # 旧客户端的请求按它自己的超时时间结束
+            delay = float(client.config.get("timeout", 30)) + 5
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 不在事件循环中（如模块导入时），等到close()时统一关闭
+            self._retiring[client] = None
+            return
+        self._retiring[client] = loop.call_later(delay, self._close_retired, client)
+
+    def _close_retired(self, client: SAPHttpClient) -> None:
+        """关闭等待期已过的旧客户端"""
+        self._retiring.pop(client, None)
+        task = asyncio.ensure_future(client.close())
+        self._close_tasks.add(task)
+        task.add_done_callback(self._close_tasks.discard)
+
+    async def close(self) -> None:
+        """关闭当前客户端和所有等待关闭的旧客户端（应用关闭时调用）"""
+        self._closed = True
+        clients = list(self._retiring)
+        for handle in self._retiring.values():
+            if handle is not None:
+                handle.cancel()
+        self._retiring.clear()
+        if self._client is not None:
+            clients.append(self._client)
+            self._client = None
+        results = await asyncio.gather(*(client.close() for client in clients), *self._close_tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"关闭SAP HTTP客户端失败: {result}")
+
+    def stats(self) -> Dict[str, Any]:
+        """获取注册表状态
+
+        Returns:
+            dict: 当前指纹、代数、创建时间和等待关闭的客户端数量
+        """
+        return {
+            "fingerprint": self._fingerprint,
+            "generation": self._generation,
+            "created_at": self._created_at,
+            "retiring": len(self._retiring),
+            "closed": self._closed,
+        }
@@ -0,0 +1,275 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils.metrics import registry
+
+# 自适应并发控制配置（每个SAP系统一个限流器）
+CONCURRENCY_CONFIG = {
+    "initial_limit": 10,  # 初始并发上限
+    "min_limit": 2,  # 并发上限的最小值
+    "max_limit": 50,  # 并发上限的最大值
+    "backoff_ratio": 0.7,  # 检测到过载时并发上限乘以该比例
+    "latency_tolerance": 2.0,  # 响应时间超过基线的该倍数时视为过载
+    "baseline_weight": 0.05,  # 基线响应时间（指数移动平均）中新样本的权重
+    "max_baselines": 1024,  # 保存基线响应时间的接口/工具数量上限，超过时淘汰最久未使用的
+    "decrease_interval": 1.0,  # 两次降低并发上限的最小间隔（秒），避免一次拥塞被重复计算
+    "queue_size": 500,  # 排队请求的最大数量
+    "queue_timeout": 30.0,  # 排队等待的最长时间（秒）
+    "metadata_reserve": 2,  # 为元数据请求保留的额外并发数
+}
+
+# 优先级通道：数值越小优先级越高
+# TOOL_LIST/TOOL_DETAIL是元数据请求，PING是健康检查探测，都不能排在大量TOOL_USED之后
+PRIORITY_METADATA = 0
+PRIORITY_DEFAULT = 1
+FUNCTION_PRIORITIES = {
+    "TOOL_LIST": PRIORITY_METADATA,
+    "TOOL_DETAIL": PRIORITY_METADATA,
+    "PING": PRIORITY_METADATA,
+}
+
+# 请求结果，用于调整并发上限
+OUTCOME_SUCCESS = "success"
+OUTCOME_OVERLOAD = "overload"
+OUTCOME_ERROR = "error"
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """排队已满或排队超时"""
+
+
+class AdaptiveLimiter:
+    """自适应并发限流器（AIMD）
+
+    - 请求成功且响应时间正常时，并发上限缓慢增加（每个上限周期加1）
+    - 出现5xx、429、超时或响应时间明显变长时，并发上限按比例降低
+    - 响应时间基线按接口ID和工具ID分别统计，TOOL_LIST等快速请求不会让正常的慢工具被判定为过载
+    - 超过上限的请求按优先级排队，排队超时后快速失败
+    - 元数据请求可以额外使用metadata_reserve个并发，不会被TOOL_USED占满
+    """
+
+    def __init__(self, name: str = "", config: Optional[Dict[str, Any]] = None):
+        """初始化限流器
+
+        Args:
+            name: 限流器名称（通常是SAP系统标识）
+            config: 限流配置，None表示使用CONCURRENCY_CONFIG
+        """
+        self.name = name
+        self.config = dict(CONCURRENCY_CONFIG, **(config or {}))
+        self.limit = float(self.config["initial_limit"])
+        self.inflight = 0
+        # 基线键（见latency_key）到基线响应时间的映射
+        self._baselines: "OrderedDict[str, float]" = OrderedDict()
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._last_decrease = 0.0
+        self.rejected = 0
+        self.queue_timeouts = 0
+
+    def _capacity(self, priority: int) -> int:
+        """当前优先级可用的并发上限"""
+        capacity = int(self.limit)
+        if priority == PRIORITY_METADATA:
+            capacity += self.config["metadata_reserve"]
+        return capacity
+
+    def queued(self) -> int:
+        """正在排队的请求数量"""
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, priority: int = PRIORITY_DEFAULT, timeout: Optional[float] = None) -> None:
+        """获取一个并发许可，超过上限时排队等待
+
+        Args:
+            priority: 优先级，数值越小越优先
+            timeout: 排队超时时间（秒），None表示使用配置的queue_timeout
+
+        Raises:
+            ConcurrencyLimitExceeded: 排队已满或排队超时
+        """
+        has_priority_waiters = any(p <= priority and not f.done() for p, _, f in self._waiters)
+        if self.inflight < self._capacity(priority) and not has_priority_waiters:
+            self.inflight += 1
+            return
+
+        if self.queued() >= self.config["queue_size"]:
+            self.rejected += 1
+            raise ConcurrencyLimitExceeded(f"SAP系统 {self.name} 并发请求排队已满({self.config['queue_size']})")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await asyncio.wait_for(future, timeout if timeout is not None else self.config["queue_timeout"])
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # 许可已经分配，但调用方超时或被取消，归还许可
+                self.inflight = max(self.inflight - 1, 0)
+                self._wake()
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                self.queue_timeouts += 1
+                raise ConcurrencyLimitExceeded(
+                    f"SAP系统 {self.name} 并发请求排队超时({self.config['queue_timeout']}秒)"
+                ) from None
+            raise
+
+    def baseline(self, key: str = "") -> Optional[float]:
+        """获取基线响应时间（秒），还没有成功请求时返回None"""
+        return self._baselines.get(key)
+
+    def _update_baseline(self, key: str, latency: float) -> None:
+        """把一次成功请求的响应时间计入基线（指数移动平均）"""
+        baseline = self._baselines.pop(key, None)
+        if baseline is None:
+            baseline = latency
+        else:
+            weight = self.config["baseline_weight"]
+            baseline = baseline * (1 - weight) + latency * weight
+        self._baselines[key] = baseline
+        while len(self._baselines) > self.config["max_baselines"]:
+            self._baselines.popitem(last=False)
+
+    def release(self, latency: float, outcome: str = OUTCOME_SUCCESS, key: str = "") -> None:
+        """归还并发许可，并根据请求结果调整并发上限
+
+        Args:
+            latency: 请求耗时（秒）
+            outcome: 请求结果，OUTCOME_SUCCESS、OUTCOME_OVERLOAD或OUTCOME_ERROR
+            key: 基线键，同一个键的请求互相比较响应时间，见latency_key
+        """
+        self.inflight = max(self.inflight - 1, 0)
+
+        if outcome == OUTCOME_SUCCESS:
+            baseline = self._baselines.get(key)
+            # 所有成功请求（包括偏慢的）都计入基线，响应时间整体变长后基线随之上升，
+            # 不会因为基线停留在较低的值而一直判定为过载
+            self._update_baseline(key, latency)
+            if baseline is not None and latency > baseline * self.config["latency_tolerance"]:
+                outcome = OUTCOME_OVERLOAD
+
+        if outcome == OUTCOME_SUCCESS:
+            self.limit = min(self.limit + 1.0 / self.limit, float(self.config["max_limit"]))
+        elif outcome == OUTCOME_OVERLOAD:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.config["decrease_interval"]:
+                self._last_decrease = now
+                self.limit = max(self.limit * self.config["backoff_ratio"], float(self.config["min_limit"]))
+
+        self._wake()
+
+    def _wake(self) -> None:
+        """按优先级唤醒排队的请求，直到达到并发上限"""
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                # 已超时或取消的等待者
+                heapq.heappop(self._waiters)
+                continue
+            if self.inflight >= self._capacity(priority):
+                break
+            heapq.heappop(self._waiters)
+            self.inflight += 1
+            future.set_result(True)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取限流器状态
+
+        Returns:
+            dict: 当前并发上限、进行中和排队的请求数量等
+        """
+        return {
+            "name": self.name,
+            "limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "queued": self.queued(),
+            "baselines": len(self._baselines),
+            "rejected": self.rejected,
+            "queue_timeouts": self.queue_timeouts
+        }
+
+
+# 每个SAP系统一个限流器（舱壁隔离，一个系统过载不影响其他系统）
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(system_key: str, config: Optional[Dict[str, Any]] = None) -> AdaptiveLimiter:
+    """获取SAP系统对应的限流器
+
+    Args:
+        system_key: SAP系统标识
+        config: 该系统的限流配置（覆盖CONCURRENCY_CONFIG中的项），只在第一次创建限流器时使用
+
+    Returns:
+        AdaptiveLimiter: 限流器
+    """
+    limiter = _limiters.get(system_key)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(system_key)
+            if limiter is None:
+                limiter = _limiters[system_key] = AdaptiveLimiter(system_key, config)
+    return limiter
+
+
+def latency_key(function_id: Optional[str], tool_id: Optional[str] = None) -> str:
+    """获取请求的基线键
+
+    TOOL_USED的响应时间取决于具体工具，按工具分别统计；其他接口按接口ID统计。
+
+    Args:
+        function_id: SAP接口ID
+        tool_id: 工具ID
+
+    Returns:
+        str: 形如"TOOL_USED:工具ID"或"TOOL_LIST"的字符串
+    """
+    if tool_id and function_id == "TOOL_USED":
+        return f"{function_id}:{tool_id}"
+    return function_id or ""
+
+
+def get_priority(function_id: Optional[str]) -> int:
+    """获取SAP接口ID对应的优先级
+
+    Args:
+        function_id: SAP接口ID
+
+    Returns:
+        int: 优先级，数值越小越优先
+    """
+    return FUNCTION_PRIORITIES.get(function_id or "", PRIORITY_DEFAULT)
+
+
+def limiter_stats() -> List[Dict[str, Any]]:
+    """获取所有限流器的状态
+
+    Returns:
+        list: 每个SAP系统的限流器状态
+    """
+    return [limiter.stats() for limiter in list(_limiters.values())]
+
+
+def _collect_metrics():
+    """导出限流器指标"""
+    limiters = list(_limiters.values())
+    return [
+        ("sap_concurrency_limit", "gauge", "SAP系统当前的自适应并发上限",
+         [({"system": limiter.name}, limiter.limit) for limiter in limiters]),
+        ("sap_concurrency_inflight", "gauge", "SAP系统正在使用的并发许可数量",
+         [({"system": limiter.name}, limiter.inflight) for limiter in limiters]),
+        ("sap_concurrency_queued", "gauge", "等待并发许可的请求数量",
+         [({"system": limiter.name}, limiter.queued()) for limiter in limiters]),
+        ("sap_concurrency_rejected_total", "counter", "排队已满或排队超时被拒绝的请求数量",
+         [({"system": limiter.name}, limiter.rejected + limiter.queue_timeouts) for limiter in limiters]),
+    ]
+
+
+registry.register_collector(_collect_metrics)
@@ -1,28 +1,189 @@
-import json as json_module
+import asyncio
 import logging
 import os
 import re
 import sys
 import time
-from typing import Optional, Dict, Any
+import weakref
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List, AsyncIterator
 
 import httpx
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import SAP_CONFIG
-from utils.logging_config import get_logger
-from utils.cache import cache_decorator
+from utils.logging_config import get_logger, log_context, log_payload, payload_sampled, redact
+from utils.cache import cache, cache_decorator, make_cache_key
+from server.retry import RetryPolicy, get_retry_policy, parse_retry_after
+from server.concurrency import (
+    get_limiter, get_priority, latency_key, ConcurrencyLimitExceeded, OUTCOME_SUCCESS, OUTCOME_OVERLOAD, OUTCOME_ERROR
+)
+from server.circuit_breaker import get_breaker, CircuitOpenError, RESULT_SUCCESS, RESULT_FAILURE, RESULT_IGNORED
+from server.streaming import SAPResponseError, SAPAuthRequiredError, read_json_response, iter_json_array, looks_like_html
+from utils import codec
+from utils.metrics import registry
+from utils.tracing import start_span, inject_headers, untraced
 
 # 获取logger实例
 logger = get_logger('SAPHttpClient')
 
+# HTTP连接池配置，max_connections应不小于CONCURRENCY_CONFIG中的max_limit与metadata_reserve之和
+HTTP_POOL_CONFIG = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,
+}
+
+# 可缓存的POST接口配置
+# 只能加入幂等的SAP接口ID：TOOL_DETAIL只读取工具参数格式，可以缓存；TOOL_USED会执行业务逻辑，不能缓存
+POST_CACHE_CONFIG = {
+    "function_ids": {"TOOL_DETAIL"},
+    "ttl": 3600,  # 1小时，SAP配置表变更后可调用invalidate_post_cache立即失效
+}
+
+# POST缓存键前缀，格式为 "SAPHttpClient.post:<接口ID>:<TOOL_ID>:"
+POST_CACHE_PREFIX = "SAPHttpClient.post"
+
+# SAP接口调用指标，通过/metrics导出
+SAP_REQUEST_SECONDS = registry.histogram(
+    "sap_request_duration_seconds",
+    "SAP接口调用耗时（秒），包括排队和重试",
+    ("function_id", "tool_id", "outcome")
+)
+SAP_ATTEMPT_SECONDS = registry.histogram(
+    "sap_attempt_duration_seconds",
+    "单次发往SAP的请求耗时（秒），从发送到读取完响应体",
+    ("function_id",)
+)
+SAP_RETRIES = registry.counter(
+    "sap_request_retries_total",
+    "SAP接口重试次数",
+    ("function_id", "error_class")
+)
+SAP_ERRORS = registry.counter(
+    "sap_request_errors_total",
+    "SAP接口错误次数，每次请求尝试分别计数",
+    ("function_id", "error_class")
+)
+SAP_IN_FLIGHT = registry.gauge(
+    "sap_requests_in_flight",
+    "正在发往SAP的请求数量（已获得并发许可）",
+    ("function_id",)
+)
+
+# 错误类型（sap_request_errors_total的error_class标签）
+ERROR_HTML_REAUTH = "html_reauth"
+ERROR_JSON_DECODE = "json_decode"
+ERROR_TIMEOUT = "timeout"
+ERROR_NETWORK = "network"
+ERROR_HTTP_4XX = "http_4xx"
+ERROR_HTTP_5XX = "http_5xx"
+ERROR_CIRCUIT_OPEN = "circuit_open"
+ERROR_OVERLOAD = "overload"
+ERROR_OTHER = "other"
+
+# 已创建的客户端，用于导出连接池使用情况
+_clients: "weakref.WeakSet[SAPHttpClient]" = weakref.WeakSet()
+
+def error_class(error: BaseException) -> str:
+    """获取请求异常的错误类型
+    
+    Args:
+        error: 请求过程中抛出的异常（可以是包装后的异常）
+        
+    Returns:
+        str: ERROR_*常量之一
+    """
+    cause = error.__cause__ or error
+    if isinstance(cause, httpx.TimeoutException):
+        return ERROR_TIMEOUT
+    if isinstance(cause, httpx.RequestError):
+        return ERROR_NETWORK
+    if isinstance(cause, httpx.HTTPStatusError):
+        return ERROR_HTTP_5XX if cause.response.status_code >= 500 else ERROR_HTTP_4XX
+    if isinstance(cause, SAPAuthRequiredError):
+        return ERROR_HTML_REAUTH
+    if isinstance(cause, SAPResponseError):
+        return ERROR_JSON_DECODE
+    if isinstance(cause, CircuitOpenError):
+        return ERROR_CIRCUIT_OPEN
+    if isinstance(cause, ConcurrencyLimitExceeded):
+        return ERROR_OVERLOAD
+    return ERROR_OTHER
+
+def _collect_pool_metrics():
+    """导出HTTP连接池使用情况（httpx未提供公开接口，读取httpcore连接池的状态）"""
+    active = idle = requests = 0
+    for client in list(_clients):
+        http_client = client._client
+        if http_client is None or http_client.is_closed:
+            continue
+        pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+        if pool is None:
+            continue
+        for connection in list(pool.connections):
+            if connection.is_idle():
+                idle += 1
+            else:
+                active += 1
+        requests += len(getattr(pool, "_requests", ()))
+    return [
+        ("sap_http_pool_connections", "gauge", "SAP HTTP连接池中的连接数量",
+         [({"state": "active"}, active), ({"state": "idle"}, idle)]),
+        ("sap_http_pool_max_connections", "gauge", "SAP HTTP连接池的连接数上限",
+         [({}, HTTP_POOL_CONFIG["max_connections"])]),
+        ("sap_http_pool_requests", "gauge", "使用连接池的请求数量（包括等待连接的请求）",
+         [({}, requests)]),
+    ]
+
+registry.register_collector(_collect_pool_metrics)
+
+def circuit_result(error: Exception) -> str:
+    """根据请求异常判断熔断器应记录的结果
+    
+    网络错误、超时和5xx计为失败；SAP已正常响应的错误（4xx、HTML登录页、非JSON响应）
+    说明SAP可达，计为成功；本地排队超时等与SAP无关的错误不计入统计。
+    
+    Args:
+        error: _send_with_retry抛出的异常
+        
+    Returns:
+        str: RESULT_SUCCESS、RESULT_FAILURE或RESULT_IGNORED
+    """
+    cause = error.__cause__ or error
+    if isinstance(cause, httpx.RequestError):
+        return RESULT_FAILURE
+    if isinstance(cause, httpx.HTTPStatusError):
+        return RESULT_FAILURE if cause.response.status_code >= 500 else RESULT_SUCCESS
+    if isinstance(cause, SAPResponseError):
+        return RESULT_SUCCESS
+    return RESULT_IGNORED
+
 class SAPHttpClient:
     """SAP接口HTTP客户端"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        retry_policies: Optional[Dict[str, RetryPolicy]] = None,
+        post_cache_config: Optional[Dict[str, Any]] = None,
+        config: Optional[Dict[str, Any]] = None
+    ):
+        """初始化HTTP客户端
+        
+        Args:
+            retry_policies: 按SAP接口ID自定义的重试策略，None表示使用server.retry.RETRY_POLICIES
+            post_cache_config: 可缓存POST接口配置，None表示使用POST_CACHE_CONFIG
+            config: SAP系统配置（格式同SAP_CONFIG，可另外包含HTTP_POOL_CONFIG中的连接池配置项
+                和concurrency限流配置），None表示使用SAP_CONFIG
+        """
+        # 每次请求都读取这个字典；需要随/api/config变化的调用方应通过SAPClientRegistry传入配置副本
+        self.config = config if config is not None else SAP_CONFIG
         # 创建可重用的HTTP客户端
         self._client: Optional[httpx.AsyncClient] = None
+        self._retry_policies = retry_policies
+        self._post_cache_config = post_cache_config or POST_CACHE_CONFIG
+        _clients.add(self)
     
     async def _get_client(self) -> httpx.AsyncClient:
         """获取HTTP客户端实例（使用连接池）
@@ -31,16 +192,17 @@ class SAPHttpClient:
             httpx.AsyncClient: HTTP客户端实例
         """
         if self._client is None or self._client.is_closed:
-            # 从SAP_CONFIG读取配置
-            timeout = SAP_CONFIG["timeout"]
+            # 从SAP系统配置读取超时和连接池配置，未配置的连接池项使用HTTP_POOL_CONFIG
+            timeout = self.config["timeout"]
+            pool = {key: self.config.get(key, value) for key, value in HTTP_POOL_CONFIG.items()}
             
             # 创建新的客户端实例
             self._client = httpx.AsyncClient(
                 timeout=timeout,
                 limits=httpx.Limits(
-                    max_connections=100,
-                    max_keepalive_connections=20,
-                    keepalive_expiry=30.0,
+                    max_connections=pool["max_connections"],
+                    max_keepalive_connections=pool["max_keepalive_connections"],
+                    keepalive_expiry=pool["keepalive_expiry"],
                 ),
                 headers={
                     "Content-Type": "application/json",
@@ -49,6 +211,28 @@ class SAPHttpClient:
             )
         return self._client
     
+    def cache_namespace(self) -> Dict[str, Any]:
+        """获取缓存命名空间
+        
+        缓存键包含当前SAP系统地址、客户端和用户，配置变更后不会读到其他系统的缓存数据。
+        
+        Returns:
+            dict: 包含base_url、client_id和用户的字典
+        """
+        return {
+            "base_url": self.config["base_url"],
+            "client_id": self.config["client_id"],
+            "user": self.config["sap-user"]
+        }
+    
+    def system_key(self) -> str:
+        """获取当前SAP系统标识
+        
+        Returns:
+            str: 形如"base_url|client_id"的字符串
+        """
+        return f"{self.config['base_url']}|{self.config['client_id']}"
+    
     async def close(self) -> None:
         """关闭HTTP客户端"""
         if self._client is not None and not self._client.is_closed:
@@ -56,7 +240,10 @@ class SAPHttpClient:
             self._client = None
     
     async def _send_request(self, method: str, endpoint: str = "", params: dict = None, json: dict = None) -> dict:
-        """发送HTTP请求到SAP接口
+        """发送HTTP请求到SAP接口（经过熔断器）
+        
+        同一SAP系统同一接口ID的失败率过高时熔断器打开，请求直接抛出CircuitOpenError，
+        不再等待超时和重试。
         
         Args:
             method: HTTP方法 (GET, POST, PUT, DELETE)
@@ -66,119 +253,191 @@ class SAPHttpClient:
             
         Returns:
             dict: 响应数据
+            
+        Raises:
+            CircuitOpenError: 熔断器打开
         """
-        start_time = time.time()
-        retry_count = 0
-        max_retries = 3
-        retry_delay = 1  # 秒
-        
-        while retry_count <= max_retries:
+        function_id = (params or {}).get("id")
+        tool_id = json.get("TOOL_ID") if isinstance(json, dict) else None
+        with start_span("sap.request", function_id=function_id, tool_id=tool_id, method=method):
+            start_time = time.monotonic()
+            breaker = get_breaker(self.system_key(), function_id)
             try:
-                # 每次请求时都从SAP_CONFIG读取最新配置
-                base_url = SAP_CONFIG["base_url"]
-                client_id = SAP_CONFIG["client_id"]
-                sap_user = SAP_CONFIG["sap-user"]
-                sap_password = SAP_CONFIG["sap-password"]
-                
-                # 构建完整URL
-                url = f"{base_url}{endpoint}"
-                
-                # 添加SAP客户端ID到查询参数
-                if params is None:
-                    params = {}
-                params["sap-client"] = client_id
-                
-                # 记录请求日志
-                logger.info(f"请求开始 - 方法: {method}, URL: {url}")
-                logger.info(f"请求参数: {params}")
-                if json:
-                    logger.info(f"请求数据: {json_module.dumps(json, ensure_ascii=False)}")
-                
-                # 发送请求（使用HTTP Basic Auth）
-                auth = (sap_user, sap_password)
-                
-                # 获取客户端实例
-                client = await self._get_client()
-                response = await client.request(
+                token = breaker.before_call()
+            except CircuitOpenError:
+                SAP_ERRORS.inc(function_id=function_id, error_class=ERROR_CIRCUIT_OPEN)
+                raise
+            try:
+                with log_context(function_id=function_id, tool_id=tool_id):
+                    result = await self._send_with_retry(method=method, endpoint=endpoint, params=params, json=json)
+            except Exception as e:
+                breaker.record(circuit_result(e), str(e)[:200], token)
+                SAP_REQUEST_SECONDS.observe(time.monotonic() - start_time, function_id=function_id, tool_id=tool_id, outcome="error")
+                raise
+            except BaseException:
+                # 请求被取消，不计入统计，但要释放半开状态的探测许可
+                breaker.record(RESULT_IGNORED, token=token)
+                raise
+            breaker.record(RESULT_SUCCESS, token=token)
+            SAP_REQUEST_SECONDS.observe(time.monotonic() - start_time, function_id=function_id, tool_id=tool_id, outcome="success")
+            return result
+    
+    @asynccontextmanager
+    async def _open_response(self, method: str, endpoint: str, params: Optional[dict], content: Optional[bytes], timeout: float, sampled: bool = True, tool_id: Optional[str] = None) -> AsyncIterator[httpx.Response]:
+        """以流式方式发送一次请求，返回尚未读取响应体的响应
+        
+        请求经过SAP系统的并发限流器；4xx/5xx响应会读取响应体后抛出HTTPStatusError。
+        
+        Args:
+            method: HTTP方法
+            endpoint: 接口端点
+            params: URL查询参数
+            content: 已编码的请求体JSON字节
+            timeout: 本次请求的超时时间（秒）
+            sampled: 是否记录请求数据（payload_sampled的结果）
+            tool_id: 工具ID，限流器按接口ID和工具ID分别统计响应时间基线
+            
+        Yields:
+            httpx.Response: 响应对象，响应体需要在上下文内读取
+        """
+        # 每次请求时都读取最新配置
+        base_url = self.config["base_url"]
+        client_id = self.config["client_id"]
+        sap_user = self.config["sap-user"]
+        sap_password = self.config["sap-password"]
+        
+        # 构建完整URL
+        url = f"{base_url}{endpoint}"
+        
+        # 添加SAP客户端ID到查询参数（复制一份，不修改调用方传入的字典）
+        request_params = dict(params or {})
+        request_params["sap-client"] = client_id
+        
+        # 记录请求日志（延迟格式化，请求数据按采样记录、截断并脱敏）
+        logger.info("请求开始 - 方法: %s, URL: %s, 参数: %s", method, url, redact(request_params))
+        if content:
+            log_payload(logger, "请求数据", content, sampled)
+        
+        # 获取客户端实例
+        client = await self._get_client()
+        
+        # 按SAP系统限制并发，超过自适应上限时按优先级排队
+        function_id = (params or {}).get("id")
+        limiter = get_limiter(self.system_key(), self.config.get("concurrency"))
+        try:
+            with start_span("sap.queue_wait", system=self.system_key()):
+                await limiter.acquire(get_priority(function_id))
+        except ConcurrencyLimitExceeded:
+            SAP_ERRORS.inc(function_id=function_id, error_class=ERROR_OVERLOAD)
+            raise
+        request_start = time.monotonic()
+        SAP_IN_FLIGHT.inc(function_id=function_id)
+        # 限流器按收到响应头的耗时判断是否过载，大响应体的传输时间不计入
+        latency = None
+        outcome = OUTCOME_ERROR
+        try:
+            with start_span("sap.http", url=url, timeout=timeout) as span:
+                # 发送请求（使用HTTP Basic Auth），traceparent请求头把调用链ID传给SAP
+                async with client.stream(
                     method=method,
                     url=url,
-                    params=params,
-                    json=json,
-                    auth=auth
-                )
-                
-                # 计算响应时间
-                response_time = time.time() - start_time
-                
-                # 记录响应日志
-                logger.info(f"响应成功 - 状态码: {response.status_code}, 响应时间: {response_time:.3f}秒")
-                logger.info(f"响应内容类型: {response.headers.get('content-type', 'unknown')}")
-                
-                # 检查响应状态
-                response.raise_for_status()
-                
-                # 获取响应内容
-                content = response.text
-                content_type = response.headers.get("content-type", "")
-                
-                # 首先检查内容是否为HTML，无论content-type是什么
-                if content.strip().startswith("<!DOCTYPE html") or content.strip().startswith("<html"):
-                    logger.error(f"响应错误: 返回HTML内容")
-                    raise Exception("SAP接口返回HTML内容，可能需要重新认证")
-                
-                # 处理Server-Sent Events (SSE)响应
-                if "text/event-stream" in content_type:
-                    # 解析SSE响应，提取data字段
-                    lines = content.splitlines()
-                    data_lines = []
-                    for line in lines:
-                        line = line.strip()
-                        if line.startswith("data:"):
-                            data_lines.append(line[5:].strip())
+                    params=request_params,
+                    content=content,
+                    headers=inject_headers(),
+                    auth=(sap_user, sap_password),
+                    timeout=timeout
+                ) as response:
+                    latency = time.monotonic() - request_start
+                    span.set_attributes(status_code=response.status_code, time_to_headers_ms=round(latency * 1000, 3))
+                    overloaded = response.status_code >= 500 or response.status_code == 429
+                    outcome = OUTCOME_OVERLOAD if overloaded else OUTCOME_SUCCESS
+                    if response.status_code >= 400:
+                        # 错误响应体较小，读取后用于错误信息
+                        await response.aread()
+                        response.raise_for_status()
+                    yield response
+        except Exception as e:
+            # 包括读取响应体时的错误（HTML登录页、非JSON响应等）
+            if isinstance(e, httpx.TimeoutException):
+                outcome = OUTCOME_OVERLOAD
+            SAP_ERRORS.inc(function_id=function_id, error_class=error_class(e))
+            raise
+        finally:
+            SAP_IN_FLIGHT.dec(function_id=function_id)
+            SAP_ATTEMPT_SECONDS.observe(time.monotonic() - request_start, function_id=function_id)
+            limiter.release(
+                latency if latency is not None else time.monotonic() - request_start,
+                outcome,
+                latency_key(function_id, tool_id)
+            )
+    
+    async def _send_with_retry(self, method: str, endpoint: str = "", params: dict = None, json: dict = None) -> dict:
+        """发送HTTP请求到SAP接口（按重试策略重试）
+        
+        请求体使用utils.codec编码为字节；响应体以流式方式读取，只在内存中保存一份，
+        见server.streaming.read_json_response。
+        
+        Args:
+            method: HTTP方法 (GET, POST, PUT, DELETE)
+            endpoint: 接口端点
+            params: URL查询参数
+            json: 请求体JSON数据
+            
+        Returns:
+            dict: 响应数据
+        """
+        start_time = time.time()
+        # 按接口ID（TOOL_LIST / TOOL_DETAIL / TOOL_USED）选择重试策略
+        function_id = (params or {}).get("id")
+        retry_state = get_retry_policy(function_id, self._retry_policies).start()
+        # 请求体只编码一次，重试时复用
+        content = codec.dumps(json) if json is not None else None
+        # 同一请求的请求数据和响应数据一起采样
+        sampled = payload_sampled(logger)
+        tool_id = json.get("TOOL_ID") if isinstance(json, dict) else None
+        
+        while True:
+            try:
+                timeout = retry_state.attempt_timeout(self.config["timeout"])
+                async with self._open_response(method, endpoint, params, content, timeout, sampled, tool_id) as response:
+                    # 计算响应时间
+                    response_time = time.time() - start_time
                     
-                    if data_lines:
-                        json_data = "\n".join(data_lines)
-                        result = json_module.loads(json_data)
-                        logger.info(f"响应数据: {json_module.dumps(result, ensure_ascii=False)[:500]}...")
-                        return result
-                    else:
-                        logger.error(f"响应错误: 无法从SSE响应中提取数据")
-                        raise Exception("无法从SSE响应中提取数据")
-                
-                # 处理HTML响应（可能是登录页面）
-                if "text/html" in content_type:
-                    logger.error(f"响应错误: 返回HTML内容")
-                    raise Exception("SAP接口返回HTML内容，可能需要重新认证")
+                    # 记录响应日志
+                    logger.info(
+                        "响应成功 - 状态码: %s, 响应时间: %.3f秒, 内容类型: %s",
+                        response.status_code, response_time, response.headers.get("content-type", "unknown")
+                    )
+                    
+                    try:
+                        result = await read_json_response(response, logger, sampled)
+                    except SAPResponseError as e:
+                        logger.error(f"响应错误: {str(e)}")
+                        raise
                 
-                # 尝试返回普通JSON响应
-                try:
-                    result = response.json()
-                    logger.info(f"响应数据: {json_module.dumps(result, ensure_ascii=False)[:500]}...")
-                    return result
-                except json_module.JSONDecodeError as e:
-                    logger.error(f"响应错误: 无法解析JSON响应")
-                    logger.error(f"JSON解析错误详情: {str(e)}")
-                    logger.error(f"实际响应内容 (前500字符): {content[:500]}")
-                    logger.error(f"响应内容长度: {len(content)} 字符")
-                    raise Exception("SAP接口返回非JSON响应") from e
+                return result
                 
             except httpx.HTTPStatusError as e:
                 # 处理HTTP错误
                 response_time = time.time() - start_time
-                error_msg = f"HTTP请求错误: {e.response.status_code} - {e.response.text}"
+                status_code = e.response.status_code
+                error_msg = f"HTTP请求错误: {status_code} - {e.response.text}"
                 logger.error(f"{error_msg}, 响应时间: {response_time:.3f}秒")
                 
-                # 对于4xx错误，不重试
-                if 400 <= e.response.status_code < 500:
+                # 对于4xx错误（429除外），不重试
+                if not retry_state.policy.should_retry_status(status_code):
                     raise Exception(error_msg) from e
                 
-                # 对于5xx错误，重试
-                retry_count += 1
-                if retry_count > max_retries:
+                # 对于5xx错误，按策略重试，并遵循Retry-After
+                retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+                delay = retry_state.next_delay(retry_after)
+                if delay is None:
                     raise Exception(error_msg) from e
                 
-                logger.warning(f"请求失败，正在重试 ({retry_count}/{max_retries})...")
-                time.sleep(retry_delay * (2 ** (retry_count - 1)))  # 指数退避
+                logger.warning(f"请求失败，{delay:.2f}秒后重试 ({retry_state.attempt}/{retry_state.max_retries})...")
+                SAP_RETRIES.inc(function_id=function_id, error_class=error_class(e))
+                with start_span("sap.backoff", delay=round(delay, 3), attempt=retry_state.attempt, error_class=error_class(e)):
+                    await asyncio.sleep(delay)  # 指数退避，不阻塞事件循环
                 
             except httpx.RequestError as e:
                 # 处理请求错误
@@ -187,15 +446,17 @@ class SAPHttpClient:
                 logger.error(f"{error_msg}, 响应时间: {response_time:.3f}秒")
                 
                 # 对于网络错误，重试
-                retry_count += 1
-                if retry_count > max_retries:
+                delay = retry_state.next_delay()
+                if delay is None:
                     # 提供更详细的错误信息
                     if isinstance(e, httpx.ReadTimeout):
-                        error_msg = f"连接SAP服务器超时({SAP_CONFIG['timeout']}秒)，请检查：\n1. SAP服务器地址是否正确\n2. 网络连接是否正常\n3. SAP服务器是否正在运行"
+                        error_msg = f"连接SAP服务器超时({self.config['timeout']}秒)，请检查：\n1. SAP服务器地址是否正确\n2. 网络连接是否正常\n3. SAP服务器是否正在运行"
                     raise Exception(error_msg) from e
                 
-                logger.warning(f"请求失败，正在重试 ({retry_count}/{max_retries})...")
-                time.sleep(retry_delay * (2 ** (retry_count - 1)))  # 指数退避
+                logger.warning(f"请求失败，{delay:.2f}秒后重试 ({retry_state.attempt}/{retry_state.max_retries})...")
+                SAP_RETRIES.inc(function_id=function_id, error_class=error_class(e))
+                with start_span("sap.backoff", delay=round(delay, 3), attempt=retry_state.attempt, error_class=error_class(e)):
+                    await asyncio.sleep(delay)  # 指数退避，不阻塞事件循环
                 
             except Exception as e:
                 # 处理其他错误
@@ -204,6 +465,65 @@ class SAPHttpClient:
                 logger.error(f"{error_msg}, 响应时间: {response_time:.3f}秒")
                 raise Exception(error_msg) from e
     
+    async def stream_rows(self, endpoint: str = "", params: dict = None, json: dict = None, method: str = "POST", key: Optional[str] = "RESULT") -> AsyncIterator[Any]:
+        """流式读取SAP响应中的大数组，逐行返回
+        
+        适用于返回大量数据行的接口（如 {"RESULT": [...]}），边接收边解析，
+        不需要等待并保存完整响应。已返回数据后无法重试，因此该方法不重试，
+        也不使用响应缓存；仍然经过熔断器和并发限流器。
+        
+        Args:
+            endpoint: 接口端点
+            params: URL查询参数
+            json: 请求体JSON数据
+            method: HTTP方法
+            key: 顶层对象中数组的键名，None表示响应本身是数组
+            
+        Yields:
+            Any: 数组中的每一行数据
+            
+        Raises:
+            CircuitOpenError: 熔断器打开
+        """
+        function_id = (params or {}).get("id")
+        tool_id = json.get("TOOL_ID") if isinstance(json, dict) else None
+        start_time = time.monotonic()
+        breaker = get_breaker(self.system_key(), function_id)
+        try:
+            token = breaker.before_call()
+        except CircuitOpenError:
+            SAP_ERRORS.inc(function_id=function_id, error_class=ERROR_CIRCUIT_OPEN)
+            raise
+        content = codec.dumps(json) if json is not None else None
+        sampled = payload_sampled(logger)
+        try:
+            try:
+                with log_context(function_id=function_id, tool_id=tool_id), \
+                        start_span("sap.stream", function_id=function_id, tool_id=tool_id, method=method) as span:
+                    rows = 0
+                    async with self._open_response(method, endpoint, params, content, self.config["timeout"], sampled, tool_id) as response:
+                        async for row in iter_json_array(response, key):
+                            rows += 1
+                            yield row
+                    span.set_attribute("rows", rows)
+            except httpx.HTTPStatusError as e:
+                raise Exception(f"HTTP请求错误: {e.response.status_code} - {e.response.text}") from e
+            except httpx.RequestError as e:
+                raise Exception(f"请求发送失败: {str(e)}") from e
+            except SAPResponseError as e:
+                raise Exception(f"请求处理失败: {str(e)}") from e
+        except Exception as e:
+            logger.error(f"流式读取失败: {str(e)}")
+            breaker.record(circuit_result(e), str(e)[:200], token)
+            SAP_REQUEST_SECONDS.observe(time.monotonic() - start_time, function_id=function_id, tool_id=tool_id, outcome="error")
+            raise
+        except BaseException:
+            # 调用方提前结束迭代或请求被取消，不计入统计
+            breaker.record(RESULT_IGNORED, token=token)
+            raise
+        breaker.record(RESULT_SUCCESS, token=token)
+        SAP_REQUEST_SECONDS.observe(time.monotonic() - start_time, function_id=function_id, tool_id=tool_id, outcome="success")
+    
     @cache_decorator(ttl=300)  # 缓存5分钟
     async def get(self, endpoint: str = "", params: dict = None) -> dict:
         """发送GET请求
@@ -217,15 +537,134 @@ class SAPHttpClient:
         """
         return await self._send_request(method="GET", endpoint=endpoint, params=params)
     
-    async def post(self, endpoint: str = "", params: dict = None, json: dict = None) -> dict:
+    async def ping(self, function_id: str = "PING", timeout: float = 5.0, endpoint: str = "") -> Dict[str, Any]:
+        """探测SAP接口是否可达（健康检查用）
+        
+        只发送一次GET请求，不经过缓存、重试和熔断器，也不记录调用链。ICF服务能完成登录并返回
+        非HTML响应即视为可达，响应内容不做解析，SAP侧未实现该接口ID时也能判断网络和登录状态。
+        
+        Args:
+            function_id: 探测用的SAP接口ID
+            timeout: 超时时间（秒）
+            endpoint: 接口端点
+            
+        Returns:
+            dict: 包含status_code和latency_ms的字典
+            
+        Raises:
+            httpx.HTTPError: 网络错误、超时或4xx/5xx响应
+            SAPAuthRequiredError: SAP返回HTML登录页
+        """
+        start_time = time.monotonic()
+        with untraced():
+            async with self._open_response("GET", endpoint, {"id": function_id}, None, timeout, sampled=False) as response:
+                body = await response.aread()
+        if looks_like_html(body[:512]):
+            raise SAPAuthRequiredError("SAP接口返回HTML内容，可能需要重新认证")
+        return {
+            "status_code": response.status_code,
+            "latency_ms": round((time.monotonic() - start_time) * 1000, 3)
+        }
+    
+    async def post(self, endpoint: str = "", params: dict = None, json: dict = None, refresh: bool = False) -> dict:
         """发送POST请求
         
+        接口ID在POST_CACHE_CONFIG["function_ids"]中时（如TOOL_DETAIL），响应会被缓存。
+        
         Args:
             endpoint: 接口端点
             params: URL查询参数
             json: 请求体JSON数据
+            refresh: 不读取缓存，直接从SAP获取并更新缓存
             
         Returns:
             dict: 响应数据
         """
-        return await self._send_request(method="POST", endpoint=endpoint, params=params, json=json)
\ No newline at end of file
+        function_id = (params or {}).get("id")
+        if function_id not in self._post_cache_config["function_ids"]:
+            return await self._send_request(method="POST", endpoint=endpoint, params=params, json=json)
+        
+        # 缓存键前缀包含接口ID和TOOL_ID，便于按工具失效
+        tool_id = (json or {}).get("TOOL_ID", "")
+        cache_key = make_cache_key(
+            f"{POST_CACHE_PREFIX}:{function_id}:{tool_id}",
+            {"endpoint": endpoint, "params": params, "json": json},
+            self.cache_namespace()
+        )
+        if refresh:
+            result = await self._send_request(method="POST", endpoint=endpoint, params=params, json=json)
+            if result is not None:
+                await cache.set_async(cache_key, result, ttl=self._post_cache_config["ttl"])
+            return result
+        return await cache.get_or_load(
+            cache_key,
+            lambda: self._send_request(method="POST", endpoint=endpoint, params=params, json=json),
+            ttl=self._post_cache_config["ttl"]
+        )
+    
+    def invalidate_post_cache(self, function_id: Optional[str] = None, tool_id: Optional[str] = None) -> int:
+        """使POST响应缓存失效
+        
+        Args:
+            function_id: SAP接口ID，None表示所有可缓存的接口
+            tool_id: 工具ID，None表示该接口下的所有工具
+        
+        Returns:
+            int: 失效的缓存项数量
+        """
+        prefix = f"{POST_CACHE_PREFIX}:"
+        if function_id is not None:
+            prefix += f"{function_id}:"
+            if tool_id is not None:
+                prefix += f"{tool_id}:"
+        count = cache.delete_prefix(prefix)
+        logger.info(f"POST缓存已失效 - 接口: {function_id or '全部'}, 工具: {tool_id or '全部'}, 数量: {count}")
+        return count
+    
+    async def post_batch(self, requests: List[Dict[str, Any]], endpoint: str = "", function_id: str = "TOOL_USED_BATCH") -> List[Dict[str, Any]]:
+        """使用批量信封在一次POST中发送多个TOOL_USED调用
+        
+        信封格式见 Request/TOOL_USED_BATCH.md。
+        
+        Args:
+            requests: TOOL_USED请求体列表，每项包含TOOL_ID和PARAM
+            endpoint: 接口端点
+            function_id: SAP批量接口ID
+            
+        Returns:
+            list: 与requests顺序一致的结果列表，每项为
+                {"STATUS": "S", "DATA": {...}} 或 {"STATUS": "E", "MESSAGE": "错误信息"}；
+                响应中缺少或重复出现的序号对应的条目返回错误
+        """
+        envelope = {
+            "BATCH": [
+                {"SEQ": seq, "TOOL_ID": request.get("TOOL_ID"), "PARAM": request.get("PARAM", {})}
+                for seq, request in enumerate(requests, start=1)
+            ]
+        }
+        response = await self._send_request(method="POST", endpoint=endpoint, params={"id": function_id}, json=envelope)
+        
+        # 按SEQ拆分响应
+        items = response.get("RESULT", []) if isinstance(response, dict) else []
+        by_seq: Dict[Any, Dict[str, Any]] = {}
+        duplicated = set()
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            seq = item.get("SEQ")
+            if seq in by_seq:
+                duplicated.add(seq)
+            by_seq[seq] = item
+        results = []
+        for seq in range(1, len(requests) + 1):
+            item = by_seq.get(seq)
+            if item is None:
+                results.append({"STATUS": "E", "MESSAGE": f"批量响应中缺少序号 {seq} 的结果"})
+            elif seq in duplicated:
+                # 无法确定哪一个结果属于该调用
+                results.append({"STATUS": "E", "MESSAGE": f"批量响应中序号 {seq} 重复"})
+            elif item.get("STATUS") == "S":
+                results.append({"STATUS": "S", "DATA": item.get("DATA")})
+            else:
+                results.append({"STATUS": "E", "MESSAGE": item.get("MESSAGE") or "SAP批量调用返回错误"})
+        return results
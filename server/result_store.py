@@ -0,0 +1,548 @@
+import asyncio
+import copy
+import functools
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils import codec
+from utils.cache import estimate_size
+from utils.logging_config import get_logger
+
+# 获取logger实例
+logger = get_logger(__name__)
+
+# 大结果分页配置
+RESULT_STORE_CONFIG = {
+    "page_size": 100,  # 默认每页行数
+    "max_page_size": 1000,  # fetch_result_page单页的最大行数
+    "auto_page_rows": 200,  # 结果中最大的表超过该行数时自动分页
+    "ttl": 600,  # 游标有效期（秒），每次读取后重新计时
+    "max_results": 50,  # 同时保存的结果数量上限
+    "max_bytes": 256 * 1024 * 1024,  # 保存结果的估算内存上限（字节）
+}
+
+# 多进程共享的结果存储配置，MCP服务器多工作进程模式下通过ResultStore.enable_shared启用
+SHARED_RESULT_CONFIG = {
+    "db_path": os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "result_store.db"),
+    "max_value_bytes": 64 * 1024 * 1024,  # 单个结果序列化后的最大字节数，超过时不分页、直接返回完整结果
+}
+
+# 行过滤支持的比较运算符
+FILTER_OPERATORS = {
+    "eq": lambda value, target: value == target,
+    "ne": lambda value, target: value != target,
+    "gt": lambda value, target: value is not None and value > target,
+    "ge": lambda value, target: value is not None and value >= target,
+    "lt": lambda value, target: value is not None and value < target,
+    "le": lambda value, target: value is not None and value <= target,
+    "in": lambda value, target: value in target,
+    "contains": lambda value, target: str(target).lower() in str(value).lower(),
+    "startswith": lambda value, target: str(value).startswith(str(target)),
+}
+
+
+class ResultNotFound(Exception):
+    """游标不存在、已过期或已释放"""
+
+
+def find_largest_table(result: Any, max_depth: int = 6) -> Tuple[Optional[List[str]], Optional[List[Any]]]:
+    """查找结果中行数最多的表（字典列表）
+
+    Args:
+        result: SAP返回的工具执行结果
+        max_depth: 最大查找深度
+
+    Returns:
+        tuple: (键路径, 行列表)，未找到时返回(None, None)
+    """
+    best_path: Optional[List[str]] = None
+    best_rows: Optional[List[Any]] = None
+
+    def walk(value: Any, path: List[str], depth: int) -> None:
+        nonlocal best_path, best_rows
+        if isinstance(value, list):
+            if value and isinstance(value[0], dict) and (best_rows is None or len(value) > len(best_rows)):
+                best_path, best_rows = path, value
+            return
+        if isinstance(value, dict) and depth < max_depth:
+            for key, child in value.items():
+                walk(child, path + [key], depth + 1)
+
+    walk(result, [], 0)
+    return best_path, best_rows
+
+
+def normalize_filters(filters: Any) -> List[Dict[str, Any]]:
+    """把过滤条件统一为条件列表
+
+    Args:
+        filters: {"列名": 值}（等值过滤），或
+            [{"column": "列名", "op": "eq", "value": 值}, ...]
+
+    Returns:
+        list: 条件列表
+
+    Raises:
+        ValueError: 过滤条件格式错误或运算符不支持
+    """
+    if not filters:
+        return []
+    if isinstance(filters, dict):
+        return [{"column": column, "op": "eq", "value": value} for column, value in filters.items()]
+    if not isinstance(filters, list):
+        raise ValueError("filters必须是字典或条件列表")
+
+    conditions = []
+    for condition in filters:
+        if not isinstance(condition, dict) or not condition.get("column"):
+            raise ValueError(f"过滤条件格式错误: {condition}")
+        op = str(condition.get("op", "eq")).lower()
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f"不支持的过滤运算符: {op}，可用: {', '.join(FILTER_OPERATORS)}")
+        conditions.append({"column": condition["column"], "op": op, "value": condition.get("value")})
+    return conditions
+
+
+def match_row(row: Any, conditions: List[Dict[str, Any]]) -> bool:
+    """判断一行数据是否满足所有过滤条件"""
+    if not isinstance(row, dict):
+        return False
+    for condition in conditions:
+        try:
+            if not FILTER_OPERATORS[condition["op"]](row.get(condition["column"]), condition["value"]):
+                return False
+        except TypeError:
+            # 类型无法比较（如字符串和数字），视为不匹配
+            return False
+    return True
+
+
+def project_row(row: Any, columns: Optional[List[str]]) -> Any:
+    """只保留指定的列"""
+    if not columns or not isinstance(row, dict):
+        return row
+    return {column: row[column] for column in columns if column in row}
+
+
+class SQLiteResultBackend:
+    """多进程共享的结果存储（本地SQLite文件）
+
+    多工作进程模式下，同一个MCP会话的后续请求可能由其他工作进程处理，
+    游标对应的结果保存在这里，任何工作进程都可以读取和释放。
+    过期时间使用墙上时间，读取时顺延；数量和大小上限对所有进程共同生效。
+    """
+
+    def __init__(self, db_path: str, max_value_bytes: int = 64 * 1024 * 1024):
+        """初始化存储
+
+        Args:
+            db_path: SQLite数据库文件路径
+            max_value_bytes: 单个结果序列化后的最大字节数
+        """
+        self.db_path = db_path
+        self.max_value_bytes = max_value_bytes
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if hasattr(os, "register_at_fork"):
+            # 连接不能跨fork使用，子进程首次访问时重新连接
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self) -> None:
+        self._lock = threading.RLock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取数据库连接，首次调用时创建数据库文件和表（调用方需持有锁）"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS result_entry ("
+                "cursor TEXT PRIMARY KEY, tool_id TEXT NOT NULL, path TEXT NOT NULL, columns TEXT NOT NULL, "
+                "rows BLOB NOT NULL, size INTEGER NOT NULL, expire_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def put(self, cursor: str, entry: Dict[str, Any], ttl: float, max_results: int, max_bytes: int) -> bool:
+        """保存结果，并按上限淘汰最久未读取的结果
+
+        Args:
+            cursor: 游标
+            entry: 包含tool_id、path、rows、columns和size的结果
+            ttl: 有效期（秒）
+            max_results: 所有进程共同的结果数量上限
+            max_bytes: 所有进程共同的估算内存上限（字节）
+
+        Returns:
+            bool: 结果无法序列化或过大而没有保存时返回False
+        """
+        try:
+            data = codec.dumps(entry["rows"])
+        except (TypeError, ValueError):
+            return False
+        if len(data) > self.max_value_bytes:
+            return False
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM result_entry WHERE expire_at <= ?", (now,))
+            conn.execute(
+                "INSERT OR REPLACE INTO result_entry (cursor, tool_id, path, columns, rows, size, expire_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (cursor, entry["tool_id"], codec.dumps(entry["path"]), codec.dumps(entry["columns"]),
+                 data, entry["size"], now + ttl)
+            )
+            # 过期时间每次读取后顺延，最早过期的就是最久未读取的
+            count, total, evicted = 0, 0, []
+            for other, size in conn.execute("SELECT cursor, size FROM result_entry ORDER BY expire_at DESC"):
+                count += 1
+                total += size
+                if other != cursor and (count > max_results or total > max_bytes):
+                    evicted.append((other,))
+            if evicted:
+                conn.executemany("DELETE FROM result_entry WHERE cursor = ?", evicted)
+        return True
+
+    def touch(self, cursor: str, ttl: float) -> bool:
+        """顺延有效期
+
+        Returns:
+            bool: 游标存在且未过期时返回True
+        """
+        now = time.time()
+        with self._lock:
+            return self._connect().execute(
+                "UPDATE result_entry SET expire_at = ? WHERE cursor = ? AND expire_at > ?",
+                (now + ttl, cursor, now)
+            ).rowcount > 0
+
+    def get(self, cursor: str) -> Optional[Dict[str, Any]]:
+        """读取未过期的结果，不存在时返回None"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT tool_id, path, columns, rows, size FROM result_entry WHERE cursor = ? AND expire_at > ?",
+                (cursor, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "tool_id": row[0],
+            "path": codec.loads(row[1]),
+            "columns": codec.loads(row[2]),
+            "rows": codec.loads(row[3]),
+            "size": row[4],
+        }
+
+    def delete(self, cursor: str) -> bool:
+        with self._lock:
+            return self._connect().execute("DELETE FROM result_entry WHERE cursor = ?", (cursor,)).rowcount > 0
+
+    def size(self) -> int:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT COUNT(*) FROM result_entry WHERE expire_at > ?", (time.time(),)
+            ).fetchone()[0]
+
+
+class ResultStore:
+    """大结果游标存储
+
+    保存完整的工具执行结果，按游标分页读取。结果数量和估算内存都有上限，
+    超出时淘汰最久未读取的结果；游标过期或释放后立即删除。
+    启用共享存储（多工作进程模式）后，结果同时写入共享的SQLite文件，
+    进程内只保留解码后的副本，游标是否有效以共享存储为准。
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """初始化结果存储
+
+        Args:
+            config: 分页配置，None表示使用RESULT_STORE_CONFIG
+        """
+        self.config = dict(RESULT_STORE_CONFIG, **(config or {}))
+        self._results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+        self.shared: Optional[SQLiteResultBackend] = None
+
+    def enable_shared(self, db_path: Optional[str] = None) -> None:
+        """让结果存储在多个工作进程间共享
+
+        需要在fork工作进程之前或进程启动时调用，数据库连接在首次访问时建立。
+
+        Args:
+            db_path: SQLite数据库文件路径，None表示使用SHARED_RESULT_CONFIG中的配置
+        """
+        if self.shared is None:
+            self.shared = SQLiteResultBackend(
+                db_path or SHARED_RESULT_CONFIG["db_path"],
+                SHARED_RESULT_CONFIG["max_value_bytes"]
+            )
+
+    def should_paginate(self, result: Any) -> bool:
+        """结果中最大的表是否超过自动分页的行数"""
+        _, rows = find_largest_table(result)
+        return rows is not None and len(rows) > self.config["auto_page_rows"]
+
+    def put(self, tool_id: str, rows: List[Any], path: List[str]) -> Optional[str]:
+        """保存结果表
+
+        Args:
+            tool_id: 工具ID
+            rows: 结果表的所有行
+            path: 结果表在工具执行结果中的键路径
+
+        Returns:
+            str: 游标；启用共享存储但结果无法写入时返回None（其他工作进程读取不到这个游标）
+        """
+        cursor = uuid.uuid4().hex
+        size = estimate_size(rows)
+        columns: List[str] = []
+        for row in rows[:50]:
+            if isinstance(row, dict):
+                columns.extend(column for column in row if column not in columns)
+        entry = {"tool_id": tool_id, "path": path, "rows": rows, "columns": columns, "size": size}
+
+        if self.shared is not None:
+            try:
+                stored = self.shared.put(
+                    cursor, entry, self.config["ttl"], self.config["max_results"], self.config["max_bytes"]
+                )
+            except sqlite3.Error as e:
+                logger.warning(f"写入共享结果存储失败: {e}")
+                stored = False
+            if not stored:
+                return None
+
+        self._store_local(cursor, entry)
+        return cursor
+
+    def _store_local(self, cursor: str, entry: Dict[str, Any]) -> None:
+        """保存进程内副本"""
+        with self._lock:
+            self._purge_expired()
+            self._remove(cursor)
+            self._results[cursor] = dict(entry, expire_at=time.monotonic() + self.config["ttl"])
+            self._bytes += entry["size"]
+            self._evict(keep=cursor)
+
+    def _load(self, cursor: str) -> Dict[str, Any]:
+        """获取游标对应的结果并顺延有效期
+
+        Raises:
+            ResultNotFound: 游标不存在或已过期
+        """
+        not_found = ResultNotFound(f"游标 {cursor} 不存在或已过期，请重新调用工具")
+        if self.shared is not None:
+            try:
+                alive = self.shared.touch(cursor, self.config["ttl"])
+            except sqlite3.Error as e:
+                # 共享存储不可用时只使用进程内副本
+                logger.warning(f"读取共享结果存储失败: {e}")
+                alive = None
+            if alive is False:
+                # 已被其他工作进程释放或淘汰
+                with self._lock:
+                    self._remove(cursor)
+                raise not_found
+
+        with self._lock:
+            self._purge_expired()
+            entry = self._results.get(cursor)
+            if entry is not None:
+                entry["expire_at"] = time.monotonic() + self.config["ttl"]
+                self._results.move_to_end(cursor)
+                return entry
+
+        if self.shared is None:
+            raise not_found
+        try:
+            entry = self.shared.get(cursor)
+        except sqlite3.Error as e:
+            logger.warning(f"读取共享结果存储失败: {e}")
+            entry = None
+        if entry is None:
+            raise not_found
+        self._store_local(cursor, entry)
+        return entry
+
+    def get_page(
+        self,
+        cursor: str,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        columns: Optional[List[str]] = None,
+        filters: Any = None
+    ) -> Dict[str, Any]:
+        """读取一页数据
+
+        Args:
+            cursor: 游标
+            offset: 起始行（过滤后的行号，从0开始）
+            limit: 行数，None表示使用默认页大小
+            columns: 只返回的列，None表示返回所有列
+            filters: 过滤条件，格式见normalize_filters
+
+        Returns:
+            dict: 包含ROWS、TOTAL_ROWS、HAS_MORE、NEXT_OFFSET等字段的分页结果
+
+        Raises:
+            ResultNotFound: 游标不存在或已过期
+            ValueError: 过滤条件格式错误
+        """
+        conditions = normalize_filters(filters)
+        offset = max(int(offset or 0), 0)
+        limit = min(max(int(limit or self.config["page_size"]), 1), self.config["max_page_size"])
+
+        entry = self._load(cursor)
+        rows = entry["rows"]
+
+        if conditions:
+            rows = [row for row in rows if match_row(row, conditions)]
+        page = [project_row(row, columns) for row in rows[offset:offset + limit]]
+        next_offset = offset + len(page)
+        return {
+            "CURSOR": cursor,
+            "TOOL_ID": entry["tool_id"],
+            "PATH": ".".join(entry["path"]),
+            "COLUMNS": columns or entry["columns"],
+            "ROWS": page,
+            "OFFSET": offset,
+            "LIMIT": limit,
+            "RETURNED": len(page),
+            "TOTAL_ROWS": len(rows),
+            "HAS_MORE": next_offset < len(rows),
+            "NEXT_OFFSET": next_offset if next_offset < len(rows) else None,
+            "EXPIRES_IN": self.config["ttl"],
+        }
+
+    def release(self, cursor: str) -> bool:
+        """释放游标对应的结果
+
+        Args:
+            cursor: 游标
+
+        Returns:
+            bool: 游标存在并已释放时返回True
+        """
+        released = False
+        if self.shared is not None:
+            try:
+                released = self.shared.delete(cursor)
+            except sqlite3.Error as e:
+                logger.warning(f"删除共享结果失败: {e}")
+        with self._lock:
+            return self._remove(cursor) or released
+
+    def _remove(self, cursor: str) -> bool:
+        """删除结果（调用方需持有锁）"""
+        entry = self._results.pop(cursor, None)
+        if entry is None:
+            return False
+        self._bytes -= entry["size"]
+        return True
+
+    def _purge_expired(self) -> None:
+        """删除过期的结果（调用方需持有锁）"""
+        now = time.monotonic()
+        for cursor in [cursor for cursor, entry in self._results.items() if entry["expire_at"] <= now]:
+            self._remove(cursor)
+            self.expirations += 1
+
+    def _evict(self, keep: str) -> None:
+        """超过数量或内存上限时淘汰最久未读取的结果（调用方需持有锁）"""
+        while len(self._results) > 1 and (
+            len(self._results) > self.config["max_results"] or self._bytes > self.config["max_bytes"]
+        ):
+            cursor = next(iter(self._results))
+            if cursor == keep:
+                break
+            self._remove(cursor)
+            self.evictions += 1
+
+    def paginate(self, tool_id: str, result: Any, page_size: Optional[int] = None) -> Any:
+        """结果过大时保存完整结果，返回第一页和游标
+
+        Args:
+            tool_id: 工具ID
+            result: 工具执行结果
+            page_size: 第一页的行数，None表示使用默认页大小
+
+        Returns:
+            Any: 未超过auto_page_rows时原样返回；否则返回把最大的表替换为第一页、
+                并附加PAGINATION字段（游标、总行数等）的结果
+        """
+        path, rows = find_largest_table(result)
+        if rows is None or len(rows) <= self.config["auto_page_rows"]:
+            return result
+
+        cursor = self.put(tool_id, rows, path)
+        if cursor is None:
+            return result
+        page = self.get_page(cursor, 0, page_size)
+        pagination = {key: value for key, value in page.items() if key != "ROWS"}
+
+        if not path:
+            return {"RESULT": page["ROWS"], "PAGINATION": pagination}
+
+        # 只复制到结果表所在的路径，其余数据共享引用
+        paged = copy.copy(result)
+        node = paged
+        for key in path[:-1]:
+            node[key] = copy.copy(node[key])
+            node = node[key]
+        node[path[-1]] = page["ROWS"]
+        paged["PAGINATION"] = pagination
+        return paged
+
+    async def _offload(self, func, *args) -> Any:
+        """启用共享存储时在线程池中执行，序列化大结果和SQLite读写不阻塞事件循环"""
+        if self.shared is None:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args))
+
+    async def paginate_async(self, tool_id: str, result: Any, page_size: Optional[int] = None) -> Any:
+        """paginate的异步版本，供事件循环中的调用方使用"""
+        return await self._offload(self.paginate, tool_id, result, page_size)
+
+    async def get_page_async(
+        self,
+        cursor: str,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        columns: Optional[List[str]] = None,
+        filters: Any = None
+    ) -> Dict[str, Any]:
+        """get_page的异步版本，供事件循环中的调用方使用"""
+        return await self._offload(self.get_page, cursor, offset, limit, columns, filters)
+
+    async def release_async(self, cursor: str) -> bool:
+        """release的异步版本，供事件循环中的调用方使用"""
+        return await self._offload(self.release, cursor)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取结果存储状态"""
+        with self._lock:
+            stats = {
+                "results": len(self._results),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+        if self.shared is not None:
+            try:
+                stats["shared_results"] = self.shared.size()
+            except sqlite3.Error as e:
+                logger.warning(f"读取共享结果存储失败: {e}")
+        return stats
@@ -0,0 +1,184 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+
+class RetryPolicy:
+    """SAP请求重试策略（带抖动的指数退避）"""
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 10.0,
+        jitter: float = 0.5,
+        deadline: Optional[float] = 60.0,
+        retry_statuses: tuple = (429,),
+        honor_retry_after: bool = True,
+        max_retry_after: float = 30.0,
+    ):
+        """初始化重试策略
+
+        Args:
+            max_retries: 最大重试次数（不含首次请求）
+            base_delay: 首次重试的基础等待时间（秒）
+            max_delay: 单次退避等待的上限（秒）
+            jitter: 抖动比例（0~1），0表示不加抖动，1表示完全抖动
+            deadline: 整个请求（含所有重试）的总时限（秒），None表示不限制
+            retry_statuses: 除5xx外需要重试的HTTP状态码
+            honor_retry_after: 是否遵循服务端返回的Retry-After头
+            max_retry_after: Retry-After允许的最大等待时间（秒）
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = min(max(jitter, 0.0), 1.0)
+        self.deadline = deadline
+        self.retry_statuses = tuple(retry_statuses)
+        self.honor_retry_after = honor_retry_after
+        self.max_retry_after = max_retry_after
+
+    def should_retry_status(self, status_code: int) -> bool:
+        """判断HTTP状态码是否可重试
+
+        Args:
+            status_code: HTTP状态码
+
+        Returns:
+            bool: 5xx及retry_statuses中的状态码返回True
+        """
+        return status_code >= 500 or status_code in self.retry_statuses
+
+    def backoff(self, attempt: int) -> float:
+        """计算第attempt次重试的退避时间
+
+        Args:
+            attempt: 重试序号，从1开始
+
+        Returns:
+            float: 等待时间（秒）
+        """
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
+
+    def start(self) -> "RetryState":
+        """为一次请求创建重试状态
+
+        Returns:
+            RetryState: 重试状态
+        """
+        return RetryState(self)
+
+
+class RetryState:
+    """单次请求的重试状态（已重试次数、截止时间）"""
+
+    def __init__(self, policy: RetryPolicy):
+        self.policy = policy
+        self.attempt = 0
+        self.started_at = time.monotonic()
+
+    @property
+    def max_retries(self) -> int:
+        return self.policy.max_retries
+
+    def remaining(self) -> Optional[float]:
+        """距离总时限的剩余时间（秒），None表示不限制"""
+        if self.policy.deadline is None:
+            return None
+        return self.policy.deadline - (time.monotonic() - self.started_at)
+
+    def attempt_timeout(self, timeout: float) -> float:
+        """计算本次请求可用的超时时间，不超过总时限的剩余时间
+
+        Args:
+            timeout: 配置的单次请求超时（秒）
+
+        Returns:
+            float: 本次请求的超时时间（秒）
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        return max(min(timeout, remaining), 0.1)
+
+    def next_delay(self, retry_after: Optional[float] = None) -> Optional[float]:
+        """登记一次失败并计算下次重试前的等待时间
+
+        Args:
+            retry_after: 服务端Retry-After头给出的等待时间（秒）
+
+        Returns:
+            Optional[float]: 等待时间（秒），重试次数或总时限用尽时返回None
+        """
+        self.attempt += 1
+        if self.attempt > self.policy.max_retries:
+            return None
+
+        delay = self.policy.backoff(self.attempt)
+        if retry_after is not None and self.policy.honor_retry_after:
+            if retry_after > self.policy.max_retry_after:
+                # 服务端要求等待的时间过长，不再重试
+                return None
+            delay = max(delay, retry_after)
+
+        remaining = self.remaining()
+        if remaining is not None and delay >= remaining:
+            return None
+        return delay
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After响应头
+
+    Args:
+        value: Retry-After头的值，可以是秒数或HTTP日期
+
+    Returns:
+        Optional[float]: 等待时间（秒），无法解析时返回None
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+# 默认重试策略
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+# 按SAP接口ID配置的重试策略
+# TOOL_USED会在SAP中执行业务逻辑，不保证幂等，因此只允许少量重试
+RETRY_POLICIES: Dict[str, RetryPolicy] = {
+    "TOOL_LIST": RetryPolicy(max_retries=3, base_delay=0.5, deadline=45.0),
+    "TOOL_DETAIL": RetryPolicy(max_retries=3, base_delay=0.5, deadline=45.0),
+    "TOOL_USED": RetryPolicy(max_retries=1, base_delay=1.0, deadline=60.0),
+    "TOOL_USED_BATCH": RetryPolicy(max_retries=1, base_delay=1.0, deadline=90.0),
+}
+
+
+def get_retry_policy(
+    function_id: Optional[str],
+    policies: Optional[Dict[str, RetryPolicy]] = None,
+) -> RetryPolicy:
+    """获取SAP接口ID对应的重试策略
+
+    Args:
+        function_id: SAP接口ID（如TOOL_LIST、TOOL_DETAIL、TOOL_USED）
+        policies: 自定义策略表，None表示使用RETRY_POLICIES
+
+    Returns:
+        RetryPolicy: 重试策略，未配置时返回DEFAULT_RETRY_POLICY
+    """
+    policies = RETRY_POLICIES if policies is None else policies
+    return policies.get(function_id or "", DEFAULT_RETRY_POLICY)
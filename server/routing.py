@@ -0,0 +1,205 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    from .http_client import SAPHttpClient
+except ImportError:
+    from server.http_client import SAPHttpClient
+
+from config import SAP_CONFIG, SAP_SYSTEMS
+from utils.logging_config import get_logger
+
+# 获取logger实例
+logger = get_logger(__name__)
+
+# 多SAP系统路由配置
+ROUTING_CONFIG = {
+    "system_field": "SAP_SYSTEM",  # 合并后的工具清单中标记所属系统的字段，use_tools_batch的条目也可以用它指定系统
+    "fanout_timeout": None,  # 合并工具清单时等待单个系统的最长时间（秒），None表示由该系统的超时和重试策略决定
+}
+
+# 没有配置SAP_SYSTEMS时，SAP_CONFIG对应的系统名称
+DEFAULT_SYSTEM = "default"
+
+# 系统配置中只用于路由、不传给SAPHttpClient的项
+ROUTE_KEYS = ("prefixes", "default")
+
+
+class UnknownSystemError(ValueError):
+    """指定的SAP系统不存在"""
+
+
+def build_system_configs(systems: Dict[str, Dict[str, Any]], base_config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """生成每个SAP系统的连接配置
+
+    Args:
+        systems: 系统名称到系统配置的映射（SAP_SYSTEMS），为空表示只有SAP_CONFIG一个系统
+        base_config: SAP_CONFIG，系统配置中未填写的项从这里继承
+
+    Returns:
+        dict: 系统名称到连接配置的映射，每个系统都是独立的副本
+    """
+    if not systems:
+        return {DEFAULT_SYSTEM: dict(base_config)}
+    return {
+        name: dict(base_config, **{key: value for key, value in overrides.items() if key not in ROUTE_KEYS})
+        for name, overrides in systems.items()
+    }
+
+
+class SAPSystemRouter:
+    """多SAP系统路由
+
+    每个SAP系统有独立的SAPHttpClient（连接池），缓存命名空间、熔断器和限流器都按
+    系统标识（base_url|client_id）区分，一个系统故障或过载不影响其他系统。
+    工具调用按显式指定的系统、TOOL_ID前缀（最长匹配）、默认系统的顺序选择目标系统。
+    """
+
+    def __init__(
+        self,
+        systems: Optional[Dict[str, Dict[str, Any]]] = None,
+        base_config: Optional[Dict[str, Any]] = None,
+        factory: Callable[[Dict[str, Any]], SAPHttpClient] = lambda config: SAPHttpClient(config=config)
+    ):
+        """初始化路由
+
+        Args:
+            systems: 系统配置，None表示使用SAP_SYSTEMS
+            base_config: 继承的基础配置，None表示使用SAP_CONFIG
+            factory: 按系统连接配置创建客户端的函数
+
+        Raises:
+            ValueError: 同一个TOOL_ID前缀配置在多个系统中
+        """
+        systems = SAP_SYSTEMS if systems is None else systems
+        base_config = SAP_CONFIG if base_config is None else base_config
+        self.configs = build_system_configs(systems, base_config)
+        self._factory = factory
+        self._clients: Dict[str, SAPHttpClient] = {}
+
+        # 前缀按长度倒序匹配，"ZMM_STOCK_"优先于"ZMM_"
+        owners: Dict[str, str] = {}
+        for name, overrides in systems.items():
+            for prefix in overrides.get("prefixes", ()):
+                if prefix in owners and owners[prefix] != name:
+                    raise ValueError(f"TOOL_ID前缀 {prefix} 同时配置在SAP系统 {owners[prefix]} 和 {name} 中")
+                owners[prefix] = name
+        self.prefixes: List[Tuple[str, str]] = sorted(owners.items(), key=lambda item: len(item[0]), reverse=True)
+
+        defaults = [name for name, overrides in systems.items() if overrides.get("default")]
+        if len(defaults) > 1:
+            raise ValueError(f"多个SAP系统被设置为默认系统: {', '.join(defaults)}")
+        self.default = defaults[0] if defaults else next(iter(self.configs))
+
+    @property
+    def multi(self) -> bool:
+        """是否配置了多个SAP系统"""
+        return len(self.configs) > 1
+
+    def names(self) -> List[str]:
+        """所有SAP系统名称（按配置顺序）"""
+        return list(self.configs)
+
+    def resolve(self, tool_id: Optional[str] = None, system: Optional[str] = None) -> str:
+        """选择处理请求的SAP系统
+
+        Args:
+            tool_id: 工具ID，按前缀匹配系统
+            system: 显式指定的系统名称，优先于前缀
+
+        Returns:
+            str: 系统名称
+
+        Raises:
+            UnknownSystemError: 指定的系统不存在
+        """
+        if system:
+            if system not in self.configs:
+                raise UnknownSystemError(f"SAP系统 {system} 不存在，可用的系统: {', '.join(self.configs)}")
+            return system
+        if tool_id:
+            for prefix, name in self.prefixes:
+                if tool_id.startswith(prefix):
+                    return name
+        return self.default
+
+    def client(self, system: Optional[str] = None, tool_id: Optional[str] = None) -> SAPHttpClient:
+        """获取SAP系统对应的客户端（首次使用时创建）
+
+        Args:
+            system: 系统名称
+            tool_id: 工具ID，未指定系统时按前缀选择
+
+        Returns:
+            SAPHttpClient: 该系统共享的HTTP客户端
+        """
+        name = self.resolve(tool_id, system)
+        client = self._clients.get(name)
+        if client is None:
+            client = self._clients[name] = self._factory(self.configs[name])
+        return client
+
+    async def fan_out(
+        self,
+        call: Callable[[str, SAPHttpClient], Awaitable[Any]],
+        systems: Optional[List[str]] = None,
+        timeout: Optional[float] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """并发调用多个SAP系统，单个系统失败不影响其他系统
+
+        Args:
+            call: 调用函数，参数为系统名称和客户端
+            systems: 系统名称列表，None表示所有系统
+            timeout: 等待单个系统的最长时间（秒），None表示使用ROUTING_CONFIG["fanout_timeout"]
+
+        Returns:
+            tuple: (系统名称到结果的映射, 系统名称到错误信息的映射)
+        """
+        names = systems if systems is not None else self.names()
+        timeout = timeout if timeout is not None else ROUTING_CONFIG["fanout_timeout"]
+
+        async def run(name: str) -> Any:
+            coroutine = call(name, self.client(name))
+            return await (asyncio.wait_for(coroutine, timeout) if timeout else coroutine)
+
+        outcomes = await asyncio.gather(*(run(name) for name in names), return_exceptions=True)
+        results: Dict[str, Any] = {}
+        errors: Dict[str, str] = {}
+        for name, outcome in zip(names, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                errors[name] = f"等待超时({timeout}秒)"
+            elif isinstance(outcome, Exception):
+                errors[name] = str(outcome) or type(outcome).__name__
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                results[name] = outcome
+        for name, error in errors.items():
+            logger.warning(f"SAP系统 {name} 调用失败: {error}")
+        return results, errors
+
+    async def close(self) -> None:
+        """关闭所有系统的客户端"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for result in await asyncio.gather(*(client.close() for client in clients), return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.warning(f"关闭SAP HTTP客户端失败: {result}")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """获取路由配置（不包含用户和密码）
+
+        Returns:
+            list: 每个系统的名称、地址、客户端、前缀和是否为默认系统
+        """
+        return [
+            {
+                "name": name,
+                "base_url": config["base_url"],
+                "client_id": config["client_id"],
+                "prefixes": [prefix for prefix, owner in self.prefixes if owner == name],
+                "default": name == self.default,
+                "connected": name in self._clients,
+            }
+            for name, config in self.configs.items()
+        ]
@@ -1,18 +1,39 @@
 import sys
 import os
+import asyncio
 import logging
+import time
+from contextlib import asynccontextmanager
 from typing import Dict, Any, Optional, List
 
 # 添加父目录到Python路径，解决相对导入问题
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from fastmcp import FastMCP
+from fastmcp.server.dependencies import get_http_headers
+from fastmcp.server.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
 
 # 尝试相对导入，如果失败则使用绝对导入
 try:
     from .http_client import SAPHttpClient
+    from .schema_store import ToolSchemaStore
+    from .batching import ToolCallBatcher, BATCH_ENVELOPE_CONFIG
+    from .circuit_breaker import breaker_stats
+    from .concurrency import limiter_stats
+    from .result_store import ResultStore
+    from .workers import PreforkServer, fork_supported, worker_id
+    from .routing import SAPSystemRouter, ROUTING_CONFIG
 except ImportError:
     from server.http_client import SAPHttpClient
+    from server.schema_store import ToolSchemaStore
+    from server.batching import ToolCallBatcher, BATCH_ENVELOPE_CONFIG
+    from server.circuit_breaker import breaker_stats
+    from server.concurrency import limiter_stats
+    from server.result_store import ResultStore
+    from server.workers import PreforkServer, fork_supported, worker_id
+    from server.routing import SAPSystemRouter, ROUTING_CONFIG
 
 # 导入配置文件
 try:
@@ -28,9 +49,27 @@ except ImportError:
 
 # 导入日志配置
 try:
-    from utils.logging_config import get_logger
+    from utils.logging_config import get_logger, log_context
 except ImportError:
-    from ..utils.logging_config import get_logger
+    from ..utils.logging_config import get_logger, log_context
+
+# 导入指标注册表
+try:
+    from utils.metrics import registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+except ImportError:
+    from ..utils.metrics import registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+
+# 导入响应缓存
+try:
+    from utils.cache import enable_shared_cache
+except ImportError:
+    from ..utils.cache import enable_shared_cache
+
+# 导入调用链追踪
+try:
+    from utils.tracing import start_span, memory_exporter, build_span_tree, STATUS_ERROR
+except ImportError:
+    from ..utils.tracing import start_span, memory_exporter, build_span_tree, STATUS_ERROR
 
 # 获取logger实例
 logger = get_logger(__name__)
@@ -41,29 +80,403 @@ API_ENDPOINTS = {
     "USE_TOOL": "TOOL_USED"
 }
 
-mcp = FastMCP("SAP_MCP_Server")
-http_client = SAPHttpClient()
+# 启动预热配置
+WARMUP_CONFIG = {
+    "enabled": True,
+    "concurrency": 8,  # 并发获取TOOL_DETAIL的最大数量
+    "refresh_schemas": False,  # True表示重新获取所有工具参数格式，False表示跳过已存储的工具
+    # 多工作进程模式下的预热锁文件，工作进程依次预热，后面的进程直接使用共享的缓存和参数格式存储
+    "lock_file": os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "warmup.lock"),
+}
 
-# 工具参数格式缓存（内存存储，无需数据库）
-TOOL_PARAMS_CACHE: Dict[str, Dict[str, Any]] = {}
+# 批量调用配置
+BATCH_CONFIG = {
+    "max_concurrency": 10,  # 同时发往SAP的最大请求数
+    "item_timeout": 60.0,  # 单个条目的超时时间（秒）
+    "max_items": 500,  # 单次批量调用的最大条目数
+}
+
+# 服务就绪状态，预热完成前/ready返回503
+readiness: Dict[str, Any] = {
+    "ready": False,
+    "warmup": {"status": "pending"}
+}
 
 
-async def get_tool_params_format(tool_id: str) -> Optional[Dict[str, Any]]:
-    """从内存缓存获取工具参数格式
+@asynccontextmanager
+async def server_lifespan(server: FastMCP):
+    """MCP服务器生命周期：启动时在后台预热缓存，关闭时释放HTTP连接"""
+    warmup_task = None
+    if WARMUP_CONFIG["enabled"]:
+        warmup_task = asyncio.create_task(warm_up_exclusive(WARMUP_CONFIG["concurrency"]))
+    else:
+        readiness["ready"] = True
+        readiness["warmup"] = {"status": "disabled"}
+    try:
+        yield {}
+    finally:
+        if warmup_task is not None and not warmup_task.done():
+            warmup_task.cancel()
+        await sap_router.close()
+
+
+# MCP工具调用指标
+MCP_TOOL_SECONDS = registry.histogram(
+    "mcp_tool_duration_seconds",
+    "MCP工具调用耗时（秒）",
+    ("tool", "status")
+)
+MCP_TOOL_IN_FLIGHT = registry.gauge(
+    "mcp_tool_calls_in_flight",
+    "正在执行的MCP工具调用数量",
+    ("tool",)
+)
+
+
+class ToolMetricsMiddleware(Middleware):
+    """记录每次MCP工具调用的耗时和结果
+    
+    工具通过handle_error返回{"error": ...}而不是抛出异常，这类结果也计为error。
+    """
+    
+    async def on_call_tool(self, context, call_next):
+        tool = context.message.name
+        status = "error"
+        start_time = time.monotonic()
+        MCP_TOOL_IN_FLIGHT.inc(tool=tool)
+        try:
+            result = await call_next(context)
+            structured = getattr(result, "structured_content", None)
+            if not (isinstance(structured, dict) and "error" in structured):
+                status = "success"
+            return result
+        finally:
+            MCP_TOOL_IN_FLIGHT.dec(tool=tool)
+            MCP_TOOL_SECONDS.observe(time.monotonic() - start_time, tool=tool, status=status)
+
+
+class ToolTracingMiddleware(Middleware):
+    """为每次MCP工具调用创建调用链的根span
+    
+    MCP客户端通过HTTP传输发送traceparent请求头时延续客户端的调用链，
+    客户端测得的耗时减去根span的耗时即为MCP传输耗时。
+    """
+    
+    async def on_call_tool(self, context, call_next):
+        traceparent = get_http_headers(include={"traceparent"}).get("traceparent")
+        with start_span("mcp.tool", traceparent=traceparent, tool=context.message.name) as span:
+            result = await call_next(context)
+            structured = getattr(result, "structured_content", None)
+            if isinstance(structured, dict) and "error" in structured:
+                span.set_status(STATUS_ERROR, str(structured["error"])[:500])
+            return result
+
+
+mcp = FastMCP("SAP_MCP_Server", lifespan=server_lifespan)
+mcp.add_middleware(ToolTracingMiddleware())
+mcp.add_middleware(ToolMetricsMiddleware())
+# SAP系统路由：每个系统一个HTTP客户端（连接池），未配置SAP_SYSTEMS时只有SAP_CONFIG一个系统
+sap_router = SAPSystemRouter()
+
+# 默认系统的HTTP客户端
+http_client = sap_router.client()
+
+# 每个SAP系统一个TOOL_USED调用合并器，BATCH_ENVELOPE_CONFIG["enabled"]为True时使用
+tool_call_batchers: Dict[str, ToolCallBatcher] = {}
+
+# 工具参数格式存储（SQLite持久化，重启后保留，可在多个进程间共享）
+schema_store = ToolSchemaStore()
+
+# 大结果游标存储，use_tool结果过大时只返回第一页，其余通过fetch_result_page读取
+result_store = ResultStore()
+
+
+def _collect_server_metrics():
+    """导出MCP服务器状态指标"""
+    stats = result_store.stats()
+    return [
+        ("mcp_ready", "gauge", "预热是否完成（1表示就绪）", [({}, 1 if readiness["ready"] else 0)]),
+        ("mcp_result_cursors", "gauge", "保存的分页结果数量", [({}, stats["results"])]),
+        ("mcp_result_bytes", "gauge", "保存的分页结果估算占用的字节数", [({}, stats["bytes"])]),
+    ]
+
+
+registry.register_collector(_collect_server_metrics)
+
+
+def tag_system(tools: List[Any], system: str) -> List[Any]:
+    """在工具清单的每一项中标记所属的SAP系统（复制每一项，不修改缓存中的数据）"""
+    field = ROUTING_CONFIG["system_field"]
+    return [dict(tool, **{field: system}) if isinstance(tool, dict) else tool for tool in tools]
+
+
+def extract_param_format(result: Dict[str, Any]) -> Dict[str, Any]:
+    """从TOOL_DETAIL响应中提取参数格式
+    
+    Args:
+        result: TOOL_DETAIL接口的响应数据
+        
+    Returns:
+        工具参数格式字典
+    """
+    # 处理新的JSON格式，从param字段获取参数格式
+    param_format = result.get("param", {})
+    # 同时兼容旧格式，从PARAM字段获取参数格式
+    if not param_format:
+        param_format = result.get("PARAM", {})
+    return param_format
+
+
+async def fetch_tool_params_format(
+    tool_id: str,
+    json_data: Optional[Dict[str, Any]] = None,
+    system: Optional[str] = None,
+    refresh: bool = False
+) -> Optional[Dict[str, Any]]:
+    """从SAP获取工具参数格式，并保存到参数格式存储
     
     Args:
         tool_id: 工具ID
+        json_data: TOOL_DETAIL请求数据，None表示只传TOOL_ID
+        system: SAP系统名称，None表示按TOOL_ID前缀选择
+        refresh: 不使用TOOL_DETAIL响应缓存，参数格式存储中没有记录时使用，
+            避免把失效前缓存的旧参数格式写回存储
         
     Returns:
-        工具参数格式字典，如果不存在返回None
+        工具参数格式字典，SAP未返回有效数据时返回None
+    """
+    http_client = sap_router.client(system, tool_id)
+    result = await http_client.post(
+        params={"id": API_ENDPOINTS["TOOL_DETAIL"]},
+        json=json_data or {"TOOL_ID": tool_id},
+        refresh=refresh
+    )
+    if not result or not isinstance(result, dict):
+        return None
+    
+    param_format = extract_param_format(result)
+    version = schema_store.put(tool_id, param_format, http_client.system_key())
+    logger.info(f"工具参数格式已保存: {tool_id}, 版本: {version}")
+    return param_format
+
+
+async def get_tool_params_format(tool_id: str, system: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """获取工具参数格式
+    
+    优先从参数格式存储读取，未找到时自动从SAP获取并保存，
+    因此第一次调用工具前无需先调用get_tool_details。
+    
+    Args:
+        tool_id: 工具ID
+        system: SAP系统名称，None表示按TOOL_ID前缀选择
+        
+    Returns:
+        工具参数格式字典，如果无法获取返回None
+    """
+    with start_span("tool.params_format", tool_id=tool_id) as span:
+        param_format = schema_store.get(tool_id, sap_router.client(system, tool_id).system_key())
+        if param_format is not None:
+            span.set_attribute("source", "store")
+            return param_format
+        
+        span.set_attribute("source", "sap")
+        logger.info(f"工具 {tool_id} 参数格式未缓存，从SAP获取")
+        try:
+            return await fetch_tool_params_format(tool_id, system=system, refresh=True)
+        except Exception as e:
+            logger.warning(f"获取工具 {tool_id} 参数格式失败: {str(e)}")
+            span.set_status(STATUS_ERROR, str(e)[:500])
+            return None
+
+
+async def warm_up(concurrency: int = 8) -> Dict[str, Any]:
+    """预热工具清单和工具参数格式缓存
+    
+    先获取TOOL_LIST（写入响应缓存），再以有限并发获取每个工具的TOOL_DETAIL并保存到参数格式存储。
+    配置了多个SAP系统时并发预热所有系统，并发数由所有系统共用。
+    单个工具或系统失败不影响其他工具和系统，预热结束后（无论成功与否）服务标记为就绪。
+    
+    Args:
+        concurrency: 并发获取TOOL_DETAIL的最大数量
+        
+    Returns:
+        dict: 预热结果统计
+    """
+    start_time = time.time()
+    readiness["warmup"] = {"status": "running", "started_at": start_time}
+    logger.info(f"开始预热工具缓存，并发数: {concurrency}, SAP系统: {', '.join(sap_router.names())}")
+    
+    try:
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+        progress = {"tools": 0, "done": 0, "failed": 0, "skipped": 0}
+        
+        async def warm_system(system: str, client: SAPHttpClient) -> int:
+            result = format_jsonrpc_result(await client.get(params={"id": API_ENDPOINTS["TOOL_LIST"]}))
+            tool_ids = [
+                tool.get("TOOL_ID")
+                for tool in result.get("RESULT", [])
+                if isinstance(tool, dict) and tool.get("TOOL_ID")
+            ]
+            progress["tools"] += len(tool_ids)
+            list_time = time.time() - start_time
+            logger.info(f"工具清单已加载: {system}, {len(tool_ids)} 个工具, 耗时: {list_time:.3f}秒")
+            namespace = client.system_key()
+            
+            async def load(tool_id: str) -> None:
+                async with semaphore:
+                    try:
+                        if not WARMUP_CONFIG["refresh_schemas"] and schema_store.get(tool_id, namespace) is not None:
+                            progress["skipped"] += 1
+                        else:
+                            await fetch_tool_params_format(tool_id, system=system, refresh=True)
+                    except Exception as e:
+                        progress["failed"] += 1
+                        logger.warning(f"预热工具参数格式失败: {system}, {tool_id}, {str(e)}")
+                    finally:
+                        progress["done"] += 1
+                        readiness["warmup"]["progress"] = f"{progress['done']}/{progress['tools']}"
+                        logger.info(f"预热进度: {progress['done']}/{progress['tools']} ({system}, {tool_id})")
+            
+            await asyncio.gather(*(load(tool_id) for tool_id in tool_ids))
+            return len(tool_ids)
+        
+        results, errors = await sap_router.fan_out(warm_system)
+        if not results:
+            # 所有系统的工具清单都获取失败
+            if not sap_router.multi:
+                raise Exception(next(iter(errors.values())))
+            raise Exception("; ".join(f"{system}: {error}" for system, error in errors.items()))
+        
+        elapsed = time.time() - start_time
+        readiness["warmup"] = {
+            "status": "completed",
+            "tools": progress["tools"],
+            "failed": progress["failed"],
+            "skipped": progress["skipped"],
+            "elapsed": round(elapsed, 3)
+        }
+        if sap_router.multi:
+            readiness["warmup"]["systems"] = results
+        if errors:
+            readiness["warmup"]["errors"] = errors
+        logger.info(
+            f"预热完成 - 工具: {progress['tools']}, 失败: {progress['failed']}, "
+            f"跳过: {progress['skipped']}, 失败的系统: {len(errors)}, 耗时: {elapsed:.3f}秒"
+        )
+    except Exception as e:
+        readiness["warmup"] = {
+            "status": "failed",
+            "error": str(e),
+            "elapsed": round(time.time() - start_time, 3)
+        }
+        logger.error(f"预热失败: {str(e)}")
+    finally:
+        readiness["ready"] = True
+    
+    return readiness["warmup"]
+
+
+async def warm_up_exclusive(concurrency: int = 8) -> Dict[str, Any]:
+    """预热缓存，多工作进程模式下通过文件锁让工作进程依次预热
+    
+    第一个拿到锁的工作进程从SAP加载工具清单和参数格式，之后的进程命中共享缓存和参数格式存储，
+    避免N个进程同时启动时向SAP发送N倍的请求。
+    
+    Args:
+        concurrency: 并发获取TOOL_DETAIL的最大数量
+        
+    Returns:
+        dict: 预热结果统计
+    """
+    if worker_id() is None:
+        return await warm_up(concurrency)
+    
+    # fcntl只在POSIX平台可用，多工作进程模式也只在POSIX平台启用
+    import fcntl
+    
+    lock_file = WARMUP_CONFIG["lock_file"]
+    os.makedirs(os.path.dirname(lock_file), exist_ok=True)
+    fd = os.open(lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        readiness["warmup"] = {"status": "waiting"}
+        await asyncio.get_running_loop().run_in_executor(None, fcntl.flock, fd, fcntl.LOCK_EX)
+        return await warm_up(concurrency)
+    finally:
+        # 关闭文件描述符即释放锁
+        os.close(fd)
+
+
+@mcp.custom_route("/ready", methods=["GET"])
+async def ready_check(request: Request) -> JSONResponse:
+    """就绪检查，预热完成前返回503"""
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> Response:
+    """Prometheus格式的指标"""
+    return Response(registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@mcp.custom_route("/traces", methods=["GET"])
+async def traces(request: Request) -> JSONResponse:
+    """最近的工具调用链（内存导出器），?trace_id=xxx 返回该调用链的span树"""
+    trace_id = request.query_params.get("trace_id")
+    if trace_id:
+        spans = memory_exporter.get_trace(trace_id)
+        if spans is None:
+            return JSONResponse({"error": f"调用链 {trace_id} 不存在"}, status_code=404)
+        return JSONResponse({"trace_id": trace_id, "spans": build_span_tree(spans)})
+    try:
+        limit = int(request.query_params.get("limit", 50))
+    except ValueError:
+        return JSONResponse({"error": "limit必须是整数"}, status_code=400)
+    limit = min(max(limit, 1), 500)
+    return JSONResponse({"traces": memory_exporter.traces(limit)})
+
+
+@mcp.custom_route("/circuits", methods=["GET"])
+async def circuits_status(request: Request) -> JSONResponse:
+    """SAP接口熔断器状态"""
+    return JSONResponse({"circuit_breakers": breaker_stats()})
+
+
+@mcp.custom_route("/limiters", methods=["GET"])
+async def limiters_status(request: Request) -> JSONResponse:
+    """SAP系统自适应并发限流器状态"""
+    return JSONResponse({"concurrency_limiters": limiter_stats()})
+
+
+@mcp.custom_route("/cache/invalidate", methods=["POST"])
+async def invalidate_tool_cache(request: Request) -> JSONResponse:
+    """使工具详情缓存和参数格式失效（所有SAP系统），?tool_id=xxx 只处理该工具
+    
+    Web管理端的/api/tools/cache调用该接口，清除MCP服务器进程内的缓存。
+    多工作进程模式下请求只到达一个工作进程，响应缓存通过共享存储对所有工作进程生效，
+    其他工作进程内的参数格式缓存最迟在SCHEMA_STORE_CONFIG["memory_ttl"]秒后失效。
     """
-    return TOOL_PARAMS_CACHE.get(tool_id)
+    tool_id = request.query_params.get("tool_id") or None
+    count = http_client.invalidate_post_cache(API_ENDPOINTS["TOOL_DETAIL"], tool_id)
+    schema_count = schema_store.delete(tool_id)
+    return JSONResponse({"tool_id": tool_id, "invalidated": count, "schemas_deleted": schema_count})
+
+
+@mcp.custom_route("/systems", methods=["GET"])
+async def systems_status(request: Request) -> JSONResponse:
+    """SAP系统路由配置"""
+    return JSONResponse({"default": sap_router.default, "systems": sap_router.stats()})
 
 
 @mcp.tool(name="get_tool_list")
-async def get_tool_list() -> Dict[str, Any]:
+async def get_tool_list(system: Optional[str] = None) -> Dict[str, Any]:
     """获取工具清单
     
+    配置了多个SAP系统时，不指定system会并发获取所有系统的工具清单并合并，
+    每个工具带有SAP_SYSTEM字段，调用其他工具时可以把它作为system参数传入。
+    
+    Args:
+        system: SAP系统名称，不指定表示所有系统
+    
     Returns:
         dict: 包含工具清单的JSON-RPC响应，格式为:
             {
@@ -71,25 +484,44 @@ async def get_tool_list() -> Dict[str, Any]:
                 "RESULT": [工具列表],
                 "ID": ""
             }
+            部分系统失败时附加ERRORS字段（系统名称到错误信息的映射），
             或包含错误信息的字典
     """
     try:
-        logger.info("获取工具清单")
-        result = await http_client.get(params={"id": API_ENDPOINTS["TOOL_LIST"]})
-        return format_jsonrpc_result(result)
+        logger.info(f"获取工具清单: {system or '所有系统'}")
+        params = {"id": API_ENDPOINTS["TOOL_LIST"]}
+        if not sap_router.multi:
+            return format_jsonrpc_result(await http_client.get(params=params))
+        
+        if system:
+            result = format_jsonrpc_result(await sap_router.client(system).get(params=params))
+            return dict(result, RESULT=tag_system(result.get("RESULT", []), system))
+        
+        results, errors = await sap_router.fan_out(lambda name, client: client.get(params=params))
+        if not results:
+            raise Exception("; ".join(f"{name}: {error}" for name, error in errors.items()))
+        tools = []
+        for name in sap_router.names():
+            if name in results:
+                tools.extend(tag_system(format_jsonrpc_result(results[name]).get("RESULT", []), name))
+        merged = {"JSONRPC": "2.0", "RESULT": tools, "ID": ""}
+        if errors:
+            merged["ERRORS"] = errors
+        return merged
     except Exception as e:
         return handle_error(e, "获取工具清单失败")
 
 
 @mcp.tool(name="get_tool_details")
-async def get_tool_details(json_data: Dict[str, Any]) -> Dict[str, Any]:
-    """根据工具信息获取工具使用说明，并保存到内存缓存
+async def get_tool_details(json_data: Dict[str, Any], system: Optional[str] = None) -> Dict[str, Any]:
+    """根据工具信息获取工具使用说明，并保存到参数格式存储
     
     Args:
         json_data: JSON格式数据，必须包含TOOL_ID字段
             {
                 "TOOL_ID": "工具ID"
             }
+        system: SAP系统名称（get_tool_list返回的SAP_SYSTEM），不指定时按TOOL_ID前缀选择
         
     Returns:
         dict: 工具参数格式，包含工具的详细参数信息
@@ -102,37 +534,87 @@ async def get_tool_details(json_data: Dict[str, Any]) -> Dict[str, Any]:
         
         logger.info(f"获取工具详情: {tool_id}")
         
-        result = await http_client.post(
-            params={"id": API_ENDPOINTS["TOOL_DETAIL"]},
-            json=json_data
-        )
+        param_format = await fetch_tool_params_format(tool_id, json_data, system)
         
-        if result and isinstance(result, dict):
-            # 处理新的JSON格式，从param字段获取参数格式
-            param_format = result.get("param", {})
-            # 同时兼容旧格式，从PARAM字段获取参数格式
-            if not param_format:
-                param_format = result.get("PARAM", {})
-            # 将工具参数格式保存到内存缓存
-            TOOL_PARAMS_CACHE[tool_id] = param_format
-            logger.info(f"工具参数格式已保存到内存缓存: {tool_id}")
-            
+        if param_format is not None:
             # 确保返回的数据格式符合前端预期
-            return {
+            details = {
                 "TOOL_ID": tool_id,
                 "PARAM": param_format
             }
+            if sap_router.multi:
+                details[ROUTING_CONFIG["system_field"]] = sap_router.resolve(tool_id, system)
+            return details
         
-        return result
+        return handle_error(ValueError("SAP未返回有效的工具详情"), "获取工具详情失败")
     except Exception as e:
         return handle_error(e, "获取工具详情失败")
 
 
+async def execute_tool(tool_id: str, user_params: Dict[str, Any], system: Optional[str] = None) -> Dict[str, Any]:
+    """转换参数并调用SAP执行工具
+    
+    Args:
+        tool_id: 工具ID
+        user_params: 用户传入的参数（扁平格式，不含TOOL_ID）
+        system: SAP系统名称，None表示按TOOL_ID前缀选择
+        
+    Returns:
+        dict: 工具执行结果
+        
+    Raises:
+        UnknownSystemError: 指定的SAP系统不存在
+        Exception: SAP接口调用失败
+    """
+    system = sap_router.resolve(tool_id, system)
+    # 该工具调用期间的日志都带有tool_id，/api/logs可以按工具过滤
+    with log_context(tool_id=tool_id):
+        # 从参数格式存储获取工具参数格式（未缓存时自动从SAP获取）
+        param_format = await get_tool_params_format(tool_id, system)
+        
+        # 如果无法获取参数格式，尝试直接使用用户参数
+        if param_format is None:
+            logger.warning(f"工具 {tool_id} 无法获取参数格式，尝试直接使用用户参数")
+            # 直接使用用户参数，不进行格式转换
+            sap_params = {
+                "IMPORT": {
+                    "IMPORTING_DATA": user_params
+                }
+            }
+        else:
+            # 将用户参数转换为SAP接口要求的格式
+            with start_span("tool.convert_params", param_count=len(user_params)):
+                sap_params = convert_user_params_to_sap_format(user_params, param_format)
+        
+        # 构造SAP请求数据
+        sap_request_data = {
+            "TOOL_ID": tool_id,
+            "PARAM": sap_params
+        }
+        
+        logger.info(f"参数转换完成，调用SAP接口: {tool_id} ({system})")
+        client = sap_router.client(system)
+        if BATCH_ENVELOPE_CONFIG["enabled"]:
+            # 短时间内到达的同一系统的调用合并为一个TOOL_USED_BATCH请求
+            # 合并后的请求记录在触发发送的调用的调用链中，其他调用只记录等待时间
+            batcher = tool_call_batchers.get(system)
+            if batcher is None:
+                batcher = tool_call_batchers[system] = ToolCallBatcher(client)
+            with start_span("tool.batch_wait", tool_id=tool_id):
+                return await batcher.submit(sap_request_data)
+        return await client.post(
+            params={"id": API_ENDPOINTS["USE_TOOL"]},
+            json=sap_request_data
+        )
+
+
 @mcp.tool(name="use_tool")
-async def use_tool(json_data: Dict[str, Any]) -> Dict[str, Any]:
+async def use_tool(json_data: Dict[str, Any], page_size: Optional[int] = None, system: Optional[str] = None) -> Dict[str, Any]:
     """使用工具执行操作
     
-    使用工具前，请先调用get_tool_details获取工具使用说明
+    建议使用工具前先调用get_tool_details了解参数含义；参数格式未缓存时会自动从SAP获取。
+    结果中的表行数较多时只返回第一页，并附加PAGINATION字段（含CURSOR），
+    其余数据通过fetch_result_page读取。
     
     Args:
         json_data: JSON格式数据，必须包含TOOL_ID和参数
@@ -142,6 +624,8 @@ async def use_tool(json_data: Dict[str, Any]) -> Dict[str, Any]:
                 "参数名2": "值2",
                 ...
             }
+        page_size: 结果分页时第一页的行数，默认使用RESULT_STORE_CONFIG["page_size"]
+        system: SAP系统名称（get_tool_list返回的SAP_SYSTEM），不指定时按TOOL_ID前缀选择
         
     Returns:
         dict: 工具执行结果
@@ -154,9 +638,6 @@ async def use_tool(json_data: Dict[str, Any]) -> Dict[str, Any]:
         
         logger.info(f"使用工具: {tool_id}")
         
-        # 从内存缓存获取工具参数格式
-        param_format = await get_tool_params_format(tool_id)
-        
         # 提取用户传入的参数（除了 TOOL_ID 之外的所有字段）
         user_params = {
             key: value 
@@ -164,34 +645,167 @@ async def use_tool(json_data: Dict[str, Any]) -> Dict[str, Any]:
             if key != "TOOL_ID"
         }
         
-        # 如果缓存中没有参数格式，尝试直接使用用户参数
-        if param_format is None:
-            logger.warning(f"工具 {tool_id} 未在缓存中找到，尝试直接使用用户参数")
-            # 直接使用用户参数，不进行格式转换
-            sap_params = {
-                "IMPORT": {
-                    "IMPORTING_DATA": user_params
-                }
+        result = await execute_tool(tool_id, user_params, system)
+        with start_span("tool.paginate") as span:
+            paged = await result_store.paginate_async(tool_id, result, page_size)
+            span.set_attribute("paginated", paged is not result)
+            return paged
+    except Exception as e:
+        return handle_error(e, "使用工具失败")
+
+
+@mcp.tool(name="fetch_result_page")
+async def fetch_result_page(
+    cursor: str,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    columns: Optional[List[str]] = None,
+    filters: Optional[Any] = None
+) -> Dict[str, Any]:
+    """读取use_tool分页结果的指定页
+    
+    可以只选择需要的列，并在服务端过滤行，减少返回的数据量。
+    
+    Args:
+        cursor: use_tool返回的PAGINATION.CURSOR
+        offset: 起始行（过滤后的行号，从0开始），下一页使用上次返回的NEXT_OFFSET
+        limit: 行数，默认使用RESULT_STORE_CONFIG["page_size"]
+        columns: 只返回的列名列表，如 ["MATNR", "MAKTX"]
+        filters: 过滤条件，可以是 {"列名": 值}（等值过滤），或
+            [{"column": "列名", "op": "eq|ne|gt|ge|lt|le|in|contains|startswith", "value": 值}, ...]
+        
+    Returns:
+        dict: 分页结果，格式为:
+            {
+                "CURSOR": "游标",
+                "ROWS": [...],
+                "OFFSET": 起始行,
+                "RETURNED": 本页行数,
+                "TOTAL_ROWS": 满足过滤条件的总行数,
+                "HAS_MORE": 是否还有数据,
+                "NEXT_OFFSET": 下一页的起始行,
+                ...
             }
-        else:
-            # 将用户参数转换为SAP接口要求的格式
-            sap_params = convert_user_params_to_sap_format(user_params, param_format)
+            或包含错误信息的字典
+    """
+    try:
+        logger.info(f"读取分页结果: {cursor}, offset: {offset}, limit: {limit}")
+        return await result_store.get_page_async(cursor, offset, limit, columns, filters)
+    except Exception as e:
+        return handle_error(e, "读取分页结果失败")
+
+
+@mcp.tool(name="release_result")
+async def release_result(cursor: str) -> Dict[str, Any]:
+    """释放分页结果，不再需要剩余数据时调用以尽快释放服务端内存
+    
+    Args:
+        cursor: use_tool返回的PAGINATION.CURSOR
         
-        # 构造SAP请求数据
-        sap_request_data = {
-            "TOOL_ID": tool_id,
-            "PARAM": sap_params
-        }
+    Returns:
+        dict: {"CURSOR": "游标", "RELEASED": 是否释放}
+    """
+    released = await result_store.release_async(cursor)
+    logger.info(f"释放分页结果: {cursor}, {'成功' if released else '游标不存在'}")
+    return {"CURSOR": cursor, "RELEASED": released}
+
+
+@mcp.tool(name="use_tools_batch")
+async def use_tools_batch(
+    items: List[Dict[str, Any]],
+    max_concurrency: Optional[int] = None,
+    item_timeout: Optional[float] = None,
+    system: Optional[str] = None
+) -> Dict[str, Any]:
+    """批量使用工具，并发调用SAP
+    
+    适用于需要对同一个或多个工具执行大量调用的场景（如批量查询物料），
+    单个条目失败不影响其他条目，结果按输入顺序返回。
+    
+    Args:
+        items: 工具调用列表，每项格式为
+            {
+                "TOOL_ID": "工具ID",
+                "params": {"参数名1": "值1", ...},
+                "SAP_SYSTEM": "SAP系统名称（可选，优先于system参数）"
+            }
+            也可以像use_tool一样把参数直接写在TOOL_ID旁边
+        max_concurrency: 最大并发数，不能超过BATCH_CONFIG["max_concurrency"]
+        item_timeout: 单个条目的超时时间（秒），默认使用BATCH_CONFIG["item_timeout"]
+        system: 所有条目默认使用的SAP系统名称，不指定时按TOOL_ID前缀选择
         
-        logger.info(f"参数转换完成，调用SAP接口: {tool_id}")
-        result = await http_client.post(
-            params={"id": API_ENDPOINTS["USE_TOOL"]},
-            json=sap_request_data
-        )
+    Returns:
+        dict: 批量执行结果，格式为:
+            {
+                "TOTAL": 条目数,
+                "SUCCEEDED": 成功数,
+                "FAILED": 失败数,
+                "RESULTS": [
+                    {"INDEX": 0, "TOOL_ID": "工具ID", "SUCCESS": true, "RESULT": {...}},
+                    {"INDEX": 1, "TOOL_ID": "工具ID", "SUCCESS": false, "ERROR": "错误信息"},
+                    ...
+                ]
+            }
+            或包含错误信息的字典
+    """
+    try:
+        if not isinstance(items, list) or not items:
+            return handle_error(ValueError("items不能为空"), "批量使用工具")
+        if len(items) > BATCH_CONFIG["max_items"]:
+            return handle_error(
+                ValueError(f"条目数量 {len(items)} 超过上限 {BATCH_CONFIG['max_items']}"),
+                "批量使用工具"
+            )
+        
+        concurrency = min(max_concurrency or BATCH_CONFIG["max_concurrency"], BATCH_CONFIG["max_concurrency"])
+        timeout = item_timeout or BATCH_CONFIG["item_timeout"]
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+        start_time = time.time()
+        logger.info(f"批量使用工具: {len(items)} 个条目, 并发数: {concurrency}")
         
-        return result
+        async def run_item(index: int, item: Any) -> Dict[str, Any]:
+            tool_id = item.get("TOOL_ID") if isinstance(item, dict) else None
+            entry: Dict[str, Any] = {"INDEX": index, "TOOL_ID": tool_id}
+            if not tool_id:
+                entry.update({"SUCCESS": False, "ERROR": "TOOL_ID不能为空"})
+                return entry
+            
+            system_field = ROUTING_CONFIG["system_field"]
+            item_system = item.get(system_field) or system
+            if "params" in item:
+                if not isinstance(item["params"], dict):
+                    entry.update({"SUCCESS": False, "ERROR": "params必须是字典"})
+                    return entry
+                user_params = item["params"]
+            else:
+                user_params = {key: value for key, value in item.items() if key not in ("TOOL_ID", system_field)}
+            
+            async with semaphore:
+                try:
+                    result = await asyncio.wait_for(execute_tool(tool_id, user_params, item_system), timeout)
+                    entry.update({"SUCCESS": True, "RESULT": result})
+                except asyncio.TimeoutError:
+                    logger.warning(f"批量条目 {index} ({tool_id}) 超时: {timeout}秒")
+                    entry.update({"SUCCESS": False, "ERROR": f"执行超时({timeout}秒)"})
+                except Exception as e:
+                    logger.warning(f"批量条目 {index} ({tool_id}) 执行失败: {str(e)}")
+                    entry.update({"SUCCESS": False, "ERROR": str(e)})
+            return entry
+        
+        results = await asyncio.gather(*(run_item(index, item) for index, item in enumerate(items)))
+        succeeded = sum(1 for entry in results if entry["SUCCESS"])
+        logger.info(
+            f"批量使用工具完成 - 成功: {succeeded}, 失败: {len(results) - succeeded}, "
+            f"耗时: {time.time() - start_time:.3f}秒"
+        )
+        return {
+            "TOTAL": len(results),
+            "SUCCEEDED": succeeded,
+            "FAILED": len(results) - succeeded,
+            "RESULTS": list(results)
+        }
     except Exception as e:
-        return handle_error(e, "使用工具失败")
+        return handle_error(e, "批量使用工具失败")
 
 
 def main():
@@ -199,12 +813,43 @@ def main():
     
     这个函数被sap-mcp-server命令调用，用于启动MCP服务器。
     """
-    logger.info("启动MCP服务器")
+    workers = int(MCP_SERVER_CONFIG.get("workers", 1) or 1)
+    if workers > 1 and not fork_supported():
+        logger.warning("当前平台不支持fork，多工作进程模式不可用，以单进程运行")
+        workers = 1
+    
+    if workers == 1:
+        logger.info("启动MCP服务器")
+        mcp.run(
+            transport="http",
+            host=MCP_SERVER_CONFIG["host"],
+            port=MCP_SERVER_CONFIG["port"],
+            path=MCP_SERVER_CONFIG["path"]
+        )
+        return
+    
+    # 响应缓存和分页结果放到共享存储（参数格式存储本身就是共享的SQLite文件），连接在工作进程中建立；
+    # 同一个会话的fetch_result_page可能由其他工作进程处理
+    enable_shared_cache()
+    result_store.enable_shared()
+    logger.info(f"以多工作进程模式启动MCP服务器，工作进程数: {workers}")
+    PreforkServer(_serve_worker, MCP_SERVER_CONFIG["host"], MCP_SERVER_CONFIG["port"], workers).run()
+
+
+def _serve_worker(sock, index: int) -> None:
+    """工作进程入口：在主进程创建的监听socket上运行MCP服务器
+    
+    MCP会话保存在进程内存中，而同一客户端的请求可能被分配到任意工作进程，
+    因此多工作进程模式使用无状态HTTP（每个请求独立处理）。
+    """
     mcp.run(
         transport="http",
         host=MCP_SERVER_CONFIG["host"],
         port=MCP_SERVER_CONFIG["port"],
-        path=MCP_SERVER_CONFIG["path"]
+        path=MCP_SERVER_CONFIG["path"],
+        stateless_http=True,
+        sockets=[sock],
+        show_banner=index == 0
     )
 
 if __name__ == "__main__":
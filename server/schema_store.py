@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional, List, Tuple
+
+# 数据库结构版本，结构变化时递增并在_migrate中处理
+DB_SCHEMA_VERSION = 1
+
+# 工具参数格式存储配置
+SCHEMA_STORE_CONFIG = {
+    "db_path": os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "tool_schema.db"),
+    "memory_ttl": 60,  # 进程内缓存时间（秒），多进程共享时其他进程的更新最迟在此时间后可见
+}
+
+
+class ToolSchemaStore:
+    """工具参数格式持久化存储
+
+    使用本地SQLite文件保存TOOL_DETAIL返回的参数格式，服务重启后无需重新获取，
+    多个服务进程也可以共享同一个文件。每个工具的参数格式内容变化时版本号递增。
+    进程内另有一层短时间的内存缓存，避免每次调用都读取数据库。
+    """
+
+    def __init__(self, db_path: Optional[str] = None, memory_ttl: Optional[float] = None):
+        """初始化存储
+
+        Args:
+            db_path: SQLite数据库文件路径，None表示使用SCHEMA_STORE_CONFIG中的配置
+            memory_ttl: 进程内缓存时间（秒），None表示使用SCHEMA_STORE_CONFIG中的配置
+        """
+        self.db_path = db_path or SCHEMA_STORE_CONFIG["db_path"]
+        self.memory_ttl = SCHEMA_STORE_CONFIG["memory_ttl"] if memory_ttl is None else memory_ttl
+        self._memory: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取数据库连接，首次调用时创建数据库文件和表"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._migrate(conn)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection) -> None:
+        """创建或升级数据库结构"""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tool_schema (
+                    namespace TEXT NOT NULL,
+                    tool_id TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    param_format TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, tool_id)
+                )
+                """
+            )
+            conn.execute(f"PRAGMA user_version={DB_SCHEMA_VERSION}")
+
+    def get_record(self, tool_id: str, namespace: str = "") -> Optional[Dict[str, Any]]:
+        """从数据库读取工具参数格式记录
+
+        Args:
+            tool_id: 工具ID
+            namespace: 命名空间（SAP系统标识）
+
+        Returns:
+            dict: 包含tool_id、version、param_format和updated_at的字典，不存在时返回None
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT version, param_format, updated_at FROM tool_schema WHERE namespace = ? AND tool_id = ?",
+                (namespace, tool_id)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "tool_id": tool_id,
+            "version": row[0],
+            "param_format": json.loads(row[1]),
+            "updated_at": row[2]
+        }
+
+    def get(self, tool_id: str, namespace: str = "") -> Optional[Dict[str, Any]]:
+        """获取工具参数格式（先查进程内缓存，再查数据库）
+
+        Args:
+            tool_id: 工具ID
+            namespace: 命名空间（SAP系统标识）
+
+        Returns:
+            dict: 工具参数格式，不存在时返回None
+        """
+        key = (namespace, tool_id)
+        now = time.time()
+        cached = self._memory.get(key)
+        if cached is not None and now < cached[0]:
+            return cached[1]
+
+        record = self.get_record(tool_id, namespace)
+        if record is None:
+            self._memory.pop(key, None)
+            return None
+        self._memory[key] = (now + self.memory_ttl, record["param_format"])
+        return record["param_format"]
+
+    def put(self, tool_id: str, param_format: Dict[str, Any], namespace: str = "") -> int:
+        """保存工具参数格式，内容变化时版本号加1
+
+        Args:
+            tool_id: 工具ID
+            param_format: 工具参数格式
+            namespace: 命名空间（SAP系统标识）
+
+        Returns:
+            int: 保存后的版本号
+        """
+        content = json.dumps(param_format, sort_keys=True, ensure_ascii=False)
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT version, content_hash FROM tool_schema WHERE namespace = ? AND tool_id = ?",
+                    (namespace, tool_id)
+                ).fetchone()
+                if row is None:
+                    version = 1
+                elif row[1] == content_hash:
+                    version = row[0]
+                else:
+                    version = row[0] + 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO tool_schema "
+                    "(namespace, tool_id, version, content_hash, param_format, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (namespace, tool_id, version, content_hash, content, now)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        self._memory[(namespace, tool_id)] = (now + self.memory_ttl, param_format)
+        return version
+
+    def delete(self, tool_id: Optional[str] = None, namespace: Optional[str] = None) -> int:
+        """删除工具参数格式
+
+        Args:
+            tool_id: 工具ID，None表示所有工具
+            namespace: 命名空间，None表示所有命名空间
+
+        Returns:
+            int: 删除的记录数量
+        """
+        conditions = []
+        values: List[str] = []
+        if namespace is not None:
+            conditions.append("namespace = ?")
+            values.append(namespace)
+        if tool_id is not None:
+            conditions.append("tool_id = ?")
+            values.append(tool_id)
+        sql = "DELETE FROM tool_schema"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            count = self._connect().execute(sql, values).rowcount
+        for key in list(self._memory):
+            if (namespace is None or key[0] == namespace) and (tool_id is None or key[1] == tool_id):
+                self._memory.pop(key, None)
+        return count
+
+    def list(self, namespace: str = "") -> List[Dict[str, Any]]:
+        """列出命名空间下所有工具的版本信息
+
+        Args:
+            namespace: 命名空间（SAP系统标识）
+
+        Returns:
+            list: 包含tool_id、version和updated_at的字典列表
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT tool_id, version, updated_at FROM tool_schema WHERE namespace = ? ORDER BY tool_id",
+                (namespace,)
+            ).fetchall()
+        return [{"tool_id": row[0], "version": row[1], "updated_at": row[2]} for row in rows]
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,385 @@
+import codecs
+import json
+import re
+from typing import Any, AsyncIterator, List, Optional
+
+import httpx
+
+from utils import codec
+from utils.logging_config import LazyPayload, log_payload
+
+# 检测HTML登录页时最多读取的响应前缀字节数
+HTML_SNIFF_BYTES = 512
+
+_HTML_PREFIXES = (b"<!doctype html", b"<html")
+_SEEK_PATTERN = re.compile(r'["{}\[\]:,]')
+_STRING_PATTERN = re.compile(r'["\\]')
+
+
+class SAPResponseError(Exception):
+    """SAP已响应，但响应内容无法使用（HTML登录页、非JSON响应等）"""
+
+
+class SAPAuthRequiredError(SAPResponseError):
+    """SAP返回HTML页面（通常是登录页），需要重新认证"""
+
+
+def looks_like_html(prefix: bytes) -> bool:
+    """根据响应前缀判断内容是否为HTML
+
+    Args:
+        prefix: 响应体开头的若干字节
+
+    Returns:
+        bool: 以<!DOCTYPE html或<html开头时返回True
+    """
+    head = prefix.lstrip(b"\xef\xbb\xbf \t\r\n")[:16].lower()
+    return head.startswith(_HTML_PREFIXES)
+
+
+class SSEParser:
+    """增量解析Server-Sent Events响应，提取data字段"""
+
+    def __init__(self, keep_lines: bool = True):
+        """初始化解析器
+
+        Args:
+            keep_lines: 是否保存所有data行（供data()使用）；交给增量解析器处理时设为False，
+                不在内存中保留完整响应
+        """
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending = ""
+        self.keep_lines = keep_lines
+        self.data_lines: List[str] = []
+        self.saw_data = False
+
+    def feed(self, chunk: bytes) -> List[str]:
+        """输入一段响应数据
+
+        Args:
+            chunk: 响应数据
+
+        Returns:
+            list: 本次新解析出的data行内容
+        """
+        text = self._pending + self._decoder.decode(chunk)
+        lines = text.split("\n")
+        # 最后一行可能不完整，留到下次处理
+        self._pending = lines.pop()
+        return self._collect(lines)
+
+    def close(self) -> List[str]:
+        """结束解析，处理剩余的不完整行
+
+        Returns:
+            list: 剩余的data行内容
+        """
+        text = self._pending + self._decoder.decode(b"", final=True)
+        self._pending = ""
+        return self._collect([text])
+
+    def _collect(self, lines: List[str]) -> List[str]:
+        new_lines = []
+        for line in lines:
+            line = line.strip()
+            if line.startswith("data:"):
+                new_lines.append(line[5:].strip())
+        if new_lines:
+            self.saw_data = True
+            if self.keep_lines:
+                self.data_lines.extend(new_lines)
+        return new_lines
+
+    def data(self) -> str:
+        """所有data行以换行连接后的内容"""
+        return "\n".join(self.data_lines)
+
+
+class JSONArrayStreamer:
+    """增量解析JSON文档中的大数组，逐个返回数组元素
+
+    支持两种文档结构：
+    - 顶层对象中名为key的数组，如 {"JSONRPC": "2.0", "RESULT": [...], "ID": ""}
+    - 顶层即为数组，如 [...]
+
+    只解析目标数组的元素，数组之后的内容会被忽略。
+    """
+
+    def __init__(self, key: Optional[str] = "RESULT"):
+        """初始化解析器
+
+        Args:
+            key: 顶层对象中目标数组的键名，None表示只处理顶层数组
+        """
+        self.key = key
+        self.found = False
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._state = "seek"  # seek: 查找目标数组, array: 解析数组元素, done: 数组结束
+        self._depth = 0
+        self._in_string = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._current_key: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, text: str) -> List[Any]:
+        """输入一段JSON文本
+
+        Args:
+            text: JSON文本片段
+
+        Returns:
+            list: 本次新解析出的完整数组元素
+        """
+        if self._state == "done":
+            return []
+        self._buffer += text
+        if self._state == "seek":
+            self._seek()
+        items = self._parse_items(final=False) if self._state == "array" else []
+        self._compact()
+        return items
+
+    def close(self) -> List[Any]:
+        """结束解析
+
+        Returns:
+            list: 剩余的数组元素
+
+        Raises:
+            json.JSONDecodeError: 数组不完整或格式错误
+        """
+        items = self._parse_items(final=True) if self._state == "array" else []
+        if self._state == "array":
+            raise json.JSONDecodeError("JSON数组不完整", self._buffer, self._pos)
+        return items
+
+    def _seek(self) -> None:
+        """扫描文本，找到目标数组的起始位置"""
+        buffer = self._buffer
+        pos = self._pos
+        while True:
+            if self._in_string:
+                match = _STRING_PATTERN.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                    break
+                pos = match.end()
+                if match.group() == "\\":
+                    if pos >= len(buffer):
+                        # 转义符在末尾，等待下一段数据
+                        pos -= 1
+                        break
+                    pos += 1
+                    continue
+                self._in_string = False
+                if self._depth == 1:
+                    self._last_string = buffer[self._string_start:pos - 1]
+                continue
+
+            match = _SEEK_PATTERN.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char == "[" and (
+                self._depth == 0 or (self._depth == 1 and self.key is not None and self._current_key == self.key)
+            ):
+                self._state = "array"
+                self.found = True
+                break
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth <= 0:
+                    self._state = "done"
+                    break
+            elif char == ":" and self._depth == 1:
+                self._current_key = self._last_string
+            elif char == "," and self._depth == 1:
+                self._current_key = None
+        self._pos = pos
+
+    def _parse_items(self, final: bool) -> List[Any]:
+        """从缓冲区解析完整的数组元素"""
+        items = []
+        buffer = self._buffer
+        length = len(buffer)
+        pos = self._pos
+        while True:
+            while pos < length and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= length:
+                break
+            if buffer[pos] == "]":
+                self._state = "done"
+                pos += 1
+                break
+            try:
+                value, end = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                # 元素不完整，等待下一段数据
+                break
+            if not final and not isinstance(value, (dict, list, str)) and (
+                end >= length or buffer[end] not in " \t\r\n,]"
+            ):
+                # 数字等标量只有看到后面的分隔符才算完整（如 -1500. 或 2e 可能在分段处被截断），等待下一段数据
+                break
+            items.append(value)
+            pos = end
+        self._pos = pos
+        return items
+
+    def _compact(self) -> None:
+        """丢弃已处理的文本，避免缓冲区无限增长"""
+        cut = self._string_start if (self._state == "seek" and self._in_string) else self._pos
+        if cut > 0:
+            self._buffer = self._buffer[cut:]
+            self._pos -= cut
+            self._string_start -= cut
+
+
+async def read_json_response(response: httpx.Response, logger=None, sampled: bool = True) -> Any:
+    """流式读取响应体并解析为JSON
+
+    响应体只在内存中保存一份：HTML检测只看前HTML_SNIFF_BYTES字节，
+    SSE响应边读边提取data行，普通JSON响应读完后直接从字节解析（utils.codec）。
+    日志中的响应数据截取自原始响应体（截断、脱敏），不会重新序列化。
+
+    Args:
+        response: 尚未读取响应体的httpx响应
+        logger: 记录响应数据和解析错误的logger
+        sampled: 是否记录响应数据（utils.logging_config.payload_sampled的结果）
+
+    Returns:
+        Any: 解析后的JSON数据
+
+    Raises:
+        SAPResponseError: 响应为HTML、SSE中没有数据或不是合法JSON
+    """
+    content_type = response.headers.get("content-type", "")
+    sse = SSEParser() if "text/event-stream" in content_type else None
+    body = bytearray()
+    prefix = bytearray()
+    sniffed = False
+
+    async for chunk in response.aiter_bytes():
+        if not sniffed:
+            prefix += chunk[:HTML_SNIFF_BYTES - len(prefix)]
+            if len(prefix) >= HTML_SNIFF_BYTES:
+                sniffed = True
+                if looks_like_html(bytes(prefix)):
+                    raise SAPAuthRequiredError("SAP接口返回HTML内容，可能需要重新认证")
+        if sse is not None:
+            sse.feed(chunk)
+        else:
+            body += chunk
+
+    # 首先检查内容是否为HTML，无论content-type是什么
+    if (not sniffed and looks_like_html(bytes(prefix))) or "text/html" in content_type:
+        raise SAPAuthRequiredError("SAP接口返回HTML内容，可能需要重新认证")
+
+    # 处理Server-Sent Events (SSE)响应
+    if sse is not None:
+        sse.close()
+        if not sse.saw_data:
+            raise SAPResponseError("无法从SSE响应中提取数据")
+        data = sse.data()
+        try:
+            result = codec.loads(data)
+        except ValueError as e:
+            raise SAPResponseError("SAP接口返回非JSON响应") from e
+        if logger is not None:
+            log_payload(logger, "响应数据", data, sampled)
+        return result
+
+    try:
+        result = codec.loads(body)
+    except ValueError as e:
+        if logger is not None:
+            logger.error(f"JSON解析错误详情: {str(e)}")
+            logger.error("实际响应内容 (前500字节): %s", LazyPayload(body))
+            logger.error(f"响应内容长度: {len(body)} 字节")
+        raise SAPResponseError("SAP接口返回非JSON响应") from e
+    if logger is not None:
+        log_payload(logger, "响应数据", body, sampled)
+    return result
+
+
+async def iter_json_array(response: httpx.Response, key: Optional[str] = "RESULT") -> AsyncIterator[Any]:
+    """流式读取响应体，逐个返回目标数组的元素
+
+    Args:
+        response: 尚未读取响应体的httpx响应
+        key: 顶层对象中目标数组的键名，None表示只处理顶层数组
+
+    Yields:
+        Any: 数组元素
+
+    Raises:
+        SAPResponseError: 响应为HTML或不包含目标数组
+    """
+    content_type = response.headers.get("content-type", "")
+    if "text/html" in content_type:
+        raise SAPAuthRequiredError("SAP接口返回HTML内容，可能需要重新认证")
+
+    # data行直接交给增量解析器，不保存完整响应
+    sse = SSEParser(keep_lines=False) if "text/event-stream" in content_type else None
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="strict")
+    streamer = JSONArrayStreamer(key)
+    prefix = bytearray()
+    sniffed = False
+    first_data_line = True
+
+    async for chunk in response.aiter_bytes():
+        if not sniffed:
+            prefix += chunk[:HTML_SNIFF_BYTES - len(prefix)]
+            if len(prefix) >= HTML_SNIFF_BYTES:
+                sniffed = True
+                if looks_like_html(bytes(prefix)):
+                    raise SAPAuthRequiredError("SAP接口返回HTML内容，可能需要重新认证")
+        if streamer.done:
+            continue
+        if sse is not None:
+            # 多个data行以换行连接后构成完整的JSON文本
+            for line in sse.feed(chunk):
+                text = line if first_data_line else "\n" + line
+                first_data_line = False
+                for item in streamer.feed(text):
+                    yield item
+        else:
+            for item in streamer.feed(decoder.decode(chunk)):
+                yield item
+
+    if not sniffed and looks_like_html(bytes(prefix)):
+        raise SAPAuthRequiredError("SAP接口返回HTML内容，可能需要重新认证")
+
+    if sse is not None:
+        for line in sse.close():
+            text = line if first_data_line else "\n" + line
+            first_data_line = False
+            for item in streamer.feed(text):
+                yield item
+    else:
+        for item in streamer.feed(decoder.decode(b"", final=True)):
+            yield item
+
+    try:
+        for item in streamer.close():
+            yield item
+    except json.JSONDecodeError as e:
+        raise SAPResponseError("SAP接口返回非JSON响应") from e
+    if not streamer.found:
+        raise SAPResponseError(f"响应中没有找到数组: {key}")
@@ -0,0 +1,582 @@
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from utils.logging_config import get_logger
+
+# 获取logger实例
+logger = get_logger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# MCP服务器进程管理配置
+SUPERVISOR_CONFIG = {
+    "script": os.path.join("server", "sap_mcp_server.py"),  # 相对项目根目录
+    "python_candidates": ("python", "python3", "python3.13", "python3.12"),  # 当前解释器没有fastmcp时依次尝试
+    "log_file": os.path.join(PROJECT_ROOT, "log", "mcp_server.log"),
+    "listen_timeout": 30.0,  # 启动后等待端口开始监听的最长时间（秒）
+    "ready_timeout": 300.0,  # 等待/ready返回200（预热完成）的最长时间（秒）
+    "poll_interval": 0.5,  # 轮询端口和/ready的间隔（秒）
+    "stop_timeout": 15.0,  # 优雅停止时等待正在处理的请求完成的时间（秒），超时后强制结束
+    "restart": True,  # 进程意外退出时自动重启
+    "backoff_initial": 1.0,  # 第一次重启前的等待时间（秒）
+    "backoff_max": 60.0,  # 连续重启的最长等待时间（秒）
+    "backoff_reset_after": 60.0,  # 进程运行超过该时间后再退出时，重启等待时间从backoff_initial重新开始
+}
+
+# 服务状态
+STATE_STOPPED = "stopped"
+STATE_STARTING = "starting"
+STATE_RUNNING = "running"
+STATE_STOPPING = "stopping"
+STATE_RESTARTING = "restarting"
+
+
+def connect_host(host: str) -> str:
+    """监听地址为0.0.0.0时使用127.0.0.1连接"""
+    return "127.0.0.1" if host in ("0.0.0.0", "") else host
+
+
+async def port_open(host: str, port: int, timeout: float = 1.0) -> bool:
+    """检查端口是否在监听
+
+    Args:
+        host: 主机地址
+        port: 端口
+        timeout: 连接超时时间（秒）
+
+    Returns:
+        bool: 能建立TCP连接时返回True
+    """
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(connect_host(host), port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+def _proc_listening_inodes(port: int) -> List[str]:
+    """从/proc/net/tcp(6)中查找监听指定端口的socket inode"""
+    inodes = []
+    for path in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(path, "r", encoding="ascii") as f:
+                lines = f.readlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            parts = line.split()
+            # 状态0A为LISTEN，本地地址格式为 十六进制IP:十六进制端口
+            if len(parts) > 9 and parts[3] == "0A" and int(parts[1].rsplit(":", 1)[1], 16) == port:
+                inodes.append(parts[9])
+    return inodes
+
+
+def _proc_parent_pid(pid: int) -> Optional[int]:
+    """从/proc/<pid>/stat读取父进程ID（Linux）"""
+    try:
+        with open(f"/proc/{pid}/stat", "r", encoding="ascii", errors="replace") as f:
+            # 进程名可能包含空格和括号，父进程ID是最后一个")"之后的第二个字段
+            return int(f.read().rsplit(")", 1)[1].split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _proc_find_pid(port: int) -> Optional[int]:
+    """通过/proc查找监听端口的进程ID（Linux）
+
+    多工作进程模式下主进程和工作进程持有同一个监听socket，返回其中的主进程。
+    """
+    targets = {f"socket:[{inode}]" for inode in _proc_listening_inodes(port)}
+    if not targets:
+        return None
+    holders = set()
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        fd_dir = f"/proc/{name}/fd"
+        try:
+            for fd in os.listdir(fd_dir):
+                if os.readlink(os.path.join(fd_dir, fd)) in targets:
+                    holders.add(int(name))
+                    break
+        except OSError:
+            # 进程已退出或没有权限读取其他用户的进程
+            continue
+    roots = [pid for pid in holders if _proc_parent_pid(pid) not in holders]
+    return min(roots or holders) if holders else None
+
+
+def _proc_child_pids(pid: int) -> List[int]:
+    """通过/proc查找子进程ID（Linux）"""
+    return sorted(int(name) for name in os.listdir("/proc") if name.isdigit() and _proc_parent_pid(int(name)) == pid)
+
+
+def _psutil_find_pid(port: int) -> Optional[int]:
+    """通过psutil查找监听端口的进程ID
+
+    多工作进程模式下主进程和工作进程持有同一个监听socket，返回其中的主进程。
+    """
+    try:
+        holders = {
+            connection.pid
+            for connection in psutil.net_connections(kind="tcp")
+            if connection.status == psutil.CONN_LISTEN and connection.laddr and connection.laddr.port == port and connection.pid
+        }
+        roots = [pid for pid in holders if psutil.Process(pid).ppid() not in holders]
+        return min(roots or holders) if holders else None
+    except (psutil.Error, OSError):
+        pass
+    return None
+
+
+async def _netstat_find_pid(port: int) -> Optional[int]:
+    """通过netstat查找监听端口的进程ID（仅用于没有安装psutil的Windows）"""
+    process = await asyncio.create_subprocess_exec(
+        "netstat", "-ano", "-p", "TCP",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL
+    )
+    stdout, _ = await asyncio.wait_for(process.communicate(), timeout=10)
+    for line in stdout.decode(errors="replace").splitlines():
+        # 协议  本地地址  外部地址  状态  PID
+        parts = line.split()
+        if len(parts) >= 5 and parts[3] == "LISTENING" and parts[1].rsplit(":", 1)[-1] == str(port):
+            return int(parts[4])
+    return None
+
+
+async def find_listening_pid(port: int) -> Optional[int]:
+    """查找监听端口的进程ID
+
+    依次使用psutil、/proc（Linux），没有这两者的Windows上使用netstat。
+
+    Args:
+        port: 端口
+
+    Returns:
+        int: 进程ID，找不到或没有权限时返回None
+    """
+    loop = asyncio.get_running_loop()
+    if psutil is not None:
+        return await loop.run_in_executor(None, _psutil_find_pid, port)
+    if os.path.isdir("/proc/net"):
+        return await loop.run_in_executor(None, _proc_find_pid, port)
+    if sys.platform == "win32":
+        try:
+            return await _netstat_find_pid(port)
+        except Exception as e:
+            logger.warning(f"无法通过netstat获取占用端口的进程: {str(e)}")
+    return None
+
+
+def _psutil_child_pids(pid: int) -> List[int]:
+    """通过psutil查找子进程ID"""
+    try:
+        return sorted(child.pid for child in psutil.Process(pid).children())
+    except (psutil.Error, OSError):
+        return []
+
+
+async def find_child_pids(pid: int) -> List[int]:
+    """查找进程的直接子进程（多工作进程模式下的MCP工作进程）
+
+    Args:
+        pid: 父进程ID
+
+    Returns:
+        list: 子进程ID列表，无法查询时返回空列表
+    """
+    loop = asyncio.get_running_loop()
+    if psutil is not None:
+        return await loop.run_in_executor(None, _psutil_child_pids, pid)
+    if os.path.isdir("/proc"):
+        return await loop.run_in_executor(None, _proc_child_pids, pid)
+    return []
+
+
+def process_exited(process: Any) -> bool:
+    """进程是否已退出（兼容asyncio子进程和subprocess.Popen）"""
+    if isinstance(process, subprocess.Popen):
+        return process.poll() is not None
+    return process.returncode is not None
+
+
+async def run_quiet(args: List[str], timeout: float = 5.0) -> int:
+    """运行命令并返回退出码，不读取输出
+
+    事件循环不支持子进程时（如Windows上的SelectorEventLoop）在线程池中运行。
+    """
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+        )
+    except NotImplementedError:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, lambda: subprocess.run(args, capture_output=True, timeout=timeout))
+        return result.returncode
+    try:
+        return await asyncio.wait_for(process.wait(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise
+
+
+class MCPServerSupervisor:
+    """MCP服务器进程管理
+
+    用异步子进程启动MCP服务器，通过轮询端口和/ready接口判断启动和预热是否完成；
+    进程意外退出时按指数退避自动重启；停止时先发送终止信号，等待正在处理的请求完成后再强制结束。
+    不是由本管理器启动的MCP服务器（端口已被占用）通过/proc或psutil查找进程ID。
+    """
+
+    def __init__(self, server_config: Dict[str, Any], config: Optional[Dict[str, Any]] = None, env: Optional[Dict[str, str]] = None):
+        """初始化进程管理器
+
+        Args:
+            server_config: MCP服务器配置（host、port），/api/config会原地修改它
+            config: 覆盖SUPERVISOR_CONFIG中的配置项
+            env: 子进程的额外环境变量
+        """
+        self.server_config = server_config
+        self.config = dict(SUPERVISOR_CONFIG, **(config or {}))
+        self.env = env or {}
+        self.state = STATE_STOPPED
+        self.process: Any = None
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self.restarts = 0
+        self.last_exit_code: Optional[int] = None
+        self.error: Optional[str] = None
+        self.next_restart_at: Optional[float] = None
+        self._python: Optional[str] = None
+        self._backoff = self.config["backoff_initial"]
+        self._stop_requested = False
+        self._log_file = None
+        self._tasks: set = set()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # 在事件循环内创建，避免Python 3.8/3.9中Lock绑定到导入模块时的事件循环
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _spawn_task(self, coroutine) -> asyncio.Task:
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    @property
+    def managed_alive(self) -> bool:
+        """由本管理器启动的进程是否还在运行"""
+        return self.process is not None and not process_exited(self.process)
+
+    async def find_python(self) -> str:
+        """查找安装了fastmcp的Python解释器（结果会被缓存）"""
+        if self._python is not None:
+            return self._python
+        for candidate in (sys.executable,) + tuple(self.config["python_candidates"]):
+            try:
+                if await run_quiet([candidate, "-c", "import fastmcp"]) == 0:
+                    if candidate != sys.executable:
+                        logger.info(f"找到可用的Python解释器: {candidate}")
+                    self._python = candidate
+                    return candidate
+            except Exception:
+                continue
+            if candidate == sys.executable:
+                logger.warning(f"当前Python解释器({sys.executable})没有fastmcp模块，尝试查找其他Python解释器")
+        self._python = sys.executable
+        return self._python
+
+    async def _launch(self) -> None:
+        """启动进程，并在后台等待退出和预热完成（调用方需持有锁）"""
+        args = [await self.find_python(), self.config["script"]]
+        os.makedirs(os.path.dirname(self.config["log_file"]), exist_ok=True)
+        self._log_file = open(self.config["log_file"], "a", encoding="utf-8")
+        env = dict(os.environ, **self.env)
+        kwargs: Dict[str, Any] = {}
+        if sys.platform == "win32":
+            # 新进程组才能收到CTRL_BREAK_EVENT，用于优雅停止
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                *args, stdout=self._log_file, stderr=self._log_file, cwd=PROJECT_ROOT, env=env, **kwargs
+            )
+        except NotImplementedError:
+            # 事件循环不支持子进程时退回subprocess.Popen，退出由线程池中的wait()等待
+            self.process = subprocess.Popen(args, stdout=self._log_file, stderr=self._log_file, cwd=PROJECT_ROOT, env=env, **kwargs)
+        self.state = STATE_STARTING
+        self.started_at = time.time()
+        self.ready_at = None
+        self.error = None
+        self.next_restart_at = None
+        logger.info(f"MCP服务器进程启动，PID: {self.process.pid}，命令: {' '.join(args)}，日志文件: {self.config['log_file']}")
+        self._spawn_task(self._watch(self.process))
+        self._spawn_task(self._wait_ready(self.process))
+
+    async def _wait_process(self, process: Any) -> int:
+        if isinstance(process, subprocess.Popen):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, process.wait)
+        return await process.wait()
+
+    async def _watch(self, process: Any) -> None:
+        """等待进程退出，意外退出时按退避时间重启"""
+        exit_code = await self._wait_process(process)
+        if self._log_file is not None and process is self.process:
+            self._log_file.close()
+            self._log_file = None
+        if process is not self.process or self._stop_requested:
+            return
+        self.last_exit_code = exit_code
+        uptime = time.time() - (self.started_at or time.time())
+        self.error = f"进程意外退出，退出码: {exit_code}\n{await self.read_log_tail()}".rstrip()
+        logger.error(f"MCP服务器进程意外退出，退出码: {exit_code}，运行时间: {uptime:.1f}秒")
+        if not self.config["restart"]:
+            self.state = STATE_STOPPED
+            return
+
+        if uptime >= self.config["backoff_reset_after"]:
+            self._backoff = self.config["backoff_initial"]
+        delay = self._backoff
+        self._backoff = min(self._backoff * 2, self.config["backoff_max"])
+        self.state = STATE_RESTARTING
+        self.next_restart_at = time.time() + delay
+        logger.info(f"{delay:.1f}秒后重启MCP服务器")
+        await asyncio.sleep(delay)
+
+        async with self._get_lock():
+            if self._stop_requested or process is not self.process:
+                return
+            if await port_open(self.server_config["host"], self.server_config["port"]):
+                self.state = STATE_STOPPED
+                self.error = f"端口 {self.server_config['port']} 已被其他进程占用，停止自动重启"
+                logger.error(self.error)
+                return
+            self.restarts += 1
+            await self._launch()
+
+    async def _wait_ready(self, process: Any) -> None:
+        """轮询/ready，预热完成后状态变为running"""
+        url = f"http://{connect_host(self.server_config['host'])}:{self.server_config['port']}/ready"
+        deadline = time.monotonic() + self.config["ready_timeout"]
+        async with httpx.AsyncClient(timeout=2.0) as client:
+            while process is self.process and not process_exited(process):
+                try:
+                    if (await client.get(url)).status_code == 200:
+                        self.state = STATE_RUNNING
+                        self.ready_at = time.time()
+                        logger.info(f"MCP服务器已就绪，启动耗时: {self.ready_at - self.started_at:.1f}秒")
+                        return
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    self.error = f"MCP服务器在{self.config['ready_timeout']}秒内未完成预热"
+                    logger.warning(self.error)
+                    return
+                await asyncio.sleep(self.config["poll_interval"])
+
+    async def _wait_listening(self, process: Any) -> bool:
+        """等待端口开始监听，进程退出或超时返回False"""
+        deadline = time.monotonic() + self.config["listen_timeout"]
+        while time.monotonic() < deadline:
+            if process_exited(process):
+                return False
+            if await port_open(self.server_config["host"], self.server_config["port"], timeout=0.5):
+                return True
+            await asyncio.sleep(self.config["poll_interval"])
+        return False
+
+    async def start(self) -> Dict[str, Any]:
+        """启动MCP服务器
+
+        端口开始监听后立即返回（此时状态为starting），预热在后台继续，完成后状态变为running。
+
+        Returns:
+            dict: 服务状态，启动失败时包含error
+        """
+        async with self._get_lock():
+            if self.managed_alive or self.state == STATE_RESTARTING:
+                return await self.status()
+            self._stop_requested = False
+            self._backoff = self.config["backoff_initial"]
+            await self._launch()
+            process = self.process
+
+        if not await self._wait_listening(process):
+            if not process_exited(process):
+                # 进程还在运行但一直没有监听端口
+                await self.stop()
+                self.error = f"MCP服务器在{self.config['listen_timeout']}秒内没有开始监听端口\n{await self.read_log_tail()}".rstrip()
+            else:
+                # 启动阶段就退出（如端口冲突、缺少依赖），不自动重启
+                self._stop_requested = True
+                self.state = STATE_STOPPED
+                self.last_exit_code = process.returncode
+                self.error = f"启动失败，退出码: {process.returncode}\n{await self.read_log_tail()}".rstrip()
+            logger.error(f"MCP服务器启动失败: {self.error}")
+        return await self.status()
+
+    async def _terminate(self, process: Any) -> None:
+        """发送优雅停止信号：uvicorn收到后停止接受新连接，等待正在处理的请求完成"""
+        if sys.platform == "win32":
+            process.send_signal(signal.CTRL_BREAK_EVENT)
+        else:
+            process.terminate()
+
+    async def stop(self) -> Dict[str, Any]:
+        """停止MCP服务器
+
+        先发送终止信号并等待stop_timeout秒让正在处理的请求完成，超时后强制结束。
+        不是由本管理器启动的进程通过端口查找进程ID后停止。
+
+        Returns:
+            dict: 服务状态，停止失败时包含error
+        """
+        async with self._get_lock():
+            self._stop_requested = True
+            self.next_restart_at = None
+            process = self.process
+            if process is not None and not process_exited(process):
+                await self._stop_managed(process)
+            elif await port_open(self.server_config["host"], self.server_config["port"]):
+                await self._stop_external()
+            else:
+                self.state = STATE_STOPPED
+        return await self.status()
+
+    async def _stop_managed(self, process: Any) -> None:
+        self.state = STATE_STOPPING
+        logger.info(f"停止MCP服务器进程，进程ID: {process.pid}")
+        try:
+            await self._terminate(process)
+            exit_code = await asyncio.wait_for(self._wait_process(process), self.config["stop_timeout"])
+            logger.info(f"MCP服务器进程正常终止，退出码: {exit_code}")
+        except asyncio.TimeoutError:
+            logger.warning(f"MCP服务器进程未能在{self.config['stop_timeout']}秒内正常终止，强制结束")
+            process.kill()
+            exit_code = await self._wait_process(process)
+        except ProcessLookupError:
+            exit_code = process.returncode
+        self.last_exit_code = exit_code
+        self.state = STATE_STOPPED
+        self.error = None
+
+    async def _stop_external(self) -> None:
+        port = self.server_config["port"]
+        pid = await find_listening_pid(port)
+        if pid is None:
+            self.error = f"端口 {port} 正在使用，但无法确定占用端口的进程"
+            logger.error(self.error)
+            return
+        logger.info(f"停止占用端口 {port} 的进程，PID: {pid}")
+        self.state = STATE_STOPPING
+        try:
+            if psutil is not None:
+                psutil.Process(pid).terminate()
+            else:
+                os.kill(pid, signal.SIGTERM)
+        except Exception as e:
+            self.state = STATE_STOPPED
+            self.error = f"停止进程 {pid} 失败: {str(e)}"
+            logger.error(self.error)
+            return
+
+        deadline = time.monotonic() + self.config["stop_timeout"]
+        while time.monotonic() < deadline:
+            if not await port_open(self.server_config["host"], port, timeout=0.5):
+                self.state = STATE_STOPPED
+                self.error = None
+                logger.info(f"成功停止进程 {pid}")
+                return
+            await asyncio.sleep(self.config["poll_interval"])
+
+        logger.warning(f"进程 {pid} 未能在{self.config['stop_timeout']}秒内正常终止，强制结束")
+        try:
+            if psutil is not None:
+                psutil.Process(pid).kill()
+            elif sys.platform != "win32":
+                os.kill(pid, signal.SIGKILL)
+        except Exception as e:
+            self.error = f"强制结束进程 {pid} 失败: {str(e)}"
+        self.state = STATE_STOPPED
+
+    async def status(self) -> Dict[str, Any]:
+        """获取服务状态
+
+        Returns:
+            dict: 状态、地址、进程ID、是否由本管理器启动、重启次数和错误信息，
+                多工作进程模式下workers为工作进程ID列表
+        """
+        result: Dict[str, Any] = {
+            "status": self.state,
+            "host": self.server_config["host"],
+            "port": self.server_config["port"],
+        }
+        if self.managed_alive or self.state in (STATE_RESTARTING, STATE_STOPPING):
+            result.update({
+                "pid": self.process.pid if self.managed_alive else None,
+                "managed": True,
+                "started_at": self.started_at,
+                "ready_at": self.ready_at,
+                "log_file": self.config["log_file"],
+            })
+            if self.state == STATE_RESTARTING and self.next_restart_at:
+                result["restart_in"] = round(max(self.next_restart_at - time.time(), 0.0), 1)
+        elif await port_open(self.server_config["host"], self.server_config["port"]):
+            # 端口被占用，但不是本管理器启动的进程
+            result.update({
+                "status": STATE_RUNNING,
+                "pid": await find_listening_pid(self.server_config["port"]),
+                "managed": False,
+            })
+        else:
+            result["status"] = STATE_STOPPED
+        if result.get("pid") and int(self.server_config.get("workers", 1) or 1) > 1:
+            result["workers"] = await find_child_pids(result["pid"])
+        result["restarts"] = self.restarts
+        if self.last_exit_code is not None:
+            result["last_exit_code"] = self.last_exit_code
+        if self.error:
+            result["error"] = self.error[:500]
+        return result
+
+    async def read_log_tail(self, max_bytes: int = 2000) -> str:
+        """读取MCP服务器日志的最后一部分，用于显示启动失败原因"""
+        def read() -> str:
+            try:
+                with open(self.config["log_file"], "rb") as f:
+                    f.seek(0, os.SEEK_END)
+                    f.seek(max(f.tell() - max_bytes, 0))
+                    return f.read().decode("utf-8", errors="replace")
+            except OSError:
+                return ""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, read)
+
+    async def shutdown(self) -> None:
+        """Web应用关闭时调用：停止自动重启和后台任务，MCP服务器进程继续运行"""
+        self._stop_requested = True
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,185 @@
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Callable, Dict, Optional
+
+from utils.logging_config import get_logger
+
+# 获取logger实例
+logger = get_logger(__name__)
+
+# 多工作进程配置
+WORKER_CONFIG = {
+    "backlog": 2048,  # 监听socket的连接队列长度
+    "graceful_timeout": 10.0,  # 停止时等待工作进程处理完请求的时间（秒），应小于supervisor的stop_timeout
+    "poll_interval": 0.2,  # 主进程检查工作进程状态的间隔（秒）
+    "backoff_initial": 1.0,  # 工作进程异常退出后首次重启的等待时间（秒）
+    "backoff_max": 30.0,  # 重启等待时间的上限（秒）
+    "backoff_reset_after": 60.0,  # 工作进程稳定运行超过该时间后重置等待时间（秒）
+}
+
+# 工作进程编号的环境变量，工作进程内可以通过它判断自己是否运行在多工作进程模式下
+WORKER_ID_ENV = "MCP_WORKER_ID"
+
+# 工作进程入口：参数为共享的监听socket和工作进程编号，返回时工作进程退出
+WorkerTarget = Callable[[socket.socket, int], None]
+
+
+def fork_supported() -> bool:
+    """当前平台是否支持fork（Windows不支持，只能以单进程运行）"""
+    return hasattr(os, "fork")
+
+
+def worker_id() -> Optional[int]:
+    """当前进程的工作进程编号，不是多工作进程模式时返回None"""
+    value = os.environ.get(WORKER_ID_ENV)
+    return int(value) if value is not None else None
+
+
+def bind_socket(host: str, port: int, backlog: Optional[int] = None) -> socket.socket:
+    """创建所有工作进程共享的监听socket
+
+    Args:
+        host: 监听地址
+        port: 监听端口
+        backlog: 连接队列长度，None表示使用WORKER_CONFIG
+
+    Returns:
+        socket.socket: 已绑定并开始监听的socket
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog if backlog is not None else WORKER_CONFIG["backlog"])
+    sock.set_inheritable(True)
+    return sock
+
+
+class PreforkServer:
+    """预先fork的多工作进程服务器
+
+    主进程只负责监听socket和管理工作进程，不处理请求：所有工作进程在同一个
+    监听socket上accept，由内核在进程间分配连接。工作进程异常退出时主进程
+    按指数退避重启它；主进程收到SIGTERM/SIGINT时把信号转发给工作进程，
+    等待graceful_timeout后强制结束仍未退出的进程。
+    """
+
+    def __init__(self, target: WorkerTarget, host: str, port: int, workers: int, config: Optional[Dict] = None):
+        """初始化服务器
+
+        Args:
+            target: 工作进程入口
+            host: 监听地址
+            port: 监听端口
+            workers: 工作进程数量
+            config: 覆盖WORKER_CONFIG中的配置项
+        """
+        self.target = target
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.config = dict(WORKER_CONFIG, **(config or {}))
+        self.sock: Optional[socket.socket] = None
+        # 工作进程编号 -> {"pid", "started_at", "backoff", "restart_at"}
+        self.slots: Dict[int, Dict] = {
+            index: {"pid": None, "started_at": None, "backoff": self.config["backoff_initial"], "restart_at": 0.0}
+            for index in range(workers)
+        }
+        self._stopping = False
+
+    def run(self) -> None:
+        """启动工作进程并管理它们，直到收到停止信号"""
+        self.sock = bind_socket(self.host, self.port, self.config["backlog"])
+        logger.info(f"MCP服务器主进程 {os.getpid()} 监听 {self.host}:{self.port}，启动 {self.workers} 个工作进程")
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        try:
+            while not self._stopping:
+                self._reap()
+                now = time.time()
+                for index, slot in self.slots.items():
+                    if slot["pid"] is None and now >= slot["restart_at"]:
+                        self._spawn(index)
+                time.sleep(self.config["poll_interval"])
+        finally:
+            self._shutdown()
+            self.sock.close()
+
+    def _handle_signal(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _spawn(self, index: int) -> None:
+        """fork一个工作进程"""
+        slot = self.slots[index]
+        pid = os.fork()
+        if pid == 0:
+            # 工作进程：恢复默认信号处理，uvicorn启动时会安装自己的处理函数
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            os.environ[WORKER_ID_ENV] = str(index)
+            code = 0
+            try:
+                self.target(self.sock, index)
+            except BaseException:
+                logger.exception(f"MCP工作进程 {index} 异常退出")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        slot["pid"] = pid
+        slot["started_at"] = time.time()
+        logger.info(f"MCP工作进程 {index} 已启动，PID: {pid}")
+
+    def _reap(self) -> None:
+        """回收已退出的工作进程并安排重启"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            for index, slot in self.slots.items():
+                if slot["pid"] != pid:
+                    continue
+                now = time.time()
+                if now - slot["started_at"] > self.config["backoff_reset_after"]:
+                    slot["backoff"] = self.config["backoff_initial"]
+                slot["pid"] = None
+                slot["restart_at"] = now + slot["backoff"]
+                if not self._stopping:
+                    code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+                    logger.warning(
+                        f"MCP工作进程 {index}（PID: {pid}）退出，退出码: {code}，"
+                        f"{slot['backoff']:.1f}秒后重启"
+                    )
+                slot["backoff"] = min(slot["backoff"] * 2, self.config["backoff_max"])
+
+    def _alive(self) -> Dict[int, int]:
+        return {index: slot["pid"] for index, slot in self.slots.items() if slot["pid"] is not None}
+
+    def _shutdown(self) -> None:
+        """把停止信号转发给工作进程，超时后强制结束"""
+        self._stopping = True
+        for pid in self._alive().values():
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.time() + self.config["graceful_timeout"]
+        while self._alive() and time.time() < deadline:
+            self._reap()
+            time.sleep(self.config["poll_interval"] / 2)
+        for index, pid in self._alive().items():
+            logger.warning(f"MCP工作进程 {index}（PID: {pid}）未在{self.config['graceful_timeout']}秒内退出，强制结束")
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+            self.slots[index]["pid"] = None
+        logger.info("MCP服务器主进程已停止")
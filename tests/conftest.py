@@ -0,0 +1,31 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# utils/config.py是本地配置文件（不在版本库中），没有时使用示例配置
+try:
+    import utils.config  # noqa: F401
+except ImportError:
+    spec = importlib.util.spec_from_file_location("utils.config", os.path.join(ROOT, "utils", "config.example.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    sys.modules["utils.config"] = module
+
+
+def load_module(name: str, path: str):
+    """按文件路径加载不在包中的脚本模块（如mcpDemo下的模拟SAP服务器）"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def mock_sap():
+    """mcpDemo/mockSapServer.py模拟的SAP ICF接口模块，每个测试重新加载，计数器互不影响"""
+    return load_module("mock_sap_server", os.path.join("mcpDemo", "mockSapServer.py"))
@@ -0,0 +1,172 @@
+import asyncio
+
+import httpx
+import pytest
+
+from server.batching import ToolCallBatcher
+from server.http_client import SAPHttpClient
+from utils import codec
+from utils.cache import cache
+
+from test_http_client import SAP_TEST_CONFIG, make_client
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def mock_client(mock_sap):
+    """通过ASGI直接调用模拟SAP服务器的客户端"""
+    client = SAPHttpClient(config=dict(SAP_TEST_CONFIG, base_url="http://mock/sap/zmcp"), retry_policies={})
+    client._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=mock_sap.app))
+    return client
+
+
+def tool_request(tool_id, value):
+    return {"TOOL_ID": tool_id, "PARAM": {"IMPORT": {"MATERIAL": value}}}
+
+
+def test_post_batch_demultiplexes_by_seq(mock_sap):
+    client = mock_client(mock_sap)
+    requests = [tool_request("CHECK_MATNR", str(index)) for index in range(3)]
+    requests.insert(1, tool_request("NOT_EXIST", "x"))
+
+    async def main():
+        try:
+            return await client.post_batch(requests)
+        finally:
+            await client.close()
+
+    results = asyncio.run(main())
+    assert [result["STATUS"] for result in results] == ["S", "E", "S", "S"]
+    assert [result["DATA"]["EXPORT"]["ECHO"]["IMPORT"]["MATERIAL"] for result in results if result["STATUS"] == "S"] == ["0", "1", "2"]
+    assert "NOT_EXIST" in results[1]["MESSAGE"]
+    assert mock_sap.request_counter == {"TOOL_USED_BATCH": 1}
+
+
+def batch_response(items):
+    def handler(request):
+        return httpx.Response(200, json={"RESULT": items})
+    return handler
+
+
+def test_post_batch_out_of_order_missing_and_duplicate_seq():
+    client = make_client(batch_response([
+        {"SEQ": 3, "STATUS": "S", "DATA": {"N": 3}},
+        {"SEQ": 1, "STATUS": "S", "DATA": {"N": 1}},
+        {"SEQ": 4, "STATUS": "S", "DATA": {"N": 4}},
+        {"SEQ": 4, "STATUS": "S", "DATA": {"N": 44}},
+        {"SEQ": 9, "STATUS": "S", "DATA": {"N": 9}},
+        "garbage",
+    ]))
+    results = asyncio.run(client.post_batch([tool_request("T", str(index)) for index in range(4)]))
+    assert results[0] == {"STATUS": "S", "DATA": {"N": 1}}
+    assert results[1]["STATUS"] == "E" and "缺少" in results[1]["MESSAGE"]
+    assert results[2] == {"STATUS": "S", "DATA": {"N": 3}}
+    assert results[3]["STATUS"] == "E" and "重复" in results[3]["MESSAGE"]
+
+
+def test_post_batch_item_error_without_message():
+    client = make_client(batch_response([{"SEQ": 1, "STATUS": "E"}]))
+    assert asyncio.run(client.post_batch([tool_request("T", "1")])) == [
+        {"STATUS": "E", "MESSAGE": "SAP批量调用返回错误"}
+    ]
+
+
+def test_post_batch_sends_envelope_with_seq():
+    bodies = []
+
+    def handler(request):
+        bodies.append((request.url.params["id"], codec.loads(request.content)))
+        return httpx.Response(200, json={"RESULT": []})
+
+    client = make_client(handler)
+    asyncio.run(client.post_batch([tool_request("A", "1"), {"TOOL_ID": "B"}]))
+    assert bodies == [("TOOL_USED_BATCH", {"BATCH": [
+        {"SEQ": 1, "TOOL_ID": "A", "PARAM": {"IMPORT": {"MATERIAL": "1"}}},
+        {"SEQ": 2, "TOOL_ID": "B", "PARAM": {}},
+    ]})]
+
+
+def test_batcher_merges_concurrent_calls(mock_sap):
+    client = mock_client(mock_sap)
+    batcher = ToolCallBatcher(client, window=0.01, max_batch_size=50)
+
+    async def main():
+        try:
+            return await asyncio.gather(
+                *(batcher.submit(tool_request("CHECK_MATNR", str(index))) for index in range(10)),
+                batcher.submit(tool_request("NOT_EXIST", "x")),
+                return_exceptions=True
+            )
+        finally:
+            await client.close()
+
+    results = asyncio.run(main())
+    assert [result["EXPORT"]["ECHO"]["IMPORT"]["MATERIAL"] for result in results[:10]] == [str(index) for index in range(10)]
+    assert isinstance(results[10], Exception) and "NOT_EXIST" in str(results[10])
+    assert batcher.calls_submitted == 11
+    assert batcher.requests_sent == 1
+    assert mock_sap.request_counter == {"TOOL_USED_BATCH": 1}
+
+
+def test_batcher_splits_at_max_batch_size(mock_sap):
+    client = mock_client(mock_sap)
+    batcher = ToolCallBatcher(client, window=0.01, max_batch_size=4)
+
+    async def main():
+        try:
+            return await asyncio.gather(*(batcher.submit(tool_request("CHECK_MATNR", str(index))) for index in range(10)))
+        finally:
+            await client.close()
+
+    results = asyncio.run(main())
+    assert len(results) == 10
+    # 4 + 4 + 2
+    assert mock_sap.request_counter == {"TOOL_USED_BATCH": 3}
+
+
+def test_batcher_single_call_falls_back_to_tool_used(mock_sap):
+    client = mock_client(mock_sap)
+    batcher = ToolCallBatcher(client, window=0.001)
+
+    async def main():
+        try:
+            return await batcher.submit(tool_request("CHECK_MATNR", "1"))
+        finally:
+            await client.close()
+
+    assert asyncio.run(main())["TOOL_ID"] == "CHECK_MATNR"
+    assert mock_sap.request_counter == {"TOOL_USED": 1}
+
+
+def test_batcher_request_failure_fails_every_call():
+    client = make_client(lambda request: httpx.Response(400, text="bad envelope"))
+    batcher = ToolCallBatcher(client, window=0.01)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(tool_request("T", str(index))) for index in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, Exception) and "400" in str(result) for result in results)
+
+
+def test_post_batch_against_benchmark_tools(mock_sap):
+    mock_sap.MOCK_CONFIG.update(tools=2, latency_ms=0.0, rows=3)
+    client = mock_client(mock_sap)
+
+    async def main():
+        try:
+            return await client.post_batch([
+                {"TOOL_ID": "BENCH_TOOL_001", "PARAM": {}},
+                {"TOOL_ID": "BENCH_TOOL_002", "PARAM": {}},
+            ])
+        finally:
+            await client.close()
+
+    results = asyncio.run(main())
+    assert [len(result["DATA"]["EXPORT"]["ET_DATA"]) for result in results if result["STATUS"] == "S"] == [3]
+    assert results[1]["STATUS"] == "E" and "BENCH_TOOL_002" in results[1]["MESSAGE"]
@@ -0,0 +1,234 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+from utils import cache as cache_module
+from utils.cache import LRUCache, SQLiteCacheBackend, cache_decorator, make_cache_key
+
+
+def make_cache(**kwargs):
+    kwargs.setdefault("sweep_interval", 0)
+    return LRUCache(**kwargs)
+
+
+def test_lru_eviction_by_entries():
+    cache = make_cache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_single_flight_coalesces_concurrent_loads():
+    cache = make_cache()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"value": 1}
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert results == [{"value": 1}] * 5
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 4
+    assert cache.get("key") == {"value": 1}
+
+
+def test_stale_while_revalidate_returns_old_value_and_refreshes():
+    cache = make_cache(stale_ttl=60)
+    cache.set("key", "old", ttl=1)
+    cache._cache["key"]["expire_at"] = time.time() - 1
+
+    async def loader():
+        return "new"
+
+    async def main():
+        first = await cache.get_or_load("key", loader)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return first
+
+    assert asyncio.run(main()) == "old"
+    assert cache.stats()["stale_hits"] == 1
+    assert cache.get("key") == "new"
+
+
+def test_failed_load_is_not_cached():
+    cache = make_cache()
+
+    async def loader():
+        raise RuntimeError("boom")
+
+    async def main():
+        try:
+            await cache.get_or_load("key", loader)
+        except RuntimeError:
+            pass
+        return await cache.get_or_load("key", lambda: asyncio.sleep(0, result="ok"))
+
+    assert asyncio.run(main()) == "ok"
+
+
+def test_delete_during_load_drops_loaded_value():
+    cache = make_cache()
+
+    async def main():
+        event = asyncio.Event()
+
+        async def loader():
+            await event.wait()
+            return "stale"
+
+        task = asyncio.ensure_future(cache.get_or_load("key", loader))
+        await asyncio.sleep(0)
+        cache.delete("key")
+        # 删除后的请求不会合并到失效的加载上
+        fresh = await cache.get_or_load("key", lambda: asyncio.sleep(0, result="fresh"))
+        event.set()
+        return await task, fresh
+
+    stale, fresh = asyncio.run(main())
+    assert stale == "stale"
+    assert fresh == "fresh"
+    assert cache.get("key") == "fresh"
+
+
+def test_delete_prefix_and_clear_invalidate_inflight_loads():
+    cache = make_cache()
+
+    async def main():
+        event = asyncio.Event()
+
+        async def loader():
+            await event.wait()
+            return "value"
+
+        tasks = [asyncio.ensure_future(cache.get_or_load(key, loader)) for key in ("a:1", "b:1")]
+        await asyncio.sleep(0)
+        cache.delete_prefix("a:")
+        event.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert cache.get("a:1") is None
+    assert cache.get("b:1") == "value"
+
+
+class LockedBackend(SQLiteCacheBackend):
+    """模拟被其他进程锁住的共享存储"""
+
+    def _connect(self):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_shared_backend_errors_do_not_break_invalidation(tmp_path):
+    cache = make_cache(shared=LockedBackend(str(tmp_path / "cache.db")))
+    cache.set("key:1", "value")
+    assert cache.get("key:1") == "value"
+    cache.delete("key:1")
+    cache.set("key:2", "value")
+    assert cache.delete_prefix("key:") == 1
+    cache.clear()
+    assert cache.size() == 0
+
+
+def test_shared_backend_is_visible_to_other_caches(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+    writer = make_cache(shared=backend)
+    reader = make_cache(shared=SQLiteCacheBackend(str(tmp_path / "cache.db")), shared_sync_interval=0)
+    writer.set("key", {"rows": [1, 2]})
+    assert reader.get("key") == {"rows": [1, 2]}
+    writer.delete("key")
+    assert reader.get("key") is None
+
+
+class ThreadRecordingBackend(SQLiteCacheBackend):
+    """记录共享存储读写所在的线程"""
+
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.current_thread())
+        return super().get(key)
+
+    def set(self, key, value, expire_at, stale_until):
+        self.threads.append(threading.current_thread())
+        return super().set(key, value, expire_at, stale_until)
+
+
+def test_get_or_load_does_shared_io_off_the_event_loop(tmp_path):
+    backend = ThreadRecordingBackend(str(tmp_path / "cache.db"))
+    writer = make_cache(shared=backend)
+    reader = make_cache(shared=SQLiteCacheBackend(str(tmp_path / "cache.db")), shared_sync_interval=0)
+
+    async def load():
+        return {"rows": [1, 2]}
+
+    async def main():
+        assert await writer.get_or_load("key", load) == {"rows": [1, 2]}
+
+        async def never():
+            raise AssertionError("应从共享存储读取")
+
+        return await reader.get_or_load("key", never)
+
+    assert asyncio.run(main()) == {"rows": [1, 2]}
+    assert len(backend.threads) == 2
+    assert threading.main_thread() not in backend.threads
+
+
+def test_cache_key_ignores_dict_key_order():
+    first = {"TOOL_ID": "T", "PARAM": {"IMPORT": {"MATNR": "1", "WERKS": "1000"}, "TABLES": {"IT": [{"A": 1, "B": 2}]}}}
+    second = {"PARAM": {"TABLES": {"IT": [{"B": 2, "A": 1}]}, "IMPORT": {"WERKS": "1000", "MATNR": "1"}}, "TOOL_ID": "T"}
+    assert make_cache_key("post", {"json_data": first}) == make_cache_key("post", {"json_data": second})
+
+
+def test_cache_key_distinguishes_different_params():
+    base = make_cache_key("post", {"json_data": {"TOOL_ID": "T", "MATNR": "1"}})
+    assert make_cache_key("post", {"json_data": {"TOOL_ID": "T", "MATNR": "2"}}) != base
+    assert make_cache_key("post", {"json_data": {"TOOL_ID": "T", "MATNR": 1}}) != base
+    assert make_cache_key("post", {"json_data": {"TOOL_ID": "T", "MATNR": "1", "X": None}}) != base
+    # 列表顺序有意义
+    assert make_cache_key("f", {"rows": [1, 2]}) != make_cache_key("f", {"rows": [2, 1]})
+    assert make_cache_key("other", {"json_data": {"TOOL_ID": "T", "MATNR": "1"}}) != base
+    assert make_cache_key("post", {"json_data": {"TOOL_ID": "T", "MATNR": "1"}}, namespace="QAS") != base
+    assert base.startswith("post:")
+
+
+def test_cache_decorator_shares_entries_for_equivalent_calls(monkeypatch):
+    monkeypatch.setattr(cache_module, "cache", make_cache())
+    calls = []
+
+    class Client:
+        def __init__(self, namespace):
+            self.namespace = namespace
+
+        def cache_namespace(self):
+            return self.namespace
+
+        @cache_decorator(ttl=60)
+        async def fetch(self, json_data, refresh=False):
+            calls.append(json_data)
+            return len(calls)
+
+    async def main():
+        client = Client("PRD")
+        first = await client.fetch({"A": 1, "B": 2})
+        # 位置参数、关键字参数、默认值和键顺序不同，仍是同一次调用
+        assert await client.fetch(json_data={"B": 2, "A": 1}, refresh=False) == first
+        assert await Client("PRD").fetch({"B": 2, "A": 1}) == first
+        assert await client.fetch({"A": 1, "B": 3}) != first
+        assert await Client("QAS").fetch({"A": 1, "B": 2}) != first
+
+    asyncio.run(main())
+    assert len(calls) == 3
@@ -0,0 +1,118 @@
+import pytest
+
+from server import circuit_breaker
+from server.circuit_breaker import (
+    CircuitBreaker, CircuitOpenError, RESULT_FAILURE, RESULT_IGNORED, RESULT_SUCCESS,
+    STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def make_breaker(**config):
+    config = dict({"window_size": 4, "min_calls": 4, "failure_rate_threshold": 0.5, "open_duration": 10.0}, **config)
+    return CircuitBreaker("sys", "TOOL_USED", config)
+
+
+def trip(breaker):
+    for _ in range(4):
+        token = breaker.before_call()
+        breaker.record(RESULT_FAILURE, "down", token)
+    assert breaker.state == STATE_OPEN
+
+
+def test_opens_at_failure_rate_threshold(clock):
+    breaker = make_breaker()
+    for result in (RESULT_SUCCESS, RESULT_SUCCESS, RESULT_FAILURE):
+        breaker.record(result, token=breaker.before_call())
+    assert breaker.state == STATE_CLOSED
+    breaker.record(RESULT_FAILURE, "down", breaker.before_call())
+    assert breaker.state == STATE_OPEN
+    assert breaker.last_failure == "down"
+
+
+def test_ignored_results_do_not_count(clock):
+    breaker = make_breaker()
+    for _ in range(10):
+        breaker.record(RESULT_IGNORED, token=breaker.before_call())
+    assert breaker.stats()["calls"] == 0
+
+
+def test_open_rejects_until_open_duration(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats()["retry_after"] == 10.0
+    clock[0] += 10
+    assert breaker.before_call() is not None
+    assert breaker.state == STATE_HALF_OPEN
+
+
+def test_half_open_allows_single_probe_and_success_closes(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock[0] += 10
+    token = breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(RESULT_SUCCESS, token=token)
+    assert breaker.state == STATE_CLOSED
+    assert breaker.before_call() is None
+
+
+def test_probe_failure_reopens(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock[0] += 10
+    breaker.record(RESULT_FAILURE, "still down", breaker.before_call())
+    assert breaker.state == STATE_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_calls_admitted_before_opening_do_not_decide_half_open(clock):
+    breaker = make_breaker()
+    # 熔断前放行的慢请求
+    stale_tokens = [breaker.before_call() for _ in range(2)]
+    trip(breaker)
+    # 打开期间完成的旧请求不计入
+    breaker.record(RESULT_SUCCESS, token=stale_tokens[0])
+    assert breaker.state == STATE_OPEN
+    clock[0] += 10
+    probe = breaker.before_call()
+    # 半开期间完成的旧请求既不关闭熔断器，也不释放探测许可
+    breaker.record(RESULT_SUCCESS, token=stale_tokens[1])
+    assert breaker.state == STATE_HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(RESULT_FAILURE, "down", probe)
+    assert breaker.state == STATE_OPEN
+
+
+def test_timed_out_probe_is_replaced(clock):
+    breaker = make_breaker(probe_timeout=5.0)
+    trip(breaker)
+    clock[0] += 10
+    old_probe = breaker.before_call()
+    clock[0] += 5
+    new_probe = breaker.before_call()
+    assert new_probe != old_probe
+    breaker.record(RESULT_FAILURE, "late", old_probe)
+    assert breaker.state == STATE_HALF_OPEN
+    breaker.record(RESULT_SUCCESS, token=new_probe)
+    assert breaker.state == STATE_CLOSED
+
+
+def test_cancelled_probe_frees_the_slot(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock[0] += 10
+    breaker.record(RESULT_IGNORED, token=breaker.before_call())
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.before_call() is not None
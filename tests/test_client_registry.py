@@ -0,0 +1,42 @@
+import asyncio
+
+from server.client_registry import SAPClientRegistry
+
+from test_http_client import SAP_TEST_CONFIG
+
+
+def test_client_uses_snapshot_of_config():
+    config = dict(SAP_TEST_CONFIG, concurrency={"max_limit": 8})
+    registry = SAPClientRegistry(config=config, drain_seconds=0)
+    client = registry.current()
+    assert client.config == config and client.config is not config
+
+    # /api/config逐项修改配置时，已创建的客户端看不到修改了一半的配置
+    config["base_url"] = "http://other.test/sap/zmcp"
+    assert client.config["base_url"] == SAP_TEST_CONFIG["base_url"]
+
+    config["concurrency"]["max_limit"] = 2
+    assert client.config["concurrency"]["max_limit"] == 8
+    assert registry.refresh() is True
+    assert registry.current() is not client
+    assert registry.current().config["base_url"] == "http://other.test/sap/zmcp"
+    assert registry.current().config["concurrency"] == {"max_limit": 2}
+    assert registry.refresh() is False
+    asyncio.run(registry.close())
+
+
+def test_current_replaces_client_when_config_changes():
+    config = dict(SAP_TEST_CONFIG)
+    registry = SAPClientRegistry(config=config, drain_seconds=0)
+
+    async def main():
+        first = registry.current()
+        assert registry.current() is first
+        config["timeout"] = 10
+        second = registry.current()
+        assert second is not first and second.config["timeout"] == 10
+        assert first.config["timeout"] == SAP_TEST_CONFIG["timeout"]
+        assert registry.stats()["generation"] == 2
+        await registry.close()
+
+    asyncio.run(main())
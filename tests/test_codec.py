@@ -0,0 +1,63 @@
+import datetime
+import json
+
+import pytest
+
+from utils import codec
+
+BACKENDS = ["orjson", "msgspec", "json"]
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    """依次使用每个已安装的编解码后端"""
+    if request.param != "orjson":
+        monkeypatch.setattr(codec, "orjson", None)
+    if request.param != "msgspec":
+        monkeypatch.setattr(codec, "msgspec", None)
+    elif codec.msgspec is None:
+        pytest.skip("msgspec未安装")
+    if request.param == "orjson" and codec.orjson is None:
+        pytest.skip("orjson未安装")
+    return request.param
+
+
+DOCUMENT = {"TOOL_ID": "CHECK_MATNR", "PARAM": {"IMPORT": {"MAKTX": "物料描述", "N": 1.5, "OK": True, "X": None}}}
+
+
+def test_dumps_is_compact_utf8_and_round_trips(backend):
+    data = codec.dumps(DOCUMENT)
+    assert isinstance(data, bytes)
+    assert "物料描述".encode("utf-8") in data and b" " not in data
+    assert json.loads(data) == DOCUMENT
+    assert codec.loads(data) == codec.loads(data.decode("utf-8")) == DOCUMENT
+    assert codec.loads(bytearray(data)) == codec.loads(memoryview(data)) == DOCUMENT
+    assert codec.dumps_str(DOCUMENT) == data.decode("utf-8")
+
+
+def test_sort_keys_and_default(backend):
+    assert codec.dumps({"b": 1, "a": {"d": 2, "c": 3}}, sort_keys=True) == b'{"a":{"c":3,"d":2},"b":1}'
+    value = {"date": datetime.date(2024, 1, 2), "obj": object()}
+    encoded = codec.loads(codec.dumps(value, default=str))
+    assert encoded["date"] == "2024-01-02" and encoded["obj"].startswith("<object")
+    with pytest.raises(TypeError):
+        codec.dumps({"obj": object()})
+
+
+def test_values_unsupported_by_fast_encoders_fall_back(backend):
+    big = 2 ** 70
+    assert codec.loads(codec.dumps({"N": big})) == {"N": big}
+
+
+def test_invalid_json_raises_value_error(backend):
+    for data in (b"{", b"<html>", "", b'{"A": 1,}'):
+        with pytest.raises(ValueError):
+            codec.loads(data)
+
+
+def test_preview_truncates_without_reencoding():
+    assert codec.preview(b'{"A":1}') == '{"A":1}'
+    assert codec.preview("abcdef", 3) == "abc..."
+    # 截断处的多字节字符被丢弃，不产生乱码
+    assert codec.preview("中文".encode("utf-8"), 4) == "中..."
+    assert codec.preview(bytearray(b"x" * 10), 5) == "xxxxx..."
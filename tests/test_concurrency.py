@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from server import concurrency
+from server.concurrency import (
+    AdaptiveLimiter, ConcurrencyLimitExceeded, OUTCOME_OVERLOAD, OUTCOME_SUCCESS,
+    PRIORITY_DEFAULT, PRIORITY_METADATA, latency_key
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(concurrency.time, "monotonic", lambda: now[0])
+    return now
+
+
+def run_requests(limiter, key, latency, count, clock):
+    """模拟count个依次完成的请求，每个请求间隔latency秒"""
+    for _ in range(count):
+        limiter.inflight += 1
+        clock[0] += latency
+        limiter.release(latency, OUTCOME_SUCCESS, key)
+
+
+def test_fast_metadata_does_not_make_tool_calls_look_overloaded(clock):
+    limiter = AdaptiveLimiter("sys", {"initial_limit": 10})
+    run_requests(limiter, latency_key("TOOL_DETAIL"), 0.005, 21, clock)
+    limit = limiter.limit
+    # 健康的TOOL_USED比元数据请求慢10倍，但不应被视为过载
+    run_requests(limiter, latency_key("TOOL_USED", "T1"), 0.05, 200, clock)
+    assert limiter.limit > limit
+    assert limiter.baseline(latency_key("TOOL_DETAIL")) == pytest.approx(0.005)
+    assert limiter.baseline(latency_key("TOOL_USED", "T1")) == pytest.approx(0.05)
+
+
+def test_latency_spike_reduces_limit_and_baseline_recovers(clock):
+    limiter = AdaptiveLimiter("sys", {"initial_limit": 10, "min_limit": 2})
+    key = latency_key("TOOL_USED", "T1")
+    run_requests(limiter, key, 0.05, 20, clock)
+    limit = limiter.limit
+    run_requests(limiter, key, 0.5, 1, clock)
+    assert limiter.limit == pytest.approx(limit * 0.7)
+
+    # 响应时间持续变长后基线随之上升，并发上限不会一直降到min_limit
+    run_requests(limiter, key, 0.5, 200, clock)
+    assert limiter.baseline(key) > 0.4
+    assert limiter.limit > limiter.config["min_limit"]
+
+
+def test_overload_decrease_is_rate_limited(clock):
+    limiter = AdaptiveLimiter("sys", {"initial_limit": 10, "decrease_interval": 1.0})
+    for _ in range(5):
+        limiter.inflight += 1
+        limiter.release(0.1, OUTCOME_OVERLOAD)
+    assert limiter.limit == pytest.approx(7.0)
+    clock[0] += 1.0
+    limiter.inflight += 1
+    limiter.release(0.1, OUTCOME_OVERLOAD)
+    assert limiter.limit == pytest.approx(4.9)
+
+
+def test_baselines_are_bounded():
+    limiter = AdaptiveLimiter("sys", {"max_baselines": 3})
+    for index in range(5):
+        limiter.inflight += 1
+        limiter.release(0.01, OUTCOME_SUCCESS, latency_key("TOOL_USED", f"T{index}"))
+    assert limiter.stats()["baselines"] == 3
+    assert limiter.baseline("TOOL_USED:T0") is None
+
+
+def test_latency_key():
+    assert latency_key("TOOL_USED", "T1") == "TOOL_USED:T1"
+    assert latency_key("TOOL_DETAIL", "T1") == "TOOL_DETAIL"
+    assert latency_key(None) == ""
+
+
+def test_metadata_reserve_and_priority_queue():
+    limiter = AdaptiveLimiter("sys", {"initial_limit": 2, "metadata_reserve": 1, "queue_timeout": 1.0})
+    order = []
+
+    async def main():
+        await limiter.acquire(PRIORITY_DEFAULT)
+        await limiter.acquire(PRIORITY_DEFAULT)
+        # 元数据请求可以使用保留的并发
+        await limiter.acquire(PRIORITY_METADATA)
+
+        async def waiter(priority, name):
+            await limiter.acquire(priority)
+            order.append(name)
+
+        tasks = [
+            asyncio.ensure_future(waiter(PRIORITY_DEFAULT, "tool")),
+            asyncio.ensure_future(waiter(PRIORITY_METADATA, "metadata")),
+        ]
+        await asyncio.sleep(0)
+        limiter.release(0.01)
+        await asyncio.sleep(0)
+        limiter.release(0.01)
+        limiter.release(0.01)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["metadata", "tool"]
+
+
+def test_queue_timeout_raises():
+    limiter = AdaptiveLimiter("sys", {"initial_limit": 1, "min_limit": 1, "metadata_reserve": 0})
+
+    async def main():
+        await limiter.acquire()
+        with pytest.raises(ConcurrencyLimitExceeded):
+            await limiter.acquire(timeout=0.01)
+
+    asyncio.run(main())
+    assert limiter.queue_timeouts == 1
+    assert limiter.inflight == 1
@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from server.http_client import SAPAuthRequiredError
+from test_http_client import make_client
+from utils.health import STATUS_DOWN, STATUS_UNKNOWN, STATUS_UP, HealthProber
+
+
+def make_check(results, calls=None):
+    """按顺序返回results中的结果，异常实例会被抛出"""
+    results = list(results)
+
+    async def check():
+        if calls is not None:
+            calls.append(time.monotonic())
+        result = results.pop(0) if len(results) > 1 else results[0]
+        if isinstance(result, BaseException):
+            raise result
+        if result == "hang":
+            await asyncio.sleep(10)
+        return result
+
+    return check
+
+
+def test_not_ready_until_first_probe():
+    prober = HealthProber({"sap": make_check([None])})
+    snapshot = prober.snapshot()
+    assert snapshot["ready"] is False and snapshot["running"] is False
+    assert snapshot["checks"]["sap"]["status"] == STATUS_UNKNOWN
+    assert snapshot["checks"]["sap"]["age_seconds"] is None
+
+
+def test_probe_results_and_critical_checks():
+    prober = HealthProber(
+        {
+            "sap": make_check([{"status_code": 200}]),
+            "mcp_server": make_check([RuntimeError("连接被拒绝")]),
+            "slow": make_check(["hang"]),
+        },
+        critical={"sap"},
+        timeout=0.05
+    )
+    asyncio.run(prober.probe_all())
+    snapshot = prober.snapshot()
+    checks = snapshot["checks"]
+    assert checks["sap"]["status"] == STATUS_UP and checks["sap"]["detail"] == {"status_code": 200}
+    assert checks["mcp_server"] == {**checks["mcp_server"], "status": STATUS_DOWN, "error": "连接被拒绝", "critical": False}
+    assert checks["slow"]["status"] == STATUS_DOWN and "超时" in checks["slow"]["error"]
+    # 非关键检查失败不影响就绪
+    assert snapshot["ready"] is True
+
+
+def test_critical_failure_and_recovery():
+    prober = HealthProber({"sap": make_check([ValueError(), None])})
+    asyncio.run(prober.probe_all())
+    snapshot = prober.snapshot()
+    assert snapshot["ready"] is False and snapshot["checks"]["sap"]["error"] == "ValueError"
+    asyncio.run(prober.probe_all())
+    assert prober.snapshot()["ready"] is True
+
+
+def test_stale_results_are_not_ready(monkeypatch):
+    prober = HealthProber({"sap": make_check([None])}, stale_after=30)
+    asyncio.run(prober.probe_all())
+    assert prober.snapshot()["ready"] is True
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 31)
+    snapshot = prober.snapshot()
+    assert snapshot["ready"] is False
+    assert snapshot["checks"]["sap"]["stale"] is True and snapshot["checks"]["sap"]["age_seconds"] >= 30
+
+
+def test_background_task_probes_on_interval():
+    calls = []
+    prober = HealthProber({"sap": make_check([None], calls)}, interval=0.01)
+
+    async def scenario():
+        await prober.start()
+        await prober.start()
+        await asyncio.sleep(0.1)
+        running = prober.snapshot()["running"]
+        await prober.stop()
+        count = len(calls)
+        await asyncio.sleep(0.05)
+        return running, count
+
+    running, count = asyncio.run(scenario())
+    assert running is True
+    assert count >= 3
+    # 停止后不再探测
+    assert len(calls) == count
+    assert prober.snapshot()["running"] is False
+
+
+def test_ping_sends_single_get_without_retry():
+    calls = []
+
+    def handler(request):
+        calls.append((request.method, request.url.params["id"]))
+        if len(calls) == 1:
+            return httpx.Response(200, text="anything")
+        if len(calls) == 2:
+            return httpx.Response(200, text="<html><body>Logon</body></html>")
+        return httpx.Response(503)
+
+    client = make_client(handler)
+
+    async def scenario():
+        result = await client.ping()
+        with pytest.raises(SAPAuthRequiredError):
+            await client.ping()
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.ping()
+        await client.close()
+        return result
+
+    result = asyncio.run(scenario())
+    assert result["status_code"] == 200 and result["latency_ms"] >= 0
+    assert calls == [("GET", "PING")] * 3
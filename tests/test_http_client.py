@@ -0,0 +1,121 @@
+import asyncio
+
+import httpx
+import pytest
+
+from server.http_client import SAPHttpClient
+from server.retry import RetryPolicy
+from utils import codec
+from utils.cache import cache
+
+SAP_TEST_CONFIG = {
+    "base_url": "http://sap.test/sap/zmcp",
+    "client_id": "100",
+    "sap-user": "USER",
+    "sap-password": "PASSWORD",
+    "timeout": 5,
+}
+
+
+def make_client(handler, **kwargs):
+    """创建使用模拟传输层的客户端，handler接收httpx.Request并返回httpx.Response"""
+    kwargs.setdefault("retry_policies", {})
+    client = SAPHttpClient(config=dict(SAP_TEST_CONFIG), **kwargs)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def test_post_caches_tool_detail_and_refresh_bypasses_cache():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.params["id"])
+        return httpx.Response(200, json={"TOOL_ID": "T1", "PARAM": {"VERSION": len(calls)}})
+
+    client = make_client(handler)
+    params = {"id": "TOOL_DETAIL"}
+
+    async def main():
+        first = await client.post(params=params, json={"TOOL_ID": "T1"})
+        cached = await client.post(params=params, json={"TOOL_ID": "T1"})
+        refreshed = await client.post(params=params, json={"TOOL_ID": "T1"}, refresh=True)
+        after = await client.post(params=params, json={"TOOL_ID": "T1"})
+        await client.close()
+        return first, cached, refreshed, after
+
+    first, cached, refreshed, after = asyncio.run(main())
+    assert len(calls) == 2
+    assert first == cached
+    assert refreshed["PARAM"] == {"VERSION": 2}
+    # 刷新的结果写回缓存
+    assert after == refreshed
+
+
+def test_invalidate_post_cache_by_tool():
+    calls = []
+
+    def handler(request):
+        body = codec.loads(request.content)
+        calls.append(body["TOOL_ID"])
+        return httpx.Response(200, json={"TOOL_ID": body["TOOL_ID"], "PARAM": {}})
+
+    client = make_client(handler)
+    params = {"id": "TOOL_DETAIL"}
+
+    async def main():
+        for tool_id in ("T1", "T2"):
+            await client.post(params=params, json={"TOOL_ID": tool_id})
+        assert client.invalidate_post_cache("TOOL_DETAIL", "T1") == 1
+        for tool_id in ("T1", "T2"):
+            await client.post(params=params, json={"TOOL_ID": tool_id})
+        await client.close()
+
+    asyncio.run(main())
+    assert calls == ["T1", "T2", "T1"]
+
+
+def test_tool_used_is_not_cached():
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        return httpx.Response(200, json={"RESULT": len(calls)})
+
+    client = make_client(handler)
+
+    async def main():
+        for _ in range(2):
+            await client.post(params={"id": "TOOL_USED"}, json={"TOOL_ID": "T1", "PARAM": {}})
+        await client.close()
+
+    asyncio.run(main())
+    assert len(calls) == 2
+
+
+def test_retry_honors_retry_after_and_gives_up_on_4xx(monkeypatch):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr("server.http_client.asyncio.sleep", fake_sleep)
+    responses = [
+        httpx.Response(503, headers={"Retry-After": "3"}, text="busy"),
+        httpx.Response(200, json={"OK": True}),
+    ]
+    policy = {"PING_TEST": RetryPolicy(max_retries=2, base_delay=0.1, jitter=0)}
+    client = make_client(lambda request: responses.pop(0), retry_policies=policy)
+    assert asyncio.run(client._send_with_retry("GET", params={"id": "PING_TEST"})) == {"OK": True}
+    assert delays == [3.0]
+
+    client = make_client(lambda request: httpx.Response(404, text="not found"), retry_policies=policy)
+    with pytest.raises(Exception, match="404"):
+        asyncio.run(client._send_with_retry("GET", params={"id": "PING_TEST"}))
+    assert delays == [3.0]
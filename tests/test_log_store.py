@@ -0,0 +1,140 @@
+import logging
+import os
+
+import pytest
+
+from utils import codec
+from utils.log_store import LOG_INDEX_CONFIG, LogStore, index_path
+from utils.logging_config import BatchRotatingFileHandler, IndexedJSONLinesHandler
+
+
+def make_record(message, level=logging.INFO, created=None, tool_id=None):
+    record = logging.LogRecord("test", level, __file__, 0, message, (), None)
+    if created is not None:
+        record.created = created
+    if tool_id is not None:
+        record.tool_id = tool_id
+    return record
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    monkeypatch.setitem(LOG_INDEX_CONFIG, "block_records", 10)
+
+
+def write_entries(path, count, **kwargs):
+    handler = IndexedJSONLinesHandler(str(path), encoding="utf-8", **kwargs)
+    for index in range(count):
+        level = logging.ERROR if index % 25 == 0 else logging.INFO
+        tool_id = "T_SPECIAL" if index == 42 else f"T{index % 3}"
+        handler.emit(make_record(f"message {index}", level, created=1000.0 + index, tool_id=tool_id))
+    handler.close()
+
+
+def test_query_newest_first_with_pagination(tmp_path, small_blocks):
+    path = tmp_path / "app.jsonl"
+    write_entries(path, 100)
+    store = LogStore(str(path))
+    first = store.query(limit=30)
+    assert [entry["message"] for entry in first["entries"][:2]] == ["message 99", "message 98"]
+    second = store.query(limit=100, cursor=first["next_cursor"])
+    messages = [entry["message"] for entry in first["entries"] + second["entries"]]
+    assert messages == [f"message {index}" for index in range(99, -1, -1)]
+    assert second["next_cursor"] is None
+
+
+def test_query_filters_use_index_to_skip_blocks(tmp_path, small_blocks):
+    path = tmp_path / "app.jsonl"
+    write_entries(path, 100)
+    store = LogStore(str(path))
+    size = os.path.getsize(path)
+
+    errors = store.query(levels=["error"])
+    assert [entry["ts"] for entry in errors["entries"]] == [1075.0, 1050.0, 1025.0, 1000.0]
+    assert errors["scanned_bytes"] < size
+
+    tool = store.query(tool="T_SPECIAL")
+    assert [entry["message"] for entry in tool["entries"]] == ["message 42"]
+    assert tool["scanned_bytes"] < size / 5
+
+    window = store.query(start=1010.0, end=1019.0)
+    assert len(window["entries"]) == 10
+    assert window["scanned_bytes"] < size / 2
+
+    assert [entry["message"] for entry in store.query(text="message 7", limit=3)["entries"]] == [
+        "message 79", "message 78", "message 77"
+    ]
+
+
+def test_unindexed_ranges_are_scanned(tmp_path, small_blocks):
+    path = tmp_path / "app.jsonl"
+    write_entries(path, 20)
+    # 其他进程写入、没有索引的日志
+    with open(path, "ab") as f:
+        f.write(codec.dumps({"ts": 2000.0, "level": "ERROR", "message": "foreign", "tool_id": "T_FOREIGN"}) + b"\n")
+    store = LogStore(str(path))
+    assert [entry["message"] for entry in store.query(tool="T_FOREIGN")["entries"]] == ["foreign"]
+    assert store.query(levels=["ERROR"])["entries"][0]["message"] == "foreign"
+
+
+def test_rotation_moves_index_with_log(tmp_path, small_blocks):
+    path = tmp_path / "app.jsonl"
+    write_entries(path, 200, maxBytes=8 * 1024, backupCount=10)
+    assert os.path.exists(index_path(f"{path}.1"))
+    store = LogStore(str(path), backup_count=10)
+    entries = store.query(limit=1000)["entries"]
+    assert [entry["message"] for entry in entries] == [f"message {index}" for index in range(199, -1, -1)]
+    assert [entry["message"] for entry in store.query(tool="T_SPECIAL")["entries"]] == ["message 42"]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="需要fork")
+def test_processes_sharing_a_file_do_not_lose_lines_on_rotation(tmp_path, small_blocks):
+    path = tmp_path / "app.jsonl"
+    text_path = tmp_path / "app.log"
+    processes, batches, per_batch = 4, 25, 8
+    # 父进程先打开文件，子进程继承打开的handler（与fork出的工作进程相同）
+    handler = IndexedJSONLinesHandler(str(path), maxBytes=16 * 1024, backupCount=50, encoding="utf-8")
+    text_handler = BatchRotatingFileHandler(str(text_path), maxBytes=8 * 1024, backupCount=50, encoding="utf-8")
+    text_handler.setFormatter(logging.Formatter("%(message)s"))
+    handler.emit(make_record("parent"))
+    pids = []
+    for worker in range(processes):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                for batch in range(batches):
+                    records = [
+                        make_record(f"w{worker} b{batch} r{index}", tool_id=f"W{worker}")
+                        for index in range(per_batch)
+                    ]
+                    handler.emit_batch(records)
+                    text_handler.emit_batch(records)
+                handler.close()
+                text_handler.close()
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        pids.append(pid)
+    for pid in pids:
+        assert os.waitpid(pid, 0)[1] == 0
+    handler.close()
+    text_handler.close()
+
+    expected = {f"w{worker} b{batch} r{index}" for worker in range(processes)
+                for batch in range(batches) for index in range(per_batch)}
+    store = LogStore(str(path), backup_count=50)
+    messages = [entry["message"] for entry in store.query(limit=100000)["entries"]]
+    assert len(messages) == len(expected) + 1
+    assert set(messages) == expected | {"parent"}
+    # 索引块的范围与所在文件一致，按工具过滤不会漏掉日志
+    for worker in range(processes):
+        assert len(store.query(tool=f"W{worker}", limit=100000)["entries"]) == batches * per_batch
+
+    lines = []
+    for name in os.listdir(tmp_path):
+        if name.startswith("app.log") and not name.endswith(".lock"):
+            with open(tmp_path / name, encoding="utf-8") as f:
+                lines.extend(f.read().splitlines())
+    assert sorted(lines) == sorted(expected)
@@ -0,0 +1,137 @@
+import asyncio
+import os
+
+import pytest
+
+from utils.log_tail import (
+    LOG_TAIL_CONFIG, FileFollower, LogSubscription, LogTailHub, parse_json_line, parse_text_line
+)
+
+
+def append(path, text):
+    with open(path, "ab") as f:
+        f.write(text.encode("utf-8"))
+
+
+def test_follower_starts_at_end_and_buffers_partial_lines(tmp_path):
+    path = tmp_path / "app.log"
+    append(path, "old line\n")
+    follower = FileFollower(str(path))
+    assert follower.read_new_lines() == []
+
+    append(path, "first\nsec")
+    assert follower.read_new_lines() == ["first"]
+    append(path, "ond\r\n\n")
+    assert follower.read_new_lines() == ["second"]
+    assert follower.read_new_lines() == []
+
+
+def test_follower_reads_rotated_remainder_then_new_file(tmp_path):
+    path = tmp_path / "app.log"
+    append(path, "old\n")
+    follower = FileFollower(str(path))
+    follower.read_new_lines()
+
+    append(path, "before rotation\n")
+    os.replace(path, str(path) + ".1")
+    append(path, "after rotation\n")
+    assert follower.read_new_lines() == ["before rotation", "after rotation"]
+
+
+def test_follower_restarts_after_truncation(tmp_path):
+    path = tmp_path / "app.log"
+    append(path, "a long line that will be cleared\n")
+    follower = FileFollower(str(path))
+    follower.read_new_lines()
+
+    with open(path, "wb"):
+        pass
+    append(path, "new\n")
+    assert follower.read_new_lines() == ["new"]
+
+
+def test_missing_file_returns_no_lines(tmp_path):
+    assert FileFollower(str(tmp_path / "missing.log")).read_new_lines() == []
+
+
+def test_parse_lines():
+    text = parse_text_line("mcp", "2024-01-01 08:00:00,000 - sap_api - ERROR - 请求失败")
+    assert text["level"] == "ERROR" and text["tool_id"] is None
+    assert parse_text_line("mcp", "Traceback (most recent call last):")["level"] is None
+
+    entry = parse_json_line("sap", '{"ts": 1000.0, "level": "INFO", "tool_id": "CHECK_MATNR", "message": "ok"}')
+    assert entry["source"] == "sap" and entry["level"] == "INFO" and entry["tool_id"] == "CHECK_MATNR"
+    assert "ok" in entry["line"]
+    assert parse_json_line("sap", "not json") is None
+    assert parse_json_line("sap", "[1, 2]") is None
+
+
+def test_subscription_filters():
+    async def scenario():
+        by_tool = LogSubscription({"sap"}, {"ERROR"}, "CHECK_MATNR")
+        assert by_tool.matches({"source": "sap", "level": "ERROR", "tool_id": "CHECK_MATNR", "line": ""})
+        assert not by_tool.matches({"source": "sap", "level": "ERROR", "tool_id": "OTHER", "line": "CHECK_MATNR"})
+        assert not by_tool.matches({"source": "mcp", "level": "ERROR", "tool_id": "CHECK_MATNR", "line": ""})
+        assert not by_tool.matches({"source": "sap", "level": "INFO", "tool_id": "CHECK_MATNR", "line": ""})
+        # 文本日志没有tool_id，按行内容匹配
+        by_text = LogSubscription(None, None, "CHECK_MATNR")
+        assert by_text.matches({"source": "mcp", "level": None, "tool_id": None, "line": "调用 CHECK_MATNR"})
+        assert not by_text.matches({"source": "mcp", "level": None, "tool_id": None, "line": "调用 OTHER"})
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_drops_oldest(monkeypatch):
+    monkeypatch.setitem(LOG_TAIL_CONFIG, "subscriber_queue", 3)
+
+    async def scenario():
+        subscription = LogSubscription(None, None, None)
+        for index in range(5):
+            subscription.put({"line": str(index)})
+        assert subscription.dropped == 2
+        assert [entry["line"] for entry in subscription.drain(10)] == ["2", "3", "4"]
+        assert subscription.drain(10) == []
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def fast_poll(monkeypatch):
+    monkeypatch.setitem(LOG_TAIL_CONFIG, "poll_interval", 0.01)
+
+
+def test_hub_dispatches_new_lines_by_filter(tmp_path, fast_poll):
+    sap_path, mcp_path = tmp_path / "sap_api.jsonl", tmp_path / "mcp_server.log"
+    append(sap_path, '{"level": "INFO", "message": "history"}\n')
+    append(mcp_path, "")
+    hub = LogTailHub({"sap": (str(sap_path), parse_json_line), "mcp": (str(mcp_path), parse_text_line)})
+
+    async def wait_for(subscription, count):
+        items = []
+        for _ in range(200):
+            items += subscription.drain(100)
+            if len(items) >= count:
+                return items
+            await asyncio.sleep(0.01)
+        return items
+
+    async def scenario():
+        everything = hub.subscribe()
+        errors = hub.subscribe(levels={"ERROR"})
+        mcp_only = hub.subscribe(sources={"mcp"})
+        append(sap_path, '{"level": "INFO", "message": "sap info"}\n{"level": "ERROR", "message": "sap error"}\n')
+        append(mcp_path, "2024-01-01 08:00:00,000 - server - ERROR - mcp error\n")
+
+        assert len(await wait_for(everything, 3)) == 3
+        assert [entry["line"][-9:] for entry in await wait_for(errors, 2)] == ["sap error", "mcp error"]
+        assert [entry["source"] for entry in await wait_for(mcp_only, 1)] == ["mcp"]
+        assert hub.stats() == {"subscribers": 3, "dropped": 0}
+
+        task = hub._task
+        for subscription in (everything, errors, mcp_only):
+            hub.unsubscribe(subscription)
+        await asyncio.sleep(0)
+        assert task.cancelled() or task.done()
+        assert hub.stats()["subscribers"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,177 @@
+import logging
+import os
+import queue
+
+import pytest
+
+from utils import logging_config
+from utils.logging_config import (
+    PAYLOAD_LOG_CONFIG, REDACTED, BatchingQueueListener, BatchRotatingFileHandler, BoundedQueueHandler,
+    LazyPayload, log_payload, payload_sampled, redact
+)
+
+
+def make_record(message, level=logging.INFO):
+    return logging.LogRecord("test", level, __file__, 0, message, (), None)
+
+
+class CollectingHandler(logging.Handler):
+    """收集日志记录的handler，记录每次批量写入的条数"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.batches = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def emit_batch(self, records):
+        self.batches.append(len(records))
+        self.records.extend(records)
+
+
+# 请求热路径日志（user-014）
+
+def test_redact_only_sensitive_keys():
+    data = {"sap-user": "U", "sap-password": "secret", "Authorization": "Basic x", "id": "TOOL_LIST"}
+    assert redact(data) == {"sap-user": "U", "sap-password": REDACTED, "Authorization": REDACTED, "id": "TOOL_LIST"}
+    assert data["sap-password"] == "secret"
+    assert redact(["not", "a", "dict"]) == ["not", "a", "dict"]
+
+
+def test_lazy_payload_truncates_and_redacts_objects():
+    payload = LazyPayload({"TOOL_ID": "T", "password": "secret", "ROWS": list(range(100000))}, max_chars=80, max_items=5)
+    text = str(payload)
+    assert text.startswith('{"TOOL_ID": "T", "password": "***", "ROWS": [0, 1, 2, 3, 4, ...(+99995)]')
+    assert "secret" not in text
+    assert str(LazyPayload({"A": "x" * 1000}, max_chars=20)) == '{"A": "' + "x" * 13 + "..."
+
+
+def test_lazy_payload_previews_encoded_json_without_parsing():
+    data = b'{"sap-password":"secret","DATA":"' + b"x" * 1000 + b'"}'
+    text = str(LazyPayload(data, max_chars=40))
+    assert text.startswith('{"sap-password":"***","DATA":"') and text.endswith("...")
+    assert str(LazyPayload('{"TOKEN": "abc"}')) == '{"TOKEN": "***"}'
+
+
+class Exploding:
+    def __repr__(self):
+        raise AssertionError("日志级别未启用时不应格式化数据")
+
+
+def test_payload_not_formatted_when_level_disabled(monkeypatch):
+    logger = logging.getLogger("test.payload.disabled")
+    handler = CollectingHandler()
+    logger.addHandler(handler)
+    logger.propagate = False
+    monkeypatch.setitem(PAYLOAD_LOG_CONFIG, "level", logging.DEBUG)
+    try:
+        logger.setLevel(logging.INFO)
+        sampled = payload_sampled(logger)
+        log_payload(logger, "请求数据", {"obj": Exploding()}, sampled)
+        assert sampled is False and handler.records == []
+
+        logger.setLevel(logging.DEBUG)
+        log_payload(logger, "请求数据", {"A": 1}, payload_sampled(logger))
+        assert handler.records[0].getMessage() == '请求数据: {"A": 1}'
+    finally:
+        logger.removeHandler(handler)
+
+
+def test_payload_sampling_rate(monkeypatch):
+    logger = logging.getLogger("test.payload.sampling")
+    logger.setLevel(logging.INFO)
+    monkeypatch.setitem(PAYLOAD_LOG_CONFIG, "sample_rate", 0.0)
+    assert not any(payload_sampled(logger) for _ in range(100))
+    monkeypatch.setitem(PAYLOAD_LOG_CONFIG, "sample_rate", 0.5)
+    assert 10 < sum(payload_sampled(logger) for _ in range(400)) < 390
+
+
+# 异步日志管道（user-015）
+
+def test_drop_policy_drops_info_and_waits_briefly_for_warnings():
+    log_queue = queue.Queue(maxsize=1)
+    handler = BoundedQueueHandler(log_queue, policy="drop", block_timeout=0.01)
+    handler.handle(make_record("first"))
+    handler.handle(make_record("dropped info"))
+    handler.handle(make_record("dropped warning", logging.WARNING))
+    assert handler.dropped == 2
+    assert log_queue.get_nowait().getMessage() == "first"
+
+    handler.handle(make_record("kept warning", logging.ERROR))
+    assert handler.dropped == 2 and log_queue.qsize() == 1
+
+
+def test_exception_text_is_formatted_in_calling_thread():
+    log_queue = queue.Queue()
+    handler = BoundedQueueHandler(log_queue)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger = logging.getLogger("test.exception")
+        record = logger.makeRecord("test", logging.ERROR, __file__, 0, "failed", (), __import__("sys").exc_info())
+    handler.handle(record)
+    queued = log_queue.get_nowait()
+    assert queued.exc_info is None and "ValueError: boom" in queued.exc_text
+
+
+def test_listener_batches_and_reports_dropped_records():
+    log_queue = queue.Queue(maxsize=2)
+    queue_handler = BoundedQueueHandler(log_queue, block_timeout=0)
+    target = CollectingHandler()
+    listener = BatchingQueueListener(log_queue, [target], batch_size=10, queue_handler=queue_handler)
+    for index in range(5):
+        queue_handler.handle(make_record(f"message {index}"))
+    listener.start()
+    listener.stop()
+
+    messages = [record.getMessage() for record in target.records]
+    assert messages == ["message 0", "message 1", "日志队列已满，已丢弃 3 条日志"]
+    assert target.batches == [3]
+    assert listener.stats()["dropped"] == 3
+
+
+def test_listener_respects_handler_levels():
+    log_queue = queue.Queue()
+    info, errors = CollectingHandler(), CollectingHandler()
+    errors.setLevel(logging.ERROR)
+    listener = BatchingQueueListener(log_queue, [info, errors])
+    listener.start()
+    log_queue.put(make_record("info"))
+    log_queue.put(make_record("error", logging.ERROR))
+    listener.stop()
+    assert [record.getMessage() for record in info.records] == ["info", "error"]
+    assert [record.getMessage() for record in errors.records] == ["error"]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="需要fork")
+def test_pipeline_restarts_in_forked_child(tmp_path, monkeypatch):
+    path = tmp_path / "app.log"
+    file_handler = BatchRotatingFileHandler(str(path), encoding="utf-8")
+    file_handler.setFormatter(logging.Formatter("%(message)s"))
+    log_queue = queue.Queue()
+    queue_handler = BoundedQueueHandler(log_queue)
+    listener = BatchingQueueListener(log_queue, [file_handler], queue_handler=queue_handler)
+    listener.start()
+    monkeypatch.setattr(logging_config, "_listener", listener)
+    queue_handler.handle(make_record("parent before fork"))
+
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            # 子进程有新的队列和后台线程，日志不会留在父进程的队列中
+            if listener.queue is not log_queue and listener._thread.is_alive():
+                queue_handler.handle(make_record("child"))
+                listener.stop()
+                code = 0
+        finally:
+            os._exit(code)
+    assert os.waitpid(pid, 0)[1] == 0
+    queue_handler.handle(make_record("parent after fork"))
+    listener.stop()
+    file_handler.close()
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert sorted(lines) == ["child", "parent after fork", "parent before fork"]
@@ -0,0 +1,123 @@
+import asyncio
+
+import httpx
+import pytest
+from fastmcp import Client
+
+from server import http_client, sap_mcp_server
+from utils.metrics import CONTENT_TYPE, OTHER_LABEL, MetricsRegistry
+
+from test_http_client import make_client
+from test_sap_mcp_server import get
+
+
+def sample_values(metric, name=None, **labels):
+    """读取指标中标签匹配的样本值"""
+    return [
+        value for sample_name, sample_labels, value in metric.samples()
+        if (name is None or sample_name == name) and all(sample_labels.get(key) == expected for key, expected in labels.items())
+    ]
+
+
+def test_render_counter_gauge_and_histogram():
+    registry = MetricsRegistry()
+    registry.counter("calls_total", "调用次数", ("tool",)).inc(2, tool='A"B')
+    gauge = registry.gauge("in_flight", "进行中")
+    with gauge.track_inprogress():
+        gauge.inc()
+    histogram = registry.histogram("duration_seconds", "耗时", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value)
+
+    assert registry.render().splitlines() == [
+        "# HELP calls_total 调用次数",
+        "# TYPE calls_total counter",
+        'calls_total{tool="A\\"B"} 2',
+        "# HELP in_flight 进行中",
+        "# TYPE in_flight gauge",
+        "in_flight 1",
+        "# HELP duration_seconds 耗时",
+        "# TYPE duration_seconds histogram",
+        'duration_seconds_bucket{le="0.1"} 1',
+        'duration_seconds_bucket{le="1"} 3',
+        'duration_seconds_bucket{le="+Inf"} 4',
+        "duration_seconds_count 4",
+        "duration_seconds_sum 4.25",
+    ]
+
+
+def test_series_limit_and_label_validation():
+    registry = MetricsRegistry()
+    counter = registry.counter("calls_total", "调用次数", ("tool",))
+    counter.max_series = 2
+    for tool in ("A", "B", "C", "D"):
+        counter.inc(tool=tool)
+    counter.inc(tool="A")
+    assert {labels["tool"]: value for _, labels, value in counter.samples()} == {"A": 2, "B": 1, OTHER_LABEL: 2}
+
+    with pytest.raises(ValueError):
+        counter.inc(other="A")
+    with pytest.raises(ValueError):
+        counter.inc(-1, tool="A")
+    # 同名指标返回同一个对象，类型或标签不同时报错
+    assert registry.counter("calls_total", "调用次数", ("tool",)) is counter
+    with pytest.raises(ValueError):
+        registry.gauge("calls_total", "调用次数", ("tool",))
+
+
+def test_failing_collector_does_not_break_render():
+    registry = MetricsRegistry()
+
+    def broken():
+        raise RuntimeError("boom")
+
+    registry.register_collector(broken)
+    registry.register_collector(lambda: [("pool_size", "gauge", "连接池大小", [({"system": "PRD"}, 3)])])
+    registry.register_collector(broken)
+    assert registry.render().splitlines() == [
+        "# 采集失败: boom",
+        "# HELP pool_size 连接池大小",
+        "# TYPE pool_size gauge",
+        'pool_size{system="PRD"} 3',
+    ]
+
+
+def test_sap_calls_are_measured():
+    def handler(request):
+        if request.url.params["id"] == "TOOL_LIST":
+            return httpx.Response(200, json=[])
+        return httpx.Response(400, text="bad request")
+
+    client = make_client(handler)
+    labels = {"function_id": "TOOL_LIST", "tool_id": "", "outcome": "success"}
+    before = sum(sample_values(http_client.SAP_REQUEST_SECONDS, "sap_request_duration_seconds_count", **labels))
+    errors_before = sum(sample_values(http_client.SAP_ERRORS, function_id="TOOL_DETAIL"))
+
+    async def main():
+        await client.get(params={"id": "TOOL_LIST"})
+        with pytest.raises(Exception):
+            await client.post(params={"id": "TOOL_DETAIL"}, json={"TOOL_ID": "T"}, refresh=True)
+        await client.close()
+
+    asyncio.run(main())
+    assert sum(sample_values(http_client.SAP_REQUEST_SECONDS, "sap_request_duration_seconds_count", **labels)) == before + 1
+    assert sum(sample_values(http_client.SAP_ERRORS, function_id="TOOL_DETAIL")) == errors_before + 1
+    assert sum(sample_values(http_client.SAP_IN_FLIGHT, function_id="TOOL_LIST")) == 0
+
+
+def test_tool_calls_are_measured_and_exported():
+    count = "mcp_tool_duration_seconds_count"
+    before = sum(sample_values(sap_mcp_server.MCP_TOOL_SECONDS, count, tool="use_tool", status="error"))
+
+    async def main():
+        async with Client(sap_mcp_server.mcp) as client:
+            await client.call_tool("use_tool", {"json_data": {}})
+
+    asyncio.run(main())
+    assert sum(sample_values(sap_mcp_server.MCP_TOOL_SECONDS, count, tool="use_tool", status="error")) == before + 1
+    assert sum(sample_values(sap_mcp_server.MCP_TOOL_IN_FLIGHT, tool="use_tool")) == 0
+
+    response = get("/metrics")
+    assert response.status_code == 200 and response.headers["content-type"] == CONTENT_TYPE
+    assert 'mcp_tool_duration_seconds_count{tool="use_tool",status="error"}' in response.text
+    assert "# TYPE mcp_ready gauge" in response.text
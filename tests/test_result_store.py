@@ -0,0 +1,93 @@
+import asyncio
+import threading
+
+import pytest
+
+from server.result_store import SHARED_RESULT_CONFIG, ResultNotFound, ResultStore
+
+
+def make_result(count):
+    return {"EXPORT": {"ET_DATA": [{"MATNR": f"{index:04d}", "LABST": index} for index in range(count)]}}
+
+
+def shared_store(db_path, **config):
+    store = ResultStore(dict({"auto_page_rows": 10, "page_size": 5}, **config))
+    store.enable_shared(str(db_path))
+    return store
+
+
+def test_paginate_returns_first_page_and_cursor():
+    store = ResultStore({"auto_page_rows": 10, "page_size": 5})
+    assert store.paginate("T", make_result(10)) == make_result(10)
+
+    paged = store.paginate("T", make_result(12))
+    assert [row["LABST"] for row in paged["EXPORT"]["ET_DATA"]] == [0, 1, 2, 3, 4]
+    pagination = paged["PAGINATION"]
+    assert pagination["TOTAL_ROWS"] == 12 and pagination["PATH"] == "EXPORT.ET_DATA"
+
+    page = store.get_page(pagination["CURSOR"], 0, 3, columns=["LABST"], filters=[{"column": "LABST", "op": "ge", "value": 2}])
+    assert page["ROWS"] == [{"LABST": 2}, {"LABST": 3}, {"LABST": 4}]
+    assert page["TOTAL_ROWS"] == 10 and page["NEXT_OFFSET"] == 3
+    assert store.release(pagination["CURSOR"]) is True
+    with pytest.raises(ResultNotFound):
+        store.get_page(pagination["CURSOR"])
+
+
+def test_cursor_is_readable_and_releasable_from_other_workers(tmp_path):
+    db_path = tmp_path / "results.db"
+    worker_a, worker_b = shared_store(db_path), shared_store(db_path)
+
+    cursor = worker_a.paginate("T", make_result(12))["PAGINATION"]["CURSOR"]
+    page = worker_b.get_page(cursor, 5, 5)
+    assert [row["LABST"] for row in page["ROWS"]] == [5, 6, 7, 8, 9]
+    assert page["NEXT_OFFSET"] == 10
+
+    # 工作进程B释放后，工作进程A的进程内副本也不能再读取
+    assert worker_b.release(cursor) is True
+    with pytest.raises(ResultNotFound):
+        worker_a.get_page(cursor)
+    assert worker_a.stats()["results"] == 0
+
+
+def test_shared_limits_apply_across_workers(tmp_path):
+    db_path = tmp_path / "results.db"
+    worker_a, worker_b = shared_store(db_path, max_results=2), shared_store(db_path, max_results=2)
+
+    first = worker_a.paginate("T", make_result(12))["PAGINATION"]["CURSOR"]
+    second = worker_b.paginate("T", make_result(12))["PAGINATION"]["CURSOR"]
+    third = worker_b.paginate("T", make_result(12))["PAGINATION"]["CURSOR"]
+    assert worker_a.stats()["shared_results"] == 2
+    with pytest.raises(ResultNotFound):
+        worker_a.get_page(first)
+    assert worker_a.get_page(second)["TOTAL_ROWS"] == 12
+    assert worker_a.get_page(third)["TOTAL_ROWS"] == 12
+
+
+def test_result_too_large_to_share_is_returned_whole(tmp_path, monkeypatch):
+    monkeypatch.setitem(SHARED_RESULT_CONFIG, "max_value_bytes", 100)
+    store = shared_store(tmp_path / "results.db")
+    assert store.paginate("T", make_result(12)) == make_result(12)
+    assert store.stats()["results"] == 0
+
+
+def test_shared_io_runs_off_the_event_loop(tmp_path, monkeypatch):
+    store = shared_store(tmp_path / "results.db")
+    threads = []
+    original = type(store.shared).put
+
+    def put(self, *args):
+        threads.append(threading.current_thread())
+        return original(self, *args)
+
+    monkeypatch.setattr(type(store.shared), "put", put)
+
+    async def main():
+        paged = await store.paginate_async("T", make_result(12))
+        cursor = paged["PAGINATION"]["CURSOR"]
+        page = await store.get_page_async(cursor, 10)
+        return page, await store.release_async(cursor)
+
+    page, released = asyncio.run(main())
+    assert page["ROWS"] == [{"MATNR": "0010", "LABST": 10}, {"MATNR": "0011", "LABST": 11}]
+    assert released is True
+    assert threads and threads[0] is not threading.main_thread()
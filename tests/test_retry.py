@@ -0,0 +1,83 @@
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+from server import retry
+from server.retry import RetryPolicy, get_retry_policy, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_backoff_is_exponential_and_capped_without_jitter():
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0, jitter=0)
+    assert [policy.backoff(attempt) for attempt in (1, 2, 3, 4)] == [1.0, 2.0, 4.0, 5.0]
+
+
+def test_backoff_jitter_stays_within_bounds():
+    policy = RetryPolicy(base_delay=2.0, jitter=0.5)
+    for _ in range(100):
+        assert 1.0 <= policy.backoff(1) <= 2.0
+
+
+def test_retry_count_is_limited():
+    state = RetryPolicy(max_retries=2, jitter=0, deadline=None).start()
+    assert state.next_delay() == 1.0
+    assert state.next_delay() == 2.0
+    assert state.next_delay() is None
+
+
+def test_deadline_stops_retries_and_limits_attempt_timeout(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(retry.time, "monotonic", clock)
+    state = RetryPolicy(max_retries=5, base_delay=4.0, jitter=0, deadline=10.0).start()
+    assert state.attempt_timeout(30) == 10.0
+    clock.now += 5
+    assert state.attempt_timeout(30) == 5.0
+    # 退避4秒 < 剩余5秒，可以重试
+    assert state.next_delay() == 4.0
+    clock.now += 4
+    # 退避8秒 >= 剩余1秒，放弃
+    assert state.next_delay() is None
+    clock.now += 10
+    assert state.attempt_timeout(30) == 0.1
+
+
+def test_retry_after_extends_backoff_and_too_long_gives_up():
+    policy = RetryPolicy(max_retries=3, base_delay=1.0, jitter=0, deadline=None, max_retry_after=30)
+    state = policy.start()
+    assert state.next_delay(retry_after=7) == 7
+    assert state.next_delay(retry_after=0.5) == 2.0
+    assert state.next_delay(retry_after=60) is None
+
+
+def test_retry_after_ignored_when_disabled():
+    state = RetryPolicy(jitter=0, deadline=None, honor_retry_after=False).start()
+    assert state.next_delay(retry_after=60) == 1.0
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("5") == 5.0
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after("") is None
+    assert parse_retry_after("soon") is None
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 <= parse_retry_after(format_datetime(later, usegmt=True)) <= 30
+
+
+def test_should_retry_status():
+    policy = RetryPolicy()
+    assert policy.should_retry_status(503)
+    assert policy.should_retry_status(429)
+    assert not policy.should_retry_status(404)
+
+
+def test_get_retry_policy_by_function_id():
+    assert get_retry_policy("TOOL_USED").max_retries == 1
+    assert get_retry_policy("UNKNOWN") is retry.DEFAULT_RETRY_POLICY
+    custom = {"TOOL_LIST": RetryPolicy(max_retries=9)}
+    assert get_retry_policy("TOOL_LIST", custom).max_retries == 9
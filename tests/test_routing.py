@@ -0,0 +1,156 @@
+import asyncio
+import os
+
+import pytest
+
+from server import sap_mcp_server
+from server.routing import DEFAULT_SYSTEM, SAPSystemRouter, UnknownSystemError, build_system_configs
+from server.schema_store import ToolSchemaStore
+from utils.cache import cache
+
+from test_http_client import SAP_TEST_CONFIG
+from test_sap_mcp_server import mock_router
+from conftest import load_module
+
+SYSTEMS = {
+    "prd": {"base_url": "http://prd/sap/zmcp", "client_id": "800", "prefixes": ["Z", "ZMM_"], "default": True},
+    "qas": {"base_url": "http://qas/sap/zmcp", "sap-password": "QAS", "prefixes": ["ZMM_STOCK_", "GET_"]},
+}
+
+
+class FakeClient:
+    def __init__(self, config):
+        self.config = config
+
+
+def make_router(systems=SYSTEMS):
+    return SAPSystemRouter(systems, dict(SAP_TEST_CONFIG), FakeClient)
+
+
+def test_system_configs_inherit_base_config():
+    assert build_system_configs({}, SAP_TEST_CONFIG) == {DEFAULT_SYSTEM: SAP_TEST_CONFIG}
+    configs = build_system_configs(SYSTEMS, SAP_TEST_CONFIG)
+    assert configs["prd"] == dict(SAP_TEST_CONFIG, base_url="http://prd/sap/zmcp", client_id="800")
+    assert configs["qas"]["sap-password"] == "QAS" and configs["qas"]["sap-user"] == "USER"
+    assert "prefixes" not in configs["qas"] and "default" not in configs["prd"]
+
+
+def test_resolve_by_system_then_longest_prefix_then_default():
+    router = make_router()
+    assert router.multi and router.names() == ["prd", "qas"]
+    assert router.resolve("ZMM_STOCK_LIST") == "qas"
+    assert router.resolve("ZMM_ORDER") == "prd"
+    assert router.resolve("GET_MATNR") == "qas"
+    assert router.resolve("CHECK_MATNR") == "prd"
+    assert router.resolve() == "prd"
+    # 显式指定的系统优先于前缀
+    assert router.resolve("GET_MATNR", "prd") == "prd"
+    with pytest.raises(UnknownSystemError, match="dev"):
+        router.resolve("GET_MATNR", "dev")
+
+
+def test_default_is_first_system_when_not_configured():
+    router = make_router({"a": {"prefixes": ["A"]}, "b": {}})
+    assert router.default == "a" and router.resolve("B_TOOL") == "a"
+    single = SAPSystemRouter({}, dict(SAP_TEST_CONFIG), FakeClient)
+    assert not single.multi and single.resolve("ANY") == DEFAULT_SYSTEM
+
+
+def test_invalid_routing_config_is_rejected():
+    with pytest.raises(ValueError, match="Z_"):
+        make_router({"a": {"prefixes": ["Z_"]}, "b": {"prefixes": ["Z_"]}})
+    with pytest.raises(ValueError, match="a, b"):
+        make_router({"a": {"default": True}, "b": {"default": True}})
+
+
+def test_clients_are_created_once_per_system():
+    router = make_router()
+    assert router.client(tool_id="GET_X") is router.client("qas")
+    assert router.client() is router.client("prd")
+    assert router.client("qas").config["base_url"] == "http://qas/sap/zmcp"
+
+
+def test_fan_out_collects_results_errors_and_timeouts():
+    router = make_router(dict(SYSTEMS, dev={"base_url": "http://dev/sap/zmcp"}))
+
+    async def call(name, client):
+        if name == "qas":
+            raise RuntimeError("连接被拒绝")
+        if name == "dev":
+            await asyncio.sleep(10)
+        return client.config["base_url"]
+
+    results, errors = asyncio.run(router.fan_out(call, timeout=0.05))
+    assert results == {"prd": "http://prd/sap/zmcp"}
+    assert errors == {"qas": "连接被拒绝", "dev": "等待超时(0.05秒)"}
+
+    results, errors = asyncio.run(router.fan_out(call, systems=["prd"]))
+    assert results == {"prd": "http://prd/sap/zmcp"} and errors == {}
+
+
+def test_stats_hide_credentials():
+    router = make_router()
+    router.client("qas")
+    stats = {item["name"]: item for item in router.stats()}
+    assert stats["qas"] == {
+        "name": "qas", "base_url": "http://qas/sap/zmcp", "client_id": "100",
+        "prefixes": ["ZMM_STOCK_", "GET_"], "default": False, "connected": True,
+    }
+    assert stats["prd"]["prefixes"] == ["ZMM_", "Z"] and stats["prd"]["connected"] is False
+    assert "PASSWORD" not in str(stats) and "QAS" not in str(stats)
+
+
+@pytest.fixture
+def two_systems(monkeypatch, tmp_path):
+    """两个模拟SAP系统：CHECK_前缀的工具在prd，GET_前缀的工具在qas"""
+    apps = {
+        "prd": load_module("mock_sap_prd", os.path.join("mcpDemo", "mockSapServer.py")),
+        "qas": load_module("mock_sap_qas", os.path.join("mcpDemo", "mockSapServer.py")),
+    }
+    store = ToolSchemaStore(str(tmp_path / "schema.db"), memory_ttl=60)
+    monkeypatch.setattr(sap_mcp_server, "schema_store", store)
+    router = mock_router(monkeypatch, {name: module.app for name, module in apps.items()}, {
+        "prd": {"base_url": "http://prd/sap/zmcp", "prefixes": ["CHECK_"], "default": True},
+        "qas": {"base_url": "http://qas/sap/zmcp", "prefixes": ["GET_"]},
+    })
+    yield apps, router
+    asyncio.run(router.close())
+    store.close()
+    cache.clear()
+
+
+def test_tool_list_is_merged_and_tagged_by_system(two_systems):
+    apps, router = two_systems
+    apps["qas"].MOCK_TOOLS.pop("CHECK_MATNR")
+
+    merged = asyncio.run(sap_mcp_server.get_tool_list())
+    tools = [(tool["TOOL_ID"], tool["SAP_SYSTEM"]) for tool in merged["RESULT"]]
+    assert tools == [("GET_MATNR_FROM_DES", "prd"), ("CHECK_MATNR", "prd"), ("GET_MATNR_FROM_DES", "qas")]
+    assert "ERRORS" not in merged
+
+    only_qas = asyncio.run(sap_mcp_server.get_tool_list(system="qas"))
+    assert [tool["SAP_SYSTEM"] for tool in only_qas["RESULT"]] == ["qas"]
+
+
+def test_tool_list_reports_failed_system(two_systems):
+    apps, router = two_systems
+    apps["qas"].MOCK_CONFIG["error_rate"] = 1.0
+    merged = asyncio.run(sap_mcp_server.get_tool_list())
+    assert {tool["SAP_SYSTEM"] for tool in merged["RESULT"]} == {"prd"}
+    assert list(merged["ERRORS"]) == ["qas"]
+
+
+def test_use_tool_is_routed_by_prefix_or_system(two_systems):
+    apps, router = two_systems
+
+    async def main():
+        by_prefix = await sap_mcp_server.use_tool({"TOOL_ID": "GET_MATNR_FROM_DES", "MAKTX": "螺丝"})
+        explicit = await sap_mcp_server.use_tool({"TOOL_ID": "GET_MATNR_FROM_DES", "MAKTX": "螺丝"}, system="prd")
+        unknown = await sap_mcp_server.use_tool({"TOOL_ID": "CHECK_MATNR"}, system="dev")
+        return by_prefix, explicit, unknown
+
+    by_prefix, explicit, unknown = asyncio.run(main())
+    assert by_prefix["TOOL_ID"] == explicit["TOOL_ID"] == "GET_MATNR_FROM_DES"
+    assert apps["qas"].request_counter == {"TOOL_DETAIL": 1, "TOOL_USED": 1}
+    assert apps["prd"].request_counter == {"TOOL_DETAIL": 1, "TOOL_USED": 1}
+    assert "SAP系统 dev 不存在" in unknown["error"]
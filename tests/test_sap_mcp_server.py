@@ -0,0 +1,133 @@
+import asyncio
+
+from urllib.parse import urlparse
+
+import httpx
+import pytest
+
+from server import circuit_breaker, concurrency, retry, sap_mcp_server
+from server.http_client import SAPHttpClient
+from server.routing import SAPSystemRouter
+from utils.cache import cache
+
+from test_http_client import SAP_TEST_CONFIG
+
+
+def mock_router(monkeypatch, apps, systems=None):
+    """把MCP服务器的SAP路由指向模拟SAP服务器
+
+    Args:
+        apps: 主机名到模拟SAP ASGI应用的映射，单系统时主机名为default
+        systems: SAP_SYSTEMS格式的系统配置，None表示只有一个系统
+    """
+    def factory(config):
+        client = SAPHttpClient(config=config, retry_policies={})
+        app = apps[urlparse(config["base_url"]).hostname]
+        client._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+        return client
+
+    # 模拟的故障不重试，熔断器、限流器和调用合并器的状态不带到其他测试
+    monkeypatch.setattr(retry, "DEFAULT_RETRY_POLICY", retry.RetryPolicy(max_retries=0))
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    monkeypatch.setattr(concurrency, "_limiters", {})
+    monkeypatch.setattr(sap_mcp_server, "tool_call_batchers", {})
+    router = SAPSystemRouter(systems or {}, dict(SAP_TEST_CONFIG, base_url="http://default/sap/zmcp"), factory)
+    monkeypatch.setattr(sap_mcp_server, "sap_router", router)
+    cache.clear()
+    return router
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """用模拟的execute_tool替换对SAP的调用，记录每次调用的参数"""
+    calls = []
+
+    async def execute_tool(tool_id, user_params, system=None):
+        calls.append((tool_id, user_params, system))
+        if tool_id == "FAIL":
+            raise ValueError("SAP返回错误")
+        if tool_id == "SLOW":
+            await asyncio.sleep(1)
+        # 先开始的条目后完成，结果仍按输入顺序返回
+        await asyncio.sleep(user_params.get("DELAY", 0))
+        return {"TOOL_ID": tool_id, "ECHO": user_params}
+
+    monkeypatch.setattr(sap_mcp_server, "execute_tool", execute_tool)
+    return calls
+
+
+def run_batch(items, **kwargs):
+    return asyncio.run(sap_mcp_server.use_tools_batch(items, **kwargs))
+
+
+def test_mixed_success_and_failure_keep_input_order(calls):
+    result = run_batch([
+        {"TOOL_ID": "A", "params": {"DELAY": 0.05}},
+        {"TOOL_ID": "FAIL", "params": {}},
+        {"params": {}},
+        {"TOOL_ID": "B", "MATNR": "1", "SAP_SYSTEM": "QAS"},
+    ])
+    assert (result["TOTAL"], result["SUCCEEDED"], result["FAILED"]) == (4, 2, 2)
+    assert [entry["INDEX"] for entry in result["RESULTS"]] == [0, 1, 2, 3]
+    assert [entry["SUCCESS"] for entry in result["RESULTS"]] == [True, False, False, True]
+    assert result["RESULTS"][0]["RESULT"] == {"TOOL_ID": "A", "ECHO": {"DELAY": 0.05}}
+    assert result["RESULTS"][1]["ERROR"] == "SAP返回错误"
+    assert "TOOL_ID" in result["RESULTS"][2]["ERROR"]
+    # 参数直接写在TOOL_ID旁边，SAP_SYSTEM用于路由而不作为参数
+    assert ("B", {"MATNR": "1"}, "QAS") in calls
+
+
+def test_params_that_are_not_a_dict_fail_the_item(calls):
+    result = run_batch([{"TOOL_ID": "A", "params": ["X"]}, {"TOOL_ID": "B", "params": None}, {"TOOL_ID": "C"}])
+    assert [entry["SUCCESS"] for entry in result["RESULTS"]] == [False, False, True]
+    assert "params" in result["RESULTS"][0]["ERROR"]
+    assert [call[0] for call in calls] == ["C"]
+
+
+def test_item_timeout_fails_only_that_item(calls):
+    result = run_batch([{"TOOL_ID": "SLOW"}, {"TOOL_ID": "A"}], item_timeout=0.05)
+    assert result["RESULTS"][0]["SUCCESS"] is False and "超时" in result["RESULTS"][0]["ERROR"]
+    assert result["RESULTS"][1]["SUCCESS"] is True
+
+
+def test_concurrency_is_capped(calls, monkeypatch):
+    monkeypatch.setitem(sap_mcp_server.BATCH_CONFIG, "max_concurrency", 2)
+    running = []
+    peak = []
+
+    async def execute_tool(tool_id, user_params, system=None):
+        running.append(tool_id)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(tool_id)
+        return {}
+
+    monkeypatch.setattr(sap_mcp_server, "execute_tool", execute_tool)
+    result = run_batch([{"TOOL_ID": f"T{index}"} for index in range(6)], max_concurrency=10)
+    assert result["SUCCEEDED"] == 6 and max(peak) == 2
+
+
+def test_rejects_empty_and_oversized_batches(calls, monkeypatch):
+    assert "items不能为空" in run_batch([])["error"]
+    monkeypatch.setitem(sap_mcp_server.BATCH_CONFIG, "max_items", 2)
+    assert "超过上限" in run_batch([{"TOOL_ID": "A"}] * 3)["error"]
+    assert calls == []
+
+
+def get(path):
+    async def main():
+        transport = httpx.ASGITransport(app=sap_mcp_server.mcp.http_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://mcp") as client:
+            return await client.get(path)
+    return asyncio.run(main())
+
+
+def test_traces_limit_is_validated_and_clamped(monkeypatch):
+    limits = []
+    monkeypatch.setattr(sap_mcp_server.memory_exporter, "traces", lambda limit: limits.append(limit) or [])
+    response = get("/traces?limit=abc")
+    assert response.status_code == 400 and "limit" in response.json()["error"]
+    assert get("/traces?limit=0").status_code == 200
+    assert get("/traces?limit=100000").json() == {"traces": []}
+    assert get("/traces").status_code == 200
+    assert limits == [1, 500, 50]
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from server import sap_mcp_server
+from server.schema_store import ToolSchemaStore
+from utils.cache import cache
+
+from test_sap_mcp_server import mock_router
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ToolSchemaStore(str(tmp_path / "schema.db"), memory_ttl=60)
+    yield store
+    store.close()
+
+
+def test_version_changes_only_when_content_changes(store):
+    assert store.put("T", {"IMPORT": {"A": "", "B": ""}}) == 1
+    # 键顺序不同的相同内容不增加版本号
+    assert store.put("T", {"IMPORT": {"B": "", "A": ""}}) == 1
+    assert store.put("T", {"IMPORT": {"A": ""}}) == 2
+    record = store.get_record("T")
+    assert record["version"] == 2 and record["param_format"] == {"IMPORT": {"A": ""}}
+    assert [item["tool_id"] for item in store.list()] == ["T"]
+
+
+def test_namespaces_are_isolated_and_delete_filters(store):
+    store.put("T", {"P": 1}, "PRD")
+    store.put("T", {"P": 2}, "QAS")
+    store.put("U", {"P": 3}, "QAS")
+    assert store.get("T", "PRD") == {"P": 1} and store.get("T", "QAS") == {"P": 2}
+    assert store.get("T") is None
+
+    assert store.delete("T") == 2
+    assert store.get("T", "PRD") is None and store.get("U", "QAS") == {"P": 3}
+    assert store.delete(namespace="QAS") == 1
+    assert store.list("QAS") == []
+
+
+def test_store_survives_restart_and_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "schema.db")
+    writer = ToolSchemaStore(path, memory_ttl=60)
+    reader = ToolSchemaStore(path, memory_ttl=0)
+    writer.put("T", {"P": 1})
+    assert reader.get("T") == {"P": 1}
+    writer.put("T", {"P": 2})
+    # memory_ttl为0时每次都读取数据库，能看到其他进程的更新
+    assert reader.get("T") == {"P": 2}
+    writer.delete("T")
+    assert reader.get("T") is None
+    writer.close()
+
+    restarted = ToolSchemaStore(path)
+    restarted.put("U", {"P": 3})
+    restarted.close()
+    assert ToolSchemaStore(path).get_record("U")["version"] == 1
+
+
+@pytest.fixture
+def server_store(monkeypatch, store):
+    monkeypatch.setattr(sap_mcp_server, "schema_store", store)
+    monkeypatch.setitem(sap_mcp_server.readiness, "ready", False)
+    monkeypatch.setitem(sap_mcp_server.readiness, "warmup", {"status": "pending"})
+    yield store
+    cache.clear()
+
+
+def test_params_format_is_loaded_once_then_served_from_store(monkeypatch, mock_sap, server_store):
+    router = mock_router(monkeypatch, {"default": mock_sap.app})
+    namespace = router.client().system_key()
+
+    async def main():
+        first = await sap_mcp_server.get_tool_params_format("CHECK_MATNR")
+        second = await sap_mcp_server.get_tool_params_format("CHECK_MATNR")
+        await router.close()
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first == second == {"IMPORT": {"MATERIAL": ""}}
+    assert server_store.get("CHECK_MATNR", namespace) == first
+    assert mock_sap.request_counter == {"TOOL_DETAIL": 1}
+
+
+def test_warm_up_loads_schemas_then_skips_stored_tools(monkeypatch, mock_sap, server_store):
+    router = mock_router(monkeypatch, {"default": mock_sap.app})
+
+    async def main():
+        first = await sap_mcp_server.warm_up(concurrency=2)
+        cache.clear()
+        second = await sap_mcp_server.warm_up(concurrency=2)
+        await router.close()
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first["status"] == "completed" and (first["tools"], first["skipped"], first["failed"]) == (2, 0, 0)
+    assert second["status"] == "completed" and second["skipped"] == 2
+    assert sap_mcp_server.readiness["ready"] is True
+    assert mock_sap.request_counter == {"TOOL_LIST": 2, "TOOL_DETAIL": 2}
+
+
+def test_warm_up_failure_still_marks_ready(monkeypatch, mock_sap, server_store):
+    mock_sap.MOCK_CONFIG["error_rate"] = 1.0
+    router = mock_router(monkeypatch, {"default": mock_sap.app})
+
+    async def main():
+        result = await sap_mcp_server.warm_up()
+        await router.close()
+        return result
+
+    assert asyncio.run(main())["status"] == "failed"
+    assert sap_mcp_server.readiness["ready"] is True
@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from server.streaming import (
+    JSONArrayStreamer, SAPAuthRequiredError, SAPResponseError, SSEParser, iter_json_array, read_json_response
+)
+
+DOCUMENTS = [
+    ("ET_DATA", '{"ET_DATA":[{"A":1},-1500.0,2e5]}'),
+    ("ET_DATA", '{"X": "a]\\"b", "ET_DATA": [ 1.25E-3 , "s,]", [1, [2]], {"K": "v"}, true, null, -0 ], "Y": 1}'),
+    ("RESULT", '{"RESULT":[3.5,{"MATNR":"000001","BRGEW":12.125}, 1e+10],"ID":""}'),
+    (None, '[1, 22, 333.0, -4e-2, "五", {"中文": "值"}]'),
+]
+
+
+def stream(key, document, size):
+    streamer = JSONArrayStreamer(key)
+    items = []
+    for start in range(0, len(document), size):
+        items.extend(streamer.feed(document[start:start + size]))
+    items.extend(streamer.close())
+    return items
+
+
+@pytest.mark.parametrize("key,document", DOCUMENTS)
+def test_every_chunk_boundary_gives_same_result_as_json_loads(key, document):
+    parsed = json.loads(document)
+    expected = parsed[key] if key is not None else parsed
+    for size in range(1, len(document) + 1):
+        assert stream(key, document, size) == expected, size
+
+
+def test_split_number_waits_for_delimiter():
+    streamer = JSONArrayStreamer("ET_DATA")
+    assert streamer.feed('{"ET_DATA":[-1500.') == []
+    assert streamer.feed("0,2e") == [-1500.0]
+    assert streamer.feed("5]}") == [2e5]
+    assert streamer.done
+
+
+def test_incomplete_array_raises():
+    streamer = JSONArrayStreamer("ET_DATA")
+    streamer.feed('{"ET_DATA":[1, 2')
+    with pytest.raises(json.JSONDecodeError):
+        streamer.close()
+
+
+def test_sse_parser_can_drop_lines():
+    parser = SSEParser(keep_lines=False)
+    assert parser.feed(b"event: message\ndata: [1,\nda") == ["[1,"]
+    assert parser.close() == []
+    assert parser.saw_data and parser.data_lines == []
+
+    parser = SSEParser()
+    parser.feed(b"data: [1,\ndata: 2]\n")
+    assert parser.data() == "[1,\n2]"
+
+
+def make_response(chunks, content_type="application/json"):
+    async def body():
+        for chunk in chunks:
+            yield chunk
+    return httpx.Response(200, headers={"content-type": content_type}, content=body())
+
+
+async def collect(response, key):
+    return [item async for item in iter_json_array(response, key)]
+
+
+def test_iter_json_array_over_sse_does_not_keep_lines(monkeypatch):
+    parsers = []
+    original = SSEParser.__init__
+
+    def track(self, *args, **kwargs):
+        original(self, *args, **kwargs)
+        parsers.append(self)
+
+    monkeypatch.setattr(SSEParser, "__init__", track)
+    chunks = [b'event: message\ndata: {"RESULT":[1.', b'5,{"A":2}', b']}\n\n']
+    assert asyncio.run(collect(make_response(chunks, "text/event-stream"), "RESULT")) == [1.5, {"A": 2}]
+    assert parsers[0].saw_data and parsers[0].data_lines == []
+
+
+def test_iter_json_array_errors():
+    with pytest.raises(SAPResponseError):
+        asyncio.run(collect(make_response([b'{"OTHER": []}']), "RESULT"))
+    with pytest.raises(SAPAuthRequiredError):
+        asyncio.run(collect(make_response([b"<html><body>Logon</body></html>"]), "RESULT"))
+
+
+def test_read_json_response_sse_and_json():
+    assert asyncio.run(read_json_response(make_response([b'{"A":', b' 1}']))) == {"A": 1}
+    sse = make_response([b"data: {\"A\":", b" 2}\n\n"], "text/event-stream")
+    assert asyncio.run(read_json_response(sse)) == {"A": 2}
+    with pytest.raises(SAPResponseError):
+        asyncio.run(read_json_response(make_response([b"event: ping\n\n"], "text/event-stream")))
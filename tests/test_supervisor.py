@@ -0,0 +1,184 @@
+import asyncio
+import socket
+import sys
+import textwrap
+
+import pytest
+
+from server.supervisor import (
+    STATE_RESTARTING, STATE_RUNNING, STATE_STARTING, STATE_STOPPED, MCPServerSupervisor, port_open
+)
+
+# 模拟MCP服务器：监听端口，/ready等请求一律返回200，EXIT_AFTER秒后以EXIT_CODE退出
+FAKE_SERVER = textwrap.dedent("""
+    import asyncio, os, sys
+
+    async def handle(reader, writer):
+        await reader.readuntil(b"\\r\\n\\r\\n")
+        writer.write(b"HTTP/1.1 200 OK\\r\\nContent-Length: 2\\r\\nConnection: close\\r\\n\\r\\nok")
+        await writer.drain()
+        writer.close()
+
+    async def main():
+        print("fake server starting", flush=True)
+        if os.environ.get("EXIT_BEFORE_LISTEN"):
+            sys.exit(int(os.environ["EXIT_CODE"]))
+        await asyncio.start_server(handle, "127.0.0.1", int(os.environ["PORT"]))
+        await asyncio.sleep(float(os.environ.get("EXIT_AFTER", "60")))
+        sys.exit(int(os.environ.get("EXIT_CODE", "0")))
+
+    asyncio.run(main())
+""")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def make_supervisor(tmp_path):
+    script = tmp_path / "fake_server.py"
+    script.write_text(FAKE_SERVER, encoding="utf-8")
+
+    def factory(env=None, **config):
+        port = free_port()
+        config = dict({
+            "script": str(script),
+            "log_file": str(tmp_path / "mcp_server.log"),
+            "poll_interval": 0.02,
+            "listen_timeout": 10.0,
+            "stop_timeout": 5.0,
+            "backoff_initial": 0.05,
+            "backoff_max": 0.1,
+            "backoff_reset_after": 60.0,
+        }, **config)
+        supervisor = MCPServerSupervisor(
+            {"host": "127.0.0.1", "port": port}, config=config, env=dict({"PORT": str(port)}, **(env or {}))
+        )
+        # 跳过查找安装了fastmcp的解释器
+        supervisor._python = sys.executable
+        return supervisor
+
+    return factory
+
+
+async def wait_until(predicate, timeout=10.0):
+    for _ in range(int(timeout / 0.02)):
+        if predicate():
+            return True
+        await asyncio.sleep(0.02)
+    return False
+
+
+def test_start_waits_for_port_then_ready_and_stops_gracefully(make_supervisor):
+    supervisor = make_supervisor()
+
+    async def scenario():
+        status = await supervisor.start()
+        assert status["status"] in (STATE_STARTING, STATE_RUNNING) and status["managed"] is True
+        assert await port_open("127.0.0.1", supervisor.server_config["port"])
+        assert await wait_until(lambda: supervisor.state == STATE_RUNNING)
+        assert supervisor.ready_at is not None
+
+        # 已经在运行时不会重复启动
+        pid = supervisor.process.pid
+        assert (await supervisor.start())["pid"] == pid
+
+        status = await supervisor.stop()
+        assert status["status"] == STATE_STOPPED and "error" not in status
+        assert supervisor.last_exit_code is not None
+        assert not await port_open("127.0.0.1", supervisor.server_config["port"])
+        await supervisor.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_unexpected_exit_restarts_with_capped_backoff(make_supervisor):
+    supervisor = make_supervisor(env={"EXIT_AFTER": "0.2", "EXIT_CODE": "3"}, backoff_max=0.15)
+    backoffs = []
+
+    async def scenario():
+        await supervisor.start()
+        while len(backoffs) < 3:
+            assert await wait_until(lambda: supervisor.state == STATE_RESTARTING)
+            backoffs.append(supervisor._backoff)
+            status = await supervisor.status()
+            assert status["managed"] is True and "restart_in" in status
+            assert status["last_exit_code"] == 3 and "fake server starting" in status["error"]
+            assert await wait_until(lambda: supervisor.state != STATE_RESTARTING)
+        await supervisor.stop()
+        await supervisor.shutdown()
+
+    asyncio.run(scenario())
+    assert supervisor.restarts == 3
+    # 每次重启前的等待时间翻倍，但不超过backoff_max
+    assert backoffs == [0.1, 0.15, 0.15]
+
+
+def test_backoff_resets_after_long_uptime(make_supervisor):
+    supervisor = make_supervisor(env={"EXIT_AFTER": "0.1", "EXIT_CODE": "3"}, backoff_reset_after=0.0, backoff_max=10.0)
+
+    async def scenario():
+        await supervisor.start()
+        for _ in range(3):
+            assert await wait_until(lambda: supervisor.state == STATE_RESTARTING)
+            # 每次都从backoff_initial开始
+            assert supervisor._backoff == 0.1
+            assert await wait_until(lambda: supervisor.state != STATE_RESTARTING)
+        await supervisor.stop()
+        await supervisor.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_no_restart_when_disabled(make_supervisor):
+    supervisor = make_supervisor(env={"EXIT_AFTER": "0.1", "EXIT_CODE": "3"}, restart=False)
+
+    async def scenario():
+        await supervisor.start()
+        assert await wait_until(lambda: supervisor.last_exit_code is not None)
+        await asyncio.sleep(0.2)
+        status = await supervisor.status()
+        await supervisor.shutdown()
+        return status
+
+    status = asyncio.run(scenario())
+    assert status["status"] == STATE_STOPPED and status["last_exit_code"] == 3
+    assert supervisor.restarts == 0
+
+
+def test_exit_during_startup_is_not_restarted(make_supervisor):
+    supervisor = make_supervisor(env={"EXIT_BEFORE_LISTEN": "1", "EXIT_CODE": "2"})
+
+    async def scenario():
+        status = await supervisor.start()
+        await asyncio.sleep(0.2)
+        await supervisor.shutdown()
+        return status
+
+    status = asyncio.run(scenario())
+    assert status["status"] == STATE_STOPPED and status["last_exit_code"] == 2
+    assert status["error"].startswith("启动失败，退出码: 2") and "fake server starting" in status["error"]
+    assert supervisor.restarts == 0
+
+
+def test_port_taken_by_other_process_stops_restart(make_supervisor):
+    supervisor = make_supervisor(env={"EXIT_AFTER": "0.1", "EXIT_CODE": "3"}, backoff_initial=0.3)
+
+    async def scenario():
+        await supervisor.start()
+        assert await wait_until(lambda: supervisor.state == STATE_RESTARTING)
+        # 等待重启期间其他进程占用了端口
+        server = await asyncio.start_server(lambda reader, writer: writer.close(), "127.0.0.1", supervisor.server_config["port"])
+        try:
+            assert await wait_until(lambda: supervisor.state != STATE_RESTARTING)
+        finally:
+            server.close()
+            await server.wait_closed()
+        await supervisor.shutdown()
+
+    asyncio.run(scenario())
+    assert supervisor.state == STATE_STOPPED
+    assert "已被其他进程占用" in supervisor.error and supervisor.restarts == 0
@@ -1,6 +1,21 @@
-from typing import Dict, Any, Optional
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+import asyncio
+import functools
+import hashlib
+import inspect
+import logging
+import os
+import sqlite3
+import sys
+import threading
 import time
 
+from utils import codec
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
 
 class SimpleCache:
     """简单的内存缓存实现"""
@@ -77,39 +92,683 @@ class SimpleCache:
         return len(self._cache)
 
 
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """估算缓存值占用的内存字节数
+    
+    Args:
+        value: 缓存值（通常是SAP返回的JSON结构）
+    
+    Returns:
+        int: 估算的字节数
+    """
+    size = sys.getsizeof(value)
+    if _depth > 32:
+        return size
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1)
+    elif isinstance(value, (list, tuple, set)):
+        for item in value:
+            size += estimate_size(item, _depth + 1)
+    return size
+
+
+class SQLiteCacheBackend:
+    """多进程共享的缓存存储（本地SQLite文件）
+    
+    多工作进程模式下作为LRUCache的第二层：一个进程从SAP加载的结果写入共享文件，
+    其他进程本地未命中时从这里读取，删除和清空也对所有进程生效。
+    值以JSON保存，不能序列化或超过max_value_bytes的值只保存在进程内。
+    """
+    
+    def __init__(self, db_path: str, max_value_bytes: int = 4 * 1024 * 1024):
+        """初始化存储
+        
+        Args:
+            db_path: SQLite数据库文件路径
+            max_value_bytes: 单个值序列化后的最大字节数
+        """
+        self.db_path = db_path
+        self.max_value_bytes = max_value_bytes
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if hasattr(os, "register_at_fork"):
+            # 连接不能跨fork使用，子进程首次访问时重新连接
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+    
+    def _reset_after_fork(self) -> None:
+        self._lock = threading.RLock()
+        self._conn = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        """获取数据库连接，首次调用时创建数据库文件和表（调用方需持有锁）"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entry ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expire_at REAL NOT NULL, stale_until REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+    
+    def get(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """读取缓存项
+        
+        Args:
+            key: 缓存键
+        
+        Returns:
+            tuple: (值, 过期时间, 旧值可用截止时间)，不存在或已彻底过期时返回None
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value, expire_at, stale_until FROM cache_entry WHERE key = ? AND stale_until >= ?",
+                (key, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        return codec.loads(row[0]), row[1], row[2]
+    
+    def set(self, key: str, value: Any, expire_at: float, stale_until: float) -> bool:
+        """写入缓存项
+        
+        Returns:
+            bool: 值无法序列化或过大而没有写入时返回False
+        """
+        try:
+            data = codec.dumps(value)
+        except (TypeError, ValueError):
+            return False
+        if len(data) > self.max_value_bytes:
+            return False
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO cache_entry (key, value, expire_at, stale_until) VALUES (?, ?, ?, ?)",
+                (key, data, expire_at, stale_until)
+            )
+        return True
+    
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM cache_entry WHERE key = ?", (key,))
+    
+    def delete_prefix(self, prefix: str) -> int:
+        """删除以指定前缀开头的缓存项，返回删除数量"""
+        with self._lock:
+            return self._connect().execute(
+                "DELETE FROM cache_entry WHERE key >= ? AND key < ?", (prefix, prefix + "\uffff")
+            ).rowcount
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM cache_entry")
+    
+    def purge_expired(self) -> int:
+        """删除彻底过期的缓存项，返回删除数量"""
+        with self._lock:
+            return self._connect().execute("DELETE FROM cache_entry WHERE stale_until < ?", (time.time(),)).rowcount
+    
+    def size(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM cache_entry").fetchone()[0]
+
+
+class LRUCache:
+    """有界LRU内存缓存
+    
+    在SimpleCache的基础上增加：
+    - 条目数和字节数上限，超限时按LRU淘汰
+    - 后台线程定期清理过期条目
+    - 同一个键的并发加载合并为一次（single-flight）
+    - 过期后在stale_ttl内先返回旧值，并在后台刷新（stale-while-revalidate）
+    - 命中、未命中、淘汰等统计计数
+    - 可选的多进程共享存储（shared），进程内的副本每隔shared_sync_interval秒与共享存储核对一次，
+      其他进程的删除和更新最迟在此时间后可见
+    """
+    
+    def __init__(
+        self,
+        default_ttl: int = 3600,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        stale_ttl: int = 0,
+        sweep_interval: float = 60.0,
+        shared: Optional[SQLiteCacheBackend] = None,
+        shared_sync_interval: float = 5.0
+    ):
+        """初始化缓存
+        
+        Args:
+            default_ttl: 默认缓存过期时间（秒）
+            max_entries: 最大缓存条目数
+            max_bytes: 最大缓存字节数（估算值）
+            stale_ttl: 过期后仍可返回旧值的时间（秒），0表示不启用
+            sweep_interval: 后台清理过期条目的间隔（秒）
+            shared: 多进程共享存储，None表示只使用进程内缓存
+            shared_sync_interval: 进程内副本与共享存储核对的间隔（秒）
+        """
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # 进行中的加载的代数，加载完成时代数已变化（期间被删除或清空）则丢弃结果
+        self._load_generations: Dict[str, int] = {}
+        self._generation = 0
+        self._bytes = 0
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stale_ttl = stale_ttl
+        self.sweep_interval = sweep_interval
+        self.shared = shared
+        self.shared_sync_interval = shared_sync_interval
+        self._sweeper: Optional[threading.Thread] = None
+        self._sweeper_stop = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.shared_hits = 0
+    
+    def _lookup(self, key: str, sync_shared: bool = True) -> Optional[Dict[str, Any]]:
+        """查找缓存项，彻底过期的项会被删除（调用方需持有锁）
+        
+        Args:
+            key: 缓存键
+            sync_shared: 是否在需要时同步读取共享存储；异步调用方已通过_sync_shared在线程池中读取时为False
+        """
+        item = self._cache.get(key)
+        if sync_shared and self.shared is not None and (item is None or time.time() > item["sync_at"]):
+            item = self._load_shared(key)
+        if item is None:
+            return None
+        if time.time() > item["stale_until"]:
+            self._remove(key)
+            self.expirations += 1
+            return None
+        self._cache.move_to_end(key)
+        return item
+    
+    def _load_shared(self, key: str) -> Optional[Dict[str, Any]]:
+        """从共享存储读取缓存项并更新进程内副本（调用方需持有锁）"""
+        try:
+            record = self.shared.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"读取共享缓存失败: {str(e)}")
+            return self._cache.get(key)
+        return self._apply_shared(key, record)
+    
+    def _apply_shared(self, key: str, record: Optional[Tuple[Any, float, float]]) -> Optional[Dict[str, Any]]:
+        """用共享存储中读取的记录更新进程内副本（调用方需持有锁）"""
+        if record is None:
+            # 其他进程已删除或已过期
+            self._remove(key)
+            return None
+        value, expire_at, stale_until = record
+        item = self._cache.get(key)
+        if item is not None and item["expire_at"] == expire_at:
+            item["sync_at"] = time.time() + self.shared_sync_interval
+            return item
+        self.shared_hits += 1
+        self._store(key, value, expire_at, stale_until, estimate_size(value))
+        return self._cache.get(key)
+    
+    async def _sync_shared(self, key: str) -> None:
+        """需要时在线程池中读取共享存储并更新进程内副本，避免SQLite读写阻塞事件循环"""
+        with self._lock:
+            item = self._cache.get(key)
+            if item is not None and time.time() <= item["sync_at"]:
+                return
+        loop = asyncio.get_running_loop()
+        try:
+            record = await loop.run_in_executor(None, self.shared.get, key)
+        except sqlite3.Error as e:
+            logger.warning(f"读取共享缓存失败: {str(e)}")
+            return
+        with self._lock:
+            # 读取期间本进程已写入或删除了这个键，以本进程的操作为准
+            if self._cache.get(key) is item:
+                self._apply_shared(key, record)
+    
+    async def _write_shared(self, key: str, value: Any, expire_at: float, stale_until: float) -> None:
+        """在线程池中把缓存项写入共享存储（序列化大结果和等待SQLite写锁都不阻塞事件循环）"""
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.shared.set, key, value, expire_at, stale_until)
+        except sqlite3.Error as e:
+            logger.warning(f"写入共享缓存失败: {str(e)}")
+    
+    def _store(self, key: str, value: Any, expire_at: float, stale_until: float, size: int) -> None:
+        """保存进程内缓存项并按上限淘汰（调用方需持有锁）"""
+        self._remove(key)
+        if size > self.max_bytes:
+            # 单个值超过字节上限，不缓存
+            self.evictions += 1
+            return
+        self._cache[key] = {
+            "value": value,
+            "expire_at": expire_at,
+            "stale_until": stale_until,
+            "sync_at": time.time() + self.shared_sync_interval,
+            "size": size
+        }
+        self._bytes += size
+        self._evict()
+    
+    def _remove(self, key: str) -> None:
+        """删除缓存项并更新字节数（调用方需持有锁）"""
+        item = self._cache.pop(key, None)
+        if item is not None:
+            self._bytes -= item["size"]
+    
+    def _cancel_loads(self, keys) -> None:
+        """让进行中的加载失效，之后的请求重新加载（调用方需持有锁）"""
+        for key in list(keys):
+            self._inflight.pop(key, None)
+            self._load_generations.pop(key, None)
+    
+    def _evict(self) -> None:
+        """按LRU顺序淘汰超出上限的缓存项（调用方需持有锁）"""
+        while self._cache and (len(self._cache) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._cache))
+            self._remove(key)
+            self.evictions += 1
+    
+    def get(self, key: str) -> Optional[Any]:
+        """获取缓存值
+        
+        Args:
+            key: 缓存键
+        
+        Returns:
+            Any: 缓存值，如果不存在或已过期则返回None
+        """
+        with self._lock:
+            item = self._lookup(key)
+            if item is None or time.time() > item["expire_at"]:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return item["value"]
+    
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, stale_ttl: Optional[int] = None) -> None:
+        """设置缓存值
+        
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 缓存过期时间（秒），None表示使用默认值
+            stale_ttl: 过期后仍可返回旧值的时间（秒），None表示使用默认值
+        """
+        expire_at, stale_until = self._set_local(key, value, ttl, stale_ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value, expire_at, stale_until)
+            except sqlite3.Error as e:
+                logger.warning(f"写入共享缓存失败: {str(e)}")
+    
+    async def set_async(self, key: str, value: Any, ttl: Optional[int] = None, stale_ttl: Optional[int] = None) -> None:
+        """设置缓存值，共享存储在线程池中写入（供事件循环中的调用方使用）
+        
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 缓存过期时间（秒），None表示使用默认值
+            stale_ttl: 过期后仍可返回旧值的时间（秒），None表示使用默认值
+        """
+        expire_at, stale_until = self._set_local(key, value, ttl, stale_ttl)
+        if self.shared is not None:
+            await self._write_shared(key, value, expire_at, stale_until)
+    
+    def _set_local(self, key: str, value: Any, ttl: Optional[int], stale_ttl: Optional[int]) -> Tuple[float, float]:
+        """设置进程内缓存值
+        
+        Returns:
+            tuple: (过期时间, 旧值可用截止时间)
+        """
+        expire_at = time.time() + (ttl or self.default_ttl)
+        stale_until = expire_at + (self.stale_ttl if stale_ttl is None else stale_ttl)
+        size = estimate_size(value)
+        with self._lock:
+            self._store(key, value, expire_at, stale_until, size)
+        self._ensure_sweeper()
+        return expire_at, stale_until
+    
+    def delete(self, key: str) -> None:
+        """删除缓存值
+        
+        Args:
+            key: 缓存键
+        """
+        with self._lock:
+            self._remove(key)
+            self._cancel_loads([key])
+            if self.shared is not None:
+                try:
+                    self.shared.delete(key)
+                except sqlite3.Error as e:
+                    logger.warning(f"删除共享缓存失败: {str(e)}")
+    
+    def delete_prefix(self, prefix: str) -> int:
+        """删除所有以指定前缀开头的缓存值
+        
+        Args:
+            prefix: 缓存键前缀
+        
+        Returns:
+            int: 删除的缓存项数量
+        """
+        with self._lock:
+            keys = [key for key in self._cache if key.startswith(prefix)]
+            for key in keys:
+                self._remove(key)
+            self._cancel_loads([key for key in self._inflight if key.startswith(prefix)])
+            if self.shared is not None:
+                try:
+                    return max(self.shared.delete_prefix(prefix), len(keys))
+                except sqlite3.Error as e:
+                    logger.warning(f"删除共享缓存失败: {str(e)}")
+        return len(keys)
+    
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._cache.clear()
+            self._bytes = 0
+            self._cancel_loads(self._inflight)
+            if self.shared is not None:
+                try:
+                    self.shared.clear()
+                except sqlite3.Error as e:
+                    logger.warning(f"清空共享缓存失败: {str(e)}")
+    
+    def size(self) -> int:
+        """获取缓存大小
+        
+        Returns:
+            int: 缓存项数量
+        """
+        self.purge_expired()
+        with self._lock:
+            return len(self._cache)
+    
+    def purge_expired(self) -> int:
+        """清理所有彻底过期（超过stale_ttl）的缓存项
+        
+        Returns:
+            int: 清理的缓存项数量
+        """
+        now = time.time()
+        with self._lock:
+            expired_keys = [key for key, item in self._cache.items() if now > item["stale_until"]]
+            for key in expired_keys:
+                self._remove(key)
+            self.expirations += len(expired_keys)
+            if self.shared is not None:
+                try:
+                    self.shared.purge_expired()
+                except sqlite3.Error as e:
+                    logger.warning(f"清理共享缓存失败: {str(e)}")
+        return len(expired_keys)
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息
+        
+        Returns:
+            dict: 条目数、字节数及命中/未命中/淘汰等计数
+        """
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "entries": len(self._cache),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "shared": self.shared is not None,
+                "shared_hits": self.shared_hits,
+                "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0
+            }
+    
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None
+    ) -> Any:
+        """获取缓存值，不存在时调用loader加载
+        
+        同一个键的并发加载只会调用一次loader，其余调用方等待同一个结果。
+        缓存过期但仍在stale_ttl内时，立即返回旧值并在后台刷新。
+        
+        Args:
+            key: 缓存键
+            loader: 无参数的异步加载函数
+            ttl: 缓存过期时间（秒），None表示使用默认值
+            stale_ttl: 过期后仍可返回旧值的时间（秒），None表示使用默认值
+        
+        Returns:
+            Any: 缓存值或loader的返回值
+        """
+        if self.shared is not None:
+            await self._sync_shared(key)
+        with self._lock:
+            item = self._lookup(key, sync_shared=False)
+            if item is not None:
+                if time.time() <= item["expire_at"]:
+                    self.hits += 1
+                    return item["value"]
+                # 已过期但仍可使用旧值，后台刷新
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    self._start_load(key, loader, ttl, stale_ttl)
+                return item["value"]
+            
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                future = self._start_load(key, loader, ttl, stale_ttl)
+        
+        return await asyncio.shield(future)
+    
+    def _start_load(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: Optional[int], stale_ttl: Optional[int]) -> asyncio.Future:
+        """启动一次加载任务并登记到进行中的请求表（调用方需持有锁）
+        
+        加载期间键被删除或缓存被清空时，加载结果仍返回给等待的调用方，但不写入缓存，
+        避免刚失效的旧值被写回。
+        """
+        self._generation += 1
+        generation = self._generation
+        
+        async def load():
+            try:
+                value = await loader()
+                with self._lock:
+                    current = value is not None and self._load_generations.get(key) == generation
+                if current:
+                    await self.set_async(key, value, ttl, stale_ttl)
+                    with self._lock:
+                        cancelled = self._load_generations.get(key) != generation
+                    if cancelled and self.shared is not None:
+                        # 写入共享存储期间键被删除，删掉刚写入的旧值
+                        loop = asyncio.get_running_loop()
+                        try:
+                            await loop.run_in_executor(None, self.shared.delete, key)
+                        except sqlite3.Error as e:
+                            logger.warning(f"删除共享缓存失败: {str(e)}")
+                return value
+            finally:
+                with self._lock:
+                    if self._load_generations.get(key) == generation:
+                        self._inflight.pop(key, None)
+                        self._load_generations.pop(key, None)
+        
+        future = asyncio.ensure_future(load())
+        future.add_done_callback(self._consume_exception)
+        self._inflight[key] = future
+        self._load_generations[key] = generation
+        return future
+    
+    @staticmethod
+    def _consume_exception(future: asyncio.Future) -> None:
+        """读取后台加载任务的异常，避免未处理异常告警"""
+        if not future.cancelled() and future.exception() is not None:
+            logger.debug(f"缓存加载失败: {future.exception()}")
+    
+    def _ensure_sweeper(self) -> None:
+        """按需启动后台过期清理线程"""
+        if self.sweep_interval <= 0 or (self._sweeper is not None and self._sweeper.is_alive()):
+            return
+        with self._lock:
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return
+            self._sweeper_stop.clear()
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="cache-sweeper", daemon=True)
+            self._sweeper.start()
+    
+    def _sweep_loop(self) -> None:
+        """后台清理线程主循环"""
+        while not self._sweeper_stop.wait(self.sweep_interval):
+            try:
+                self.purge_expired()
+            except Exception as e:
+                logger.warning(f"清理过期缓存失败: {str(e)}")
+    
+    def stop_sweeper(self) -> None:
+        """停止后台过期清理线程"""
+        self._sweeper_stop.set()
+
+
+# 全局缓存配置
+CACHE_CONFIG = {
+    "default_ttl": 3600,
+    "max_entries": 1024,
+    "max_bytes": 64 * 1024 * 1024,  # 64MB
+    "stale_ttl": 60,
+    "sweep_interval": 60.0
+}
+
+# 多进程共享缓存配置，MCP服务器多工作进程模式下通过enable_shared_cache启用
+SHARED_CACHE_CONFIG = {
+    "db_path": os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "response_cache.db"),
+    "sync_interval": 5.0,  # 进程内副本与共享存储核对的间隔（秒）
+    "max_value_bytes": 4 * 1024 * 1024,  # 超过该大小的值只保存在进程内
+}
+
+
 # 创建全局缓存实例
-cache = SimpleCache()
+cache = LRUCache(**CACHE_CONFIG)
+
+
+def enable_shared_cache(db_path: Optional[str] = None) -> None:
+    """让全局缓存使用多进程共享存储
+    
+    需要在fork工作进程之前或进程启动时调用，数据库连接在首次访问时建立。
+    
+    Args:
+        db_path: SQLite数据库文件路径，None表示使用SHARED_CACHE_CONFIG中的配置
+    """
+    if cache.shared is not None:
+        return
+    cache.shared = SQLiteCacheBackend(
+        db_path or SHARED_CACHE_CONFIG["db_path"],
+        SHARED_CACHE_CONFIG["max_value_bytes"]
+    )
+    cache.shared_sync_interval = SHARED_CACHE_CONFIG["sync_interval"]
+
+
+def _collect_metrics():
+    """导出全局缓存指标"""
+    stats = cache.stats()
+    labels = {"cache": "response"}
+    return [
+        ("cache_lookups_total", "counter", "缓存查询次数（按结果）", [
+            (dict(labels, result="hit"), stats["hits"]),
+            (dict(labels, result="stale_hit"), stats["stale_hits"]),
+            (dict(labels, result="miss"), stats["misses"]),
+        ]),
+        ("cache_hit_ratio", "gauge", "缓存命中率（包括过期数据命中）", [(labels, stats["hit_ratio"])]),
+        ("cache_coalesced_total", "counter", "与进行中的加载合并的请求数量", [(labels, stats["coalesced"])]),
+        ("cache_shared_hits_total", "counter", "进程内未命中、从多进程共享存储读取的次数", [(labels, stats["shared_hits"])]),
+        ("cache_evictions_total", "counter", "超过容量被淘汰的缓存项数量", [(labels, stats["evictions"])]),
+        ("cache_entries", "gauge", "缓存项数量", [(labels, stats["entries"])]),
+        ("cache_bytes", "gauge", "缓存估算占用的字节数", [(labels, stats["bytes"])]),
+    ]
+
+
+registry.register_collector(_collect_metrics)
+
+
+def make_cache_key(name: str, arguments: Dict[str, Any], namespace: Any = None) -> str:
+    """根据参数生成规范化的缓存键
+    
+    参数以排序键的JSON序列化后取SHA-256摘要，保证字典键顺序不同的相同参数得到相同的键。
+    
+    Args:
+        name: 函数名，作为缓存键的可读前缀
+        arguments: 参数名到参数值的映射
+        namespace: 命名空间（如当前SAP系统的base_url、client_id和用户），不同命名空间的缓存互不影响
+    
+    Returns:
+        str: 形如"函数名:摘要"的缓存键
+    """
+    payload = codec.dumps({"ns": namespace, "args": arguments}, sort_keys=True, default=str)
+    return f"{name}:{hashlib.sha256(payload).hexdigest()}"
 
 
 # 缓存装饰器
-def cache_decorator(ttl: int = 3600):
+def cache_decorator(ttl: int = 3600, stale_ttl: Optional[int] = None):
     """缓存装饰器
     
+    用于实例方法时不使用self参与缓存键，而是调用实例的cache_namespace()（如果有）作为命名空间，
+    因此同一配置下的不同实例可以共享缓存，不同配置之间互不影响。
+    
     Args:
         ttl: 缓存过期时间（秒）
+        stale_ttl: 过期后仍可返回旧值并后台刷新的时间（秒），None表示使用缓存默认值
     
     Returns:
         Callable: 装饰器函数
     """
     def decorator(func):
+        signature = inspect.signature(func)
+        is_method = next(iter(signature.parameters), None) == "self"
+        
+        @functools.wraps(func)
         async def wrapper(*args, **kwargs):
-            # 生成缓存键
-            key_parts = [func.__name__]
-            key_parts.extend(str(arg) for arg in args)
-            key_parts.extend(f"{k}={v}" for k, v in sorted(kwargs.items()))
-            cache_key = "|".join(key_parts)
+            # 规范化参数：位置参数和关键字参数统一绑定到参数名，并补全默认值
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
             
-            # 尝试从缓存获取
-            cached_value = cache.get(cache_key)
-            if cached_value is not None:
-                return cached_value
+            namespace = None
+            if is_method:
+                instance = arguments.pop("self")
+                get_namespace = getattr(instance, "cache_namespace", None)
+                if callable(get_namespace):
+                    namespace = get_namespace()
             
-            # 调用原函数
-            result = await func(*args, **kwargs)
-            
-            # 缓存结果
-            cache.set(cache_key, result, ttl)
+            # 生成缓存键
+            cache_key = make_cache_key(func.__qualname__, arguments, namespace)
             
-            return result
+            # 从缓存获取，未命中时调用原函数（并发请求合并为一次）
+            return await cache.get_or_load(
+                cache_key,
+                lambda: func(*args, **kwargs),
+                ttl=ttl,
+                stale_ttl=stale_ttl
+            )
         return wrapper
     return decorator
@@ -0,0 +1,111 @@
+import json
+from typing import Any, Callable, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# JSON编解码后端：优先使用orjson，其次msgspec，都未安装时使用标准库json
+# 编码结果统一为UTF-8字节（不转义非ASCII字符），可以直接作为HTTP请求体发送
+if orjson is not None:
+    JSON_BACKEND = "orjson"
+elif msgspec is not None:
+    JSON_BACKEND = "msgspec"
+else:
+    JSON_BACKEND = "json"
+
+JSONInput = Union[bytes, bytearray, memoryview, str]
+
+if msgspec is not None:
+    _msgspec_encoder = msgspec.json.Encoder()
+    _msgspec_decoder = msgspec.json.Decoder()
+    _ENCODE_ERRORS = (TypeError, msgspec.EncodeError)
+else:
+    _ENCODE_ERRORS = (TypeError,)
+
+
+def _stdlib_dumps(obj: Any, sort_keys: bool = False, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    return json.dumps(
+        obj,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        sort_keys=sort_keys,
+        default=default
+    ).encode("utf-8")
+
+
+def dumps(obj: Any, sort_keys: bool = False, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """把对象编码为JSON字节
+
+    Args:
+        obj: 要编码的对象
+        sort_keys: 是否按键排序（用于生成稳定的缓存键）
+        default: 无法编码的对象的转换函数，None表示抛出TypeError
+
+    Returns:
+        bytes: UTF-8编码的紧凑JSON
+
+    Raises:
+        TypeError: 对象无法编码
+    """
+    try:
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS
+            if sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            return orjson.dumps(obj, default=default, option=option)
+        if msgspec is not None and not sort_keys and default is None:
+            return _msgspec_encoder.encode(obj)
+    except _ENCODE_ERRORS:
+        # 超过64位的整数等快速编码器不支持的值，交给标准库处理
+        pass
+    return _stdlib_dumps(obj, sort_keys=sort_keys, default=default)
+
+
+def dumps_str(obj: Any, sort_keys: bool = False, default: Optional[Callable[[Any], Any]] = None) -> str:
+    """把对象编码为JSON字符串，参数同dumps"""
+    return dumps(obj, sort_keys=sort_keys, default=default).decode("utf-8")
+
+
+def loads(data: JSONInput) -> Any:
+    """解析JSON
+
+    Args:
+        data: JSON字节或字符串
+
+    Returns:
+        Any: 解析后的对象
+
+    Raises:
+        ValueError: 不是合法的JSON（json.JSONDecodeError也是ValueError的子类）
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    if msgspec is not None:
+        try:
+            return _msgspec_decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+    return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+def preview(data: JSONInput, limit: int = 500) -> str:
+    """截取已编码JSON的开头部分用于日志，不重新序列化
+
+    Args:
+        data: JSON字节或字符串
+        limit: 最多保留的字节（字符）数
+
+    Returns:
+        str: 截取后的文本，被截断时以...结尾
+    """
+    if isinstance(data, str):
+        return data if len(data) <= limit else data[:limit] + "..."
+    text = bytes(data[:limit]).decode("utf-8", errors="ignore")
+    return text if len(data) <= limit else text + "..."
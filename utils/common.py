@@ -13,11 +13,16 @@ def handle_error(error: Exception, context: str = "") -> Dict[str, Any]:
         context: 错误发生的上下文信息
         
     Returns:
-        包含错误信息的字典
+        包含错误信息的字典，异常带有details属性时附加其中的字段
     """
     error_msg = f"{context}: {str(error)}" if context else str(error)
     logger.error(error_msg, exc_info=True)
-    return {"error": error_msg}
+    result = {"error": error_msg}
+    # 带结构化详情的异常（如熔断异常）附加详情字段
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        result.update(details)
+    return result
 
 
 def handle_http_error(error: Exception, context: str = "") -> None:
@@ -21,6 +21,7 @@ class MCPConfig(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 6688
     path: str = "/mcp"
+    workers: int = 1  # 工作进程数量，大于1时启用多工作进程模式（仅Linux/macOS）
     
     class Config:
         env_prefix = "MCP_"
@@ -58,6 +59,7 @@ MCP_SERVER_CONFIG = {
     "host": mcp_config.host,
     "port": mcp_config.port,
     "path": mcp_config.path,
+    "workers": mcp_config.workers,
 }
 
 WEB_CONFIG = {
@@ -65,3 +67,14 @@ WEB_CONFIG = {
     "port": web_config.port,
     "reload": web_config.reload,
 }
+
+# 多SAP系统配置（可选），为空时MCP服务器只连接SAP_CONFIG中的系统
+# 键为系统名称，未填写的连接配置项继承SAP_CONFIG；prefixes为路由到该系统的TOOL_ID前缀，
+# default为True的系统处理没有匹配前缀的工具（没有时使用第一个系统）；
+# 可选的max_connections/max_keepalive_connections设置该系统的连接池，concurrency设置该系统的限流配置
+SAP_SYSTEMS = {
+    # "DEV": {"base_url": "http://sap-s4d-app.example.com:8000/sap/zmcp", "client_id": 300, "default": True},
+    # "PRD": {"base_url": "http://sap-s4p-app.example.com:8000/sap/zmcp", "client_id": 800,
+    #         "sap-user": "YOUR_SAP_USER", "sap-password": "YOUR_SAP_PASSWORD",
+    #         "prefixes": ["ZPRD_"], "max_connections": 20, "concurrency": {"max_limit": 10}},
+}
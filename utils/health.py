@@ -0,0 +1,131 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from utils.logging_config import get_logger
+
+# 获取logger实例
+logger = get_logger(__name__)
+
+# 健康检查配置
+HEALTH_CONFIG = {
+    "interval": 15.0,  # 后台探测间隔（秒），负载均衡器的探测频率与此无关
+    "timeout": 5.0,  # 单项探测的超时时间（秒）
+    "stale_after": 60.0,  # 结果超过该时间未刷新时视为不可用（探测任务卡住或已停止）
+    "sap_ping_function_id": "PING",  # SAP侧的轻量探测接口ID，见Request/PING.md
+}
+
+# 单项检查状态
+STATUS_UP = "up"
+STATUS_DOWN = "down"
+STATUS_UNKNOWN = "unknown"
+
+# 检查函数：成功时返回附加信息（可以为None），失败时抛出异常
+CheckFunction = Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class HealthProber:
+    """后台健康探测器
+
+    按固定间隔在后台执行各项检查并缓存结果，健康检查接口只读取缓存，
+    不会因为负载均衡器频繁探测而给SAP或MCP服务器带来额外负载。
+    关键检查（critical）全部正常且结果未过期时才视为就绪。
+    """
+
+    def __init__(
+        self,
+        checks: Dict[str, CheckFunction],
+        critical: Optional[Iterable[str]] = None,
+        interval: Optional[float] = None,
+        timeout: Optional[float] = None,
+        stale_after: Optional[float] = None
+    ):
+        """初始化探测器
+
+        Args:
+            checks: 检查名称到检查函数的映射
+            critical: 决定是否就绪的检查名称，None表示全部检查
+            interval: 探测间隔（秒），None表示使用HEALTH_CONFIG
+            timeout: 单项探测超时（秒），None表示使用HEALTH_CONFIG
+            stale_after: 结果过期时间（秒），None表示使用HEALTH_CONFIG
+        """
+        self.checks = dict(checks)
+        self.critical = set(critical) if critical is not None else set(self.checks)
+        self.interval = interval if interval is not None else HEALTH_CONFIG["interval"]
+        self.timeout = timeout if timeout is not None else HEALTH_CONFIG["timeout"]
+        self.stale_after = stale_after if stale_after is not None else HEALTH_CONFIG["stale_after"]
+        self._results: Dict[str, Dict[str, Any]] = {
+            name: {"status": STATUS_UNKNOWN, "checked_at": None} for name in self.checks
+        }
+        self._task: Optional[asyncio.Task] = None
+        self.started_at = time.time()
+
+    async def start(self) -> None:
+        """启动后台探测任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台探测任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self.interval)
+
+    async def probe_all(self) -> None:
+        """并发执行所有检查并更新缓存结果"""
+        await asyncio.gather(*(self._probe(name, check) for name, check in self.checks.items()))
+
+    async def _probe(self, name: str, check: CheckFunction) -> None:
+        start_time = time.monotonic()
+        try:
+            detail = await asyncio.wait_for(check(), timeout=self.timeout)
+            result = {"status": STATUS_UP}
+            if detail:
+                result["detail"] = detail
+        except asyncio.TimeoutError:
+            result = {"status": STATUS_DOWN, "error": f"探测超时({self.timeout}秒)"}
+        except Exception as e:
+            result = {"status": STATUS_DOWN, "error": str(e) or type(e).__name__}
+        result["latency_ms"] = round((time.monotonic() - start_time) * 1000, 3)
+        result["checked_at"] = time.time()
+
+        previous = self._results.get(name, {}).get("status")
+        if previous != result["status"] and previous != STATUS_UNKNOWN:
+            log = logger.info if result["status"] == STATUS_UP else logger.warning
+            log(f"健康检查 {name} 状态变化: {previous} -> {result['status']} {result.get('error', '')}".rstrip())
+        self._results[name] = result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """读取缓存的检查结果
+
+        Returns:
+            dict: ready表示是否就绪，checks为每项检查的状态、耗时和结果的存在时间（age_seconds）
+        """
+        now = time.time()
+        checks = {}
+        ready = True
+        for name, result in self._results.items():
+            item = dict(result)
+            checked_at = result.get("checked_at")
+            item["age_seconds"] = round(now - checked_at, 3) if checked_at is not None else None
+            if checked_at is not None and now - checked_at > self.stale_after:
+                item["stale"] = True
+            item["critical"] = name in self.critical
+            if name in self.critical and (item["status"] != STATUS_UP or item.get("stale")):
+                ready = False
+            checks[name] = item
+        return {
+            "ready": ready,
+            "running": self._task is not None and not self._task.done(),
+            "interval": self.interval,
+            "checks": checks,
+        }
@@ -0,0 +1,297 @@
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils import codec
+
+# JSON lines日志索引配置
+# 每个日志文件旁有一个 <文件名>.idx 索引文件，每行记录一个数据块（连续写入的若干条日志）的
+# 字节范围、时间范围、日志级别和工具ID，查询时据此跳过不相关的数据块
+LOG_INDEX_CONFIG = {
+    "block_records": 500,  # 每个数据块的最大日志条数
+    "block_bytes": 256 * 1024,  # 每个数据块的最大字节数
+    "max_block_tools": 64,  # 数据块中记录的工具ID数量上限，超过后不记录（查询时需要扫描该块）
+    "read_chunk": 64 * 1024,  # 反向读取文件时每次读取的字节数
+}
+
+
+def index_path(log_path: str) -> str:
+    """日志文件对应的索引文件路径"""
+    return log_path + ".idx"
+
+
+def parse_time(value: Any) -> Optional[float]:
+    """解析查询参数中的时间
+
+    Args:
+        value: Unix时间戳，或ISO格式的本地时间（如 2024-01-01T08:00:00 / 2024-01-01 08:00）
+
+    Returns:
+        Optional[float]: Unix时间戳，value为空时返回None
+
+    Raises:
+        ValueError: 无法解析
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(str(value).strip()).timestamp()
+
+
+def format_entry(entry: Dict[str, Any]) -> str:
+    """把JSON日志记录格式化为与文本日志相同的格式"""
+    timestamp = str(entry.get("time", "")).replace("T", " ").replace(".", ",")
+    line = f"{timestamp} - {entry.get('logger', '')} - {entry.get('level', '')} - {entry.get('message', '')}"
+    if entry.get("exception"):
+        line += "\n" + entry["exception"]
+    return line
+
+
+def read_lines_reverse(f, start: int, end: int, chunk_size: int) -> Iterator[Tuple[int, bytes]]:
+    """从后向前读取文件中[start, end)范围内的行
+
+    Args:
+        f: 以二进制模式打开的文件
+        start: 起始字节偏移
+        end: 结束字节偏移
+        chunk_size: 每次读取的字节数
+
+    Yields:
+        tuple: (行起始偏移, 行内容)，从最后一行开始
+    """
+    position = end
+    remainder = b""
+    while position > start:
+        read_size = min(chunk_size, position - start)
+        position -= read_size
+        f.seek(position)
+        data = f.read(read_size) + remainder
+        lines = data.split(b"\n")
+        # 第一段可能是不完整的行，留到下次读取
+        remainder = lines.pop(0)
+        line_end = position + len(data)
+        for line in reversed(lines):
+            line_end -= len(line) + 1
+            if line:
+                yield line_end + 1, line
+    if remainder:
+        yield start, remainder
+
+
+class LogStore:
+    """JSON lines日志查询
+
+    按从新到旧的顺序查询当前日志文件和轮转备份（.1、.2……），
+    利用索引文件跳过时间范围、日志级别或工具ID不匹配的数据块，
+    查询耗时与结果数量成正比，而不是与文件大小成正比。
+    """
+
+    def __init__(self, log_path: str, backup_count: int = 5):
+        """初始化日志查询
+
+        Args:
+            log_path: JSON lines日志文件路径
+            backup_count: 轮转备份数量
+        """
+        self.log_path = log_path
+        self.backup_count = backup_count
+
+    def exists(self) -> bool:
+        """日志文件是否存在"""
+        return os.path.exists(self.log_path)
+
+    def files(self) -> List[Tuple[str, int, int]]:
+        """当前日志文件和轮转备份，按从新到旧排序
+
+        Returns:
+            list: (文件路径, inode, 文件大小)
+        """
+        paths = [self.log_path] + [f"{self.log_path}.{index}" for index in range(1, self.backup_count + 1)]
+        files = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((path, stat.st_ino, stat.st_size))
+        return files
+
+    def segments(self, path: str, size: int) -> List[Dict[str, Any]]:
+        """把日志文件划分为数据块，按偏移排序
+
+        索引中的数据块之间没有覆盖的范围（其他进程写入的日志、尚未写入索引的最新日志）
+        作为未索引的数据块返回，查询时总是扫描。
+
+        Args:
+            path: 日志文件路径
+            size: 文件大小
+
+        Returns:
+            list: 数据块列表，索引块包含o、l、t0、t1、lv、tools字段，未索引块只有o、l
+        """
+        blocks = []
+        try:
+            with open(index_path(path), "rb") as f:
+                for line in f:
+                    try:
+                        block = codec.loads(line)
+                    except ValueError:
+                        continue
+                    if block["o"] + block["l"] <= size:
+                        blocks.append(block)
+        except OSError:
+            pass
+        blocks.sort(key=lambda block: block["o"])
+
+        segments = []
+        position = 0
+        for block in blocks:
+            if block["o"] < position:
+                # 与前一个数据块重叠（索引损坏），忽略
+                continue
+            if block["o"] > position:
+                segments.append({"o": position, "l": block["o"] - position})
+            segments.append(block)
+            position = block["o"] + block["l"]
+        if position < size:
+            segments.append({"o": position, "l": size - position})
+        return segments
+
+    def query(
+        self,
+        levels: Optional[List[str]] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        tool: Optional[str] = None,
+        text: Optional[str] = None,
+        limit: int = 200,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """查询日志，从新到旧返回
+
+        Args:
+            levels: 日志级别列表，None表示所有级别
+            start: 起始时间（Unix时间戳）
+            end: 结束时间（Unix时间戳）
+            tool: 工具ID，只返回tool_id字段等于该值的日志
+            text: 消息中包含的文本
+            limit: 最多返回的条数
+            cursor: 上一页返回的next_cursor
+
+        Returns:
+            dict: {"entries": [...], "next_cursor": 下一页游标或None, "scanned_bytes": 读取的字节数}
+        """
+        level_set = {level.upper() for level in levels} if levels else None
+        cursor_inode, cursor_offset = self._parse_cursor(cursor)
+        entries: List[Dict[str, Any]] = []
+        scanned = 0
+        chunk_size = LOG_INDEX_CONFIG["read_chunk"]
+
+        files = self.files()
+        if cursor_inode is not None:
+            inodes = [inode for _, inode, _ in files]
+            if cursor_inode not in inodes:
+                # 游标对应的文件已被删除
+                return {"entries": [], "next_cursor": None, "scanned_bytes": 0}
+            files = files[inodes.index(cursor_inode):]
+
+        for path, inode, size in files:
+            limit_offset = cursor_offset if inode == cursor_inode else size
+            try:
+                f = open(path, "rb")
+            except OSError:
+                continue
+            with f:
+                for segment in reversed(self.segments(path, size)):
+                    if segment["o"] >= limit_offset:
+                        continue
+                    if "t0" in segment:
+                        if start is not None and segment["t1"] < start:
+                            # 更早的数据块都在时间范围之前
+                            return {"entries": entries, "next_cursor": None, "scanned_bytes": scanned}
+                        if end is not None and segment["t0"] > end:
+                            continue
+                        if level_set is not None and not level_set.intersection(segment["lv"]):
+                            continue
+                        if tool is not None and segment.get("tools") is not None and tool not in segment["tools"]:
+                            continue
+
+                    segment_end = min(segment["o"] + segment["l"], limit_offset)
+                    scanned += segment_end - segment["o"]
+                    for offset, line in read_lines_reverse(f, segment["o"], segment_end, chunk_size):
+                        try:
+                            entry = codec.loads(line)
+                        except ValueError:
+                            # 不完整的行（正在写入或被截断）
+                            continue
+                        if not isinstance(entry, dict):
+                            continue
+                        ts = entry.get("ts", 0)
+                        if end is not None and ts > end:
+                            continue
+                        if start is not None and ts < start:
+                            continue
+                        if level_set is not None and entry.get("level") not in level_set:
+                            continue
+                        if tool is not None and entry.get("tool_id") != tool:
+                            continue
+                        if text and text not in str(entry.get("message", "")):
+                            continue
+                        entries.append(entry)
+                        if len(entries) >= limit:
+                            return {
+                                "entries": entries,
+                                "next_cursor": f"{inode}:{offset}",
+                                "scanned_bytes": scanned
+                            }
+
+        return {"entries": entries, "next_cursor": None, "scanned_bytes": scanned}
+
+    @staticmethod
+    def _parse_cursor(cursor: Optional[str]) -> Tuple[Optional[int], int]:
+        if not cursor:
+            return None, 0
+        try:
+            inode, offset = cursor.split(":", 1)
+            return int(inode), int(offset)
+        except ValueError:
+            raise ValueError(f"无效的游标: {cursor}")
+
+    def clear(self) -> None:
+        """清空当前日志文件和索引（轮转备份保留）"""
+        for path in (self.log_path, index_path(self.log_path)):
+            if os.path.exists(path):
+                with open(path, "w", encoding="utf-8"):
+                    pass
+
+
+def tail_text_log(log_path: str, level: Optional[str] = None, limit: int = 1000) -> List[str]:
+    """从文本日志末尾读取最近的日志行（不读取整个文件）
+
+    Args:
+        log_path: 文本日志文件路径
+        level: 日志级别，None或all表示所有级别
+        limit: 最多返回的行数
+
+    Returns:
+        list: 日志行，按时间顺序排列
+    """
+    if not os.path.exists(log_path):
+        return []
+    lines: List[str] = []
+    marker = f" {level} " if level and level != "all" else None
+    with open(log_path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        for _, line in read_lines_reverse(f, 0, size, LOG_INDEX_CONFIG["read_chunk"]):
+            text = line.decode("utf-8", errors="replace")
+            if marker is not None and marker not in text:
+                continue
+            lines.append(text)
+            if len(lines) >= limit:
+                break
+    lines.reverse()
+    return lines
@@ -0,0 +1,231 @@
+import asyncio
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from utils import codec
+from utils.log_store import format_entry
+from utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# 实时日志跟踪配置
+LOG_TAIL_CONFIG = {
+    "poll_interval": 0.5,  # 检查日志文件变化的间隔（秒）
+    "max_read_bytes": 1024 * 1024,  # 每个文件单次最多读取的字节数
+    "subscriber_queue": 2000,  # 每个订阅者的缓冲条数，客户端消费太慢时丢弃最旧的日志
+    "heartbeat": 15.0,  # 没有新日志时发送心跳的间隔（秒）
+    "max_batch": 200,  # 单个SSE事件最多包含的日志条数
+}
+
+# 文本日志行格式：2024-01-01 08:00:00,000 - logger - LEVEL - message
+_TEXT_LINE_PATTERN = re.compile(r"^\S+ \S+ - (?P<logger>.*?) - (?P<level>DEBUG|INFO|WARNING|ERROR|CRITICAL) - ")
+
+
+def parse_text_line(source: str, line: str) -> Dict[str, Any]:
+    """解析文本日志行"""
+    match = _TEXT_LINE_PATTERN.match(line)
+    return {
+        "source": source,
+        "level": match.group("level") if match else None,
+        "tool_id": None,
+        "line": line,
+    }
+
+
+def parse_json_line(source: str, line: str) -> Optional[Dict[str, Any]]:
+    """解析JSON lines日志行"""
+    try:
+        entry = codec.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(entry, dict):
+        return None
+    return {
+        "source": source,
+        "level": entry.get("level"),
+        "tool_id": entry.get("tool_id"),
+        "line": format_entry(entry),
+    }
+
+
+class FileFollower:
+    """按字节偏移跟踪文件新增的行
+
+    文件被轮转（inode变化）时先读完轮转后的 .1 文件中剩余的内容，再从新文件开头读取；
+    文件被截断（清空日志）时从开头读取。不依赖inotify，Windows和Linux都可用。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.inode: Optional[int] = None
+        self.offset = 0
+        self._partial = b""
+
+    def read_new_lines(self) -> List[str]:
+        """读取上次读取之后新增的完整行
+
+        Returns:
+            list: 新增的行，第一次调用时从文件末尾开始，返回空列表
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return []
+
+        if self.inode is None:
+            # 第一次调用，从文件末尾开始跟踪
+            self.inode, self.offset = stat.st_ino, stat.st_size
+            return []
+
+        data = b""
+        if stat.st_ino != self.inode:
+            data = self._read_rotated_remainder()
+            self.inode, self.offset = stat.st_ino, 0
+        elif stat.st_size < self.offset:
+            # 文件被截断
+            self.offset = 0
+            self._partial = b""
+
+        if stat.st_size > self.offset:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                chunk = f.read(min(stat.st_size - self.offset, LOG_TAIL_CONFIG["max_read_bytes"]))
+            self.offset += len(chunk)
+            data += chunk
+
+        if not data:
+            return []
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        return [line.decode("utf-8", errors="replace").rstrip("\r") for line in lines if line.strip()]
+
+    def _read_rotated_remainder(self) -> bytes:
+        """读取已轮转文件中尚未读取的内容"""
+        rotated = self.path + ".1"
+        try:
+            if os.stat(rotated).st_ino != self.inode:
+                return b""
+            with open(rotated, "rb") as f:
+                f.seek(self.offset)
+                return f.read(LOG_TAIL_CONFIG["max_read_bytes"])
+        except OSError:
+            return b""
+
+
+class LogSubscription:
+    """一个实时日志客户端的订阅（过滤条件和有界缓冲）"""
+
+    def __init__(self, sources: Optional[Set[str]], levels: Optional[Set[str]], tool: Optional[str]):
+        self.sources = sources
+        self.levels = levels
+        self.tool = tool
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=LOG_TAIL_CONFIG["subscriber_queue"])
+        self.dropped = 0
+
+    def matches(self, entry: Dict[str, Any]) -> bool:
+        """日志是否满足订阅的过滤条件"""
+        if self.sources is not None and entry["source"] not in self.sources:
+            return False
+        if self.levels is not None and entry["level"] not in self.levels:
+            return False
+        if self.tool is not None:
+            if entry["tool_id"] is not None:
+                return entry["tool_id"] == self.tool
+            return self.tool in entry["line"]
+        return True
+
+    def put(self, entry: Dict[str, Any]) -> None:
+        """放入缓冲，缓冲已满时丢弃最旧的日志，不阻塞其他客户端"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(entry)
+
+    def drain(self, max_items: int) -> List[Dict[str, Any]]:
+        """取出缓冲中已有的日志"""
+        items = []
+        while len(items) < max_items and not self.queue.empty():
+            items.append(self.queue.get_nowait())
+        return items
+
+
+class LogTailHub:
+    """实时日志分发
+
+    每个日志文件只由一个后台任务读取，新增的行按各订阅者的过滤条件分发，
+    没有订阅者时后台任务自动停止。
+    """
+
+    def __init__(self, sources: Dict[str, Any]):
+        """初始化日志分发
+
+        Args:
+            sources: 日志来源名称到(文件路径, 行解析函数)的映射
+        """
+        self.sources: Dict[str, Any] = sources
+        self._followers: Dict[str, FileFollower] = {}
+        self._subscribers: List[LogSubscription] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(
+        self,
+        sources: Optional[Set[str]] = None,
+        levels: Optional[Set[str]] = None,
+        tool: Optional[str] = None
+    ) -> LogSubscription:
+        """订阅实时日志
+
+        Args:
+            sources: 日志来源，None表示所有来源
+            levels: 日志级别，None表示所有级别
+            tool: 工具ID
+
+        Returns:
+            LogSubscription: 订阅，使用完后需调用unsubscribe
+        """
+        subscription = LogSubscription(sources, levels, tool)
+        self._subscribers.append(subscription)
+        if self._task is None or self._task.done():
+            self._followers = {name: FileFollower(path) for name, (path, _) in self.sources.items()}
+            # 先定位到文件末尾，只推送订阅之后的日志
+            for follower in self._followers.values():
+                follower.read_new_lines()
+            self._task = asyncio.create_task(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription: LogSubscription) -> None:
+        """取消订阅"""
+        if subscription in self._subscribers:
+            self._subscribers.remove(subscription)
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._subscribers:
+            try:
+                for name, follower in self._followers.items():
+                    # 文件读取放到线程池，不阻塞事件循环
+                    lines = await loop.run_in_executor(None, follower.read_new_lines)
+                    if not lines:
+                        continue
+                    parse: Callable[[str, str], Optional[Dict[str, Any]]] = self.sources[name][1]
+                    for line in lines:
+                        entry = parse(name, line)
+                        if entry is None:
+                            continue
+                        for subscription in self._subscribers:
+                            if subscription.matches(entry):
+                                subscription.put(entry)
+            except Exception as e:
+                logger.warning(f"读取实时日志失败: {str(e)}")
+            await asyncio.sleep(LOG_TAIL_CONFIG["poll_interval"])
+
+    def stats(self) -> Dict[str, Any]:
+        """获取实时日志分发状态"""
+        return {
+            "subscribers": len(self._subscribers),
+            "dropped": sum(subscription.dropped for subscription in self._subscribers),
+        }
@@ -1,7 +1,467 @@
+import atexit
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
-from typing import Optional
+import queue
+import random
+import re
+import threading
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import QueueHandler, RotatingFileHandler
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Windows没有fcntl，也不支持多工作进程模式
+    fcntl = None
+
+from utils import codec
+from utils.log_store import LOG_INDEX_CONFIG, index_path
+
+
+# 异步日志管道配置
+# 日志记录先放入有界队列，由后台线程批量写入文件和控制台，请求线程（事件循环）不做文件I/O
+LOG_PIPELINE_CONFIG = {
+    "enabled": True,  # False表示直接在调用线程写日志
+    "queue_size": 10000,  # 队列容量
+    "policy": "drop",  # 队列满时的策略：drop丢弃INFO及以下日志（WARNING及以上短暂等待），block一直等待
+    "block_timeout": 0.05,  # drop策略下WARNING及以上日志等待队列空位的时间（秒）
+    "batch_size": 200,  # 后台线程单次写入的最大日志条数
+    "json_lines": True,  # 同时输出带索引的JSON lines日志（与文本日志同名，扩展名.jsonl），/api/logs从中查询
+}
+
+# LogRecord的标准属性，其余属性（logger.info(..., extra={...})传入）写入JSON lines日志
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """把日志记录格式化为一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        return codec.dumps_str(entry, default=str)
+
+
+class BatchRotatingFileHandler(RotatingFileHandler):
+    """支持批量写入的轮转文件handler，一批日志只写一次并flush一次
+
+    Web管理端、MCP服务器和它的工作进程写同一个日志文件。每批日志在进程间文件锁
+    （<文件名>.lock）内写入和轮转，写入前检查文件是否已被其他进程轮转，是则重新打开，
+    不会继续写入已改名的旧文件，也不会再次轮转覆盖其他进程刚生成的备份。
+    """
+
+    def __init__(self, filename: str, **kwargs):
+        super().__init__(filename, **kwargs)
+        self._lock_file = None
+        self._lock_pid: Optional[int] = None
+
+    def _process_lock(self):
+        """进程间文件锁（调用方需持有handler的锁），不支持fcntl的平台不加锁"""
+        if fcntl is None:
+            return nullcontext()
+        if self._lock_pid != os.getpid():
+            # fork出的子进程与父进程共用打开的文件描述，flock互不排斥，需要重新打开
+            self._lock_file = open(self.baseFilename + ".lock", "a")
+            self._lock_pid = os.getpid()
+        return _FileLock(self._lock_file)
+
+    def _reopen_if_rotated(self) -> None:
+        """日志文件已被其他进程轮转或删除时关闭旧文件，之后写入新文件（调用方需持有锁）"""
+        if self.stream is None:
+            return
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            current = None
+        opened = os.fstat(self.stream.fileno())
+        if current is not None and (current.st_ino, current.st_dev) == (opened.st_ino, opened.st_dev):
+            return
+        self._rotated_elsewhere(opened)
+        self.stream.close()
+        self.stream = None
+
+    def _rotated_elsewhere(self, opened: os.stat_result) -> None:
+        """打开的文件已被其他进程轮转（子类在此处理与旧文件相关的状态）
+
+        Args:
+            opened: 旧文件的状态
+        """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.emit_batch([record])
+
+    def emit_batch(self, records: List[logging.LogRecord]) -> None:
+        """批量写入日志
+
+        Args:
+            records: 日志记录列表
+        """
+        if not records:
+            return
+        self.acquire()
+        try:
+            with self._process_lock():
+                self._write_batch(records)
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+    def _write_batch(self, records: List[logging.LogRecord]) -> None:
+        """写入一批日志，需要时轮转（调用方需持有handler的锁和进程间文件锁）"""
+        self._reopen_if_rotated()
+        if self.stream is None:
+            self.stream = self._open()
+        pending: List[Tuple[logging.LogRecord, str, int]] = []
+        # 其他进程可能已追加日志，按文件实际大小判断是否需要轮转
+        size = self.stream.seek(0, os.SEEK_END)
+        for record in records:
+            try:
+                text = self.format(record) + self.terminator
+            except Exception:
+                self.handleError(record)
+                continue
+            length = len(text.encode(self.encoding or "utf-8", errors="replace"))
+            if self.maxBytes > 0 and size > 0 and size + length >= self.maxBytes:
+                # 写入本文件之前的日志后再轮转
+                self._write_chunk(pending)
+                pending = []
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+                size = 0
+            pending.append((record, text, length))
+            size += length
+        self._write_chunk(pending)
+        self.stream.flush()
+
+    def close(self) -> None:
+        self.acquire()
+        try:
+            if self._lock_file is not None and self._lock_pid == os.getpid():
+                self._lock_file.close()
+            self._lock_file = None
+            self._lock_pid = None
+        finally:
+            self.release()
+        super().close()
+
+    def _write_chunk(self, pending: List[Tuple[logging.LogRecord, str, int]]) -> None:
+        """一次写入多条已格式化的日志
+
+        Args:
+            pending: (日志记录, 格式化文本, 字节数)列表
+        """
+        if pending:
+            self.stream.write("".join(text for _, text, _ in pending))
+
+
+class IndexedJSONLinesHandler(BatchRotatingFileHandler):
+    """JSON lines日志handler，同时维护旁路索引文件（格式见utils.log_store）
+
+    每个索引块只覆盖本进程连续写入的日志，其他进程写入同一文件的日志落在索引块之间，
+    查询时作为未索引范围扫描。文件被其他进程轮转后，本进程尚未写入的索引块写入
+    旧文件（轮转后的备份）的索引，不会混入新文件的索引。
+    """
+
+    def __init__(self, filename: str, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.setFormatter(JSONLinesFormatter())
+        self._block: Optional[Dict[str, Any]] = None
+
+    def _write_chunk(self, pending: List[Tuple[logging.LogRecord, str, int]]) -> None:
+        if not pending:
+            return
+        super()._write_chunk(pending)
+        self.stream.flush()
+        length = sum(size for _, _, size in pending)
+        offset = self.stream.tell() - length
+
+        block = self._block
+        if block is None or block["o"] + block["l"] != offset:
+            # 与上一个索引块不连续（其他进程写入了日志），开始新的索引块
+            self._close_block()
+            block = self._block = {"o": offset, "l": 0, "n": 0, "t0": None, "t1": None, "lv": set(), "tools": set()}
+
+        for record, _, size in pending:
+            block["l"] += size
+            block["n"] += 1
+            block["t0"] = record.created if block["t0"] is None else min(block["t0"], record.created)
+            block["t1"] = record.created if block["t1"] is None else max(block["t1"], record.created)
+            block["lv"].add(record.levelname)
+            tool_id = getattr(record, "tool_id", None)
+            if tool_id is not None and block["tools"] is not None:
+                block["tools"].add(str(tool_id))
+                if len(block["tools"]) > LOG_INDEX_CONFIG["max_block_tools"]:
+                    block["tools"] = None
+
+        if block["n"] >= LOG_INDEX_CONFIG["block_records"] or block["l"] >= LOG_INDEX_CONFIG["block_bytes"]:
+            self._close_block()
+
+    def _close_block(self, log_path: Optional[str] = None) -> None:
+        """把当前索引块写入索引文件
+
+        Args:
+            log_path: 索引块所属的日志文件，None表示当前日志文件
+        """
+        block, self._block = self._block, None
+        if block is None or block["n"] == 0:
+            return
+        entry = dict(block, lv=sorted(block["lv"]))
+        if block["tools"] is not None:
+            entry["tools"] = sorted(block["tools"])
+        try:
+            with open(index_path(log_path or self.baseFilename), "ab") as f:
+                f.write(codec.dumps(entry) + b"\n")
+        except OSError:
+            pass
+
+    def _rotated_elsewhere(self, opened: os.stat_result) -> None:
+        # 按inode找到旧文件轮转后的备份，找不到（已被删除）时丢弃索引块
+        for index in range(1, self.backupCount + 1):
+            path = f"{self.baseFilename}.{index}"
+            try:
+                backup = os.stat(path)
+            except OSError:
+                continue
+            if (backup.st_ino, backup.st_dev) == (opened.st_ino, opened.st_dev):
+                self._close_block(path)
+                return
+        self._block = None
+
+    def doRollover(self) -> None:
+        self._close_block()
+        # 索引文件与日志文件一起轮转
+        for index in range(self.backupCount - 1, 0, -1):
+            source = index_path(f"{self.baseFilename}.{index}")
+            target = index_path(f"{self.baseFilename}.{index + 1}")
+            if os.path.exists(source):
+                os.replace(source, target)
+        if self.backupCount > 0 and os.path.exists(index_path(self.baseFilename)):
+            os.replace(index_path(self.baseFilename), index_path(f"{self.baseFilename}.1"))
+        elif os.path.exists(index_path(self.baseFilename)):
+            os.remove(index_path(self.baseFilename))
+        super().doRollover()
+
+    def close(self) -> None:
+        self.acquire()
+        try:
+            if self.stream is not None:
+                with self._process_lock():
+                    self._reopen_if_rotated()
+                    self._close_block()
+        except Exception:
+            pass
+        finally:
+            self.release()
+        super().close()
+
+
+class _FileLock:
+    """fcntl.flock排他锁的上下文管理器"""
+
+    def __init__(self, file):
+        self.file = file
+
+    def __enter__(self):
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        return False
+
+
+class BatchStreamHandler(logging.StreamHandler):
+    """支持批量写入的控制台handler"""
+
+    def emit_batch(self, records: List[logging.LogRecord]) -> None:
+        """批量写入日志
+
+        Args:
+            records: 日志记录列表
+        """
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.format(record) + self.terminator)
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        self.acquire()
+        try:
+            self.stream.write("".join(lines))
+            self.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+
+class BoundedQueueHandler(QueueHandler):
+    """把日志记录放入有界队列的handler
+
+    消息参数（如LazyPayload）留给后台线程格式化；异常堆栈在当前线程格式化，
+    避免后台线程持有调用栈。
+    """
+
+    def __init__(self, log_queue: "queue.Queue", policy: str = "drop", block_timeout: float = 0.05):
+        super().__init__(log_queue)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.policy == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.WARNING:
+                try:
+                    self.queue.put(record, timeout=self.block_timeout)
+                    return
+                except queue.Full:
+                    pass
+            self.dropped += 1
+
+
+class BatchingQueueListener:
+    """从队列中批量取出日志记录并交给handler写入的后台线程"""
+
+    _SENTINEL = None
+
+    def __init__(self, log_queue: "queue.Queue", handlers: List[logging.Handler], batch_size: int = 200,
+                 queue_handler: Optional[BoundedQueueHandler] = None):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.queue_handler = queue_handler
+        self._thread: Optional[threading.Thread] = None
+        # 写日志期间持有，fork前获取，保证子进程不会继承写到一半的文件和控制台缓冲区
+        self.write_lock = threading.Lock()
+        self._reported_dropped = 0
+        self.batches = 0
+        self.records = 0
+
+    def start(self) -> None:
+        """启动后台线程"""
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """写完队列中剩余的日志后停止后台线程"""
+        if self._thread is None:
+            return
+        self.queue.put(self._SENTINEL)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            record = self.queue.get()
+            batch = [record]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = self._SENTINEL in batch
+            with self.write_lock:
+                self._handle([record for record in batch if record is not self._SENTINEL])
+            if stopping:
+                return
+
+    def _handle(self, records: List[logging.LogRecord]) -> None:
+        dropped = self.queue_handler.dropped if self.queue_handler is not None else 0
+        if dropped > self._reported_dropped:
+            records.append(logging.LogRecord(
+                "utils.logging_config", logging.WARNING, __file__, 0,
+                "日志队列已满，已丢弃 %d 条日志", (dropped - self._reported_dropped,), None
+            ))
+            self._reported_dropped = dropped
+        if not records:
+            return
+        self.batches += 1
+        self.records += len(records)
+        for handler in self.handlers:
+            selected = [record for record in records if record.levelno >= handler.level and handler.filter(record)]
+            if not selected:
+                continue
+            if hasattr(handler, "emit_batch"):
+                handler.emit_batch(selected)
+            else:
+                for record in selected:
+                    handler.handle(record)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取日志管道状态"""
+        return {
+            "queued": self.queue.qsize(),
+            "dropped": self.queue_handler.dropped if self.queue_handler is not None else 0,
+            "batches": self.batches,
+            "records": self.records,
+        }
+
+
+_exception_formatter = logging.Formatter()
+
+# 当前调用的日志上下文（如tool_id、function_id），由ContextFilter附加到日志记录
+_log_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """在上下文内的所有日志记录上附加字段（值为None的字段忽略）
+
+    字段会写入JSON lines日志，/api/logs可以按tool_id过滤。
+
+    Args:
+        **fields: 要附加的字段，如 tool_id="Z_MATERIAL"
+    """
+    token = _log_context.set({**_log_context.get(), **{key: value for key, value in fields.items() if value is not None}})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """把log_context中的字段附加到日志记录（在调用线程执行）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+# 当前的日志管道后台线程
+_listener: Optional[BatchingQueueListener] = None
 
 
 def setup_logging(
@@ -14,6 +474,9 @@ def setup_logging(
 ) -> logging.Logger:
     """设置日志配置
     
+    LOG_PIPELINE_CONFIG["enabled"]为True时，root logger只挂一个队列handler，
+    文件和控制台由后台线程批量写入。
+    
     Args:
         log_dir: 日志目录
         log_file: 日志文件名
@@ -25,6 +488,8 @@ def setup_logging(
     Returns:
         logging.Logger: 配置好的logger实例
     """
+    global _listener
+    
     # 创建日志目录
     os.makedirs(log_dir, exist_ok=True)
     log_file_path = os.path.join(log_dir, log_file)
@@ -33,9 +498,14 @@ def setup_logging(
     logger = logging.getLogger()
     logger.setLevel(level)
     
-    # 清空现有handler
-    for handler in logger.handlers:
+    # 清空现有handler，并停止之前的日志管道
+    for handler in list(logger.handlers):
         logger.removeHandler(handler)
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
     
     # 创建格式化器
     formatter = logging.Formatter(
@@ -43,7 +513,7 @@ def setup_logging(
     )
     
     # 创建文件handler（带轮转）
-    file_handler = RotatingFileHandler(
+    file_handler = BatchRotatingFileHandler(
         log_file_path,
         maxBytes=max_bytes,
         backupCount=backup_count,
@@ -51,17 +521,103 @@ def setup_logging(
     )
     file_handler.setLevel(level)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
     
     # 创建控制台handler
-    console_handler = logging.StreamHandler()
+    console_handler = BatchStreamHandler()
     console_handler.setLevel(console_level or level)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    
+    handlers: List[logging.Handler] = [file_handler, console_handler]
+    
+    # 可选的JSON lines日志
+    if LOG_PIPELINE_CONFIG["json_lines"]:
+        json_handler = IndexedJSONLinesHandler(
+            os.path.splitext(log_file_path)[0] + ".jsonl",
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding='utf-8'
+        )
+        json_handler.setLevel(level)
+        handlers.append(json_handler)
+    
+    if not LOG_PIPELINE_CONFIG["enabled"]:
+        for handler in handlers:
+            handler.addFilter(ContextFilter())
+            logger.addHandler(handler)
+        return logger
+    
+    # 异步日志管道：调用线程只把日志放入队列
+    log_queue: "queue.Queue" = queue.Queue(maxsize=LOG_PIPELINE_CONFIG["queue_size"])
+    queue_handler = BoundedQueueHandler(
+        log_queue,
+        policy=LOG_PIPELINE_CONFIG["policy"],
+        block_timeout=LOG_PIPELINE_CONFIG["block_timeout"]
+    )
+    queue_handler.addFilter(ContextFilter())
+    logger.addHandler(queue_handler)
+    _listener = BatchingQueueListener(log_queue, handlers, LOG_PIPELINE_CONFIG["batch_size"], queue_handler)
+    _listener.start()
     
     return logger
 
 
+def shutdown_logging() -> None:
+    """写完队列中剩余的日志并停止日志管道（进程退出时自动调用）"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            try:
+                handler.flush()
+            except (OSError, ValueError):
+                # 控制台等输出流可能已先于日志管道关闭
+                pass
+        _listener = None
+
+
+def log_pipeline_stats() -> Optional[Dict[str, Any]]:
+    """获取日志管道状态
+
+    Returns:
+        dict: 队列长度、丢弃数量等，未启用日志管道时返回None
+    """
+    return _listener.stats() if _listener is not None else None
+
+
+def _before_fork() -> None:
+    """fork前等待后台线程写完当前批次，避免子进程继承被占用的缓冲区锁"""
+    if _listener is not None:
+        _listener.write_lock.acquire()
+
+
+def _after_fork_in_parent() -> None:
+    if _listener is not None and _listener.write_lock.locked():
+        _listener.write_lock.release()
+
+
+def _restart_after_fork() -> None:
+    """fork出的子进程中重建日志队列并重新启动后台线程
+    
+    子进程不会复制父进程的后台线程，父进程队列中尚未写入的日志由父进程负责，
+    而且fork时队列的锁可能正被其他线程持有，因此子进程使用新的队列。
+    """
+    if _listener is None:
+        return
+    _listener.write_lock = threading.Lock()
+    if _listener._thread is None:
+        return
+    log_queue: "queue.Queue" = queue.Queue(maxsize=LOG_PIPELINE_CONFIG["queue_size"])
+    _listener.queue = log_queue
+    if _listener.queue_handler is not None:
+        _listener.queue_handler.queue = log_queue
+    _listener.start()
+
+
+atexit.register(shutdown_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=_before_fork, after_in_parent=_after_fork_in_parent, after_in_child=_restart_after_fork)
+
+
 # 创建默认logger
 default_logger = setup_logging()
 
@@ -81,3 +637,162 @@ def get_logger(name: str, level: Optional[int] = None) -> logging.Logger:
     if level is not None:
         logger.setLevel(level)
     return logger
+
+
+# 请求/响应数据日志配置（SAP请求热路径）
+PAYLOAD_LOG_CONFIG = {
+    "level": logging.INFO,  # 记录请求/响应数据的日志级别，设为logging.DEBUG可在生产环境关闭
+    "sample_rate": 1.0,  # 记录请求/响应数据的采样比例（0~1），按请求采样
+    "max_chars": 500,  # 数据预览的最大字符数
+    "max_items": 20,  # 预览中每个列表/字典最多展开的元素数
+    "redact_keys": {  # 需要脱敏的键（不区分大小写）
+        "password", "passwd", "pwd", "sap-password", "sap_password",
+        "authorization", "cookie", "set-cookie", "token", "access_token", "secret", "client_secret",
+    },
+}
+
+REDACTED = "***"
+
+# 已编码JSON文本中敏感键的值，如 "password":"abc"
+_SENSITIVE_TEXT_PATTERN = re.compile(
+    r'("(?:' + "|".join(re.escape(key) for key in sorted(PAYLOAD_LOG_CONFIG["redact_keys"])) + r')"\s*:\s*)"[^"]*"',
+    re.IGNORECASE
+)
+
+
+def _is_sensitive(key: Any) -> bool:
+    return isinstance(key, str) and key.lower() in PAYLOAD_LOG_CONFIG["redact_keys"]
+
+
+def redact(data: Any) -> Any:
+    """返回敏感键已脱敏的字典副本（只处理第一层，用于请求参数等小字典）
+
+    Args:
+        data: 字典或其他值
+
+    Returns:
+        Any: 脱敏后的字典，非字典原样返回
+    """
+    if not isinstance(data, dict):
+        return data
+    return {key: REDACTED if _is_sensitive(key) else value for key, value in data.items()}
+
+
+class LazyPayload:
+    """延迟生成的数据预览
+
+    只有日志记录真正被格式化时才生成预览。预览按max_chars截断，
+    对字典/列表边遍历边输出，达到长度后立即停止，不会序列化整个对象；
+    敏感键的值替换为***。已编码的JSON字节或字符串只截取开头部分。
+    """
+
+    __slots__ = ("data", "max_chars", "max_items", "_text")
+
+    def __init__(self, data: Any, max_chars: Optional[int] = None, max_items: Optional[int] = None):
+        self.data = data
+        self.max_chars = max_chars or PAYLOAD_LOG_CONFIG["max_chars"]
+        self.max_items = max_items or PAYLOAD_LOG_CONFIG["max_items"]
+        self._text: Optional[str] = None
+
+    def __str__(self) -> str:
+        # 同一条日志会被每个handler格式化一次，预览只生成一次
+        if self._text is None:
+            self._text = self._render()
+        return self._text
+
+    def _render(self) -> str:
+        if isinstance(self.data, (bytes, bytearray, memoryview, str)):
+            return self._preview_text()
+        parts = []
+        length = 0
+        for token in self._tokens(self.data, 0):
+            parts.append(token)
+            length += len(token)
+            if length >= self.max_chars:
+                return "".join(parts)[:self.max_chars] + "..."
+        return "".join(parts)
+
+    __repr__ = __str__
+
+    def _preview_text(self) -> str:
+        data = self.data
+        total = len(data)
+        if isinstance(data, str):
+            text = data[:self.max_chars]
+        else:
+            text = bytes(data[:self.max_chars]).decode("utf-8", errors="ignore")
+        text = _SENSITIVE_TEXT_PATTERN.sub(lambda match: f'{match.group(1)}"{REDACTED}"', text)
+        return text + "..." if total > self.max_chars else text
+
+    def _tokens(self, value: Any, depth: int) -> Iterator[str]:
+        if isinstance(value, dict):
+            if depth > 16:
+                yield "{...}"
+                return
+            yield "{"
+            for index, (key, item) in enumerate(value.items()):
+                if index >= self.max_items:
+                    yield f", ...(+{len(value) - index})"
+                    break
+                if index:
+                    yield ", "
+                yield f"{_scalar(key, self.max_chars)}: "
+                if _is_sensitive(key):
+                    yield f'"{REDACTED}"'
+                else:
+                    yield from self._tokens(item, depth + 1)
+            yield "}"
+        elif isinstance(value, (list, tuple)):
+            if depth > 16:
+                yield "[...]"
+                return
+            yield "["
+            for index, item in enumerate(value):
+                if index >= self.max_items:
+                    yield f", ...(+{len(value) - index})"
+                    break
+                if index:
+                    yield ", "
+                yield from self._tokens(item, depth + 1)
+            yield "]"
+        else:
+            yield _scalar(value, self.max_chars)
+
+
+def _scalar(value: Any, max_chars: int) -> str:
+    """标量的JSON形式预览，长字符串先截断再编码"""
+    if isinstance(value, str):
+        return json.dumps(value[:max_chars], ensure_ascii=False)
+    if value is None or isinstance(value, (bool, int, float)):
+        return json.dumps(value)
+    return repr(value)[:max_chars]
+
+
+def payload_sampled(logger: logging.Logger) -> bool:
+    """判断本次请求是否记录请求/响应数据
+
+    日志级别未启用时直接返回False，不做任何格式化；启用时按sample_rate采样。
+
+    Args:
+        logger: 记录数据的logger
+
+    Returns:
+        bool: 需要记录时返回True
+    """
+    if not logger.isEnabledFor(PAYLOAD_LOG_CONFIG["level"]):
+        return False
+    rate = PAYLOAD_LOG_CONFIG["sample_rate"]
+    return rate >= 1.0 or (rate > 0 and random.random() < rate)
+
+
+def log_payload(logger: logging.Logger, label: str, data: Any, sampled: bool = True) -> None:
+    """记录请求/响应数据预览（延迟格式化、截断、脱敏）
+
+    Args:
+        logger: logger实例
+        label: 日志标签，如"请求数据"
+        data: 数据对象或已编码的JSON
+        sampled: payload_sampled的结果，False时不记录
+    """
+    if sampled:
+        logger.log(PAYLOAD_LOG_CONFIG["level"], "%s: %s", label, LazyPayload(data))
@@ -0,0 +1,307 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# 指标配置
+METRICS_CONFIG = {
+    # 延迟直方图的桶上界（秒），覆盖元数据请求的毫秒级到大结果TOOL_USED的分钟级
+    "latency_buckets": (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+    # 每个指标的标签组合上限（如按TOOL_ID区分），超出后新的组合合并到OTHER_LABEL，避免内存无限增长
+    "max_series": 500,
+}
+
+# Prometheus文本格式的Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 超出标签组合上限时使用的标签值
+OTHER_LABEL = "__other__"
+
+# 采集函数返回的样本：(标签字典, 值)
+Sample = Tuple[Dict[str, Any], float]
+
+
+def _escape(value: Any) -> str:
+    """转义标签值"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """指标基类，按标签组合保存样本"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), max_series: Optional[int] = None):
+        """初始化指标
+
+        Args:
+            name: 指标名称
+            documentation: 指标说明
+            labelnames: 标签名称
+            max_series: 标签组合上限，None表示使用METRICS_CONFIG["max_series"]
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series if max_series is not None else METRICS_CONFIG["max_series"]
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        """标签字典转为标签值元组（调用方需持有锁）"""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        key = tuple("" if labels[name] is None else str(labels[name]) for name in self.labelnames)
+        if key not in self._series and len(self._series) >= self.max_series:
+            key = tuple(OTHER_LABEL for _ in self.labelnames)
+        return key
+
+    def _new_series(self) -> Any:
+        return 0.0
+
+    def _series_for(self, labels: Dict[str, Any]) -> Tuple[Tuple[str, ...], Any]:
+        """获取标签组合对应的样本（调用方需持有锁）"""
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = self._new_series()
+        return key, series
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, Any], float]]:
+        """导出样本
+
+        Yields:
+            tuple: (样本名称, 标签字典, 值)
+        """
+        with self._lock:
+            items = list(self._series.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+    def clear(self) -> None:
+        """清除所有样本"""
+        with self._lock:
+            self._series.clear()
+
+
+class Counter(Metric):
+    """只增不减的计数器"""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """增加计数
+
+        Args:
+            amount: 增加的数量，不能为负数
+            **labels: 标签值
+        """
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        with self._lock:
+            key = self._key(labels)
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    """可增可减的当前值"""
+
+    type_name = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        """设置当前值"""
+        with self._lock:
+            self._series[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """增加当前值"""
+        with self._lock:
+            key = self._key(labels)
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        """减少当前值"""
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels: Any) -> Iterator[None]:
+        """在上下文期间把当前值加1（如进行中的请求数量）"""
+        self.inc(1.0, **labels)
+        try:
+            yield
+        finally:
+            self.dec(1.0, **labels)
+
+
+class Histogram(Metric):
+    """按桶统计的分布（延迟、大小等）"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Optional[Sequence[float]] = None,
+        max_series: Optional[int] = None
+    ):
+        """初始化直方图
+
+        Args:
+            name: 指标名称
+            documentation: 指标说明
+            labelnames: 标签名称
+            buckets: 桶上界，None表示使用METRICS_CONFIG["latency_buckets"]
+            max_series: 标签组合上限
+        """
+        super().__init__(name, documentation, labelnames, max_series)
+        self.buckets = tuple(sorted(buckets if buckets is not None else METRICS_CONFIG["latency_buckets"]))
+
+    def _new_series(self) -> Any:
+        # [各桶计数（不累计）..., +Inf桶计数, 总和]
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """记录一次观测值
+
+        Args:
+            value: 观测值（如耗时秒数）
+            **labels: 标签值
+        """
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        with self._lock:
+            _, series = self._series_for(labels)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """记录上下文的耗时"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, Any], float]]:
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                yield f"{self.name}_bucket", dict(labels, le=_format_value(float(bound))), cumulative
+            yield f"{self.name}_count", labels, cumulative
+            yield f"{self.name}_sum", labels, series[-1]
+
+
+class MetricsRegistry:
+    """指标注册表
+
+    保存进程内的所有指标，并在导出时调用采集函数读取其他模块的状态（缓存、限流器、连接池等），
+    这些状态不需要在每次变化时更新指标。
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class: type, name: str, documentation: str, labelnames: Sequence[str], **kwargs: Any) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, metric_class) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"指标 {name} 已注册为不同的类型或标签")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """获取或创建计数器"""
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """获取或创建当前值指标"""
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Optional[Sequence[float]] = None
+    ) -> Histogram:
+        """获取或创建直方图"""
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]) -> None:
+        """注册采集函数
+
+        Args:
+            collector: 导出时调用，返回(指标名称, 类型, 说明, 样本列表)的列表，
+                类型为gauge或counter，样本为(标签字典, 值)
+        """
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        """按Prometheus文本格式导出所有指标
+
+        Returns:
+            str: 指标文本
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines: List[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                # 采集失败不影响其他指标
+                lines.append(f"# 采集失败: {_escape(e)}")
+                continue
+            for name, type_name, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {type_name}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+# 进程内的全局指标注册表
+registry = MetricsRegistry()
@@ -0,0 +1,466 @@
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils import codec
+from utils.log_store import LOG_INDEX_CONFIG, read_lines_reverse
+from utils.logging_config import get_logger, log_context
+
+logger = get_logger(__name__)
+
+# 调用链追踪配置
+TRACING_CONFIG = {
+    "enabled": True,
+    "sample_rate": 1.0,  # 新调用链的采样比例（0~1），未采样的调用链仍会向SAP传递traceparent
+    "propagate": True,  # 是否在发往SAP的请求中添加W3C traceparent请求头
+    "memory_max_traces": 200,  # 内存导出器保存的调用链数量
+    "file_path": os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "log", "traces.jsonl"),
+    "file_max_bytes": 20 * 1024 * 1024,  # 文件导出器的文件大小上限，超过后轮转为 .1
+    "max_attributes": 32,  # 每个span的属性数量上限
+    "max_events": 32,  # 每个span的事件数量上限
+}
+
+# span状态
+STATUS_UNSET = "UNSET"
+STATUS_OK = "OK"
+STATUS_ERROR = "ERROR"
+
+# W3C traceparent格式：版本-trace_id-span_id-标志
+_TRACEPARENT_PATTERN = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+def _new_id(nbytes: int) -> str:
+    return "%0*x" % (nbytes * 2, random.getrandbits(nbytes * 8) or 1)
+
+
+class Span:
+    """一次调用中的一个阶段
+
+    字段命名与OpenTelemetry一致（trace_id、span_id、parent_span_id、attributes、events、status），
+    导出的JSON可以直接转换为OTLP格式。
+    """
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_span_id", "sampled", "start_time", "end_time",
+        "attributes", "events", "status", "status_message", "local_root", "_tracer"
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_span_id: Optional[str],
+        sampled: bool,
+        tracer: Optional["Tracer"] = None,
+        local_root: bool = False
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_span_id = parent_span_id
+        self.sampled = sampled
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self.attributes: Dict[str, Any] = {}
+        self.events: List[Dict[str, Any]] = []
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        # 本进程内调用链的第一个span（父span为空或来自其他进程）
+        self.local_root = local_root
+        self._tracer = tracer
+
+    @property
+    def recording(self) -> bool:
+        """是否记录该span（未采样时只传递trace_id）"""
+        return self.sampled and self._tracer is not None
+
+    @property
+    def duration(self) -> Optional[float]:
+        """耗时（秒），未结束时为None"""
+        return None if self.end_time is None else self.end_time - self.start_time
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """设置属性（值为None时忽略）"""
+        if not self.recording or value is None:
+            return
+        if key in self.attributes or len(self.attributes) < TRACING_CONFIG["max_attributes"]:
+            self.attributes[key] = value if isinstance(value, (str, int, float, bool)) else str(value)
+
+    def set_attributes(self, **attributes: Any) -> None:
+        """设置多个属性"""
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        """记录一个时间点事件（如重试、缓存未命中）"""
+        if not self.recording or len(self.events) >= TRACING_CONFIG["max_events"]:
+            return
+        self.events.append({"name": name, "time": time.time(), "attributes": attributes})
+
+    def set_status(self, status: str, message: str = "") -> None:
+        """设置span状态"""
+        self.status = status
+        self.status_message = message
+
+    def record_exception(self, error: BaseException) -> None:
+        """记录异常并把状态设为ERROR"""
+        self.set_status(STATUS_ERROR, str(error)[:500])
+        self.add_event("exception", type=type(error).__name__, message=str(error)[:500])
+
+    def traceparent(self) -> str:
+        """W3C traceparent请求头的值"""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def end(self) -> None:
+        """结束span并交给追踪器导出"""
+        if self.end_time is not None:
+            return
+        self.end_time = time.time()
+        if self.recording:
+            self._tracer._on_end(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出为字典"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": self.status,
+            "status_message": self.status_message,
+        }
+
+
+class SpanExporter:
+    """span导出器基类
+
+    调用链的根span结束时，追踪器把该调用链已结束的所有span一起交给export；
+    根span结束后才结束的span（如后台任务）单独导出。
+    """
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        """导出span
+
+        Args:
+            spans: 同一调用链的span字典列表（Span.to_dict的结果）
+        """
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        """释放资源"""
+
+
+class InMemoryExporter(SpanExporter):
+    """在内存中保存最近的调用链，供/traces查看"""
+
+    def __init__(self, max_traces: Optional[int] = None):
+        self.max_traces = max_traces or TRACING_CONFIG["memory_max_traces"]
+        self._traces: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        if not spans:
+            return
+        trace_id = spans[0]["trace_id"]
+        with self._lock:
+            self._traces.setdefault(trace_id, []).extend(spans)
+            self._traces.move_to_end(trace_id)
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+
+    def traces(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """最近的调用链摘要，从新到旧"""
+        with self._lock:
+            items = list(self._traces.items())[-limit:]
+        return [summarize_trace(trace_id, spans) for trace_id, spans in reversed(items)]
+
+    def get_trace(self, trace_id: str) -> Optional[List[Dict[str, Any]]]:
+        """调用链的所有span"""
+        with self._lock:
+            spans = self._traces.get(trace_id)
+            return list(spans) if spans is not None else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._traces.clear()
+
+
+class FileExporter(SpanExporter):
+    """把调用链以JSON lines追加到文件（每行一个调用链），离线环境和其他进程（Web管理界面）可以读取"""
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.path = path or TRACING_CONFIG["file_path"]
+        self.max_bytes = max_bytes or TRACING_CONFIG["file_max_bytes"]
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        if not spans:
+            return
+        line = codec.dumps({"trace_id": spans[0]["trace_id"], "spans": spans}, default=str) + b"\n"
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "ab") as f:
+                    f.write(line)
+            except OSError as e:
+                logger.warning(f"写入调用链文件失败: {str(e)}")
+
+
+def summarize_trace(trace_id: str, spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """生成调用链摘要
+
+    Args:
+        trace_id: 调用链ID
+        spans: 调用链的span字典列表
+
+    Returns:
+        dict: 根span名称、开始时间、耗时、span数量、是否有错误等
+    """
+    span_ids = {span["span_id"] for span in spans}
+    roots = [span for span in spans if span.get("parent_span_id") not in span_ids]
+    root = min(roots or spans, key=lambda span: span["start_time"])
+    return {
+        "trace_id": trace_id,
+        "name": root["name"],
+        "start_time": root["start_time"],
+        "duration_ms": root.get("duration_ms"),
+        "span_count": len(spans),
+        "error": any(span.get("status") == STATUS_ERROR for span in spans),
+        "attributes": root.get("attributes", {}),
+    }
+
+
+def build_span_tree(spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """把span列表组织为树（子span在children中，按开始时间排序）
+
+    Args:
+        spans: 同一调用链的span字典列表
+
+    Returns:
+        list: 根span列表
+    """
+    nodes = {span["span_id"]: dict(span, children=[]) for span in spans}
+    roots = []
+    for node in sorted(nodes.values(), key=lambda node: node["start_time"]):
+        parent = nodes.get(node.get("parent_span_id"))
+        if parent is not None:
+            parent["children"].append(node)
+        else:
+            roots.append(node)
+    return roots
+
+
+def read_trace_file(
+    path: Optional[str] = None,
+    limit: int = 50,
+    trace_id: Optional[str] = None,
+    max_scan_bytes: int = 16 * 1024 * 1024
+) -> "OrderedDict[str, List[Dict[str, Any]]]":
+    """从文件导出器的文件末尾读取最近的调用链（不读取整个文件）
+
+    Args:
+        path: 调用链文件路径，None表示使用TRACING_CONFIG["file_path"]
+        limit: 最多返回的调用链数量
+        trace_id: 只读取该调用链
+        max_scan_bytes: 最多读取的字节数
+
+    Returns:
+        OrderedDict: 调用链ID到span列表的映射，从新到旧
+    """
+    path = path or TRACING_CONFIG["file_path"]
+    traces: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+    scanned = 0
+    for file_path in (path, path + ".1"):
+        try:
+            f = open(file_path, "rb")
+        except OSError:
+            continue
+        with f:
+            size = f.seek(0, os.SEEK_END)
+            for _, line in read_lines_reverse(f, 0, size, LOG_INDEX_CONFIG["read_chunk"]):
+                scanned += len(line) + 1
+                if scanned > max_scan_bytes:
+                    return traces
+                if trace_id is not None and trace_id.encode() not in line:
+                    continue
+                try:
+                    record = codec.loads(line)
+                except ValueError:
+                    continue
+                record_id = record.get("trace_id")
+                if record_id not in traces and len(traces) >= limit:
+                    return traces
+                traces.setdefault(record_id, []).extend(record.get("spans", []))
+    return traces
+
+
+class Tracer:
+    """追踪器：创建span、采样，并在调用链结束时交给导出器"""
+
+    def __init__(self, exporters: Optional[List[SpanExporter]] = None):
+        self.exporters: List[SpanExporter] = list(exporters or [])
+        # 根span尚未结束的调用链中已结束的span
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def add_exporter(self, exporter: SpanExporter) -> None:
+        """添加导出器"""
+        self.exporters.append(exporter)
+
+    def create_span(self, name: str, parent: Optional[Span] = None, remote_parent: Optional[Tuple[str, str, bool]] = None) -> Span:
+        """创建span（不设置为当前span，一般使用start_span）
+
+        Args:
+            name: span名称
+            parent: 父span，None表示新的调用链
+            remote_parent: 来自其他进程的父span (trace_id, span_id, sampled)
+
+        Returns:
+            Span: 新的span
+        """
+        if parent is not None:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        elif remote_parent is not None:
+            trace_id, parent_id, sampled = remote_parent
+        else:
+            trace_id, parent_id = _new_id(16), None
+            sampled = random.random() < TRACING_CONFIG["sample_rate"]
+        span = Span(name, trace_id, parent_id, sampled, self if TRACING_CONFIG["enabled"] else None, parent is None)
+        if span.recording and span.local_root:
+            with self._lock:
+                self._pending.setdefault(trace_id, [])
+        return span
+
+    def _on_end(self, span: Span) -> None:
+        data = span.to_dict()
+        with self._lock:
+            pending = self._pending.get(span.trace_id)
+            if pending is not None and not span.local_root:
+                pending.append(data)
+                return
+            # 根span结束（或根span已导出后结束的span），导出该调用链
+            spans = self._pending.pop(span.trace_id, [])
+            spans.append(data)
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception as e:
+                logger.warning(f"导出调用链失败: {str(e)}")
+
+    def shutdown(self) -> None:
+        """关闭所有导出器"""
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+# 全局追踪器：内存导出器供本进程查看，文件导出器供Web管理界面读取
+memory_exporter = InMemoryExporter()
+tracer = Tracer([memory_exporter, FileExporter()])
+
+# 当前span
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    """当前span，不在span内时返回None"""
+    return _current_span.get()
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """解析W3C traceparent请求头
+
+    Args:
+        header: traceparent请求头的值
+
+    Returns:
+        tuple: (trace_id, span_id, sampled)，格式错误时返回None
+    """
+    match = _TRACEPARENT_PATTERN.match((header or "").strip().lower())
+    if match is None or match.group(1) == "ff" or set(match.group(2)) == {"0"} or set(match.group(3)) == {"0"}:
+        return None
+    return match.group(2), match.group(3), bool(int(match.group(4), 16) & 1)
+
+
+def inject_headers(headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """把当前span的traceparent加入请求头
+
+    Args:
+        headers: 原请求头，None表示新建
+
+    Returns:
+        dict: 请求头（不在span内或未启用传递时原样返回）
+    """
+    headers = dict(headers or {})
+    span = current_span()
+    if span is not None and TRACING_CONFIG["propagate"]:
+        headers["traceparent"] = span.traceparent()
+    return headers
+
+
+@contextmanager
+def start_span(name: str, traceparent: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+    """在上下文内创建并激活span，退出时结束span
+
+    在当前span内调用时创建子span，否则创建新的调用链（或延续traceparent指定的远程调用链）。
+    新调用链的trace_id会附加到日志（log_context），可以从日志定位到调用链。
+    上下文内抛出的异常会记录到span并继续抛出。
+
+    Args:
+        name: span名称，如 "sap.request"
+        traceparent: 上游传入的W3C traceparent，只在没有当前span时使用
+        **attributes: span属性
+
+    Yields:
+        Span: 当前span
+    """
+    parent = current_span()
+    remote = parse_traceparent(traceparent) if parent is None else None
+    span = tracer.create_span(name, parent=parent, remote_parent=remote)
+    span.set_attributes(**attributes)
+    token = _current_span.set(span)
+    try:
+        if parent is None:
+            with log_context(trace_id=span.trace_id):
+                yield span
+        else:
+            yield span
+        if span.status == STATUS_UNSET:
+            span.set_status(STATUS_OK)
+    except Exception as e:
+        span.record_exception(e)
+        raise
+    except BaseException as e:
+        # 任务取消或异步生成器提前关闭，不算错误
+        span.add_event("cancelled", type=type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+@contextmanager
+def untraced() -> Iterator[None]:
+    """在上下文内不记录调用链
+
+    用于定期执行的后台请求（如健康检查探测），避免它们挤占调用链存储。
+    上下文内创建的span都继承不采样的父span，因此不会被导出。
+    """
+    span = tracer.create_span("untraced", remote_parent=(_new_id(16), _new_id(8), False))
+    token = _current_span.set(span)
+    try:
+        yield
+    finally:
+        _current_span.reset(token)
@@ -1,21 +1,38 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, Response
 import uvicorn
+import asyncio
+import functools
 import sys
 import os
-import json
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
+
+import httpx
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # 导入现有的SAP MCP服务器功能
-from server.http_client import SAPHttpClient
-from config import SAP_CONFIG, MCP_SERVER_CONFIG, WEB_CONFIG
+from server.client_registry import SAPClientRegistry
+from server.supervisor import (
+    MCPServerSupervisor, connect_host, STATE_RUNNING, STATE_STARTING, STATE_STOPPED, STATE_RESTARTING
+)
+from server.schema_store import ToolSchemaStore
+from server.circuit_breaker import breaker_stats
+from server.concurrency import limiter_stats
+from config import SAP_CONFIG, MCP_SERVER_CONFIG, WEB_CONFIG, SAP_SYSTEMS
 from utils.common import handle_http_error, format_jsonrpc_result
-from utils.logging_config import get_logger
-import subprocess
+from utils.logging_config import get_logger, LazyPayload, LOG_PIPELINE_CONFIG
+from utils.log_store import LogStore, format_entry, parse_time, tail_text_log
+from utils.log_tail import LOG_TAIL_CONFIG, LogTailHub, parse_json_line, parse_text_line
+from utils.metrics import registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from utils.tracing import read_trace_file, summarize_trace, build_span_tree
+from utils.health import HEALTH_CONFIG, HealthProber, STATUS_UP
+from utils.cache import enable_shared_cache
+from utils import codec
 import time
 
 # 获取logger实例
@@ -28,6 +45,26 @@ API_ENDPOINTS = {
     "USE_TOOL": "TOOL_USED"
 }
 
+# SAP HTTP客户端注册表：所有接口共用同一个连接池，/api/config修改SAP配置后替换为新客户端
+sap_clients = SAPClientRegistry()
+
+# MCP服务器以多工作进程模式运行时响应缓存在共享存储中，Web端使缓存失效时同时对所有工作进程生效
+if int(MCP_SERVER_CONFIG.get("workers", 1) or 1) > 1:
+    enable_shared_cache()
+
+
+@asynccontextmanager
+async def app_lifespan(app: FastAPI):
+    """Web应用生命周期：启动后台健康探测，关闭时释放SAP HTTP连接"""
+    await health_prober.start()
+    try:
+        yield
+    finally:
+        await health_prober.stop()
+        await mcp_supervisor.shutdown()
+        await sap_clients.close()
+
+
 # 创建FastAPI应用
 app = FastAPI(
     title="SAP MCP Web Management",
@@ -35,7 +72,8 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    lifespan=app_lifespan
 )
 
 # 配置CORS
@@ -47,12 +85,11 @@ app.add_middleware(
     allow_headers=["Content-Type", "Accept", "Authorization"],
 )
 
-# 创建HTTP客户端实例
-http_client = SAPHttpClient()
+# 工具参数格式存储（与MCP服务器共享同一个SQLite文件）
+schema_store = ToolSchemaStore()
 
-# 服务状态管理
-mcp_server_process = None
-mcp_server_status = {"status": "stopped", "host": MCP_SERVER_CONFIG["host"], "port": MCP_SERVER_CONFIG["port"]}
+# MCP服务器进程管理
+mcp_supervisor = MCPServerSupervisor(MCP_SERVER_CONFIG)
 
 # 统一错误处理函数
 async def handle_error(error: Exception, context: str = "") -> None:
@@ -69,7 +106,7 @@ async def api_get_tool_list():
     """
     try:
         logger.info("获取工具清单")
-        result = await http_client.get(params={"id": API_ENDPOINTS["TOOL_LIST"]})
+        result = await sap_clients.current().get(params={"id": API_ENDPOINTS["TOOL_LIST"]})
         return format_jsonrpc_result(result)
     except Exception as e:
         return await handle_error(e, "获取工具清单失败")
@@ -87,7 +124,7 @@ async def api_get_tool_details(tool_id: str, request_data: dict = None):
     """
     try:
         logger.info(f"获取工具详情: {tool_id}")
-        result = await http_client.post(
+        result = await sap_clients.current().post(
             params={"id": API_ENDPOINTS["TOOL_DETAIL"]},
             json={"TOOL_ID": tool_id}
         )
@@ -109,6 +146,50 @@ async def api_get_tool_details(tool_id: str, request_data: dict = None):
     except Exception as e:
         return await handle_error(e, "获取工具详情失败")
 
+@app.delete("/api/tools/cache", tags=["工具管理"])
+async def api_invalidate_tool_cache(tool_id: str = None):
+    """使工具详情缓存失效
+    
+    SAP配置表中的工具参数变更后调用，下次获取工具详情时重新从SAP读取。
+    同时删除所有SAP系统（SAP_SYSTEMS）在参数格式存储中的记录，并通知正在运行的
+    MCP服务器清除进程内的缓存，见sap_mcp_server的/cache/invalidate。
+    
+    Args:
+        tool_id: 工具ID，不传表示所有工具
+    
+    Returns:
+        dict: 包含失效缓存项数量的字典，mcp_server为MCP服务器的处理结果（未运行时为None）
+    """
+    count = sap_clients.current().invalidate_post_cache(API_ENDPOINTS["TOOL_DETAIL"], tool_id)
+    schema_count = schema_store.delete(tool_id)
+    return {
+        "status": "success",
+        "tool_id": tool_id,
+        "invalidated": count,
+        "schemas_deleted": schema_count,
+        "mcp_server": await invalidate_mcp_cache(tool_id)
+    }
+
+async def invalidate_mcp_cache(tool_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """通知MCP服务器使工具详情缓存失效
+    
+    Args:
+        tool_id: 工具ID，None表示所有工具
+    
+    Returns:
+        dict: MCP服务器返回的失效数量，服务器未运行或无法访问时返回None
+    """
+    url = f"http://{connect_host(MCP_SERVER_CONFIG['host'])}:{MCP_SERVER_CONFIG['port']}/cache/invalidate"
+    try:
+        async with httpx.AsyncClient(timeout=2.0) as client:
+            response = await client.post(url, params={"tool_id": tool_id} if tool_id else None)
+        if response.status_code == 200:
+            return codec.loads(response.content)
+        logger.warning(f"MCP服务器缓存失效失败: HTTP {response.status_code}")
+    except Exception as e:
+        logger.debug(f"通知MCP服务器缓存失效失败: {str(e)}")
+    return None
+
 @app.post("/api/tools/{tool_id}/use", tags=["工具管理"])
 async def api_use_tool(tool_id: str, request_data: dict):
     """使用工具
@@ -132,7 +213,7 @@ async def api_use_tool(tool_id: str, request_data: dict):
             "PARAM": param_data
         }
         
-        result = await http_client.post(
+        result = await sap_clients.current().post(
             params={"id": API_ENDPOINTS["USE_TOOL"]},
             json=sap_request_data
         )
@@ -183,6 +264,7 @@ class MCPConfig(BaseSettings):
     host: str = "{MCP_SERVER_CONFIG["host"]}"
     port: int = {MCP_SERVER_CONFIG["port"]}
     path: str = "{MCP_SERVER_CONFIG["path"]}"
+    workers: int = {MCP_SERVER_CONFIG.get("workers", 1)}  # 工作进程数量，大于1时启用多工作进程模式（仅Linux/macOS）
     
     class Config:
         env_prefix = "MCP_"
@@ -220,6 +302,7 @@ MCP_SERVER_CONFIG = {{
     "host": mcp_config.host,
     "port": mcp_config.port,
     "path": mcp_config.path,
+    "workers": mcp_config.workers,
 }}
 
 WEB_CONFIG = {{
@@ -227,6 +310,9 @@ WEB_CONFIG = {{
     "port": web_config.port,
     "reload": web_config.reload,
 }}
+
+# 多SAP系统配置（可选），见utils/config.example.py
+SAP_SYSTEMS = {SAP_SYSTEMS!r}
 '''
         
         # 写入文件
@@ -250,7 +336,7 @@ async def api_save_config(config_data: dict):
         dict: 包含保存结果和更新后配置的字典
     """
     try:
-        logger.info(f"保存配置请求: {json.dumps(config_data, ensure_ascii=False)}")
+        logger.info("保存配置请求: %s", LazyPayload(config_data))
         
         # 更新内存中的配置
         if "sap" in config_data:
@@ -260,6 +346,10 @@ async def api_save_config(config_data: dict):
         if "web" in config_data:
             WEB_CONFIG.update(config_data["web"])
         
+        # SAP配置变化时切换到新的连接池，旧客户端在正在进行的请求完成后关闭
+        if "sap" in config_data and sap_clients.refresh():
+            logger.info("SAP HTTP客户端已按新配置重建: %s", sap_clients.stats()["fingerprint"])
+        
         # 保存配置到文件
         save_config_to_file()
         
@@ -283,11 +373,8 @@ async def api_test_api():
     try:
         logger.info("测试SAP接口连接")
         
-        # 使用当前配置创建新的HTTP客户端实例
-        test_client = SAPHttpClient()
-        
-        # 调用id=TOOL_LIST的接口
-        result = await test_client.get(params={"id": "TOOL_LIST"})
+        # 使用当前配置的共享HTTP客户端（配置变化后已自动替换）
+        result = await sap_clients.current().get(params={"id": "TOOL_LIST"})
         
         # 检查SAP接口返回的错误信息
         if isinstance(result, dict):
@@ -305,7 +392,7 @@ async def api_test_api():
                     "error": error_msg
                 }
         
-        logger.info(f"SAP接口测试成功: {json.dumps(result, ensure_ascii=False)}")
+        logger.info("SAP接口测试成功: %s", LazyPayload(result))
         return {
             "message": "SAP接口测试成功",
             "success": True,
@@ -319,386 +406,272 @@ async def api_test_api():
             "error": str(e)
         }
 
-@app.get("/api/service/status", tags=["服务管理"])
-async def api_get_service_status():
-    """获取服务状态"""
-    global mcp_server_process, mcp_server_status
+async def fetch_mcp_status(host: str, port: int, path: str) -> Optional[Dict[str, Any]]:
+    """查询MCP服务器的状态接口
+    
+    Args:
+        host: MCP服务器地址
+        port: MCP服务器端口
+        path: 状态接口路径，如/ready、/circuits
     
-    # 检查端口上是否有MCP服务在运行
-    import socket
+    Returns:
+        dict: 状态接口返回的数据，服务器不支持或无法访问时返回None
+    """
     try:
-        # 如果host是0.0.0.0，使用127.0.0.1进行连接测试
-        test_host = "127.0.0.1" if MCP_SERVER_CONFIG["host"] == "0.0.0.0" else MCP_SERVER_CONFIG["host"]
-        
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(1)
-        result = sock.connect_ex((test_host, MCP_SERVER_CONFIG["port"]))
-        sock.close()
-        
-        if result == 0:
-            # 端口被占用，说明有服务在运行
-            # 尝试获取进程信息
-            port_in_use = True
-            
-            # 检查进程是否还在运行
-            if mcp_server_process is not None and mcp_server_process.poll() is None:
-                # Web管理界面启动的进程还在运行
-                mcp_server_status = {
-                    "status": "running",
-                    "host": MCP_SERVER_CONFIG["host"],
-                    "port": MCP_SERVER_CONFIG["port"],
-                    "pid": mcp_server_process.pid,
-                    "managed": True
-                }
-            else:
-                # 端口被占用，但不是Web管理界面启动的进程
-                # 尝试找到占用端口的进程
-                try:
-                    import subprocess
-                    result = subprocess.run(
-                        ['netstat', '-ano'],
-                        capture_output=True,
-                        text=True,
-                        timeout=5
-                    )
-                    for line in result.stdout.split('\n'):
-                        if f':{MCP_SERVER_CONFIG["port"]}' in line and 'LISTENING' in line:
-                            parts = line.split()
-                            if len(parts) >= 5:
-                                pid = int(parts[-1])
-                                mcp_server_status = {
-                                    "status": "running",
-                                    "host": MCP_SERVER_CONFIG["host"],
-                                    "port": MCP_SERVER_CONFIG["port"],
-                                    "pid": pid,
-                                    "managed": False
-                                }
-                                break
-                except Exception as e:
-                    logger.warning(f"无法获取占用端口的进程信息: {str(e)}")
-                    mcp_server_status = {
-                        "status": "running",
-                        "host": MCP_SERVER_CONFIG["host"],
-                        "port": MCP_SERVER_CONFIG["port"],
-                        "managed": False
-                    }
-        else:
-            # 端口没有被占用，服务停止
-            mcp_server_status = {
-                "status": "stopped",
-                "host": MCP_SERVER_CONFIG["host"],
-                "port": MCP_SERVER_CONFIG["port"]
-            }
+        async with httpx.AsyncClient(timeout=1.0) as client:
+            response = await client.get(f"http://{host}:{port}{path}")
+        if response.status_code in (200, 503):
+            return codec.loads(response.content)
     except Exception as e:
-        logger.error(f"检查服务状态失败: {str(e)}")
-        # 如果无法检查端口，回退到原来的进程检查逻辑
-        if mcp_server_process is not None and mcp_server_process.poll() is None:
-            mcp_server_status = {
-                "status": "running",
-                "host": MCP_SERVER_CONFIG["host"],
-                "port": MCP_SERVER_CONFIG["port"],
-                "pid": mcp_server_process.pid,
-                "managed": True
-            }
-        else:
-            mcp_server_status = {
-                "status": "stopped",
-                "host": MCP_SERVER_CONFIG["host"],
-                "port": MCP_SERVER_CONFIG["port"]
-            }
+        logger.debug(f"查询MCP服务器状态失败({path}): {str(e)}")
+    return None
+
+async def check_mcp_ready(host: str, port: int) -> Optional[Dict[str, Any]]:
+    """查询MCP服务器的就绪状态
+    
+    Args:
+        host: MCP服务器地址
+        port: MCP服务器端口
     
-    return mcp_server_status
+    Returns:
+        dict: /ready接口返回的就绪状态，服务器不支持或无法访问时返回None
+    """
+    return await fetch_mcp_status(host, port, "/ready")
+
+def apply_readiness(status: Dict[str, Any], readiness: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """根据就绪状态调整服务状态，预热未完成时状态为starting
+    
+    Args:
+        status: 服务状态
+        readiness: MCP服务器的就绪状态
+    
+    Returns:
+        dict: 调整后的服务状态
+    """
+    if readiness is not None:
+        status["warmup"] = readiness.get("warmup")
+        if status["status"] == "running" and not readiness.get("ready"):
+            status["status"] = "starting"
+    return status
+
+@app.get("/api/service/status", tags=["服务管理"])
+async def api_get_service_status():
+    """获取服务状态
+    
+    端口已监听但MCP服务器仍在预热时，状态为starting；预热完成后才返回running。
+    """
+    status = await mcp_supervisor.status()
+    if status["status"] == STATE_RUNNING:
+        readiness = await check_mcp_ready(connect_host(MCP_SERVER_CONFIG["host"]), MCP_SERVER_CONFIG["port"])
+        status = apply_readiness(status, readiness)
+    return status
 
 @app.post("/api/service/start", tags=["服务管理"])
 async def api_start_service():
-    """启动MCP服务器"""
-    global mcp_server_process, mcp_server_status
+    """启动MCP服务器
     
+    端口开始监听后返回，预热在后台继续；进程意外退出时由mcp_supervisor自动重启。
+    """
     try:
-        # 首先检查服务是否已经在运行
-        import socket
-        try:
-            # 如果host是0.0.0.0，使用127.0.0.1进行连接测试
-            test_host = "127.0.0.1" if MCP_SERVER_CONFIG["host"] == "0.0.0.0" else MCP_SERVER_CONFIG["host"]
-            
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(1)
-            result = sock.connect_ex((test_host, MCP_SERVER_CONFIG["port"]))
-            sock.close()
-            
-            if result == 0:
-                return {"message": "服务已经在运行中", "status": mcp_server_status}
-        except Exception:
-            pass
-        
-        if mcp_server_process is not None and mcp_server_process.poll() is None:
-            return {"message": "服务已经在运行中", "status": mcp_server_status}
+        status = await api_get_service_status()
+        if status["status"] in (STATE_RUNNING, STATE_STARTING, STATE_RESTARTING):
+            return {"message": "服务已经在运行中", "status": status}
         
-        # 启动MCP服务器进程
         logger.info("启动MCP服务器进程")
-        
-        # 获取项目根目录
-        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        
-        # 尝试找到正确的Python解释器
-        python_exe = sys.executable
-        
-        # 检查是否安装了fastmcp模块
-        import subprocess
-        try:
-            result = subprocess.run(
-                [sys.executable, "-c", "import fastmcp"],
-                capture_output=True,
-                timeout=5
-            )
-            if result.returncode != 0:
-                # 当前Python没有fastmcp，尝试找到有fastmcp的Python
-                logger.warning(f"当前Python解释器({sys.executable})没有fastmcp模块，尝试查找其他Python解释器")
-                
-                # 尝试常见的Python路径
-                possible_pythons = [
-                    r"D:\Users\LEGION-Y9000X\anaconda3\python.exe",
-                    "python",
-                    "python3",
-                    "python3.13",
-                    "python3.12"
-                ]
-                
-                for python_path in possible_pythons:
-                    try:
-                        result = subprocess.run(
-                            [python_path, "-c", "import fastmcp"],
-                            capture_output=True,
-                            timeout=5
-                        )
-                        if result.returncode == 0:
-                            python_exe = python_path
-                            logger.info(f"找到可用的Python解释器: {python_exe}")
-                            break
-                    except Exception:
-                        continue
-        except Exception as e:
-            logger.warning(f"检查Python环境时出错: {str(e)}")
-        
-        # 构建启动命令
-        cmd = [
-            python_exe,
-            os.path.join("server", "sap_mcp_server.py")
-        ]
-        
-        # 启动进程，捕获输出到日志文件
-        log_file_path = os.path.join(project_root, "log", "mcp_server.log")
-        os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
-        
-        with open(log_file_path, "a", encoding="utf-8") as log_file:
-            mcp_server_process = subprocess.Popen(
-                cmd,
-                stdout=log_file,
-                stderr=log_file,
-                cwd=project_root  # 在项目根目录执行
-            )
-        
-        logger.info(f"MCP服务器进程启动，PID: {mcp_server_process.pid}")
-        logger.info(f"启动命令: {' '.join(cmd)}")
-        logger.info(f"日志文件: {log_file_path}")
-        
-        # 等待服务启动
-        time.sleep(3)
-        
-        # 检查进程是否还在运行
-        if mcp_server_process.poll() is None:
-            mcp_server_status = {
-                "status": "running",
-                "host": MCP_SERVER_CONFIG["host"],
-                "port": MCP_SERVER_CONFIG["port"],
-                "pid": mcp_server_process.pid,
-                "log_file": log_file_path
-            }
-            logger.info(f"MCP服务器启动成功，进程ID: {mcp_server_process.pid}")
-            return {"message": "服务启动成功", "status": mcp_server_status}
-        else:
-            # 获取完整的错误信息
-            try:
-                with open(log_file_path, "r", encoding="utf-8") as log_file:
-                    log_content = log_file.read()
-            except Exception:
-                log_content = "无法读取日志文件"
-            
-            logger.error(f"MCP服务器启动失败，退出码: {mcp_server_process.returncode}")
-            logger.error(f"日志内容: {log_content}")
-            
-            mcp_server_status = {
-                "status": "stopped",
-                "host": MCP_SERVER_CONFIG["host"],
-                "port": MCP_SERVER_CONFIG["port"],
-                "error": log_content[:500] if log_content else "启动失败"
-            }
-            return {"message": "服务启动失败", "status": mcp_server_status}
-            
+        status = await mcp_supervisor.start()
+        if status["status"] in (STATE_RUNNING, STATE_STARTING):
+            logger.info(f"MCP服务器启动成功，进程ID: {status.get('pid')}")
+            return {"message": "服务启动成功", "status": status}
+        return {"message": "服务启动失败", "status": status}
     except Exception as e:
         logger.error(f"启动服务失败: {str(e)}")
-        mcp_server_status = {
-            "status": "stopped",
-            "host": MCP_SERVER_CONFIG["host"],
-            "port": MCP_SERVER_CONFIG["port"],
-            "error": str(e)
-        }
-        return {"message": "服务启动失败", "status": mcp_server_status}
+        status = await mcp_supervisor.status()
+        status["error"] = str(e)
+        return {"message": "服务启动失败", "status": status}
 
 @app.post("/api/service/stop", tags=["服务管理"])
 async def api_stop_service():
-    """停止MCP服务器"""
-    global mcp_server_process, mcp_server_status
+    """停止MCP服务器
     
+    先发送终止信号，等待正在处理的请求完成（最多SUPERVISOR_CONFIG["stop_timeout"]秒）后再强制结束。
+    """
     try:
-        # 首先检查服务是否在运行
-        import socket
-        service_running = False
-        try:
-            # 如果host是0.0.0.0，使用127.0.0.1进行连接测试
-            test_host = "127.0.0.1" if MCP_SERVER_CONFIG["host"] == "0.0.0.0" else MCP_SERVER_CONFIG["host"]
-            
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(1)
-            result = sock.connect_ex((test_host, MCP_SERVER_CONFIG["port"]))
-            sock.close()
-            
-            if result != 0:
-                return {"message": "服务已经停止", "status": mcp_server_status}
-        except Exception:
-            return {"message": "服务已经停止", "status": mcp_server_status}
-        
-        if mcp_server_process is None or mcp_server_process.poll() is not None:
-            # 进程不是Web管理界面启动的，尝试查找并停止
-            try:
-                import subprocess
-                result = subprocess.run(
-                    ['netstat', '-ano'],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                for line in result.stdout.split('\n'):
-                    if f':{MCP_SERVER_CONFIG["port"]}' in line and 'LISTENING' in line:
-                        parts = line.split()
-                        if len(parts) >= 5:
-                            pid = int(parts[-1])
-                            logger.info(f"找到占用端口的进程，PID: {pid}")
-                            
-                            # 尝试停止进程
-                            try:
-                                subprocess.run(['taskkill', '/F', '/PID', str(pid)], 
-                                             capture_output=True, timeout=10, check=True)
-                                logger.info(f"成功停止进程 {pid}")
-                                
-                                # 等待进程结束
-                                import time
-                                time.sleep(2)
-                                
-                                # 更新状态
-                                mcp_server_status = {
-                                    "status": "stopped",
-                                    "host": MCP_SERVER_CONFIG["host"],
-                                    "port": MCP_SERVER_CONFIG["port"]
-                                }
-                                
-                                return {"message": "服务停止成功", "status": mcp_server_status}
-                            except subprocess.CalledProcessError as e:
-                                logger.error(f"停止进程失败: {str(e)}")
-                                return {"message": f"服务停止失败: {str(e)}", "status": mcp_server_status}
-                            except Exception as e:
-                                logger.error(f"停止进程异常: {str(e)}")
-                                return {"message": f"服务停止失败: {str(e)}", "status": mcp_server_status}
-                            break
-            except Exception as e:
-                logger.error(f"查找进程失败: {str(e)}")
-                return {"message": f"服务停止失败: {str(e)}", "status": mcp_server_status}
-        
-        logger.info(f"停止MCP服务器进程，进程ID: {mcp_server_process.pid}")
-        
-        # 终止进程
-        mcp_server_process.terminate()
-        
-        # 等待进程结束，最多等待5秒
-        try:
-            exit_code = mcp_server_process.wait(timeout=5)
-            logger.info(f"MCP服务器进程正常终止，退出码: {exit_code}")
-        except subprocess.TimeoutExpired:
-            # 如果进程没有在5秒内结束，就发送kill信号
-            logger.warning("MCP服务器进程未能在5秒内正常终止，发送kill信号")
-            mcp_server_process.kill()
-            try:
-                exit_code = mcp_server_process.wait(timeout=2)
-                logger.info(f"MCP服务器进程被强制终止，退出码: {exit_code}")
-            except subprocess.TimeoutExpired:
-                logger.error("MCP服务器进程无法终止")
-                return {"message": "服务停止失败: 进程无法终止", "status": mcp_server_status}
-        
-        # 更新状态
-        mcp_server_status = {
-            "status": "stopped",
-            "host": MCP_SERVER_CONFIG["host"],
-            "port": MCP_SERVER_CONFIG["port"]
-        }
-        
-        logger.info("MCP服务器已停止")
-        return {"message": "服务停止成功", "status": mcp_server_status}
-        
+        status = await mcp_supervisor.status()
+        if status["status"] == STATE_STOPPED:
+            return {"message": "服务已经停止", "status": status}
+        
+        status = await mcp_supervisor.stop()
+        if status["status"] == STATE_STOPPED and not status.get("error"):
+            logger.info("MCP服务器已停止")
+            return {"message": "服务停止成功", "status": status}
+        return {"message": f"服务停止失败: {status.get('error', '')}", "status": status}
     except Exception as e:
         logger.error(f"停止服务失败: {str(e)}")
-        return {"message": f"服务停止失败: {str(e)}", "status": mcp_server_status}
+        return {"message": f"服务停止失败: {str(e)}", "status": await mcp_supervisor.status()}
+
+# 日志目录
+LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "log")
+
+# JSON lines日志查询（由utils.logging_config的IndexedJSONLinesHandler写入）
+log_store = LogStore(os.path.join(LOG_DIR, "sap_api.jsonl"))
+
+# 实时日志来源：SAP API日志优先读取JSON lines（带工具ID，可按工具精确过滤），MCP服务器日志为子进程输出的文本
+log_tail_hub = LogTailHub({
+    "sap_api": (
+        (os.path.join(LOG_DIR, "sap_api.jsonl"), parse_json_line)
+        if LOG_PIPELINE_CONFIG["json_lines"]
+        else (os.path.join(LOG_DIR, "sap_api.log"), parse_text_line)
+    ),
+    "mcp_server": (os.path.join(LOG_DIR, "mcp_server.log"), parse_text_line),
+})
+
+
+def _collect_log_tail_metrics():
+    """导出实时日志连接指标"""
+    stats = log_tail_hub.stats()
+    return [
+        ("web_log_stream_subscribers", "gauge", "实时日志连接数量", [({}, stats["subscribers"])]),
+        ("web_log_stream_dropped", "gauge", "当前连接因消费太慢丢弃的日志条数", [({}, stats["dropped"])]),
+    ]
+
+
+registry.register_collector(_collect_log_tail_metrics)
+
 
 @app.get("/api/logs", tags=["日志管理"])
-async def api_get_logs(level: str = "all", limit: int = 1000):
-    """获取日志文件内容
+async def api_get_logs(
+    level: str = "all",
+    limit: int = 1000,
+    tool: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    q: Optional[str] = None,
+    cursor: Optional[str] = None
+):
+    """查询日志
+    
+    从带索引的JSON lines日志中按从新到旧的顺序查询（包括轮转备份），只读取需要的数据块。
+    未启用JSON lines日志时从文本日志末尾读取。
     
     Args:
-        level: 日志级别过滤，可选值: all, INFO, WARNING, ERROR, CRITICAL
-        limit: 返回日志行数限制，默认1000行
+        level: 日志级别过滤，可选值: all, INFO, WARNING, ERROR, CRITICAL，多个级别用逗号分隔
+        limit: 返回日志条数限制，默认1000条
+        tool: 工具ID过滤
+        start: 起始时间（ISO格式本地时间或Unix时间戳）
+        end: 结束时间（ISO格式本地时间或Unix时间戳）
+        q: 消息中包含的文本
+        cursor: 上一页返回的next_cursor，用于继续读取更早的日志
     """
     try:
-        log_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "log", "sap_api.log")
-        
-        # 读取日志文件
-        with open(log_file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
+        limit = min(max(limit, 1), 5000)
+        levels = None if level == "all" else [item.strip() for item in level.split(",") if item.strip()]
         
-        # 根据日志级别过滤
-        if level != "all":
-            filtered_lines = []
-            for line in lines:
-                if f" {level} " in line or line.strip().endswith(f" {level}"):
-                    filtered_lines.append(line)
-            lines = filtered_lines
-        
-        # 限制返回行数
-        if limit > 0:
-            lines = lines[-limit:]
+        if not log_store.exists():
+            lines = await asyncio.get_running_loop().run_in_executor(
+                None, tail_text_log, os.path.join(LOG_DIR, "sap_api.log"), level, limit
+            )
+            return {
+                "status": "success",
+                "data": "\n".join(lines),
+                "entries": [],
+                "level": level,
+                "total_lines": len(lines),
+                "next_cursor": None
+            }
         
-        # 连接成字符串并返回
-        logs_content = "".join(lines)
+        # 文件读取放到线程池，不阻塞事件循环
+        result = await asyncio.get_running_loop().run_in_executor(None, functools.partial(
+            log_store.query,
+            levels=levels,
+            start=parse_time(start),
+            end=parse_time(end),
+            tool=tool or None,
+            text=q or None,
+            limit=limit,
+            cursor=cursor
+        ))
+        # 查询结果从新到旧，按时间顺序返回
+        entries = list(reversed(result["entries"]))
         
         return {
             "status": "success",
-            "data": logs_content,
+            "data": "\n".join(format_entry(entry) for entry in entries),
+            "entries": entries,
             "level": level,
-            "total_lines": len(lines)
+            "total_lines": len(entries),
+            "next_cursor": result["next_cursor"],
+            "scanned_bytes": result["scanned_bytes"]
         }
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"查询参数错误: {str(e)}")
     except Exception as e:
         logger.error(f"读取日志文件失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"读取日志文件失败: {str(e)}")
 
+@app.get("/api/logs/stream", tags=["日志管理"])
+async def api_stream_logs(
+    request: Request,
+    sources: str = "all",
+    level: str = "all",
+    tool: Optional[str] = None
+):
+    """实时推送新日志（Server-Sent Events）
+    
+    只推送连接之后写入的日志，过滤在服务端完成。客户端消费太慢时丢弃最旧的日志，
+    并通过dropped事件告知丢弃的条数。
+    
+    Args:
+        sources: 日志来源，可选值: all, sap_api, mcp_server，多个来源用逗号分隔
+        level: 日志级别过滤，可选值: all, INFO, WARNING, ERROR, CRITICAL，多个级别用逗号分隔
+        tool: 工具ID过滤
+    """
+    source_set = None if sources == "all" else {item.strip() for item in sources.split(",") if item.strip()}
+    if source_set is not None and not source_set.issubset(log_tail_hub.sources):
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的日志来源: {sources}，可用: {', '.join(log_tail_hub.sources)}"
+        )
+    level_set = None if level == "all" else {item.strip().upper() for item in level.split(",") if item.strip()}
+    subscription = log_tail_hub.subscribe(source_set, level_set, tool or None)
+    
+    async def event_stream():
+        try:
+            # 断线后浏览器3秒后自动重连
+            yield "retry: 3000\n\n"
+            reported_drops = 0
+            while not await request.is_disconnected():
+                try:
+                    entry = await asyncio.wait_for(subscription.queue.get(), LOG_TAIL_CONFIG["heartbeat"])
+                except asyncio.TimeoutError:
+                    # 心跳，防止代理关闭空闲连接
+                    yield ": ping\n\n"
+                    continue
+                entries = [entry] + subscription.drain(LOG_TAIL_CONFIG["max_batch"] - 1)
+                if subscription.dropped > reported_drops:
+                    yield f"event: dropped\ndata: {subscription.dropped - reported_drops}\n\n"
+                    reported_drops = subscription.dropped
+                yield f"event: log\ndata: {codec.dumps_str(entries)}\n\n"
+        finally:
+            log_tail_hub.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.delete("/api/logs", tags=["日志管理"])
 async def api_clear_logs():
     """清空日志文件
     """
     try:
-        log_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "log", "sap_api.log")
+        log_file_path = os.path.join(LOG_DIR, "sap_api.log")
         
         # 清空日志文件（写入空字符串）
         with open(log_file_path, "w", encoding="utf-8") as f:
             f.write("")
+        log_store.clear()
         
         logger.info("日志文件已清空")
         
@@ -712,37 +685,159 @@ async def api_clear_logs():
         raise HTTPException(status_code=500, detail=f"清空日志文件失败: {str(e)}")
 
 
+@app.get("/api/traces", tags=["日志管理"])
+async def api_get_traces(
+    limit: int = 50,
+    tool: Optional[str] = None,
+    min_duration_ms: Optional[float] = None,
+    errors_only: bool = False
+):
+    """查询最近的工具调用链
+    
+    从MCP服务器的调用链文件（utils.tracing.FileExporter写入）末尾读取，从新到旧返回摘要。
+    
+    Args:
+        limit: 返回的调用链数量上限
+        tool: 只返回该MCP工具或TOOL_ID的调用链
+        min_duration_ms: 只返回耗时不少于该值（毫秒）的调用链
+        errors_only: 只返回包含错误的调用链
+    """
+    limit = min(max(limit, 1), 500)
+    # 过滤后数量会减少，多读取一些调用链
+    scan_limit = limit if not (tool or min_duration_ms or errors_only) else limit * 10
+    traces = await asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(read_trace_file, limit=scan_limit)
+    )
+    summaries = []
+    for trace_id, spans in traces.items():
+        summary = summarize_trace(trace_id, spans)
+        if tool and summary["attributes"].get("tool") != tool \
+                and not any(span["attributes"].get("tool_id") == tool for span in spans):
+            continue
+        if min_duration_ms is not None and (summary["duration_ms"] or 0) < min_duration_ms:
+            continue
+        if errors_only and not summary["error"]:
+            continue
+        summaries.append(summary)
+        if len(summaries) >= limit:
+            break
+    return {"status": "success", "traces": summaries}
+
+
+@app.get("/api/traces/{trace_id}", tags=["日志管理"])
+async def api_get_trace(trace_id: str):
+    """获取一个调用链的span树
+    
+    Args:
+        trace_id: 调用链ID（32位十六进制）
+    """
+    traces = await asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(read_trace_file, limit=1, trace_id=trace_id)
+    )
+    spans = traces.get(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail=f"调用链 {trace_id} 不存在或已轮转")
+    return {
+        "status": "success",
+        "trace": summarize_trace(trace_id, spans),
+        "spans": build_span_tree(spans)
+    }
+
+
+@app.get("/metrics", tags=["健康检查"])
+async def api_metrics():
+    """Prometheus格式的指标
+    
+    包括Web管理界面发往SAP的请求延迟、错误、缓存和连接池等指标；
+    MCP服务器进程的指标在MCP服务器的/metrics中。
+    """
+    return Response(registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+async def probe_sap() -> Dict[str, Any]:
+    """探测SAP接口：使用轻量的PING接口ID，不经过缓存、重试和熔断器"""
+    return await sap_clients.current().ping(HEALTH_CONFIG["sap_ping_function_id"], HEALTH_CONFIG["timeout"])
+
+
+async def probe_mcp_server() -> Dict[str, Any]:
+    """探测MCP服务器：读取/ready和/circuits接口，不检查端口占用进程"""
+    test_host = connect_host(MCP_SERVER_CONFIG["host"])
+    readiness, circuits = await asyncio.gather(
+        check_mcp_ready(test_host, MCP_SERVER_CONFIG["port"]),
+        fetch_mcp_status(test_host, MCP_SERVER_CONFIG["port"], "/circuits")
+    )
+    if readiness is None:
+        raise ConnectionError(f"MCP服务器无法访问: {test_host}:{MCP_SERVER_CONFIG['port']}")
+    return {
+        "ready": bool(readiness.get("ready")),
+        "warmup": readiness.get("warmup"),
+        "circuit_breakers": (circuits or {}).get("circuit_breakers", [])
+    }
+
+
+# 后台健康探测：SAP可达是就绪的必要条件，MCP服务器状态只作为信息展示
+health_prober = HealthProber({"sap": probe_sap, "mcp_server": probe_mcp_server}, critical={"sap"})
+
+
+@app.get("/api/health/live", tags=["健康检查"])
+async def api_health_live():
+    """存活检查，只要事件循环能响应就返回200，不访问任何外部系统"""
+    return {"status": "alive", "uptime_seconds": round(time.time() - health_prober.started_at, 3)}
+
+
+@app.get("/api/health/ready", tags=["健康检查"])
+async def api_health_ready():
+    """就绪检查，返回后台探测缓存的结果及其存在时间
+    
+    SAP探测正常且结果未过期时返回200，否则返回503。
+    """
+    snapshot = health_prober.snapshot()
+    return JSONResponse(snapshot, status_code=200 if snapshot["ready"] else 503)
+
+
 @app.get("/api/health", tags=["健康检查"])
 async def api_health_check():
     """健康检查端点
     
+    只读取后台探测缓存的结果，不会向SAP或MCP服务器发送请求。
+    
     Returns:
         dict: 健康状态信息
     """
-    try:
-        # 检查服务状态
-        service_status = await api_get_service_status()
-        
-        # 尝试连接SAP接口
-        try:
-            test_client = SAPHttpClient()
-            await test_client.get(params={"id": "TOOL_LIST"})
-            sap_status = "healthy"
-        except Exception as e:
-            sap_status = f"unhealthy: {str(e)}"
-        
-        return {
-            "status": "healthy",
-            "service_status": service_status,
-            "sap_status": sap_status,
-            "version": "1.0.0"
-        }
-    except Exception as e:
-        logger.error(f"健康检查失败: {str(e)}")
-        return {
-            "status": "unhealthy",
-            "error": str(e)
-        }
+    snapshot = health_prober.snapshot()
+    sap_check = snapshot["checks"]["sap"]
+    mcp_check = snapshot["checks"]["mcp_server"]
+    mcp_detail = mcp_check.get("detail") or {}
+    
+    if sap_check["status"] == STATUS_UP:
+        sap_status = "healthy"
+    else:
+        sap_status = f"{sap_check['status']}: {sap_check.get('error', '尚未完成探测')}"
+    if mcp_check["status"] == STATUS_UP:
+        service_status = "running" if mcp_detail.get("ready") else "starting"
+    else:
+        service_status = "stopped" if mcp_check.get("checked_at") else "unknown"
+    
+    return {
+        "status": "healthy" if snapshot["ready"] else "unhealthy",
+        "service_status": {
+            "status": service_status,
+            "host": MCP_SERVER_CONFIG["host"],
+            "port": MCP_SERVER_CONFIG["port"],
+            "warmup": mcp_detail.get("warmup")
+        },
+        "sap_status": sap_status,
+        "checks": snapshot["checks"],
+        "sap_client": sap_clients.stats(),
+        # 熔断器状态：Web管理界面自身的SAP客户端和MCP服务器进程各自维护
+        "circuit_breakers": {
+            "web": breaker_stats(),
+            "mcp": mcp_detail.get("circuit_breakers", [])
+        },
+        # Web管理界面自身的SAP并发限流器，MCP服务器进程的限流器见MCP服务器的/limiters
+        "concurrency_limiters": limiter_stats(),
+        "version": "1.0.0"
+    }
 
 # 获取当前文件的目录
 current_dir = os.path.dirname(os.path.abspath(__file__))
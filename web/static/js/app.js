@@ -459,6 +459,9 @@ function switchPage(pageName) {
     document.getElementById('configPage').style.display = 'none';
     document.getElementById('servicePage').style.display = 'none';
     document.getElementById('logsPage').style.display = 'none';
+    document.getElementById('tracesPage').style.display = 'none';
+    // 离开日志页面时断开实时日志
+    stopLogStream();
     
     console.log('开始显示页面:', pageName);
     // 显示对应的页面
@@ -480,6 +483,10 @@ function switchPage(pageName) {
         document.getElementById('logsPage').style.display = 'block';
         // 加载日志
         loadLogs();
+    } else if (pageName == '调用链') {
+        document.getElementById('tracesPage').style.display = 'block';
+        // 加载调用链列表
+        loadTraces();
     }
     console.log('页面切换完成');
 }
@@ -525,6 +532,7 @@ function renderConfigForm() {
     document.getElementById('mcpHost').value = configData.mcp.host;
     document.getElementById('mcpPort').value = configData.mcp.port;
     document.getElementById('mcpPath').value = configData.mcp.path;
+    document.getElementById('mcpWorkers').value = configData.mcp.workers || 1;
     
     // 设置WEB服务器配置
     if (configData.web) {
@@ -544,14 +552,66 @@ async function loadServiceStatus() {
         console.error('加载服务状态失败:', error);
         showServiceMessage('加载服务状态失败: ' + (error.response?.data?.detail || error.message), 'danger');
     }
+    loadCircuitBreakers();
+}
+
+// 加载SAP熔断状态
+async function loadCircuitBreakers() {
+    try {
+        const response = await axios.get('/api/health');
+        renderCircuitBreakers(response.data.circuit_breakers || {});
+    } catch (error) {
+        console.error('加载熔断状态失败:', error);
+    }
+}
+
+// 渲染SAP熔断状态
+function renderCircuitBreakers(circuitBreakers) {
+    const table = document.getElementById('circuitBreakerTable');
+    const stateLabels = {
+        closed: '<span class="badge bg-success">正常</span>',
+        open: '<span class="badge bg-danger">熔断</span>',
+        half_open: '<span class="badge bg-warning text-dark">探测中</span>'
+    };
+    const rows = [];
+    for (const [source, breakers] of Object.entries(circuitBreakers)) {
+        for (const breaker of breakers || []) {
+            rows.push(`
+                <tr>
+                    <td>${source === 'mcp' ? 'MCP服务器' : 'Web管理界面'}</td>
+                    <td>${breaker.function_id || '-'}</td>
+                    <td>${stateLabels[breaker.state] || breaker.state}</td>
+                    <td>${(breaker.failure_rate * 100).toFixed(0)}%</td>
+                    <td>${breaker.state === 'open' ? breaker.retry_after + '秒' : '-'}</td>
+                    <td class="text-muted small">${breaker.last_failure || '-'}</td>
+                </tr>
+            `);
+        }
+    }
+    table.innerHTML = rows.length ? rows.join('') : '<tr><td colspan="6" class="text-muted">暂无数据</td></tr>';
 }
 
 // 渲染服务状态
 function renderServiceStatus(status) {
     // 更新状态文本和样式
     const statusText = document.getElementById('serviceStatusText');
-    statusText.textContent = status.status === 'running' ? '运行中' : '已停止';
-    statusText.className = status.status === 'running' ? 'fs-4 fw-bold text-success' : 'fs-4 fw-bold text-danger';
+    if (status.status === 'starting') {
+        // 端口已监听，但MCP服务器仍在预热工具缓存
+        const progress = status.warmup && status.warmup.progress ? ` (${status.warmup.progress})` : '';
+        statusText.textContent = '预热中' + progress;
+        statusText.className = 'fs-4 fw-bold text-warning';
+    } else if (status.status === 'restarting') {
+        // 进程意外退出，等待退避时间后自动重启
+        const restartIn = status.restart_in !== undefined ? ` (${status.restart_in}秒后)` : '';
+        statusText.textContent = '重启中' + restartIn;
+        statusText.className = 'fs-4 fw-bold text-warning';
+    } else if (status.status === 'stopping') {
+        statusText.textContent = '停止中';
+        statusText.className = 'fs-4 fw-bold text-warning';
+    } else {
+        statusText.textContent = status.status === 'running' ? '运行中' : '已停止';
+        statusText.className = status.status === 'running' ? 'fs-4 fw-bold text-success' : 'fs-4 fw-bold text-danger';
+    }
     
     // 更新主机和端口
     document.getElementById('serviceHost').textContent = status.host;
@@ -562,7 +622,10 @@ function renderServiceStatus(status) {
     const pidElement = document.getElementById('servicePid');
     if (status.pid) {
         pidContainer.style.display = 'block';
-        pidElement.textContent = status.pid;
+        // 多工作进程模式下显示主进程和工作进程ID
+        pidElement.textContent = status.workers && status.workers.length
+            ? `${status.pid} (工作进程: ${status.workers.join(', ')})`
+            : status.pid;
     } else {
         pidContainer.style.display = 'none';
     }
@@ -593,7 +656,8 @@ async function startService() {
         const result = response.data;
         
         renderServiceStatus(result.status);
-        showServiceMessage(result.message, result.status.status === 'running' ? 'success' : 'danger');
+        const started = ['running', 'starting'].includes(result.status.status);
+        showServiceMessage(result.message, started ? 'success' : 'danger');
         
     } catch (error) {
         console.error('启动服务失败:', error);
@@ -647,28 +711,51 @@ function showServiceMessage(message, type = 'info') {
     }, 3000);
 }
 
+// 更早日志的游标
+let logsNextCursor = null;
+
 // 加载日志
-async function loadLogs() {
+async function loadLogs(older = false) {
     try {
-        // 获取当前选择的日志级别
+        // 获取当前选择的日志级别和过滤条件
         const logLevel = document.getElementById('logLevelSelect').value;
+        const tool = document.getElementById('logToolInput').value.trim();
+        const keyword = document.getElementById('logSearchInput').value.trim();
         
-        // 显示加载状态
         const logsContent = document.getElementById('logsContent');
-        logsContent.textContent = '正在加载日志...';
+        const loadOlderBtn = document.getElementById('loadOlderLogsBtn');
+        if (!older) {
+            // 显示加载状态
+            logsContent.textContent = '正在加载日志...';
+            logsNextCursor = null;
+        }
+        
+        const params = {
+            level: logLevel,
+            limit: 1000
+        };
+        if (tool) params.tool = tool;
+        if (keyword) params.q = keyword;
+        if (older && logsNextCursor) params.cursor = logsNextCursor;
         
         // 请求日志数据
-        const response = await axios.get('/api/logs', {
-            params: {
-                level: logLevel,
-                limit: 1000
-            }
-        });
+        const response = await axios.get('/api/logs', { params });
         
         const result = response.data;
         
         if (result.status === 'success') {
-            logsContent.textContent = result.data || '没有日志内容';
+            if (older) {
+                // 更早的日志插入到前面
+                logsContent.textContent = result.data + (logsContent.textContent ? '\n' + logsContent.textContent : '');
+            } else {
+                logsContent.textContent = result.data || '没有日志内容';
+            }
+            logsNextCursor = result.next_cursor || null;
+            loadOlderBtn.style.display = logsNextCursor ? 'inline-block' : 'none';
+            if (!older) {
+                // 历史日志加载完成后接收新日志
+                startLogStream();
+            }
         } else {
             logsContent.textContent = `加载日志失败: ${result.detail || '未知错误'}`;
         }
@@ -678,6 +765,159 @@ async function loadLogs() {
     }
 }
 
+// 实时日志连接
+let logEventSource = null;
+// 日志页面最多显示的行数，超出时删除最早的行
+const MAX_LOG_LINES = 5000;
+
+// 连接实时日志（服务端推送，按当前的级别和工具过滤）
+function startLogStream() {
+    stopLogStream();
+    if (!document.getElementById('logLiveSwitch').checked) {
+        return;
+    }
+    
+    const params = new URLSearchParams({
+        sources: document.getElementById('logSourceSelect').value,
+        level: document.getElementById('logLevelSelect').value
+    });
+    const tool = document.getElementById('logToolInput').value.trim();
+    if (tool) params.set('tool', tool);
+    
+    logEventSource = new EventSource(`/api/logs/stream?${params.toString()}`);
+    logEventSource.addEventListener('log', function(event) {
+        const keyword = document.getElementById('logSearchInput').value.trim();
+        const lines = JSON.parse(event.data)
+            .map(entry => entry.line)
+            .filter(line => !keyword || line.includes(keyword));
+        appendLogLines(lines);
+    });
+    logEventSource.addEventListener('dropped', function(event) {
+        appendLogLines([`[客户端处理太慢，已跳过 ${event.data} 条日志]`]);
+    });
+    logEventSource.onerror = function(error) {
+        // EventSource会自动重连，这里只记录错误
+        console.error('实时日志连接中断:', error);
+    };
+}
+
+// 断开实时日志
+function stopLogStream() {
+    if (logEventSource) {
+        logEventSource.close();
+        logEventSource = null;
+    }
+}
+
+// 追加日志行
+function appendLogLines(lines) {
+    if (!lines.length) {
+        return;
+    }
+    const logsContent = document.getElementById('logsContent');
+    const container = document.getElementById('logsContainer');
+    // 只有已滚动到底部时才自动跟随新日志
+    const atBottom = container.scrollHeight - container.scrollTop - container.clientHeight < 20;
+    
+    let text = logsContent.textContent === '没有日志内容' ? '' : logsContent.textContent;
+    text = text ? text + '\n' + lines.join('\n') : lines.join('\n');
+    const allLines = text.split('\n');
+    if (allLines.length > MAX_LOG_LINES) {
+        text = allLines.slice(allLines.length - MAX_LOG_LINES).join('\n');
+        // 最早的日志已被删除，无法继续向前加载
+        logsNextCursor = null;
+        document.getElementById('loadOlderLogsBtn').style.display = 'none';
+    }
+    logsContent.textContent = text;
+    
+    if (atBottom) {
+        container.scrollTop = container.scrollHeight;
+    }
+}
+
+// 转义HTML特殊字符
+function escapeHtml(value) {
+    return String(value ?? '').replace(/[&<>"']/g, ch => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    }[ch]));
+}
+
+// 加载调用链列表
+async function loadTraces() {
+    const traceList = document.getElementById('traceList');
+    try {
+        const params = { limit: 100 };
+        const tool = document.getElementById('traceToolInput').value.trim();
+        const minDuration = document.getElementById('traceMinDurationInput').value;
+        if (tool) params.tool = tool;
+        if (minDuration) params.min_duration_ms = minDuration;
+        if (document.getElementById('traceErrorsOnly').checked) params.errors_only = true;
+        
+        const response = await axios.get('/api/traces', { params });
+        const traces = response.data.traces || [];
+        traceList.innerHTML = traces.length ? traces.map(trace => `
+            <tr style="cursor: pointer;" data-trace-id="${escapeHtml(trace.trace_id)}">
+                <td>${new Date(trace.start_time * 1000).toLocaleString()}</td>
+                <td>${escapeHtml(trace.attributes.tool || trace.name)}</td>
+                <td>${trace.duration_ms != null ? trace.duration_ms.toFixed(1) : '-'}</td>
+                <td>${trace.span_count}</td>
+                <td>${trace.error ? '<span class="badge bg-danger">错误</span>' : '<span class="badge bg-success">成功</span>'}</td>
+            </tr>
+        `).join('') : '<tr><td colspan="5" class="text-muted">暂无调用链</td></tr>';
+        traceList.querySelectorAll('tr[data-trace-id]').forEach(row => {
+            row.addEventListener('click', () => loadTraceDetail(row.dataset.traceId));
+        });
+    } catch (error) {
+        console.error('加载调用链失败:', error);
+        traceList.innerHTML = `<tr><td colspan="5" class="text-danger">加载调用链失败: ${escapeHtml(error.response?.data?.detail || error.message)}</td></tr>`;
+    }
+}
+
+// 显示调用链的span树（按时间轴展示各阶段的耗时）
+async function loadTraceDetail(traceId) {
+    const traceDetail = document.getElementById('traceDetail');
+    traceDetail.style.display = 'block';
+    traceDetail.textContent = '正在加载调用链...';
+    try {
+        const response = await axios.get(`/api/traces/${encodeURIComponent(traceId)}`);
+        const { trace, spans } = response.data;
+        const traceStart = trace.start_time;
+        const total = Math.max(trace.duration_ms || 0, 0.001);
+        const rows = [];
+        
+        const renderSpan = (span, depth) => {
+            const offset = Math.min((span.start_time - traceStart) * 1000 / total * 100, 100);
+            const width = Math.max(Math.min((span.duration_ms || 0) / total * 100, 100 - offset), 0.5);
+            const attributes = Object.entries(span.attributes || {})
+                .map(([key, value]) => `${escapeHtml(key)}=${escapeHtml(value)}`).join(' ');
+            const barClass = span.status === 'ERROR' ? 'bg-danger' : 'bg-primary';
+            rows.push(`
+                <div class="d-flex align-items-center small mb-1">
+                    <div style="width: 35%; padding-left: ${depth * 16}px;" title="${escapeHtml(span.status_message)}">
+                        ${escapeHtml(span.name)}
+                        <span class="text-muted">${span.duration_ms != null ? span.duration_ms.toFixed(1) + 'ms' : ''}</span>
+                    </div>
+                    <div class="position-relative flex-grow-1" style="height: 14px;">
+                        <div class="position-absolute ${barClass}" style="left: ${offset}%; width: ${width}%; height: 100%;"></div>
+                    </div>
+                </div>
+                ${attributes ? `<div class="text-muted small mb-1" style="padding-left: ${depth * 16}px;">${attributes}</div>` : ''}
+            `);
+            (span.children || []).forEach(child => renderSpan(child, depth + 1));
+        };
+        spans.forEach(span => renderSpan(span, 0));
+        
+        traceDetail.innerHTML = `
+            <div class="mb-2"><strong>调用链 ${escapeHtml(trace.trace_id)}</strong>
+                <span class="text-muted">总耗时 ${total.toFixed(1)}ms</span></div>
+            ${rows.join('')}
+        `;
+    } catch (error) {
+        console.error('加载调用链详情失败:', error);
+        traceDetail.textContent = `加载调用链详情失败: ${error.response?.data?.detail || error.message}`;
+    }
+}
+
 // 绑定事件监听器
 function bindEventListeners() {
     // 搜索按钮
@@ -791,7 +1031,10 @@ function bindEventListeners() {
     document.getElementById('refreshServiceBtn').addEventListener('click', loadServiceStatus);
     
     // 日志管理按钮
-    document.getElementById('refreshLogsBtn').addEventListener('click', loadLogs);
+    document.getElementById('refreshLogsBtn').addEventListener('click', () => loadLogs());
+    document.getElementById('loadOlderLogsBtn').addEventListener('click', () => loadLogs(true));
+    document.getElementById('logToolInput').addEventListener('change', () => loadLogs());
+    document.getElementById('logSearchInput').addEventListener('change', () => loadLogs());
     document.getElementById('clearLogsBtn').addEventListener('click', async function() {
         try {
             // 显示确认提示
@@ -809,7 +1052,15 @@ function bindEventListeners() {
             document.getElementById('logsContent').textContent = `清空日志失败: ${error.response?.data?.detail || error.message}`;
         }
     });
-    document.getElementById('logLevelSelect').addEventListener('change', loadLogs);
+    document.getElementById('logLevelSelect').addEventListener('change', () => loadLogs());
+    document.getElementById('logSourceSelect').addEventListener('change', startLogStream);
+    document.getElementById('logLiveSwitch').addEventListener('change', startLogStream);
+    
+    // 调用链
+    document.getElementById('refreshTracesBtn').addEventListener('click', loadTraces);
+    document.getElementById('traceToolInput').addEventListener('change', loadTraces);
+    document.getElementById('traceMinDurationInput').addEventListener('change', loadTraces);
+    document.getElementById('traceErrorsOnly').addEventListener('change', loadTraces);
 }
 
 // 保存配置
@@ -839,6 +1090,7 @@ async function saveConfig() {
         config.sap.client_id = parseInt(config.sap.client_id);
         config.sap.timeout = parseInt(config.sap.timeout);
         config.mcp.port = parseInt(config.mcp.port);
+        config.mcp.workers = parseInt(config.mcp.workers) || 1;
         config.web.port = parseInt(config.web.port);
         
         // 发送保存请求
@@ -883,6 +1135,7 @@ async function saveConfigSection(section) {
             config.sap.timeout = parseInt(config.sap.timeout);
         } else if (section === 'mcp') {
             config.mcp.port = parseInt(config.mcp.port);
+            config.mcp.workers = parseInt(config.mcp.workers) || 1;
         } else if (section === 'web') {
             config.web.port = parseInt(config.web.port);
         }